@@ -15,24 +15,30 @@ class TransferStoreUploader(object):
 
   Input is divided into chunks, then these chunks are compressed (using zlib)
   and then they are uploaded to the transfer store (a well-known flow).
+
+  In the digest-only mode chunks are not uploaded at all, only their digests
+  are computed. The server is then expected to request contents of chunks that
+  it does not have yet.
   """
 
   DEFAULT_CHUNK_SIZE = 512 * 1024
 
   _TRANSFER_STORE_SESSION_ID = rdfvalue.SessionID(flow_name="TransferStore")
 
-  def __init__(self, action, chunk_size=None):
+  def __init__(self, action, chunk_size=None, digest_only=False):
     """Initializes the uploader.
 
     Args:
       action: A parent action that creates the uploader. Used to communicate
         with the parent flow.
       chunk_size: A number of (uncompressed) bytes per a chunk.
+      digest_only: If true, chunks are only digested and not uploaded.
     """
     chunk_size = chunk_size or self.DEFAULT_CHUNK_SIZE
 
     self._action = action
     self._streamer = streaming.Streamer(chunk_size=chunk_size)
+    self._digest_only = digest_only
 
   def UploadFilePath(self, filepath, offset=0, amount=None):
     """Uploads chunks of a file on a given path to the transfer store flow.
@@ -84,10 +90,11 @@ class TransferStoreUploader(object):
     Returns:
       A `BlobImageChunkDescriptor` object.
     """
-    blob = _CompressedDataBlob(chunk)
+    if not self._digest_only:
+      blob = _CompressedDataBlob(chunk)
 
-    self._action.ChargeBytesToSession(len(chunk.data))
-    self._action.SendReply(blob, session_id=self._TRANSFER_STORE_SESSION_ID)
+      self._action.ChargeBytesToSession(len(chunk.data))
+      self._action.SendReply(blob, session_id=self._TRANSFER_STORE_SESSION_ID)
 
     return rdf_client_fs.BlobImageChunkDescriptor(
         digest=hashlib.sha256(chunk.data).digest(),
@@ -130,6 +130,33 @@ class UploaderTest(absltest.TestCase):
       self.assertEqual(blobdesc.chunks[2].length, 1)
       self.assertEqual(blobdesc.chunks[2].digest, Sha256(b"6"))
 
+  def testDigestOnly(self):
+    action = FakeAction()
+    uploader = uploading.TransferStoreUploader(
+        action, chunk_size=3, digest_only=True
+    )
+
+    with temp.AutoTempFilePath() as temp_filepath:
+      with io.open(temp_filepath, "wb") as temp_file:
+        temp_file.write(b"1234567")
+
+      blobdesc = uploader.UploadFilePath(temp_filepath)
+
+      self.assertEqual(action.charged_bytes, 0)
+      self.assertEmpty(action.messages)
+
+      self.assertLen(blobdesc.chunks, 3)
+      self.assertEqual(blobdesc.chunk_size, 3)
+      self.assertEqual(blobdesc.chunks[0].offset, 0)
+      self.assertEqual(blobdesc.chunks[0].length, 3)
+      self.assertEqual(blobdesc.chunks[0].digest, Sha256(b"123"))
+      self.assertEqual(blobdesc.chunks[1].offset, 3)
+      self.assertEqual(blobdesc.chunks[1].length, 3)
+      self.assertEqual(blobdesc.chunks[1].digest, Sha256(b"456"))
+      self.assertEqual(blobdesc.chunks[2].offset, 6)
+      self.assertEqual(blobdesc.chunks[2].length, 1)
+      self.assertEqual(blobdesc.chunks[2].digest, Sha256(b"7"))
+
   def testIncorrectFile(self):
     action = FakeAction()
     uploader = uploading.TransferStoreUploader(action, chunk_size=10)
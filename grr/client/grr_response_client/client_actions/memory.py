@@ -4,13 +4,17 @@
 import abc
 import collections
 from collections.abc import Callable, Iterable, Iterator, Sequence
+from concurrent import futures
 import contextlib
+import hashlib
 import io
 import logging
 import os
 import platform
+import queue
 import re
 import shutil
+import threading
 from typing import Any, IO, Optional
 
 import psutil
@@ -145,6 +149,89 @@ def _ShouldIncludeError(
   return True
 
 
+def _SignatureSHA256(signature: str) -> bytes:
+  return hashlib.sha256(signature.encode("utf-8")).digest()
+
+
+class _YaraRulesCacheEntry:
+  """A cached YARA signature along with its lazily compiled rules."""
+
+  def __init__(self, signature: str) -> None:
+    self.signature = signature
+    self.rules: Optional[yara.Rules] = None
+    self.lock = threading.Lock()
+
+
+class _YaraRulesCache:
+  """A bounded cache of recently used YARA signatures and their rules.
+
+  Signatures are keyed by SHA-256 digests of their UTF-8 encoding, which allows
+  the server to refer to a signature the client has already received without
+  sending it again. Rules are compiled the first time they are used and are
+  reused by subsequent scans with the same signature.
+  """
+
+  def __init__(self) -> None:
+    self._lock = threading.Lock()
+    self._entries: collections.OrderedDict[bytes, _YaraRulesCacheEntry] = (
+        collections.OrderedDict()
+    )
+
+  def _GetEntry(self, signature: str) -> _YaraRulesCacheEntry:
+    """Returns the entry of the signature, caching it if it is not cached."""
+    digest = _SignatureSHA256(signature)
+    max_size = config.CONFIG["Client.yara_rules_cache_size"]
+
+    with self._lock:
+      entry = self._entries.get(digest)
+      if entry is not None:
+        self._entries.move_to_end(digest)
+        return entry
+
+      entry = _YaraRulesCacheEntry(signature)
+      if max_size > 0:
+        self._entries[digest] = entry
+        while len(self._entries) > max_size:
+          self._entries.popitem(last=False)
+
+      return entry
+
+  def Put(self, signature: str) -> None:
+    """Caches the signature without compiling it."""
+    self._GetEntry(signature)
+
+  def GetSignature(self, sha256: bytes) -> Optional[str]:
+    """Returns a cached signature with the given digest, if there is any."""
+    with self._lock:
+      entry = self._entries.get(sha256)
+      if entry is None:
+        return None
+
+      self._entries.move_to_end(sha256)
+      return entry.signature
+
+  def Compile(self, signature: str) -> yara.Rules:
+    """Returns rules compiled from the signature."""
+    entry = self._GetEntry(signature)
+    with entry.lock:
+      if entry.rules is None:
+        entry.rules = yara.compile(source=signature)
+      return entry.rules
+
+  def CompileAndSave(self, signature: str) -> bytes:
+    """Returns rules compiled from the signature, serialized by YARA."""
+    compiled = io.BytesIO()
+    self.Compile(signature).save(file=compiled)
+    return compiled.getvalue()
+
+  def Clear(self) -> None:
+    with self._lock:
+      self._entries.clear()
+
+
+_YARA_RULES_CACHE = _YaraRulesCache()
+
+
 class YaraWrapperError(Exception):
   pass
 
@@ -212,6 +299,8 @@ class DirectYaraWrapper(YaraWrapper):
     """
     self._rules_str = rules_str
     self._rules: Optional[yara.Rules] = None
+    # Compiled rules can be shared by threads scanning processes in parallel.
+    self._rules_lock = threading.Lock()
     self._progress = progress
     self._context_window: int = context_window
 
@@ -236,8 +325,9 @@ class DirectYaraWrapper(YaraWrapper):
     timeout_secs = (deadline - rdfvalue.RDFDatetime.Now()).ToInt(
         rdfvalue.SECONDS
     )
-    if self._rules is None:
-      self._rules = yara.compile(source=self._rules_str)
+    with self._rules_lock:
+      if self._rules is None:
+        self._rules = _YARA_RULES_CACHE.Compile(self._rules_str)
     data = process.ReadBytes(chunk.offset, chunk.amount)
     try:
       for m in self._rules.match(data=data, timeout=timeout_secs):
@@ -334,7 +424,11 @@ class UnprivilegedYaraWrapper(YaraWrapper):
     if self._client is None:
       raise ValueError("Client not instantiated.")
     if not self._rules_uploaded:
-      self._client.UploadSignature(self._rules_str)
+      # Rules are compiled (or taken from the cache) here, so that recurring
+      # scans with the same signature don't compile it in every sandbox.
+      self._client.UploadCompiledSignature(
+          _YARA_RULES_CACHE.CompileAndSave(self._rules_str)
+      )
       self._rules_uploaded = True
     if process.pid not in self._pid_to_serializable_file_descriptor:
       raise (
@@ -428,6 +522,7 @@ class BatchedUnprivilegedYaraWrapper(YaraWrapper):
       rules_str: str,
       psutil_processes: list[psutil.Process],
       context_window: Optional[int] = None,
+      batch_size: Optional[int] = None,
   ):
     """Constructor.
 
@@ -435,12 +530,14 @@ class BatchedUnprivilegedYaraWrapper(YaraWrapper):
       rules_str: The YARA rules represented as string.
       psutil_processes: List of processes that can be scanned using `Match`.
       context_window: Amount of bytes surrounding the match to return.
+      batch_size: Number of processes to open at once, BATCH_SIZE by default.
     """
 
     self._batches: list[UnprivilegedYaraWrapper] = []
 
-    for i in range(0, len(psutil_processes), self.BATCH_SIZE):
-      process_batch = psutil_processes[i : i + self.BATCH_SIZE]
+    batch_size = batch_size or self.BATCH_SIZE
+    for i in range(0, len(psutil_processes), batch_size):
+      process_batch = psutil_processes[i : i + batch_size]
       self._batches.append(UnprivilegedYaraWrapper(rules_str, process_batch))
 
     self._current_batch = self._batches.pop(0)
@@ -567,6 +664,10 @@ class YaraProcessScan(actions.ActionPlugin):
   # multiple responses for 100 processes each.
   _RESULTS_PER_RESPONSE = 100
 
+  # How often to report progress while waiting for processes scanned in
+  # parallel.
+  _PARALLEL_SCAN_PROGRESS_INTERVAL_SECS = 1
+
   def __init__(self, grr_worker=None):
     super().__init__(grr_worker=grr_worker)
     self._yara_process_matcher = None
@@ -662,12 +763,26 @@ class YaraProcessScan(actions.ActionPlugin):
       return None
 
   def Run(self, args):
-    if args.yara_signature or not args.signature_shard.payload:
+    if args.yara_signature:
       raise ValueError(
           "A Yara signature shard is required, and not the full signature."
       )
 
-    if args.num_signature_shards == 1:
+    if not args.signature_shard.payload:
+      if not args.signature_sha256:
+        raise ValueError(
+            "A Yara signature shard or a digest of a cached signature is "
+            "required."
+        )
+
+      yara_signature = _YARA_RULES_CACHE.GetSignature(args.signature_sha256)
+      if yara_signature is None:
+        # The server has to send the signature.
+        self.SendReply(
+            rdf_memory.YaraProcessScanResponse(signature_missing=True)
+        )
+        return
+    elif args.num_signature_shards == 1:
       # Skip saving to disk if there is just one shard.
       yara_signature = args.signature_shard.payload.decode("utf-8")
     else:
@@ -676,6 +791,8 @@ class YaraProcessScan(actions.ActionPlugin):
         # We haven't received the whole signature yet.
         return
 
+    _YARA_RULES_CACHE.Put(yara_signature)
+
     scan_request = args.Copy()
     scan_request.yara_signature = yara_signature
     scan_response = rdf_memory.YaraProcessScanResponse()
@@ -698,7 +815,38 @@ class YaraProcessScan(actions.ActionPlugin):
       self.SendReply(scan_response)
       return
 
-    if self._UseSandboxing(args):
+    num_workers = min(
+        scan_request.max_parallel_scans, len(processes), os.cpu_count() or 1
+    )
+    if num_workers > 1:
+      process_responses = self._ScanProcessesInParallel(
+          processes, scan_request, num_workers
+      )
+    else:
+      process_responses = self._ScanProcesses(processes, scan_request)
+
+    for process_response in process_responses:
+      num_results = (
+          len(scan_response.errors)
+          + len(scan_response.matches)
+          + len(scan_response.misses)
+      )
+      if num_results >= self._RESULTS_PER_RESPONSE:
+        self.SendReply(scan_response)
+        scan_response = rdf_memory.YaraProcessScanResponse()
+      scan_response.errors.Extend(process_response.errors)
+      scan_response.matches.Extend(process_response.matches)
+      scan_response.misses.Extend(process_response.misses)
+
+    self.SendReply(scan_response)
+
+  def _ScanProcesses(
+      self,
+      processes: list[psutil.Process],
+      scan_request: rdf_memory.YaraProcessScanRequest,
+  ) -> Iterator[rdf_memory.YaraProcessScanResponse]:
+    """Scans processes one after another, yielding a response per process."""
+    if self._UseSandboxing(scan_request):
       yara_wrapper: YaraWrapper = BatchedUnprivilegedYaraWrapper(
           str(scan_request.yara_signature),
           processes,
@@ -715,22 +863,118 @@ class YaraProcessScan(actions.ActionPlugin):
       matcher = YaraScanRequestMatcher(yara_wrapper)
       for process in processes:
         self.Progress()
-        num_results = (
-            len(scan_response.errors)
-            + len(scan_response.matches)
-            + len(scan_response.misses)
+        process_response = rdf_memory.YaraProcessScanResponse()
+        self._ScanProcess(process, scan_request, process_response, matcher)
+        yield process_response
+
+  def _ScanProcessesInParallel(
+      self,
+      processes: list[psutil.Process],
+      scan_request: rdf_memory.YaraProcessScanRequest,
+      num_workers: int,
+  ) -> Iterator[rdf_memory.YaraProcessScanResponse]:
+    """Scans processes in worker threads, yielding a response per process.
+
+    Processes are split between the workers. With sandboxing, every worker
+    scans its processes in its own sandboxed server. Without it, workers share
+    a single wrapper, as yara releases the GIL while matching.
+
+    Responses are yielded in the order in which scans complete. Progress (and
+    thus CPU and runtime limits) is checked on the calling thread, workers are
+    stopped as soon as the calling thread stops consuming the responses.
+
+    Args:
+      processes: Processes to scan.
+      scan_request: The scan request.
+      num_workers: Number of processes to scan concurrently.
+
+    Yields:
+      A response with the results of scanning a single process.
+    """
+    stopped = threading.Event()
+    process_responses = queue.Queue()
+
+    def WorkerProgress() -> None:
+      if stopped.is_set():
+        raise YaraWrapperError("Scan stopped.")
+
+    def Worker(
+        worker_processes: list[psutil.Process],
+        yara_wrapper: YaraWrapper,
+    ) -> None:
+      matcher = YaraScanRequestMatcher(yara_wrapper)
+      for process in worker_processes:
+        if stopped.is_set():
+          return
+        process_response = rdf_memory.YaraProcessScanResponse()
+        self._ScanProcess(process, scan_request, process_response, matcher)
+        process_responses.put(process_response)
+
+    partitions = [processes[i::num_workers] for i in range(num_workers)]
+
+    with contextlib.ExitStack() as stack:
+      if self._UseSandboxing(scan_request):
+        # All the sandboxed servers are open at the same time, so they have to
+        # share the limit of open file descriptors.
+        batch_size = max(
+            BatchedUnprivilegedYaraWrapper.BATCH_SIZE // num_workers, 1
         )
-        if num_results >= self._RESULTS_PER_RESPONSE:
-          self.SendReply(scan_response)
-          scan_response = rdf_memory.YaraProcessScanResponse()
-        self._ScanProcess(
-            process,
-            scan_request,
-            scan_response,
-            matcher,
+        wrappers = [
+            stack.enter_context(
+                BatchedUnprivilegedYaraWrapper(
+                    str(scan_request.yara_signature),
+                    partition,
+                    scan_request.context_window,
+                    batch_size=batch_size,
+                )
+            )
+            for partition in partitions
+        ]
+      else:
+        yara_wrapper = stack.enter_context(
+            DirectYaraWrapper(
+                str(scan_request.yara_signature),
+                WorkerProgress,
+                scan_request.context_window,
+            )
         )
+        wrappers = [yara_wrapper] * num_workers
 
-      self.SendReply(scan_response)
+      executor = stack.enter_context(
+          futures.ThreadPoolExecutor(
+              max_workers=num_workers,
+              thread_name_prefix="YaraProcessScan",
+          )
+      )
+      # Registered after the executor, so workers are stopped before it is
+      # shut down (and waits for them).
+      stack.callback(stopped.set)
+
+      worker_futures = [
+          executor.submit(Worker, partition, yara_wrapper)
+          for partition, yara_wrapper in zip(partitions, wrappers)
+      ]
+
+      while True:
+        self.Progress()
+        try:
+          process_response = process_responses.get(
+              timeout=self._PARALLEL_SCAN_PROGRESS_INTERVAL_SECS
+          )
+        except queue.Empty:
+          for worker_future in worker_futures:
+            if worker_future.done():
+              # Propagates errors raised outside of per-process scans.
+              worker_future.result()
+
+          if (
+              all(f.done() for f in worker_futures)
+              and process_responses.empty()
+          ):
+            break
+          continue
+
+        yield process_response
 
   def _UseSandboxing(self, args: rdf_memory.YaraProcessScanRequest) -> bool:
     # Memory sandboxing is currently not supported on macOS.
@@ -1,5 +1,8 @@
 #!/usr/bin/env python
+import hashlib
+import io
 import os
+import threading
 from unittest import mock
 
 from absl import app
@@ -145,6 +148,101 @@ class YaraProcessScanTest(client_test_lib.EmptyActionTest):
         results[0].errors[0].error, "No matching processes to scan."
     )
 
+  def testSignatureDigest_NotCached(self):
+    signature = b"rule missing { condition: true }"
+    scan_request = rdf_memory.YaraProcessScanRequest(
+        signature_sha256=hashlib.sha256(signature).digest()
+    )
+
+    with mock.patch.object(
+        memory.YaraScanRequestMatcher, "GetMatchesForProcess"
+    ) as mock_get_matches:
+      results = self.ExecuteAction(
+          memory.YaraProcessScan,
+          arg=scan_request,
+          session_id="C.0123456789abcdef/01234567",
+      )
+
+    mock_get_matches.assert_not_called()
+    self.assertLen(results, 2)
+    self.assertTrue(results[0].signature_missing)
+    self.assertIsInstance(results[1], rdf_flows.GrrStatus)
+
+  def testSignatureDigest_Cached(self):
+    signature = "rule cached { condition: true }"
+    shard_request = rdf_memory.YaraProcessScanRequest(
+        signature_shard=rdf_memory.YaraSignatureShard(
+            index=0, payload=signature.encode("utf-8")
+        ),
+        num_signature_shards=1,
+    )
+    digest_request = rdf_memory.YaraProcessScanRequest(
+        signature_sha256=hashlib.sha256(signature.encode("utf-8")).digest()
+    )
+
+    with mock.patch.object(
+        memory.YaraScanRequestMatcher,
+        "GetMatchesForProcess",
+        return_value=[],
+    ) as mock_get_matches:
+      self.ExecuteAction(memory.YaraProcessScan, arg=shard_request)
+      results = self.ExecuteAction(memory.YaraProcessScan, arg=digest_request)
+
+    self.assertFalse(results[0].signature_missing)
+    self.assertEqual(mock_get_matches.call_count, 2)
+    _, scan_request = mock_get_matches.call_args[0]
+    self.assertEqual(scan_request.yara_signature, signature)
+
+  def testScansProcessesInParallel(self):
+    scan_request = rdf_memory.YaraProcessScanRequest(
+        signature_shard=rdf_memory.YaraSignatureShard(index=0, payload=b"123"),
+        num_signature_shards=1,
+        include_misses_in_results=True,
+        max_parallel_scans=4,
+        implementation_type=(
+            rdf_memory.YaraProcessScanRequest.ImplementationType.DIRECT
+        ),
+    )
+    processes = [Process(pid, "cmd") for pid in range(250)]
+    thread_names = set()
+
+    def GetMatchesForProcess(unused_matcher, process, unused_scan_request):
+      thread_names.add(threading.current_thread().name)
+      return [rdf_memory.YaraMatch()] if process.pid % 2 else []
+
+    with mock.patch.object(
+        memory, "ProcessIterator", return_value=processes
+    ), mock.patch.object(
+        memory.YaraScanRequestMatcher,
+        "GetMatchesForProcess",
+        side_effect=GetMatchesForProcess,
+        autospec=True,
+    ), mock.patch.object(
+        os, "cpu_count", return_value=4
+    ):
+      results = self.ExecuteAction(
+          memory.YaraProcessScan,
+          arg=scan_request,
+          session_id="C.0123456789abcdef/01234567",
+      )
+
+    self.assertIsInstance(results[-1], rdf_flows.GrrStatus)
+    responses = results[:-1]
+    self.assertLen(responses, 3)
+    for response in responses:
+      self.assertLessEqual(
+          len(response.matches) + len(response.misses),
+          memory.YaraProcessScan._RESULTS_PER_RESPONSE,
+      )
+
+    matched_pids = [m.process.pid for r in responses for m in r.matches]
+    missed_pids = [m.process.pid for r in responses for m in r.misses]
+    self.assertCountEqual(matched_pids, range(1, 250, 2))
+    self.assertCountEqual(missed_pids, range(0, 250, 2))
+    self.assertTrue(
+        all(name.startswith("YaraProcessScan") for name in thread_names)
+    )
+
   def testCanExcludesMisses(self):
     scan_request = rdf_memory.YaraProcessScanRequest(
         signature_shard=rdf_memory.YaraSignatureShard(index=0, payload=b"123"),
@@ -282,6 +380,65 @@ class YaraProcessScanTest(client_test_lib.EmptyActionTest):
     self.assertEmpty(scan_response.matches)
 
 
+class YaraRulesCacheTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.cache = memory._YaraRulesCache()
+
+    config_overrider = test_lib.ConfigOverrider(
+        {"Client.yara_rules_cache_size": 2}
+    )
+    config_overrider.Start()
+    self.addCleanup(config_overrider.Stop)
+
+  def _Digest(self, signature):
+    return hashlib.sha256(signature.encode("utf-8")).digest()
+
+  def testCompiledRulesAreReused(self):
+    signature = "rule foo { condition: true }"
+
+    with mock.patch.object(memory.yara, "compile", wraps=memory.yara.compile):
+      rules = self.cache.Compile(signature)
+      self.assertIs(self.cache.Compile(signature), rules)
+      memory.yara.compile.assert_called_once_with(source=signature)
+
+  def testGetSignature(self):
+    self.cache.Put("rule foo { condition: true }")
+
+    self.assertEqual(
+        self.cache.GetSignature(self._Digest("rule foo { condition: true }")),
+        "rule foo { condition: true }",
+    )
+    self.assertIsNone(
+        self.cache.GetSignature(self._Digest("rule bar { condition: true }"))
+    )
+
+  def testLeastRecentlyUsedSignaturesAreEvicted(self):
+    self.cache.Put("rule foo { condition: true }")
+    self.cache.Put("rule bar { condition: true }")
+    self.cache.GetSignature(self._Digest("rule foo { condition: true }"))
+    self.cache.Put("rule baz { condition: true }")
+
+    self.assertIsNotNone(
+        self.cache.GetSignature(self._Digest("rule foo { condition: true }"))
+    )
+    self.assertIsNone(
+        self.cache.GetSignature(self._Digest("rule bar { condition: true }"))
+    )
+    self.assertIsNotNone(
+        self.cache.GetSignature(self._Digest("rule baz { condition: true }"))
+    )
+
+  def testCompileAndSave(self):
+    signature = "rule foo { condition: true }"
+
+    saved = self.cache.CompileAndSave(signature)
+
+    rules = memory.yara.load(file=io.BytesIO(saved))
+    self.assertEqual([rule.identifier for rule in rules], ["foo"])
+
+
 def R(start, size):
   """Returns a new ProcessMemoryRegion with the given start and size."""
   return rdf_memory.ProcessMemoryRegion(start=start, size=size)
@@ -16,6 +16,7 @@ from grr_response_core.lib.rdfvalues import timeline as rdf_timeline
 from grr_response_core.lib.util import temp
 from grr.test_lib import client_test_lib
 from grr.test_lib import skip
+from grr.test_lib import test_lib
 from grr.test_lib import testing_startup
 
 
@@ -73,6 +74,39 @@ class TimelineTest(client_test_lib.EmptyActionTest):
         # The filesystem type should be the same for every result.
         self.assertEqual(result.filesystem_type, results[0].filesystem_type)
 
+  def testRunWithWalkerThreads(self):
+    with temp.AutoTempDirPath(remove_non_empty=True) as temp_dirpath:
+      for idx in range(8):
+        dirpath = os.path.join(temp_dirpath, "foo{}".format(idx))
+        os.mkdir(dirpath)
+        for jdx in range(8):
+          _Touch(os.path.join(dirpath, "bar{}".format(jdx)))
+
+      args = rdf_timeline.TimelineArgs()
+      args.root = temp_dirpath.encode("utf-8")
+
+      with test_lib.ConfigOverrider({"Client.timeline_walker_threads": 4}):
+        responses = self.RunAction(timeline.Timeline, args)
+
+      results = [
+          response
+          for response in responses
+          if isinstance(response, rdf_timeline.TimelineResult)
+      ]
+      blobs = [
+          response
+          for response in responses
+          if isinstance(response, rdf_protodict.DataBlob)
+      ]
+
+      entries = list(
+          rdf_timeline.DeserializeTimelineEntryStream(
+              iter(blob.data for blob in blobs)
+          )
+      )
+      self.assertLen(entries, 1 + 8 + 8 * 8)
+      self.assertEqual(sum(result.entry_count for result in results), 73)
+
 
 class WalkTest(absltest.TestCase):
 
@@ -256,6 +290,80 @@ class WalkTest(absltest.TestCase):
       self.assertEqual(paths[1], os.path.join(dirpath, "foo", "bar"))
 
 
+class WalkProtoTest(absltest.TestCase):
+
+  def testSameEntriesAsWalk(self):
+    with temp.AutoTempDirPath(remove_non_empty=True) as root_dirpath:
+      for dirpath in [("foo", "bar"), ("foo", "baz"), ("quux", "norf")]:
+        os.makedirs(os.path.join(root_dirpath, *dirpath))
+        for idx in range(16):
+          _Touch(
+              os.path.join(root_dirpath, *dirpath, "thud{}".format(idx)),
+              content=os.urandom(idx),
+          )
+
+      def Key(entry):
+        return (entry.path, entry.mode, entry.size, entry.ino, entry.dev)
+
+      walk_entries = timeline.Walk(root_dirpath.encode("utf-8"))
+      walk_proto_entries = timeline.WalkProto(root_dirpath.encode("utf-8"), 4)
+
+      self.assertCountEqual(
+          list(map(Key, walk_proto_entries)),
+          list(map(Key, walk_entries)),
+      )
+
+  def testRootEntryFirst(self):
+    with temp.AutoTempDirPath(remove_non_empty=True) as dirpath:
+      _Touch(os.path.join(dirpath, "foo"), content=b"foobar")
+
+      entries = list(timeline.WalkProto(dirpath.encode("utf-8"), 2))
+      self.assertLen(entries, 2)
+
+      self.assertEqual(entries[0].path, dirpath.encode("utf-8"))
+      self.assertTrue(stat_mode.S_ISDIR(entries[0].mode))
+      self.assertEqual(entries[1].size, 6)
+
+  @skip.If(
+      platform.system() == "Windows",
+      reason="Symlinks are not supported on Windows.",
+  )
+  def testSymlinks(self):
+    with temp.AutoTempDirPath(remove_non_empty=True) as root_dirpath:
+      sub_dirpath = os.path.join(root_dirpath, "foo", "bar")
+      link_path = os.path.join(sub_dirpath, "quux")
+
+      # This creates a cycle, walker should be able to cope with that.
+      os.makedirs(sub_dirpath)
+      os.symlink(root_dirpath, link_path)
+
+      entries = list(timeline.WalkProto(root_dirpath.encode("utf-8"), 4))
+
+      paths = [_.path.decode("utf-8") for _ in entries]
+      self.assertCountEqual(
+          paths,
+          [
+              root_dirpath,
+              os.path.join(root_dirpath, "foo"),
+              sub_dirpath,
+              link_path,
+          ],
+      )
+
+  def testIncorrectPath(self):
+    with temp.AutoTempDirPath(remove_non_empty=True) as dirpath:
+      not_existing_path = os.path.join(dirpath, "not", "existing", "path")
+
+      with self.assertRaises(OSError):
+        timeline.WalkProto(not_existing_path.encode("utf-8"), 4)
+
+  def testRelativePath(self):
+    relpath = os.path.join("foo", "bar", "baz")
+
+    with self.assertRaises(ValueError):
+      timeline.WalkProto(relpath.encode("utf-8"), 4)
+
+
 class GetFilesystemType(absltest.TestCase):
 
   def testReturnsForExistingPath(self):
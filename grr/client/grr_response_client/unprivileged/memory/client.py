@@ -129,6 +129,13 @@ class Client:
     request = memory_pb2.UploadSignatureRequest(yara_signature=yara_signature)
     UploadSignatureHandler(self._connection).Run(request)
 
+  def UploadCompiledSignature(self, compiled_yara_signature: bytes):
+    """Uploads compiled yara rules to be used for this connection."""
+    request = memory_pb2.UploadSignatureRequest(
+        compiled_yara_signature=compiled_yara_signature
+    )
+    UploadSignatureHandler(self._connection).Run(request)
+
   def ProcessScan(
       self,
       serialized_file_descriptor: int,
@@ -1,9 +1,11 @@
 #!/usr/bin/env python
 import contextlib
+import io
 import os
 import platform
 import unittest
 from absl.testing import absltest
+import yara
 from grr_response_client import client_utils
 from grr_response_client import streaming
 from grr_response_client.unprivileged import communication
@@ -103,6 +105,32 @@ class MemoryTest(absltest.TestCase):
     self.assertTrue(found_in_actual_memory_count)
     self.assertTrue(expected_context_found)
 
+  def testProcessScanWithCompiledSignature(self):
+    compiled_signature = io.BytesIO()
+    yara.compile(source=_SIGNATURE).save(file=compiled_signature)
+
+    self._client.UploadCompiledSignature(compiled_signature.getvalue())
+
+    rule_names = set()
+    for region in self._process.Regions():
+      streamer = streaming.Streamer(
+          chunk_size=1024 * 1024, overlap_size=32 * 1024
+      )
+      for chunk in streamer.StreamRanges(region.start, region.size):
+        response = self._client.ProcessScan(
+            self._process_file_descriptor.Serialize(),
+            [memory_pb2.Chunk(offset=chunk.offset, size=chunk.amount)],
+            60,
+            0,
+        )
+        self.assertEqual(
+            response.status, memory_pb2.ProcessScanResponse.Status.NO_ERROR
+        )
+        for scan_match in response.scan_result.scan_match:
+          rule_names.add(scan_match.rule_name)
+
+    self.assertEqual(rule_names, {"test_rule"})
+
 
 def setUpModule() -> None:
   test_lib.SetUpDummyConfig()
@@ -2,6 +2,7 @@
 """Unprivileged memory RPC server."""
 
 import abc
+import io
 import sys
 import time
 import traceback
@@ -97,7 +98,12 @@ class UploadSignatureHandler(
   def HandleOperation(
       self, state: State, request: memory_pb2.UploadSignatureRequest
   ) -> memory_pb2.UploadSignatureResponse:
-    state.yara_rules = yara.compile(source=request.yara_signature)
+    if request.HasField("compiled_yara_signature"):
+      state.yara_rules = yara.load(
+          file=io.BytesIO(request.compiled_yara_signature)
+      )
+    else:
+      state.yara_rules = yara.compile(source=request.yara_signature)
     return memory_pb2.UploadSignatureResponse()
 
   def PackResponse(
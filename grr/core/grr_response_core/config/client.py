@@ -112,6 +112,18 @@ config_lib.DEFINE_bool(
     help="Whether to use the sandboxed implementation for memory scanning.",
     default=False)
 
+config_lib.DEFINE_integer(
+    name="Client.timeline_walker_threads",
+    help=("Number of threads the timeline action lists directories with. If"
+          " 0, directories are walked one after another on a single thread."),
+    default=0)
+
+config_lib.DEFINE_integer(
+    name="Client.yara_rules_cache_size",
+    help=("Number of most recently used YARA signatures kept in memory (along"
+          " with their compiled rules) by memory scanning actions."),
+    default=8)
+
 config_lib.DEFINE_string(
     name="Client.unprivileged_user",
     help="Name of (UNIX) user to run sandboxed code as.",
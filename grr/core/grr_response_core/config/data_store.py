@@ -121,3 +121,75 @@ config_lib.DEFINE_string(
         "Only used when Blobstore.implementation is GCSBlobStore."
     ),
 )
+
+# Cached blobstore config
+config_lib.DEFINE_string(
+    "Blobstore.cache.delegate",
+    default="DbBlobStore",
+    help=(
+        "Blob store whose blobs are cached. Only used when "
+        "Blobstore.implementation is CachedBlobStore."
+    ),
+)
+config_lib.DEFINE_string(
+    "Blobstore.cache.directory",
+    default="",
+    help=(
+        "Local directory to cache blobs in. If empty, blobs are not cached on "
+        "disk. Only used when Blobstore.implementation is CachedBlobStore."
+    ),
+)
+config_lib.DEFINE_integer(
+    "Blobstore.cache.max_disk_size",
+    default=10 * 1024 * 1024 * 1024,
+    help=(
+        "Maximum number of bytes of blobs cached on disk. Only used when "
+        "Blobstore.implementation is CachedBlobStore."
+    ),
+)
+config_lib.DEFINE_integer(
+    "Blobstore.cache.max_memory_size",
+    default=64 * 1024 * 1024,
+    help=(
+        "Maximum number of bytes of blobs cached in memory. If 0, blobs are "
+        "not cached in memory. Only used when Blobstore.implementation is "
+        "CachedBlobStore."
+    ),
+)
+
+# Compressed blobstore config
+config_lib.DEFINE_string(
+    "Blobstore.compression.delegate",
+    default="DbBlobStore",
+    help=(
+        "Blob store to write compressed blobs to. Only used when "
+        "Blobstore.implementation is CompressedBlobStore."
+    ),
+)
+config_lib.DEFINE_choice(
+    "Blobstore.compression.codec",
+    default="auto",
+    choices=["auto", "zstd", "zlib", "none"],
+    help=(
+        "Codec to compress blobs with. 'auto' uses zstd if the zstandard "
+        "package is installed and zlib otherwise. Only used when "
+        "Blobstore.implementation is CompressedBlobStore."
+    ),
+)
+config_lib.DEFINE_integer(
+    "Blobstore.compression.level",
+    default=3,
+    help=(
+        "Compression level of the codec. Only used when "
+        "Blobstore.implementation is CompressedBlobStore."
+    ),
+)
+config_lib.DEFINE_float(
+    "Blobstore.compression.max_ratio",
+    default=0.9,
+    help=(
+        "Maximum ratio of compressed to uncompressed size for a blob to be "
+        "stored compressed. Less compressible blobs are stored as they are. "
+        "Only used when Blobstore.implementation is CompressedBlobStore."
+    ),
+)
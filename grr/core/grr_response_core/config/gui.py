@@ -2,6 +2,7 @@
 """Configuration parameters for the admin UI."""
 
 from grr_response_core.lib import config_lib
+from grr_response_core.lib import rdfvalue
 from grr_response_core.lib.rdfvalues import config as rdf_config
 
 # The Admin UI web application.
@@ -306,3 +307,50 @@ config_lib.DEFINE_list(
     "Policy header added. This is applied to URLs after applying "
     "AdminUI.csp_include_url_prefixes.",
 )
+
+config_lib.DEFINE_integer(
+    "AdminUI.export_conversion_processes",
+    0,
+    "Number of processes that convert flow and hunt results to exported "
+    "values when results are downloaded. If 0, results are converted on the "
+    "thread serving the download.",
+)
+
+config_lib.DEFINE_integer(
+    "AdminUI.export_conversion_batch_size",
+    1000,
+    "Number of results sent to an export conversion process at once.",
+)
+
+config_lib.DEFINE_integer(
+    "AdminUI.exported_metadata_cache_size",
+    0,
+    "Maximum number of clients whose exported metadata (hostname, OS, labels "
+    "etc.) is cached across result downloads. If 0, the metadata is read "
+    "from the database for every download.",
+)
+
+config_lib.DEFINE_semantic_value(
+    rdfvalue.Duration,
+    "AdminUI.exported_metadata_cache_max_age",
+    rdfvalue.Duration.From(10, rdfvalue.MINUTES),
+    "How long cached exported metadata of a client is used before it is read "
+    "from the database again.",
+)
+
+config_lib.DEFINE_integer(
+    "AdminUI.hunt_timeline_export_prefetch",
+    0,
+    "Number of client timelines that are read and formatted concurrently "
+    "ahead of the one being written when hunt timelines are downloaded. "
+    "Prefetched timelines are spilled to disk once they grow big. If 0, "
+    "timelines are generated one by one.",
+)
+
+config_lib.DEFINE_integer(
+    "AdminUI.hunt_timeline_export_processes",
+    0,
+    "Number of processes that format timelines in the body format when hunt "
+    "timelines are downloaded. If 0, timelines are formatted on the thread "
+    "generating them.",
+)
@@ -38,6 +38,36 @@ config_lib.DEFINE_integer(
     "Worker.queue_shards", 5, "Queue notifications will be sharded across "
     "this number of datastore subjects.")
 
+config_lib.DEFINE_integer(
+    "Worker.flow_processing_batch_size", 1,
+    "Maximum number of flows a worker thread leases, processes and releases "
+    "at once. Values above 1 enable batch processing, in which the number of "
+    "flows per batch adapts to the depth of the flow processing queue.")
+
+config_lib.DEFINE_bool(
+    "Worker.async_hunt_output_plugins", False,
+    "If true, results of hunt flows are queued and processed by the hunt "
+    "output plugins in batches spanning many flows, instead of being processed "
+    "inline while the flows are being processed.")
+
+config_lib.DEFINE_integer(
+    "Worker.hunt_output_plugin_threads", 4,
+    "Number of worker threads processing queued hunt results with the hunt "
+    "output plugins (see Worker.async_hunt_output_plugins).")
+
+config_lib.DEFINE_integer(
+    "Worker.hunt_output_plugin_batch_size", 1000,
+    "Maximum number of queued hunt result batches (one per flow processing "
+    "step) processed by the hunt output plugins at once.")
+
+config_lib.DEFINE_semantic_value(
+    rdfvalue.Duration,
+    "Worker.hunt_output_plugin_lease_time",
+    rdfvalue.Duration.From(10, rdfvalue.MINUTES),
+    "Time for which queued hunt results are leased for processing by the hunt "
+    "output plugins. Results are processed again if processing them doesn't "
+    "complete in time.")
+
 config_lib.DEFINE_list("Frontend.well_known_flows", [], "Unused, Deprecated.")
 
 # Smtp settings.
@@ -102,6 +132,26 @@ config_lib.DEFINE_integer(
     "Maximum time messages remain valid within the "
     "system.")
 
+config_lib.DEFINE_bool(
+    "Frontend.proto_message_processing", False,
+    "If True, messages received from Fleetspeak in batches are processed as "
+    "protos all the way down to the datastore writes, without converting them "
+    "to RDF values.")
+
+config_lib.DEFINE_semantic_value(
+    rdfvalue.Duration,
+    "Frontend.client_metadata_flush_interval",
+    rdfvalue.Duration.From(0, rdfvalue.SECONDS),
+    "How often the Fleetspeak frontend writes accumulated client last-ping "
+    "and validation info updates to the database in bulk. If 0, every update "
+    "is written to the database right away.")
+
+config_lib.DEFINE_integer(
+    "Frontend.client_metadata_max_pending", 100000,
+    "Maximum number of clients with client metadata updates accumulated in "
+    "memory. Once reached, the updates are written to the database right "
+    "away.")
+
 config_lib.DEFINE_bool(
     "Server.initialized", False, "True once config_updater initialize has been "
     "run at least once.")
@@ -172,6 +222,38 @@ config_lib.DEFINE_integer(
     10000000,
     help="The number of bytes allowed for unbounded reads from a file object")
 
+config_lib.DEFINE_integer(
+    "Server.blob_stream_read_ahead",
+    16,
+    help="The number of blobs following the requested one that a file object "
+    "fetches from the blob store in the same call.")
+
+config_lib.DEFINE_integer(
+    "Server.blob_stream_cache_size",
+    32 * 1024 * 1024,
+    help="The maximum number of bytes of blob data a single file object keeps "
+    "cached in memory.")
+
+config_lib.DEFINE_bool(
+    "Server.blob_stream_background_read_ahead",
+    False,
+    help="If true, file objects fetch the next read-ahead window of blobs in a "
+    "background thread while the current one is being consumed.")
+
+config_lib.DEFINE_bool(
+    "Server.timeline_indexing",
+    False,
+    help="If true, the timeline flow indexes batches of collected entries by "
+    "their common path prefix and time range, so that filtered timeline "
+    "exports read only the batches that can match the filter.")
+
+config_lib.DEFINE_bool(
+    "Server.yara_signature_cache_probe",
+    False,
+    help="If true, YARA process scans first ask the client to scan with a "
+    "signature it has cached and send the signature only if the client doesn't "
+    "have it. Only enable if all the clients support signature caching.")
+
 # Data retention policies.
 config_lib.DEFINE_semantic_value(
     rdfvalue.Duration,
@@ -254,6 +336,23 @@ config_lib.DEFINE_integer(
     "If the average network usage per client becomes "
     "greater than this limit, the hunt gets stopped.")
 
+config_lib.DEFINE_semantic_value(
+    rdfvalue.Duration,
+    "Foreman.rules_cache_ttl",
+    default=rdfvalue.Duration.From(10, rdfvalue.SECONDS),
+    help="How long the foreman keeps using foreman rules read from the "
+    "database before reading them again. Newly started hunts reach clients "
+    "that check in within this time on their next check-in.")
+
+config_lib.DEFINE_semantic_value(
+    rdfvalue.Duration,
+    "Server.client_index_cache_ttl",
+    default=rdfvalue.Duration.From(0, rdfvalue.SECONDS),
+    help="How long client searches keep using keyword posting lists read from "
+    "the database before reading them again. Keywords written by other "
+    "processes become searchable within this time. If zero, posting lists are "
+    "not cached and every search reads them from the database.")
+
 # GRRafana HTTP Server settings.
 config_lib.DEFINE_string(
     "GRRafana.bind", default="localhost", help="The GRRafana server address.")
@@ -297,6 +396,18 @@ config_lib.DEFINE_integer(
     help="Maximum number of client ids to place in a single Fleetspeak "
     "ListClients() API request.")
 
+config_lib.DEFINE_integer(
+    "Server.fleetspeak_send_parallelism",
+    default=1,
+    help=(
+        "Maximum number of concurrent Fleetspeak InsertMessage() calls used "
+        "to send a batch of messages (e.g. requests of all flows processed "
+        "together by a worker). With the default of 1, messages are sent "
+        "sequentially in the order they were queued; larger values don't "
+        "preserve the order."
+    ),
+)
+
 config_lib.DEFINE_bool(
     "Server.fleetspeak_cps_enabled",
     default=False,
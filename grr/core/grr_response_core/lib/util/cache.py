@@ -1,16 +1,28 @@
 #!/usr/bin/env python
 """This file contains cache-related utility functions used by GRR."""
 
-from collections.abc import Callable
+import collections
+from collections.abc import Callable, Hashable
 import functools
 import logging
 import threading
-from typing import Any, TypeVar
+from typing import Any, Optional, TypeVar
 
 from grr_response_core.lib import rdfvalue
+from grr_response_core.stats import metrics
 
 WITH_LIMITED_CALL_FREQUENCY_PASS_THROUGH = False
 
+CALL_FREQUENCY_CACHE_HITS = metrics.Counter(
+    "call_frequency_cache_hits", fields=[("name", str)]
+)
+CALL_FREQUENCY_CACHE_MISSES = metrics.Counter(
+    "call_frequency_cache_misses", fields=[("name", str)]
+)
+CALL_FREQUENCY_CACHE_EVICTIONS = metrics.Counter(
+    "call_frequency_cache_evictions", fields=[("name", str)]
+)
+
 _F = TypeVar("_F", bound=Callable[..., Any])
 
 _FVoid = TypeVar("_FVoid", bound=Callable[..., None])
@@ -298,3 +310,313 @@ def WithLimitedCallFrequencyWithoutReturnValue(
     return Fn
 
   return Decorated
+
+
+class _CallFrequencyEntry:
+  """A time and a result of the last completed call with given arguments."""
+
+  __slots__ = ("time", "result")
+
+  def __init__(self, time: rdfvalue.RDFDatetime, result: Any) -> None:
+    self.time = time
+    self.result = result
+
+
+class _PendingCall:
+  """A lock of an ongoing call with given arguments and its waiter count."""
+
+  __slots__ = ("lock", "waiters")
+
+  def __init__(self) -> None:
+    self.lock = threading.RLock()
+    self.waiters = 0
+
+
+class _CallFrequencyShard:
+  """A part of the bounded call frequency cache guarded by its own lock.
+
+  Entries are kept in the order of their call times, so both expired entries
+  and entries evicted because of the size bound are popped from the front in
+  amortized constant time.
+  """
+
+  def __init__(self, name: str, max_entries: int) -> None:
+    self.lock = threading.Lock()
+    self.entries: collections.OrderedDict[Hashable, _CallFrequencyEntry] = (
+        collections.OrderedDict()
+    )
+    self.pending: dict[Hashable, _PendingCall] = {}
+    self._name = name
+    self._max_entries = max_entries
+
+  def Get(
+      self,
+      key: Hashable,
+      now: rdfvalue.RDFDatetime,
+      min_time: rdfvalue.Duration,
+  ) -> Optional[_CallFrequencyEntry]:
+    """Returns the entry of a call with the given key, if it is still fresh.
+
+    Has to be called with the shard lock held.
+
+    Args:
+      key: A key identifying arguments of the call.
+      now: The current time.
+      min_time: A minimal time to pass between calls with same arguments.
+
+    Returns:
+      An entry of the previous call or None if it has expired.
+    """
+    while self.entries:
+      oldest_key, oldest_entry = next(iter(self.entries.items()))
+      if oldest_entry.time > now:
+        # We have a result from the future, hopefully this is a test...
+        logging.warning(
+            "Deleting cached function result from the future (%s > %s)",
+            oldest_entry.time,
+            now,
+        )
+      elif now - oldest_entry.time < min_time:
+        break
+
+      del self.entries[oldest_key]
+
+    entry = self.entries.get(key)
+    if entry is not None and entry.time > now:
+      del self.entries[key]
+      return None
+
+    return entry
+
+  def Put(self, key: Hashable, entry: _CallFrequencyEntry) -> None:
+    """Stores the entry, evicting the oldest ones if the shard is full.
+
+    Has to be called with the shard lock held.
+
+    Args:
+      key: A key identifying arguments of the call.
+      entry: An entry of the call.
+    """
+    self.entries.pop(key, None)
+    self.entries[key] = entry
+
+    while len(self.entries) > self._max_entries:
+      self.entries.popitem(last=False)
+      CALL_FREQUENCY_CACHE_EVICTIONS.Increment(fields=[self._name])
+
+  def Acquire(self, key: Hashable) -> _PendingCall:
+    """Registers a caller waiting for the call with the given key.
+
+    Has to be called with the shard lock held.
+
+    Args:
+      key: A key identifying arguments of the call.
+
+    Returns:
+      A pending call object that has to be released with `Release`.
+    """
+    try:
+      pending = self.pending[key]
+    except KeyError:
+      pending = _PendingCall()
+      self.pending[key] = pending
+
+    pending.waiters += 1
+    return pending
+
+  def Release(self, key: Hashable, pending: _PendingCall) -> None:
+    """Unregisters a caller registered with `Acquire`."""
+    with self.lock:
+      pending.waiters -= 1
+      if pending.waiters == 0:
+        del self.pending[key]
+
+
+class _BoundedCallFrequencyCache:
+  """A cache of calls split into shards by the call arguments."""
+
+  def __init__(self, name: str, max_entries: int, num_shards: int) -> None:
+    if max_entries < num_shards:
+      num_shards = max(max_entries, 1)
+
+    self._shards = [
+        _CallFrequencyShard(name, max(max_entries // num_shards, 1))
+        for _ in range(num_shards)
+    ]
+
+  def Shard(self, key: Hashable) -> _CallFrequencyShard:
+    return self._shards[hash(key) % len(self._shards)]
+
+  def DebugInternalState(self) -> dict[str, Any]:
+    entries = {}
+    pending = {}
+    for shard in self._shards:
+      with shard.lock:
+        entries.update(shard.entries)
+        pending.update(shard.pending)
+
+    return dict(entries=entries, pending=pending)
+
+
+def WithBoundedLimitedCallFrequency(
+    min_time_between_calls: rdfvalue.Duration,
+    max_entries: int,
+    num_shards: int = 16,
+) -> Callable[[_F], _F]:
+  """Bounded variant of the `WithLimitedCallFrequency` decorator.
+
+  The decorator gives the same guarantees as `WithLimitedCallFrequency`, but
+  it keeps results of at most (approximately) max_entries recent calls. If the
+  cache is full, results of the least recent calls are evicted. Stale entries
+  are cleaned up in amortized constant time and the cache is split into shards
+  with separate locks, so that calls with different arguments do not contend.
+
+  Hits, misses and evictions are counted in metrics labeled with the name of
+  the decorated function.
+
+  Args:
+    min_time_between_calls: An rdfvalue.Duration specifying the minimal time to
+      pass between 2 consecutive function calls with same arguments.
+    max_entries: A maximum number of cached call results.
+    num_shards: A number of independently locked parts of the cache.
+
+  Returns:
+    A Python function decorator.
+  """
+
+  def Decorated(f: _F) -> _F:
+    """Actual decorator implementation."""
+
+    name = getattr(f, "__name__", "unknown")
+    calls = _BoundedCallFrequencyCache(name, max_entries, num_shards)
+
+    @functools.wraps(f)
+    def Fn(*args, **kwargs):
+      """Wrapper around the decorated function."""
+
+      if WITH_LIMITED_CALL_FREQUENCY_PASS_THROUGH:
+        # This effectively turns off the caching.
+        min_time = rdfvalue.Duration(0)
+      else:
+        min_time = min_time_between_calls
+
+      key = (args, tuple(sorted(kwargs.items())))
+      now = rdfvalue.RDFDatetime.Now()
+      shard = calls.Shard(key)
+
+      with shard.lock:
+        entry = shard.Get(key, now, min_time)
+        if entry is not None:
+          CALL_FREQUENCY_CACHE_HITS.Increment(fields=[name])
+          return entry.result
+
+        pending = shard.Acquire(key)
+
+      try:
+        with pending.lock:
+          with shard.lock:
+            entry = shard.entries.get(key)
+
+          if entry is not None and entry.time >= now:
+            # Another call completed while we were waiting for it.
+            CALL_FREQUENCY_CACHE_HITS.Increment(fields=[name])
+            return entry.result
+
+          CALL_FREQUENCY_CACHE_MISSES.Increment(fields=[name])
+          result = f(*args, **kwargs)
+
+          entry = _CallFrequencyEntry(rdfvalue.RDFDatetime.Now(), result)
+          with shard.lock:
+            shard.Put(key, entry)
+
+          return result
+      finally:
+        shard.Release(key, pending)
+
+    # This is used by the tests to ensure that the internal representation
+    # behaves as expected.
+    Fn._DebugInternalState = (  # pylint: disable=protected-access
+        calls.DebugInternalState
+    )
+
+    return Fn
+
+  return Decorated
+
+
+def WithBoundedLimitedCallFrequencyWithoutReturnValue(
+    min_time_between_calls: rdfvalue.Duration,
+    max_entries: int,
+    num_shards: int = 16,
+) -> Callable[[_FVoid], _FVoid]:
+  """Bounded variant of `WithLimitedCallFrequencyWithoutReturnValue`.
+
+  The decorator gives the same guarantees as
+  `WithLimitedCallFrequencyWithoutReturnValue` and bounds the cache the same
+  way `WithBoundedLimitedCallFrequency` does.
+
+  Args:
+    min_time_between_calls: An rdfvalue.Duration specifying the minimal time to
+      pass between 2 consecutive function calls with same arguments.
+    max_entries: A maximum number of remembered calls.
+    num_shards: A number of independently locked parts of the cache.
+
+  Returns:
+    A Python function decorator.
+  """
+
+  def Decorated(f: _FVoid) -> _FVoid:
+    """Actual decorator implementation."""
+
+    name = getattr(f, "__name__", "unknown")
+    calls = _BoundedCallFrequencyCache(name, max_entries, num_shards)
+
+    @functools.wraps(f)
+    def Fn(*args, **kwargs):
+      """Wrapper around the decorated function."""
+
+      if WITH_LIMITED_CALL_FREQUENCY_PASS_THROUGH:
+        # This effectively turns off the caching.
+        min_time = rdfvalue.Duration(0)
+      else:
+        min_time = min_time_between_calls
+
+      key = (args, tuple(sorted(kwargs.items())))
+      now = rdfvalue.RDFDatetime.Now()
+      shard = calls.Shard(key)
+
+      with shard.lock:
+        if shard.Get(key, now, min_time) is not None:
+          CALL_FREQUENCY_CACHE_HITS.Increment(fields=[name])
+          return
+
+        pending = shard.Acquire(key)
+
+      try:
+        if not pending.lock.acquire(blocking=False):
+          # A call with the same arguments is in progress.
+          CALL_FREQUENCY_CACHE_HITS.Increment(fields=[name])
+          return
+
+        try:
+          CALL_FREQUENCY_CACHE_MISSES.Increment(fields=[name])
+          r = f(*args, **kwargs)
+          assert r is None, "Wrapped function should have no return value"
+
+          entry = _CallFrequencyEntry(rdfvalue.RDFDatetime.Now(), None)
+          with shard.lock:
+            shard.Put(key, entry)
+        finally:
+          pending.lock.release()
+      finally:
+        shard.Release(key, pending)
+
+    # This is used by the tests to ensure that the internal representation
+    # behaves as expected.
+    Fn._DebugInternalState = (  # pylint: disable=protected-access
+        calls.DebugInternalState
+    )
+
+    return Fn
+
+  return Decorated
@@ -7,9 +7,15 @@ from absl.testing import absltest
 
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib.util import cache
+from grr_response_core.stats import default_stats_collector
+from grr_response_core.stats import stats_collector_instance
 from grr.test_lib import test_lib
 
 
+def setUpModule() -> None:
+  stats_collector_instance.Set(default_stats_collector.DefaultStatsCollector())
+
+
 class WithLimitedCallFrequencyTest(absltest.TestCase):
 
   def setUp(self):
@@ -426,5 +432,262 @@ class WithLimitedCallFrequencyWithoutReturnValueTest(absltest.TestCase):
       decorated("blah")
 
 
+class WithBoundedLimitedCallFrequencyTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.mock_fn = mock.Mock(wraps=lambda *_: random.random())
+    self.mock_fn.__name__ = "bounded_foo"  # Expected by functools.wraps.
+
+  def _Decorate(self, max_entries=100, num_shards=4):
+    return cache.WithBoundedLimitedCallFrequency(
+        rdfvalue.Duration.From(30, rdfvalue.SECONDS),
+        max_entries=max_entries,
+        num_shards=num_shards,
+    )(self.mock_fn)
+
+  def testCallsFunctionEveryTimeWhenMinTimeBetweenCallsZero(self):
+    decorated = cache.WithBoundedLimitedCallFrequency(
+        rdfvalue.Duration(0), max_entries=10
+    )(self.mock_fn)
+    for _ in range(10):
+      decorated()
+
+    self.assertEqual(self.mock_fn.call_count, 10)
+
+  def testCallsFunctionOnceInGivenTimeRangeWhenMinTimeBetweenCallsNonZero(self):
+    decorated = self._Decorate()
+
+    now = rdfvalue.RDFDatetime.Now()
+    with test_lib.FakeTime(now):
+      r1 = decorated(1)
+
+    with test_lib.FakeTime(now + rdfvalue.Duration.From(15, rdfvalue.SECONDS)):
+      r2 = decorated(1)
+
+    self.assertEqual(r1, r2)
+    self.assertEqual(self.mock_fn.call_count, 1)
+
+    with test_lib.FakeTime(now + rdfvalue.Duration.From(30, rdfvalue.SECONDS)):
+      r3 = decorated(1)
+
+    self.assertNotEqual(r1, r3)
+    self.assertEqual(self.mock_fn.call_count, 2)
+
+  def testCacheIsCleanedAfterMinTimeBetweenCallsHasElapsed(self):
+    decorated = self._Decorate()
+
+    now = rdfvalue.RDFDatetime.Now()
+    with test_lib.FakeTime(now):
+      for i in range(10):
+        decorated(i)
+
+    self.assertLen(decorated._DebugInternalState()["entries"], 10)
+
+    with test_lib.FakeTime(now + rdfvalue.Duration.From(30, rdfvalue.SECONDS)):
+      for i in range(10):
+        decorated(i)
+
+    self.assertLen(decorated._DebugInternalState()["entries"], 10)
+    self.assertEqual(self.mock_fn.call_count, 20)
+
+  def testNumberOfEntriesIsBounded(self):
+    decorated = self._Decorate(max_entries=8, num_shards=1)
+
+    now = rdfvalue.RDFDatetime.Now()
+    with test_lib.FakeTime(now):
+      for i in range(100):
+        decorated(i)
+
+      self.assertLen(decorated._DebugInternalState()["entries"], 8)
+
+      # Least recent calls are evicted, most recent ones are still cached.
+      decorated(99)
+      self.assertEqual(self.mock_fn.call_count, 100)
+      decorated(0)
+      self.assertEqual(self.mock_fn.call_count, 101)
+
+  def testCachingIsDonePerArguments(self):
+    decorated = self._Decorate()
+
+    now = rdfvalue.RDFDatetime.Now()
+    with test_lib.FakeTime(now):
+      r1_a = decorated(1)
+      r1_b = decorated(2)
+      r1_c = decorated(1, foo="bar")
+
+    with test_lib.FakeTime(now + rdfvalue.Duration.From(15, rdfvalue.SECONDS)):
+      self.assertEqual(decorated(1), r1_a)
+      self.assertEqual(decorated(2), r1_b)
+      self.assertEqual(decorated(1, foo="bar"), r1_c)
+
+    self.assertEqual(self.mock_fn.call_count, 3)
+
+  def testCountsHitsMissesAndEvictions(self):
+    decorated = self._Decorate(max_entries=1, num_shards=1)
+    fields = ["bounded_foo"]
+    hits = cache.CALL_FREQUENCY_CACHE_HITS.GetValue(fields=fields)
+    misses = cache.CALL_FREQUENCY_CACHE_MISSES.GetValue(fields=fields)
+    evictions = cache.CALL_FREQUENCY_CACHE_EVICTIONS.GetValue(fields=fields)
+
+    with test_lib.FakeTime(rdfvalue.RDFDatetime.Now()):
+      decorated(1)
+      decorated(1)
+      decorated(2)
+
+    self.assertEqual(
+        cache.CALL_FREQUENCY_CACHE_HITS.GetValue(fields=fields), hits + 1
+    )
+    self.assertEqual(
+        cache.CALL_FREQUENCY_CACHE_MISSES.GetValue(fields=fields), misses + 2
+    )
+    self.assertEqual(
+        cache.CALL_FREQUENCY_CACHE_EVICTIONS.GetValue(fields=fields),
+        evictions + 1,
+    )
+
+  def testDecoratedFunctionIsNotExecutedConcurrently(self):
+    event = threading.Event()
+
+    # Can't rely on mock's call_count as it's not thread safe.
+    fn_calls = []
+
+    def Fn():
+      fn_calls.append(True)
+      event.wait()
+      return self.mock_fn()
+
+    decorated = cache.WithBoundedLimitedCallFrequency(
+        rdfvalue.Duration.From(30, rdfvalue.SECONDS), max_entries=10
+    )(Fn)
+
+    results = []
+
+    def T():
+      results.append(decorated())
+
+    threads = []
+    for _ in range(10):
+      t = threading.Thread(target=T)
+      t.start()
+      threads.append(t)
+
+    event.set()
+
+    for t in threads:
+      t.join()
+
+    self.assertLen(results, len(threads))
+    self.assertLen(set(results), 1)
+    self.assertLen(fn_calls, 1)
+    self.assertEmpty(decorated._DebugInternalState()["pending"])
+
+  def testExceptionIsNotCached(self):
+    mock_fn = mock.Mock(side_effect=ValueError())
+    mock_fn.__name__ = "foo"  # Expected by functools.wraps.
+
+    decorated = cache.WithBoundedLimitedCallFrequency(
+        rdfvalue.Duration.From(30, rdfvalue.SECONDS), max_entries=10
+    )(mock_fn)
+
+    for _ in range(10):
+      with self.assertRaises(ValueError):
+        decorated()
+
+    self.assertEqual(mock_fn.call_count, 10)
+    self.assertEmpty(decorated._DebugInternalState()["pending"])
+
+  def testRaisesOnUnhashableArguments(self):
+    decorated = self._Decorate()
+
+    with self.assertRaisesRegex(TypeError, "unhashable type"):
+      decorated(dict(foo="bar"))
+
+
+class WithBoundedLimitedCallFrequencyWithoutReturnValueTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.mock_fn = mock.Mock(return_value=None)
+    self.mock_fn.__name__ = "bounded_bar"  # Expected by functools.wraps.
+
+  def _Decorate(self, max_entries=100, num_shards=4):
+    return cache.WithBoundedLimitedCallFrequencyWithoutReturnValue(
+        rdfvalue.Duration.From(30, rdfvalue.SECONDS),
+        max_entries=max_entries,
+        num_shards=num_shards,
+    )(self.mock_fn)
+
+  def testCallsFunctionOnceInGivenTimeRangeWhenMinTimeBetweenCallsNonZero(self):
+    decorated = self._Decorate()
+
+    now = rdfvalue.RDFDatetime.Now()
+    with test_lib.FakeTime(now):
+      decorated(1)
+
+    with test_lib.FakeTime(now + rdfvalue.Duration.From(15, rdfvalue.SECONDS)):
+      decorated(1)
+
+    self.assertEqual(self.mock_fn.call_count, 1)
+
+    with test_lib.FakeTime(now + rdfvalue.Duration.From(30, rdfvalue.SECONDS)):
+      decorated(1)
+
+    self.assertEqual(self.mock_fn.call_count, 2)
+
+  def testNumberOfEntriesIsBounded(self):
+    decorated = self._Decorate(max_entries=8, num_shards=1)
+
+    with test_lib.FakeTime(rdfvalue.RDFDatetime.Now()):
+      for i in range(100):
+        decorated(i)
+
+      self.assertLen(decorated._DebugInternalState()["entries"], 8)
+
+      decorated(99)
+      self.assertEqual(self.mock_fn.call_count, 100)
+      decorated(0)
+      self.assertEqual(self.mock_fn.call_count, 101)
+
+  def testDecoratedFunctionsAreNotWaitedFor(self):
+    event = threading.Event()
+    started = threading.Event()
+
+    # Can't rely on mock's call_count as it's not thread safe.
+    fn_calls = []
+
+    def Fn(x):
+      fn_calls.append(x)
+      started.set()
+      event.wait()
+
+    decorated = cache.WithBoundedLimitedCallFrequencyWithoutReturnValue(
+        rdfvalue.Duration.From(30, rdfvalue.SECONDS), max_entries=10
+    )(Fn)
+
+    t = threading.Thread(target=lambda: decorated(1))
+    t.start()
+    try:
+      started.wait()
+      # This should return immediately, as a call with the same arguments is
+      # already in progress.
+      decorated(1)
+    finally:
+      event.set()
+      t.join()
+
+    self.assertLen(fn_calls, 1)
+    self.assertEmpty(decorated._DebugInternalState()["pending"])
+
+  def testRaisesIfWrappedFunctionReturnsValue(self):
+    self.mock_fn.return_value = 42
+    decorated = self._Decorate()
+
+    with self.assertRaisesRegex(
+        AssertionError, "Wrapped function should have no return value"
+    ):
+      decorated("blah")
+
+
 if __name__ == "__main__":
   absltest.main()
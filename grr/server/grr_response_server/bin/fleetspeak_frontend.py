@@ -44,6 +44,7 @@ def main(argv):
   fsd = fleetspeak_frontend_server.GRRFSServer()
 
   with contextlib.ExitStack() as exit_stack:
+    exit_stack.callback(fsd.Shutdown)
 
     if config.CONFIG["Server.fleetspeak_cps_enabled"]:
       cps = fleetspeak_cps.Subscriber()
@@ -1,9 +1,12 @@
 #!/usr/bin/env python
 """This is the GRR frontend FS Server."""
 
-from collections.abc import Sequence
+import collections
+from collections.abc import Callable, Sequence
 import logging
 import sys
+import threading
+import time
 from typing import Optional
 
 import grpc
@@ -11,6 +14,7 @@ import grpc
 from google.protobuf import message as proto2_message
 from grr_response_core import config
 from grr_response_core.lib import rdfvalue
+from grr_response_core.lib import utils
 from grr_response_core.lib.rdfvalues import flows as rdf_flows
 from grr_response_core.lib.rdfvalues import mig_flows
 from grr_response_core.lib.util import cache
@@ -47,15 +51,43 @@ FLEETSPEAK_MESSAGE_BATCH_DECODE_ERRORS = metrics.Counter(
     fields=[("expected_type", str)],
 )
 
+FLEETSPEAK_MESSAGE_BATCH_DECODE_LATENCY = metrics.Event(
+    "fleetspeak_message_batch_decode_latency",
+    fields=[("type", str)],
+)
+
+FLEETSPEAK_MESSAGE_BATCH_PROCESSING_LATENCY = metrics.Event(
+    "fleetspeak_message_batch_processing_latency",
+    fields=[("type", str)],
+)
+
+FLEETSPEAK_MESSAGE_BATCH_GRR_MESSAGES = metrics.Counter(
+    "fleetspeak_message_batch_grr_messages",
+    fields=[("type", str)],
+)
+
+CLIENT_METADATA_FLUSH_SIZE = metrics.Event(
+    "client_metadata_flush_size",
+    bins=[1, 10, 100, 1000, 10000, 100000],
+)
+
+CLIENT_METADATA_FLUSH_LATENCY = metrics.Event("client_metadata_flush_latency")
+
+CLIENT_METADATA_FLUSH_ERRORS = metrics.Counter("client_metadata_flush_errors")
+
 MIN_DELAY_BETWEEN_METADATA_UPDATES = rdfvalue.Duration.From(
     30, rdfvalue.SECONDS
 )
 
+# Maximum number of clients whose recent metadata updates are remembered.
+MAX_RATE_LIMITED_METADATA_UPDATES = 1_000_000
+
 WARN_IF_PROCESSING_LONGER_THAN = rdfvalue.Duration.From(30, rdfvalue.SECONDS)
 
 
-@cache.WithLimitedCallFrequencyWithoutReturnValue(
-    MIN_DELAY_BETWEEN_METADATA_UPDATES
+@cache.WithBoundedLimitedCallFrequencyWithoutReturnValue(
+    MIN_DELAY_BETWEEN_METADATA_UPDATES,
+    max_entries=MAX_RATE_LIMITED_METADATA_UPDATES,
 )
 def RateLimitedWriteClientMetadata(
     client_id: str,
@@ -71,6 +103,191 @@ def RateLimitedWriteClientMetadata(
   )
 
 
+class ClientMetadataWriter:
+  """Coalesces client last-ping updates and writes them to the DB in bulk.
+
+  Updates are accumulated in memory (only the latest one is kept for every
+  client) and flushed with `MultiWriteClientMetadata` calls by a background
+  thread. Clients that share the same validation info are written with a
+  single call, using the most recent ping time of the group. This means that
+  the written last-ping time can be ahead of the actual one by at most the
+  flush interval.
+  """
+
+  def __init__(
+      self,
+      flush_interval: rdfvalue.Duration,
+      max_pending: int,
+  ) -> None:
+    """Initializes the writer.
+
+    Args:
+      flush_interval: How often accumulated updates are written to the DB.
+      max_pending: Maximum number of clients with accumulated updates. Once
+        reached, the updates are written on the thread calling `Write`.
+    """
+    self._flush_interval = flush_interval
+    self._max_pending = max_pending
+
+    self._lock = threading.Lock()
+    self._pending: dict[
+        str, tuple[rdfvalue.RDFDatetime, frozenset[tuple[str, str]]]
+    ] = {}
+    self._thread: Optional[utils.InterruptableThread] = None
+
+  def Start(self) -> None:
+    """Starts the background thread flushing accumulated updates."""
+    self._thread = utils.InterruptableThread(
+        name="ClientMetadataWriter",
+        target=self._FlushInBackground,
+        sleep_time=max(1, self._flush_interval.ToInt(rdfvalue.SECONDS)),
+    )
+    self._thread.start()
+
+  def Stop(self) -> None:
+    """Stops the background thread and flushes remaining updates."""
+    if self._thread is not None:
+      self._thread.Stop()
+      self._thread.join()
+      self._thread = None
+
+    self.Flush()
+
+  def Write(
+      self,
+      client_id: str,
+      last_ping: rdfvalue.RDFDatetime,
+      fleetspeak_validation_info: frozenset[tuple[str, str]],
+  ) -> None:
+    """Schedules a client metadata update."""
+    pending = None
+    with self._lock:
+      self._pending[client_id] = (last_ping, fleetspeak_validation_info)
+      if len(self._pending) >= self._max_pending:
+        pending, self._pending = self._pending, {}
+
+    if pending is not None:
+      self._WritePending(pending)
+
+  def Flush(self) -> None:
+    """Writes all accumulated updates to the DB."""
+    with self._lock:
+      pending, self._pending = self._pending, {}
+
+    self._WritePending(pending)
+
+  def _FlushInBackground(self) -> None:
+    with self._lock:
+      pending, self._pending = self._pending, {}
+
+    try:
+      self._WritePending(pending)
+    except Exception:  # pylint: disable=broad-exception-caught
+      logging.exception("Failed to write metadata of %d clients", len(pending))
+      CLIENT_METADATA_FLUSH_ERRORS.Increment()
+      # Retry with the next flush unless there are newer updates by then.
+      with self._lock:
+        for client_id, update in pending.items():
+          if len(self._pending) >= self._max_pending:
+            break
+          self._pending.setdefault(client_id, update)
+
+  def _WritePending(
+      self,
+      pending: dict[
+          str, tuple[rdfvalue.RDFDatetime, frozenset[tuple[str, str]]]
+      ],
+  ) -> None:
+    """Writes given updates to the DB."""
+    if not pending:
+      return
+
+    start_time = time.time()
+
+    client_ids_by_info = collections.defaultdict(list)
+    last_ping_by_info = {}
+    for client_id, (last_ping, info) in pending.items():
+      client_ids_by_info[info].append(client_id)
+      last_ping_by_info[info] = max(
+          last_ping_by_info.get(info, last_ping), last_ping
+      )
+
+    for info, client_ids in client_ids_by_info.items():
+      data_store.REL_DB.MultiWriteClientMetadata(
+          client_ids,
+          last_ping=last_ping_by_info[info],
+          fleetspeak_validation_info=dict(info),
+      )
+
+    CLIENT_METADATA_FLUSH_SIZE.RecordEvent(len(pending))
+    CLIENT_METADATA_FLUSH_LATENCY.RecordEvent(time.time() - start_time)
+
+
+def _DecodeGrrMessages(
+    serialized_messages: Sequence[bytes],
+) -> tuple[list[jobs_pb2.GrrMessage], int]:
+  """Parses serialized `GrrMessage` protos.
+
+  Args:
+    serialized_messages: A sequence of serialized `GrrMessage` protos.
+
+  Returns:
+    A tuple of parsed messages and the number of messages that failed to parse.
+  """
+  grr_message_protos: list[jobs_pb2.GrrMessage] = []
+  decode_errors = 0
+  for serialized_message in serialized_messages:
+    grr_message_proto = jobs_pb2.GrrMessage()
+    try:
+      grr_message_proto.ParseFromString(serialized_message)
+    except proto2_message.DecodeError:
+      logging.exception("invalid GRR message object: %r", serialized_message)
+      decode_errors += 1
+      continue
+
+    grr_message_protos.append(grr_message_proto)
+
+  return grr_message_protos, decode_errors
+
+
+def _DecodePackedMessageLists(
+    serialized_messages: Sequence[bytes],
+) -> tuple[list[jobs_pb2.GrrMessage], int]:
+  """Parses and decompresses serialized `PackedMessageList` protos.
+
+  Args:
+    serialized_messages: A sequence of serialized `PackedMessageList` protos.
+
+  Returns:
+    A tuple of messages from all the lists and the number of lists that failed
+    to parse.
+
+  Raises:
+    communicator.DecodingError: If a message list can't be decompressed.
+  """
+  grr_message_protos: list[jobs_pb2.GrrMessage] = []
+  decode_errors = 0
+  for serialized_message in serialized_messages:
+    packed_message_list_proto = jobs_pb2.PackedMessageList()
+    try:
+      packed_message_list_proto.ParseFromString(serialized_message)
+    except proto2_message.DecodeError:
+      logging.exception(
+          "invalid GRR message list object: %r", serialized_message
+      )
+      decode_errors += 1
+      continue
+
+    message_list_proto = (
+        communicator.Communicator.DecompressMessageListProto(
+            packed_message_list_proto
+        )
+    )
+    grr_message_protos.extend(message_list_proto.job)
+
+  return grr_message_protos, decode_errors
+
+
 class GRRFSServer:
   """The GRR FS frontend server.
 
@@ -87,6 +304,40 @@ class GRRFSServer:
         ],
     )
 
+    self._proto_message_processing = config.CONFIG[
+        "Frontend.proto_message_processing"
+    ]
+
+    self._metadata_writer: Optional[ClientMetadataWriter] = None
+    flush_interval = config.CONFIG["Frontend.client_metadata_flush_interval"]
+    if flush_interval > rdfvalue.Duration(0):
+      self._metadata_writer = ClientMetadataWriter(
+          flush_interval=flush_interval,
+          max_pending=config.CONFIG["Frontend.client_metadata_max_pending"],
+      )
+      self._metadata_writer.Start()
+
+  def Shutdown(self) -> None:
+    """Releases resources held by the server."""
+    if self._metadata_writer is not None:
+      self._metadata_writer.Stop()
+      self._metadata_writer = None
+
+  def _WriteClientMetadata(
+      self,
+      client_id: str,
+      fleetspeak_validation_info: frozenset[tuple[str, str]],
+  ) -> None:
+    """Updates the last-ping time and validation info of the client."""
+    if self._metadata_writer is not None:
+      self._metadata_writer.Write(
+          client_id,
+          last_ping=rdfvalue.RDFDatetime.Now(),
+          fleetspeak_validation_info=fleetspeak_validation_info,
+      )
+    else:
+      RateLimitedWriteClientMetadata(client_id, fleetspeak_validation_info)
+
   def ProcessFromGRPC(
       self, fs_msg: common_pb2.Message, context: grpc.ServicerContext
   ) -> None:
@@ -121,7 +372,7 @@ class GRRFSServer:
 
         if elapsed_since_ping >= MIN_DELAY_BETWEEN_METADATA_UPDATES:
           logging.info("updating metadata for existing client: %r", client_id)
-          RateLimitedWriteClientMetadata(
+          self._WriteClientMetadata(
               client_id,
               frozenset(batch.validation_info_tags.items()),
           )
@@ -132,22 +383,14 @@ class GRRFSServer:
             delta=len(batch.messages),
         )
 
-        grr_message_protos: list[jobs_pb2.GrrMessage] = []
-        for message in batch.messages:
-          grr_message_proto = jobs_pb2.GrrMessage()
-          try:
-            grr_message_proto.ParseFromString(message.value)
-          except proto2_message.DecodeError:
-            logging.exception("invalid GRR message object: %r", message)
-            FLEETSPEAK_MESSAGE_BATCH_DECODE_ERRORS.Increment(
-                fields=[jobs_pb2.GrrMessage.DESCRIPTOR.full_name]
-            )
-            continue
-
-          grr_message_protos.append(grr_message_proto)
-
-        grr_messages = list(map(mig_flows.ToRDFGrrMessage, grr_message_protos))
-        self._ProcessGRRMessages(client_id, grr_messages)
+        grr_message_protos = self._DecodeBatch(
+            batch,
+            _DecodeGrrMessages,
+            jobs_pb2.GrrMessage.DESCRIPTOR.full_name,
+        )
+        self._ProcessGRRMessageProtos(
+            client_id, batch.message_type, grr_message_protos
+        )
 
       elif batch.message_type == "MessageList":
         INCOMING_FLEETSPEAK_MESSAGES.Increment(
@@ -155,28 +398,14 @@ class GRRFSServer:
             delta=len(batch.messages),
         )
 
-        grr_message_protos: list[jobs_pb2.GrrMessage] = []
-        for message in batch.messages:
-          packed_message_list_proto = jobs_pb2.PackedMessageList()
-          try:
-            packed_message_list_proto.ParseFromString(message.value)
-          except proto2_message.DecodeError:
-            logging.exception("invalid GRR message list object: %r", message)
-            FLEETSPEAK_MESSAGE_BATCH_DECODE_ERRORS.Increment(
-                fields=[jobs_pb2.PackedMessageList.DESCRIPTOR.full_name]
-            )
-            continue
-
-          message_list_proto = mig_flows.ToProtoMessageList(
-              communicator.Communicator.DecompressMessageList(
-                  mig_flows.ToRDFPackedMessageList(packed_message_list_proto),
-              )
-          )
-
-          grr_message_protos.extend(message_list_proto.job)
-
-        grr_messages = list(map(mig_flows.ToRDFGrrMessage, grr_message_protos))
-        self._ProcessGRRMessages(client_id, grr_messages)
+        grr_message_protos = self._DecodeBatch(
+            batch,
+            _DecodePackedMessageLists,
+            jobs_pb2.PackedMessageList.DESCRIPTOR.full_name,
+        )
+        self._ProcessGRRMessageProtos(
+            client_id, batch.message_type, grr_message_protos
+        )
 
       elif batch.message_type == "rrg.Response":
         INCOMING_FLEETSPEAK_MESSAGES.Increment(
@@ -232,6 +461,71 @@ class GRRFSServer:
       FLEETSPEAK_MESSAGE_BATCH_ERRORS.Increment(fields=[batch.message_type])
       raise
 
+  def _DecodeBatch(
+      self,
+      batch: fleetspeak.MessageBatch,
+      decode_fn: Callable[
+          [Sequence[bytes]], tuple[list[jobs_pb2.GrrMessage], int]
+      ],
+      expected_type: str,
+  ) -> list[jobs_pb2.GrrMessage]:
+    """Decodes GRR messages of a batch.
+
+    Args:
+      batch: A message batch to decode.
+      decode_fn: A function decoding a sequence of serialized messages.
+      expected_type: A full name of the proto the messages are expected to be.
+
+    Returns:
+      Decoded GRR messages in the order of the batch.
+    """
+    serialized_messages = [message.value for message in batch.messages]
+
+    start_time = time.time()
+    grr_message_protos, decode_errors = decode_fn(serialized_messages)
+    if decode_errors:
+      FLEETSPEAK_MESSAGE_BATCH_DECODE_ERRORS.Increment(
+          delta=decode_errors, fields=[expected_type]
+      )
+
+    FLEETSPEAK_MESSAGE_BATCH_DECODE_LATENCY.RecordEvent(
+        time.time() - start_time, fields=[batch.message_type]
+    )
+    return grr_message_protos
+
+  def _ProcessGRRMessageProtos(
+      self,
+      grr_client_id: str,
+      batch_type: str,
+      grr_message_protos: Sequence[jobs_pb2.GrrMessage],
+  ) -> None:
+    """Handles decoded messages of a batch received via Fleetspeak.
+
+    Depending on the Frontend.proto_message_processing option the messages are
+    either handled as protos all the way down to the database or converted to
+    RDF values first.
+
+    Args:
+      grr_client_id: The unique identifier of the GRR client.
+      batch_type: A type of the batch the messages came in.
+      grr_message_protos: A sequence of `GrrMessage` protos.
+    """
+    FLEETSPEAK_MESSAGE_BATCH_GRR_MESSAGES.Increment(
+        delta=len(grr_message_protos), fields=[batch_type]
+    )
+
+    start_time = time.time()
+    try:
+      if self._proto_message_processing:
+        self._ProcessGRRMessagesProto(grr_client_id, grr_message_protos)
+      else:
+        grr_messages = list(map(mig_flows.ToRDFGrrMessage, grr_message_protos))
+        self._ProcessGRRMessages(grr_client_id, grr_messages)
+    finally:
+      FLEETSPEAK_MESSAGE_BATCH_PROCESSING_LATENCY.RecordEvent(
+          time.time() - start_time, fields=[batch_type]
+      )
+
   @FRONTEND_REQUEST_COUNT.Counted(fields=["fleetspeak"])
   @FRONTEND_REQUEST_LATENCY.Timed(fields=["fleetspeak"])
   def Process(
@@ -281,11 +575,11 @@ class GRRFSServer:
           # same GRR Fleetspeak Frontend process. This creates a race
           # condition: multiple threads of the process will read the same
           # row, check the last ping and decided to update it. Rate-limiting
-          # the calls protects against this scenario. Note: it doesn't
-          # protect against the scenario of multiple GRR Fletspeak Frontend
-          # processes receiving the messages at the same time, but such
-          # protection currently is likely excessive.
-          RateLimitedWriteClientMetadata(
+          # (or coalescing) the calls protects against this scenario. Note: it
+          # doesn't protect against the scenario of multiple GRR Fletspeak
+          # Frontend processes receiving the messages at the same time, but
+          # such protection currently is likely excessive.
+          self._WriteClientMetadata(
               grr_client_id,
               frozenset(validation_info.items()),
           )
@@ -383,3 +677,28 @@ class GRRFSServer:
     except Exception:
       logging.exception("Exception receiving messages from: %s", grr_client_id)
       raise
+
+  def _ProcessGRRMessagesProto(
+      self,
+      grr_client_id: str,
+      grr_messages: Sequence[jobs_pb2.GrrMessage],
+  ) -> None:
+    """Handles message protos from GRR clients received via Fleetspeak.
+
+    This is an equivalent of `_ProcessGRRMessages` that does not convert the
+    messages to RDF values.
+
+    Args:
+      grr_client_id: The unique identifier of the GRR client.
+      grr_messages: A sequence of `GrrMessage` protos.
+    """
+    try:
+      for grr_message in grr_messages:
+        grr_message.source = grr_client_id
+        grr_message.auth_state = jobs_pb2.GrrMessage.AUTHENTICATED
+      self.frontend.ReceiveMessagesProto(
+          client_id=grr_client_id, messages=grr_messages
+      )
+    except Exception:
+      logging.exception("Exception receiving messages from: %s", grr_client_id)
+      raise
@@ -3,6 +3,7 @@
 import random
 import sys
 from unittest import mock
+import zlib
 
 from absl import app
 
@@ -11,6 +12,7 @@ from google.protobuf import wrappers_pb2
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib.rdfvalues import client as rdf_client
 from grr_response_core.lib.rdfvalues import flows as rdf_flows
+from grr_response_core.lib.rdfvalues import paths as rdf_paths
 from grr_response_proto import flows_pb2
 from grr_response_proto import jobs_pb2
 from grr_response_server import communicator
@@ -414,6 +416,44 @@ class FleetspeakGRRFEServerTest(flow_test_lib.FlowTestsBaseclass):
     self.assertEqual(validation_info_tags[1].key, "tag-2")
     self.assertEqual(validation_info_tags[1].value, "value-2-new")
 
+  @db_test_lib.WithDatabase
+  def testProcessBatch_CoalescedClientMetadata(self, db: abstract_db.Database):
+    client_id = "C.0123456789abcdef"
+
+    last_ping = db.Now() - rdfvalue.Duration.From(12, rdfvalue.WEEKS)
+    db.WriteClientMetadata(client_id, last_ping=last_ping)
+
+    batch = fleetspeak.MessageBatch(
+        client_id=client_id,
+        service="GRR-batched",
+        message_type="rrg.Parcel",
+        messages=[],
+        validation_info_tags={"tag-1": "value-1"},
+    )
+
+    with test_lib.ConfigOverrider({
+        "Frontend.client_metadata_flush_interval": rdfvalue.Duration.From(
+            1, rdfvalue.HOURS
+        ),
+    }):
+      server = fleetspeak_frontend_server.GRRFSServer()
+
+    time_before = db.Now()
+    server.ProcessBatch(batch)
+
+    # The update is accumulated in memory until the next flush.
+    metadata = db.ReadClientMetadata(client_id)
+    self.assertEqual(metadata.ping, last_ping)
+
+    server.Shutdown()
+
+    metadata = db.ReadClientMetadata(client_id)
+    self.assertGreater(metadata.ping, time_before)
+    self.assertLen(metadata.last_fleetspeak_validation_info.tags, 1)
+    self.assertEqual(
+        metadata.last_fleetspeak_validation_info.tags[0].key, "tag-1"
+    )
+
   @db_test_lib.WithDatabase
   def testProcessBatch_GrrMessage(self, db: abstract_db.Database):
     client_id = db_test_utils.InitializeClient(db)
@@ -575,6 +615,175 @@ class FleetspeakGRRFEServerTest(flow_test_lib.FlowTestsBaseclass):
     self.assertTrue(flow_responses[3].payload.Unpack(string))
     self.assertEqual(string.value, "quux")
 
+  @db_test_lib.WithDatabase
+  def testProcessBatch_GrrMessage_ProtoProcessing(
+      self,
+      db: abstract_db.Database,
+  ):
+    client_id = db_test_utils.InitializeClient(db)
+    flow_id = db_test_utils.InitializeFlow(db, client_id)
+    request_id = random.randint(0, sys.maxsize)
+
+    flow_request = flows_pb2.FlowRequest(
+        client_id=client_id,
+        flow_id=flow_id,
+        request_id=request_id,
+    )
+    db.WriteFlowRequests([flow_request])
+
+    grr_message_1 = jobs_pb2.GrrMessage()
+    grr_message_1.session_id = f"{client_id}/{flow_id}"
+    grr_message_1.request_id = request_id
+    grr_message_1.response_id = 1
+    grr_message_1.args_rdf_name = rdf_paths.PathSpec.__name__
+    grr_message_1.args = jobs_pb2.PathSpec(path="/foo").SerializeToString()
+    grr_message_any_1 = any_pb2.Any()
+    grr_message_any_1.Pack(grr_message_1)
+
+    grr_message_2 = jobs_pb2.GrrMessage()
+    grr_message_2.session_id = f"{client_id}/{flow_id}"
+    grr_message_2.request_id = request_id
+    grr_message_2.response_id = 2
+    grr_message_2.args_rdf_name = rdfvalue.RDFString.__name__
+    grr_message_2.args = rdfvalue.RDFString("bar").SerializeToBytes()
+    grr_message_any_2 = any_pb2.Any()
+    grr_message_any_2.Pack(grr_message_2)
+
+    grr_message_3 = jobs_pb2.GrrMessage()
+    grr_message_3.session_id = f"{client_id}/{flow_id}"
+    grr_message_3.request_id = request_id
+    grr_message_3.response_id = 3
+    grr_message_3.type = jobs_pb2.GrrMessage.STATUS
+    grr_message_3.args_rdf_name = rdf_flows.GrrStatus.__name__
+    grr_message_3.args = jobs_pb2.GrrStatus().SerializeToString()
+    grr_message_any_3 = any_pb2.Any()
+    grr_message_any_3.Pack(grr_message_3)
+
+    batch = fleetspeak.MessageBatch(
+        client_id=client_id,
+        service="GRR-batched",
+        message_type="GrrMessage",
+        messages=[
+            grr_message_any_1,
+            grr_message_any_2,
+            grr_message_any_3,
+        ],
+        validation_info_tags={},
+    )
+
+    with test_lib.ConfigOverrider({"Frontend.proto_message_processing": True}):
+      server = fleetspeak_frontend_server.GRRFSServer()
+
+    with mock.patch.object(
+        server.frontend,
+        "ReceiveMessages",
+        side_effect=AssertionError("RDF processing used"),
+    ):
+      server.ProcessBatch(batch)
+
+    flow_requests_and_responses = db.ReadAllFlowRequestsAndResponses(
+        client_id=client_id,
+        flow_id=flow_id,
+    )
+
+    self.assertLen(flow_requests_and_responses, 1)
+    _, flow_responses = flow_requests_and_responses[0]
+    self.assertLen(flow_responses, 3)
+
+    pathspec = jobs_pb2.PathSpec()
+    self.assertTrue(flow_responses[1].payload.Unpack(pathspec))
+    self.assertEqual(pathspec.path, "/foo")
+
+    string = wrappers_pb2.StringValue()
+    self.assertTrue(flow_responses[2].payload.Unpack(string))
+    self.assertEqual(string.value, "bar")
+
+    self.assertIsInstance(flow_responses[3], flows_pb2.FlowStatus)
+    self.assertEqual(flow_responses[3].status, flows_pb2.FlowStatus.OK)
+
+  @db_test_lib.WithDatabase
+  def testProcessBatch_MessageList_ProtoProcessing(
+      self,
+      db: abstract_db.Database,
+  ):
+    client_id = db_test_utils.InitializeClient(db)
+    flow_id = db_test_utils.InitializeFlow(db, client_id)
+    request_id = random.randint(0, sys.maxsize)
+
+    flow_request = flows_pb2.FlowRequest(
+        client_id=client_id,
+        flow_id=flow_id,
+        request_id=request_id,
+    )
+    db.WriteFlowRequests([flow_request])
+
+    packed_message_list_anys = []
+    for i in range(1, 4):
+      message_list = jobs_pb2.MessageList()
+      grr_message = message_list.job.add()
+      grr_message.session_id = f"{client_id}/{flow_id}"
+      grr_message.request_id = request_id
+      grr_message.response_id = i
+      grr_message.args_rdf_name = rdfvalue.RDFString.__name__
+      grr_message.args = rdfvalue.RDFString(f"foo-{i}").SerializeToBytes()
+
+      packed_message_list = jobs_pb2.PackedMessageList()
+      packed_message_list.compression = jobs_pb2.PackedMessageList.ZCOMPRESSION
+      packed_message_list.message_list = zlib.compress(
+          message_list.SerializeToString()
+      )
+      packed_message_list_any = any_pb2.Any()
+      packed_message_list_any.Pack(packed_message_list)
+      packed_message_list_anys.append(packed_message_list_any)
+
+    invalid_message_any = any_pb2.Any(value=b"\xff")
+    packed_message_list_anys.append(invalid_message_any)
+
+    batch = fleetspeak.MessageBatch(
+        client_id=client_id,
+        service="GRR-batched",
+        message_type="MessageList",
+        messages=packed_message_list_anys,
+        validation_info_tags={},
+    )
+
+    with test_lib.ConfigOverrider({"Frontend.proto_message_processing": True}):
+      server = fleetspeak_frontend_server.GRRFSServer()
+    self.addCleanup(server.Shutdown)
+
+    messages_metric = (
+        fleetspeak_frontend_server.FLEETSPEAK_MESSAGE_BATCH_GRR_MESSAGES
+    )
+    messages_fields = ["MessageList"]
+    messages = messages_metric.GetValue(fields=messages_fields)
+
+    errors_metric = (
+        fleetspeak_frontend_server.FLEETSPEAK_MESSAGE_BATCH_DECODE_ERRORS
+    )
+    errors_fields = [jobs_pb2.PackedMessageList.DESCRIPTOR.full_name]
+    errors = errors_metric.GetValue(fields=errors_fields)
+
+    server.ProcessBatch(batch)
+
+    self.assertEqual(
+        messages_metric.GetValue(fields=messages_fields), messages + 3
+    )
+    self.assertEqual(errors_metric.GetValue(fields=errors_fields), errors + 1)
+
+    flow_requests_and_responses = db.ReadAllFlowRequestsAndResponses(
+        client_id=client_id,
+        flow_id=flow_id,
+    )
+
+    self.assertLen(flow_requests_and_responses, 1)
+    _, flow_responses = flow_requests_and_responses[0]
+    self.assertLen(flow_responses, 3)
+
+    for i in range(1, 4):
+      string = wrappers_pb2.StringValue()
+      self.assertTrue(flow_responses[i].payload.Unpack(string))
+      self.assertEqual(string.value, f"foo-{i}")
+
   @db_test_lib.WithDatabase
   def testProcessBatch_RRGResponse(self, db: abstract_db.Database):
     client_id = db_test_utils.InitializeClient(db)
@@ -717,6 +926,106 @@ class FleetspeakGRRFEServerTest(flow_test_lib.FlowTestsBaseclass):
     server.ProcessBatch(batch)  # Should not raise.
 
 
+class ClientMetadataWriterTest(test_lib.GRRBaseTest):
+
+  @db_test_lib.WithDatabase
+  def testFlushWritesLatestUpdates(self, db: abstract_db.Database):
+    writer = fleetspeak_frontend_server.ClientMetadataWriter(
+        flush_interval=rdfvalue.Duration.From(1, rdfvalue.HOURS),
+        max_pending=100,
+    )
+
+    ping_1 = rdfvalue.RDFDatetime.FromSecondsSinceEpoch(1)
+    ping_2 = rdfvalue.RDFDatetime.FromSecondsSinceEpoch(2)
+    ping_3 = rdfvalue.RDFDatetime.FromSecondsSinceEpoch(3)
+    tags = frozenset({"foo": "bar"}.items())
+
+    writer.Write("C.0000000000000001", ping_1, tags)
+    writer.Write("C.0000000000000002", ping_1, tags)
+    writer.Write("C.0000000000000002", ping_2, frozenset())
+    writer.Write("C.0000000000000003", ping_3, tags)
+
+    self.assertEmpty(
+        db.MultiReadClientMetadata(
+            ["C.0000000000000001", "C.0000000000000002"]
+        )
+    )
+
+    with mock.patch.object(
+        db, "MultiWriteClientMetadata", wraps=db.MultiWriteClientMetadata
+    ) as write_mock:
+      writer.Flush()
+
+    # Clients with the same validation info are written with a single call.
+    self.assertEqual(write_mock.call_count, 2)
+
+    metadatas = db.MultiReadClientMetadata([
+        "C.0000000000000001",
+        "C.0000000000000002",
+        "C.0000000000000003",
+    ])
+    self.assertEqual(metadatas["C.0000000000000001"].ping, ping_3)
+    self.assertEqual(metadatas["C.0000000000000002"].ping, ping_2)
+    self.assertEqual(metadatas["C.0000000000000003"].ping, ping_3)
+    self.assertLen(
+        metadatas["C.0000000000000001"].last_fleetspeak_validation_info.tags, 1
+    )
+    self.assertEmpty(
+        metadatas["C.0000000000000002"].last_fleetspeak_validation_info.tags
+    )
+
+  @db_test_lib.WithDatabase
+  def testWriteFlushesWhenFull(self, db: abstract_db.Database):
+    writer = fleetspeak_frontend_server.ClientMetadataWriter(
+        flush_interval=rdfvalue.Duration.From(1, rdfvalue.HOURS),
+        max_pending=2,
+    )
+    ping = rdfvalue.RDFDatetime.FromSecondsSinceEpoch(42)
+
+    writer.Write("C.0000000000000001", ping, frozenset())
+    self.assertEmpty(db.MultiReadClientMetadata(["C.0000000000000001"]))
+
+    writer.Write("C.0000000000000002", ping, frozenset())
+    metadatas = db.MultiReadClientMetadata(
+        ["C.0000000000000001", "C.0000000000000002"]
+    )
+    self.assertLen(metadatas, 2)
+
+  @db_test_lib.WithDatabase
+  def testStopFlushesPendingUpdates(self, db: abstract_db.Database):
+    writer = fleetspeak_frontend_server.ClientMetadataWriter(
+        flush_interval=rdfvalue.Duration.From(1, rdfvalue.HOURS),
+        max_pending=100,
+    )
+    writer.Start()
+
+    ping = rdfvalue.RDFDatetime.FromSecondsSinceEpoch(42)
+    writer.Write("C.0000000000000001", ping, frozenset())
+    writer.Stop()
+
+    metadata = db.ReadClientMetadata("C.0000000000000001")
+    self.assertEqual(metadata.ping, ping)
+
+  @db_test_lib.WithDatabase
+  def testFailedFlushIsRetried(self, db: abstract_db.Database):
+    writer = fleetspeak_frontend_server.ClientMetadataWriter(
+        flush_interval=rdfvalue.Duration.From(1, rdfvalue.HOURS),
+        max_pending=100,
+    )
+    ping = rdfvalue.RDFDatetime.FromSecondsSinceEpoch(42)
+    writer.Write("C.0000000000000001", ping, frozenset())
+
+    with mock.patch.object(
+        db, "MultiWriteClientMetadata", side_effect=RuntimeError()
+    ):
+      writer._FlushInBackground()  # pylint: disable=protected-access
+
+    writer.Flush()
+
+    metadata = db.ReadClientMetadata("C.0000000000000001")
+    self.assertEqual(metadata.ping, ping)
+
+
 class ListProcessesFleetspeakTest(flow_test_lib.FlowTestsBaseclass):
   """Test the process listing flow w/ Fleetspeak."""
 
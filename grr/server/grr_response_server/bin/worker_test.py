@@ -80,7 +80,7 @@ class GrrWorkerTest(flow_test_lib.FlowTestsBaseclass):
     self.assertEqual(client_mock.storage["networklimit"], [10000, 9000, 8000])
 
   def testForemanMessageHandler(self):
-    with mock.patch.object(foreman.Foreman, "AssignTasksToClient") as instr:
+    with mock.patch.object(foreman.Foreman, "AssignTasksToClients") as instr:
       # Send a message to the Foreman.
       client_id = "C.1100110011001100"
 
@@ -110,7 +110,7 @@ class GrrWorkerTest(flow_test_lib.FlowTestsBaseclass):
         # Make sure there are no leftover requests.
         self.assertEqual(data_store.REL_DB.ReadMessageHandlerRequests(), [])
 
-        instr.assert_called_once_with(client_id)
+        instr.assert_called_once_with([client_id])
       finally:
         data_store.REL_DB.UnregisterMessageHandler(timeout=60)
 
@@ -1,9 +1,37 @@
 #!/usr/bin/env python
-"""Benchmark to compare different BlobStore implementations."""
+"""Benchmark suite to compare different BlobStore implementations.
 
+The suite runs every combination of the requested operations, blob sizes,
+batch sizes and thread counts against each of the target blob stores and
+reports latency percentiles and throughput for every combination.
+
+Examples:
+
+  # Benchmark the in-memory database backed store and emit CSV.
+  benchmark --target=DbBlobStore
+      --parameter=Database.implementation=InMemoryDB
+      --operations=write,read,exists --batch_sizes=1,100 --threads=1,8
+      --output_format=csv --output=/tmp/results.csv
+
+  # Benchmark the GCS store against a local GCS emulator (e.g. the one used
+  # by gcs_blob_store_test).
+  STORAGE_EMULATOR_HOST=http://localhost:4443 benchmark --target=GCSBlobStore
+      --parameter=Blobstore.gcs.project=test
+      --parameter=Blobstore.gcs.bucket=benchmark
+
+Results in JSON and CSV formats are machine-readable so that runs can be
+compared across commits.
+"""
+
+import csv
+import dataclasses
 import io
+import json
+import os
+import sys
+import threading
 import time
-from typing import IO
+from typing import Callable, IO
 
 from absl import app
 from absl import flags
@@ -15,6 +43,19 @@ from grr_response_server import server_startup
 from grr_response_server.models import blobs as models_blobs
 
 
+_WRITE = "write"
+_WRITE_UNKNOWN_HASHES = "write_unknown_hashes"
+_READ = "read"
+_READ_AND_WAIT = "read_and_wait"
+_EXISTS = "exists"
+
+_OPERATIONS = (_WRITE, _WRITE_UNKNOWN_HASHES, _READ, _READ_AND_WAIT, _EXISTS)
+
+# Limits of the number of calls, and of the size of blobs to write, prepared
+# for a single benchmark round.
+_MAX_CALLS_PER_ROUND = 100
+_MAX_ROUND_BYTES = 256 * 1024 * 1024
+
 _TARGET = flags.DEFINE_list(
     "target",
     default=None,
@@ -24,19 +65,107 @@ _TARGET = flags.DEFINE_list(
     ),
 )
 
+_OPERATIONS_FLAG = flags.DEFINE_list(
+    "operations",
+    default=[_WRITE],
+    help=(
+        "Blob store operations to benchmark. Any of: {}.".format(
+            ", ".join(_OPERATIONS)
+        )
+    ),
+)
+
 _SIZES = flags.DEFINE_list(
     "sizes",
     default=["500K", "200K", "100K", "50K", "5K", "500", "50"],
     help="Use the given blob sizes for the benchmark.",
 )
 
+_BATCH_SIZES = flags.DEFINE_list(
+    "batch_sizes",
+    default=["1"],
+    help="Number of blobs passed to every single blob store call.",
+)
+
+_THREADS = flags.DEFINE_list(
+    "threads",
+    default=["1"],
+    help="Number of threads concurrently calling the blob store.",
+)
+
+_HIT_RATIO = flags.DEFINE_float(
+    "hit_ratio",
+    default=1.0,
+    lower_bound=0.0,
+    upper_bound=1.0,
+    help=(
+        "Fraction of blobs requested by read and exists operations that are "
+        "present in the blob store."
+    ),
+)
+
+_READ_AND_WAIT_TIMEOUT_MS = flags.DEFINE_integer(
+    "read_and_wait_timeout_ms",
+    default=100,
+    help="Timeout used by read_and_wait operations when blobs are missing.",
+)
+
 _PER_SIZE_DURATION_SECONDS = flags.DEFINE_integer(
     "per_size_duration_seconds",
     default=30,
-    help="Benchmark duration per blob size in seconds.",
+    help="Benchmark duration per benchmark configuration in seconds.",
+)
+
+_OUTPUT_FORMAT = flags.DEFINE_enum(
+    "output_format",
+    default="text",
+    enum_values=["text", "json", "csv"],
+    help="Format in which the results are reported.",
+)
+
+_OUTPUT = flags.DEFINE_string(
+    "output",
+    default=None,
+    help="File to write the results to. Standard output is used if not set.",
 )
 
 
+@dataclasses.dataclass(frozen=True)
+class BenchmarkConfig:
+  """A single combination of benchmark parameters."""
+
+  store: str
+  operation: str
+  size: str
+  batch_size: int
+  threads: int
+  hit_ratio: float
+
+
+@dataclasses.dataclass(frozen=True)
+class BenchmarkResult:
+  """Results of running a benchmark with a given configuration."""
+
+  config: BenchmarkConfig
+  total_s: float
+  num_calls: int
+  num_blobs: int
+  calls_per_sec: float
+  blobs_per_sec: float
+  bytes_per_sec: float
+  p50_ms: float
+  p90_ms: float
+  p95_ms: float
+  p99_ms: float
+
+  def AsDict(self) -> dict[str, object]:
+    result = dataclasses.asdict(self.config)
+    for field in dataclasses.fields(self):
+      if field.name != "config":
+        result[field.name] = getattr(self, field.name)
+    return result
+
+
 def _MakeBlobStore(blobstore_name):
   try:
     cls = blob_store.REGISTRY[blobstore_name]
@@ -45,13 +174,35 @@ def _MakeBlobStore(blobstore_name):
   return blob_store.BlobStoreValidationWrapper(cls())
 
 
-def _MakeRandomBlob(
-    size_b: rdfvalue.ByteSize,
-    random_fd: IO[bytes],
-) -> tuple[models_blobs.BlobID, bytes]:
-  blob_data = random_fd.read(int(size_b))
-  blob_id = models_blobs.BlobID.Of(blob_data)
-  return blob_id, blob_data
+class _RandomBlobs:
+  """Thread-safe generator of random blobs."""
+
+  def __init__(self, random_fd: IO[bytes]) -> None:
+    self._random_fd = random_fd
+    self._lock = threading.Lock()
+
+  def Make(
+      self,
+      size_b: rdfvalue.ByteSize,
+  ) -> tuple[models_blobs.BlobID, bytes]:
+    with self._lock:
+      blob_data = self._random_fd.read(int(size_b))
+    blob_id = models_blobs.BlobID.Of(blob_data)
+    return blob_id, blob_data
+
+  def MakeBatch(
+      self,
+      size_b: rdfvalue.ByteSize,
+      batch_size: int,
+  ) -> dict[models_blobs.BlobID, bytes]:
+    return dict(self.Make(size_b) for _ in range(batch_size))
+
+  def MakeMissingIds(self, count: int) -> list[models_blobs.BlobID]:
+    with self._lock:
+      return [
+          models_blobs.BlobID.Of(self._random_fd.read(16))
+          for _ in range(count)
+      ]
 
 
 def _Timed(fn, *args, **kwargs):
@@ -60,37 +211,231 @@ def _Timed(fn, *args, **kwargs):
   return result, time.time() - start
 
 
-def _PrintStats(size, size_b, durations):
-  durations_ms = np.array(durations) * 1000
-  total_s = sum(durations)
-  qps = len(durations) / total_s
-  print(
-      "{size}\t{total:.1f}s\t{num}\t{qps:.2f}\t{bps: >7}\t{p50:.1f}\t{p90:.1f}"
+def _MakeOperation(
+    bs: blob_store.BlobStore,
+    config: BenchmarkConfig,
+    random_blobs: _RandomBlobs,
+) -> Callable[[], Callable[[], object]]:
+  """Prepares the blob store for a benchmarked operation.
+
+  Args:
+    bs: A blob store to benchmark.
+    config: A benchmark configuration.
+    random_blobs: A generator of random blobs.
+
+  Returns:
+    A function that prepares a single benchmarked call (e.g. generates blobs
+    to write) and returns it. Only the returned call itself is timed.
+  """
+  size_b = rdfvalue.ByteSize(config.size)
+
+  if config.operation == _WRITE:
+
+    def PrepareWrite():
+      blobs = random_blobs.MakeBatch(size_b, config.batch_size)
+      return lambda: bs.WriteBlobs(blobs)
+
+    return PrepareWrite
+
+  if config.operation == _WRITE_UNKNOWN_HASHES:
+
+    def PrepareWriteUnknownHashes():
+      blobs = list(random_blobs.MakeBatch(size_b, config.batch_size).values())
+      return lambda: bs.WriteBlobsWithUnknownHashes(blobs)
+
+    return PrepareWriteUnknownHashes
+
+  # All the remaining operations need existing blobs to read.
+  num_hits = round(config.batch_size * config.hit_ratio)
+  existing = random_blobs.MakeBatch(size_b, num_hits)
+  if existing:
+    bs.WriteBlobs(existing)
+  blob_ids = list(existing) + random_blobs.MakeMissingIds(
+      config.batch_size - num_hits
+  )
+
+  if config.operation == _READ:
+    call = lambda: bs.ReadBlobs(blob_ids)
+  elif config.operation == _READ_AND_WAIT:
+    timeout = rdfvalue.Duration.From(
+        _READ_AND_WAIT_TIMEOUT_MS.value, rdfvalue.MILLISECONDS
+    )
+    call = lambda: bs.ReadAndWaitForBlobs(blob_ids, timeout)
+  elif config.operation == _EXISTS:
+    call = lambda: bs.CheckBlobsExist(blob_ids)
+  else:
+    raise ValueError("Unknown operation: %s" % config.operation)
+
+  return lambda: call
+
+
+def _RunBenchmark(
+    bs: blob_store.BlobStore,
+    config: BenchmarkConfig,
+    duration_sec: int,
+    random_blobs: _RandomBlobs,
+) -> BenchmarkResult:
+  """Runs the benchmark for a given configuration.
+
+  The benchmark runs in rounds. Calls of a round (e.g. blobs to write) are
+  prepared before the round's timer starts, so that only the blob store calls
+  themselves count towards the total time and the throughput.
+
+  Args:
+    bs: A blob store to benchmark.
+    config: A benchmark configuration.
+    duration_sec: Minimum total time of the timed rounds.
+    random_blobs: A generator of random blobs.
+
+  Returns:
+    The benchmark result.
+  """
+  # Every worker uses its own set of blobs, so that reads are not served by
+  # blobs written by other workers.
+  operations = [
+      _MakeOperation(bs, config, random_blobs) for _ in range(config.threads)
+  ]
+
+  round_bytes = (
+      int(rdfvalue.ByteSize(config.size)) * config.batch_size * config.threads
+  )
+  calls_per_round = max(
+      1, min(_MAX_CALLS_PER_ROUND, _MAX_ROUND_BYTES // max(round_bytes, 1))
+  )
+
+  def Worker(
+      calls: list[Callable[[], object]],
+      worker_durations: list[float],
+  ) -> None:
+    for call in calls:
+      _, call_time = _Timed(call)
+      worker_durations.append(call_time)
+
+  durations = []
+  total_s = 0.0
+  while total_s < duration_sec:
+    calls = [
+        [prepare() for _ in range(calls_per_round)] for prepare in operations
+    ]
+    round_durations = [[] for _ in operations]
+    workers = [
+        threading.Thread(target=Worker, args=(worker_calls, worker_durations))
+        for worker_calls, worker_durations in zip(calls, round_durations)
+    ]
+
+    start_timestamp = time.time()
+    for worker in workers:
+      worker.start()
+    for worker in workers:
+      worker.join()
+    total_s += time.time() - start_timestamp
+
+    for worker_durations in round_durations:
+      durations.extend(worker_durations)
+
+  return _MakeResult(config, durations, total_s)
+
+
+def _MakeResult(
+    config: BenchmarkConfig,
+    durations: list[float],
+    total_s: float,
+) -> BenchmarkResult:
+  """Computes the benchmark result out of the individual call durations."""
+  durations_ms = np.array(durations or [0.0]) * 1000
+  num_calls = len(durations)
+  num_blobs = num_calls * config.batch_size
+  blobs_per_sec = num_blobs / total_s
+  return BenchmarkResult(
+      config=config,
+      total_s=total_s,
+      num_calls=num_calls,
+      num_blobs=num_blobs,
+      calls_per_sec=num_calls / total_s,
+      blobs_per_sec=blobs_per_sec,
+      bytes_per_sec=blobs_per_sec * int(rdfvalue.ByteSize(config.size)),
+      p50_ms=float(np.percentile(durations_ms, 50)),
+      p90_ms=float(np.percentile(durations_ms, 90)),
+      p95_ms=float(np.percentile(durations_ms, 95)),
+      p99_ms=float(np.percentile(durations_ms, 99)),
+  )
+
+
+_TEXT_HEADER = (
+    "store\top\tsize\tbatch\tthreads\thits\ttotal\tcalls\tcalls/s\tblobs/s"
+    "\t  b/sec\tp50\tp90\tp95\tp99"
+)
+
+
+def _FormatTextRow(result: BenchmarkResult) -> str:
+  return (
+      "{store}\t{op}\t{size}\t{batch}\t{threads}\t{hits:.2f}\t{total:.1f}s"
+      "\t{calls}\t{cps:.2f}\t{bps_n:.2f}\t{bps: >7}\t{p50:.1f}\t{p90:.1f}"
       "\t{p95:.1f}\t{p99:.1f}".format(
-          size=size,
-          total=total_s,
-          num=len(durations),
-          qps=qps,
-          bps=str(rdfvalue.ByteSize(int(size_b * qps))).replace("iB", ""),
-          p50=np.percentile(durations_ms, 50),
-          p90=np.percentile(durations_ms, 90),
-          p95=np.percentile(durations_ms, 95),
-          p99=np.percentile(durations_ms, 99),
+          store=result.config.store,
+          op=result.config.operation,
+          size=result.config.size,
+          batch=result.config.batch_size,
+          threads=result.config.threads,
+          hits=result.config.hit_ratio,
+          total=result.total_s,
+          calls=result.num_calls,
+          cps=result.calls_per_sec,
+          bps_n=result.blobs_per_sec,
+          bps=str(rdfvalue.ByteSize(int(result.bytes_per_sec))).replace(
+              "iB", ""
+          ),
+          p50=result.p50_ms,
+          p90=result.p90_ms,
+          p95=result.p95_ms,
+          p99=result.p99_ms,
       )
   )
 
 
-def _RunBenchmark(bs, size_b, duration_sec, random_fd):
-  """Returns a list of runtimes for writes of the given size."""
-  start_timestamp = time.time()
-  durations = []
+def _WriteResults(
+    results: list[BenchmarkResult],
+    output_format: str,
+    out: IO[str],
+) -> None:
+  """Writes benchmark results in the given format."""
+  if output_format == "json":
+    json.dump([r.AsDict() for r in results], out, indent=2)
+    out.write("\n")
+  elif output_format == "csv":
+    if not results:
+      return
+    rows = [r.AsDict() for r in results]
+    writer = csv.DictWriter(out, fieldnames=list(rows[0].keys()))
+    writer.writeheader()
+    writer.writerows(rows)
+  else:
+    out.write(_TEXT_HEADER + "\n")
+    for result in results:
+      out.write(_FormatTextRow(result) + "\n")
+
+
+def _Configs() -> list[BenchmarkConfig]:
+  """Returns all benchmark configurations requested through flags."""
+  for operation in _OPERATIONS_FLAG.value:
+    if operation not in _OPERATIONS:
+      raise ValueError("Unknown operation: %s" % operation)
 
-  # Monotonically increasing time would be nice, but is unavailable in Py2.
-  while time.time() < start_timestamp + duration_sec:
-    blob_id, blob_data = _MakeRandomBlob(size_b, random_fd)
-    _, write_time = _Timed(bs.WriteBlobs, {blob_id: blob_data})
-    durations.append(write_time)
-  return durations
+  return [
+      BenchmarkConfig(
+          store=store,
+          operation=operation,
+          size=size,
+          batch_size=int(batch_size),
+          threads=int(threads),
+          hit_ratio=_HIT_RATIO.value,
+      )
+      for store in _TARGET.value
+      for operation in _OPERATIONS_FLAG.value
+      for size in _SIZES.value
+      for batch_size in _BATCH_SIZES.value
+      for threads in _THREADS.value
+  ]
 
 
 def main(argv):
@@ -105,19 +450,30 @@ def main(argv):
     print("Missing --target. Use one or multiple of: {}.".format(store_names))
     exit(1)
 
-  stores = [_MakeBlobStore(blobstore_name) for blobstore_name in _TARGET.value]
+  stores = {
+      blobstore_name: _MakeBlobStore(blobstore_name)
+      for blobstore_name in _TARGET.value
+  }
 
+  results = []
   with io.open("/dev/urandom", "rb") as random_fd:
-    for blobstore_name, bs in zip(_TARGET.value, stores):
-      print()
-      print(blobstore_name)
-      print("size\ttotal\tnum\tqps\t  b/sec\tp50\tp90\tp95\tp99")
-      for size in _SIZES.value:
-        size_b = rdfvalue.ByteSize(size)
-        durations = _RunBenchmark(
-            bs, size_b, _PER_SIZE_DURATION_SECONDS.value, random_fd
-        )
-        _PrintStats(size, size_b, durations)
+    random_blobs = _RandomBlobs(random_fd)
+    for config in _Configs():
+      result = _RunBenchmark(
+          stores[config.store],
+          config,
+          _PER_SIZE_DURATION_SECONDS.value,
+          random_blobs,
+      )
+      results.append(result)
+      # Report the progress as the full suite may take a long time.
+      print(_FormatTextRow(result), file=sys.stderr)
+
+  if _OUTPUT.value:
+    with open(os.path.expanduser(_OUTPUT.value), "w", newline="") as out:
+      _WriteResults(results, _OUTPUT_FORMAT.value, out)
+  else:
+    _WriteResults(results, _OUTPUT_FORMAT.value, sys.stdout)
 
 
 if __name__ == "__main__":
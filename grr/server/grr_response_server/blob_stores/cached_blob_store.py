@@ -0,0 +1,350 @@
+#!/usr/bin/env python
+"""A blob store implementation that caches blobs of another blob store."""
+
+import collections
+from collections.abc import Iterable
+import logging
+import os
+import threading
+from typing import Optional
+
+from grr_response_core import config
+from grr_response_core.stats import metrics
+from grr_response_server import blob_store
+from grr_response_server.models import blobs as models_blobs
+
+_MEMORY = "memory"
+_DISK = "disk"
+
+BLOB_STORE_CACHE_HITS = metrics.Counter(
+    "blob_store_cache_hits", fields=[("tier", str)]
+)
+BLOB_STORE_CACHE_MISSES = metrics.Counter("blob_store_cache_misses")
+BLOB_STORE_CACHE_EVICTIONS = metrics.Counter(
+    "blob_store_cache_evictions", fields=[("tier", str)]
+)
+
+
+class ConfigError(Exception):
+  """Raised when the cached blob store config is invalid."""
+
+
+class _MemoryCache:
+  """A thread-safe size-bounded LRU cache of blobs kept in memory."""
+
+  def __init__(self, max_size: int) -> None:
+    self._max_size = max_size
+    self._lock = threading.Lock()
+    self._blobs: collections.OrderedDict[models_blobs.BlobID, bytes] = (
+        collections.OrderedDict()
+    )
+    self._size = 0
+
+  def Get(self, blob_id: models_blobs.BlobID) -> Optional[bytes]:
+    with self._lock:
+      try:
+        blob = self._blobs[blob_id]
+      except KeyError:
+        return None
+
+      self._blobs.move_to_end(blob_id)
+      return blob
+
+  def Contains(self, blob_id: models_blobs.BlobID) -> bool:
+    with self._lock:
+      return blob_id in self._blobs
+
+  def Put(self, blob_id: models_blobs.BlobID, blob: bytes) -> None:
+    """Puts a blob into the cache, evicting least recently used blobs."""
+    if len(blob) > self._max_size:
+      return
+
+    with self._lock:
+      if blob_id in self._blobs:
+        self._blobs.move_to_end(blob_id)
+        return
+
+      self._blobs[blob_id] = blob
+      self._size += len(blob)
+
+      while self._size > self._max_size:
+        _, evicted = self._blobs.popitem(last=False)
+        self._size -= len(evicted)
+        BLOB_STORE_CACHE_EVICTIONS.Increment(fields=[_MEMORY])
+
+
+class _DiskCache:
+  """A thread-safe size-bounded LRU cache of blobs kept in a local directory.
+
+  Every blob is stored in a separate file named after the blob identifier. The
+  LRU order is kept in memory and is restored (approximately, based on file
+  access times) from the directory contents on startup.
+
+  The lock only guards the in-memory index, files are read, written and
+  removed without holding it. A blob file removed by a concurrent eviction
+  is treated as a cache miss.
+  """
+
+  _TMP_INFIX = ".tmp."
+
+  def __init__(self, path: str, max_size: int) -> None:
+    self._path = path
+    self._max_size = max_size
+    self._lock = threading.Lock()
+    self._sizes: collections.OrderedDict[models_blobs.BlobID, int] = (
+        collections.OrderedDict()
+    )
+    self._size = 0
+
+    os.makedirs(path, exist_ok=True)
+    self._LoadIndex()
+
+  def _LoadIndex(self) -> None:
+    """Indexes blobs already present in the cache directory."""
+    entries = []
+    for dirpath, _, filenames in os.walk(self._path):
+      for filename in filenames:
+        filepath = os.path.join(dirpath, filename)
+        if self._TMP_INFIX in filename:
+          # A leftover of a write interrupted by a crash.
+          self._RemoveFile(filepath)
+          continue
+
+        try:
+          blob_id = models_blobs.BlobID(bytes.fromhex(filename))
+          stat = os.stat(filepath)
+        except (ValueError, OSError):
+          # Not a blob file.
+          continue
+        entries.append((stat.st_atime, blob_id, stat.st_size))
+
+    for _, blob_id, size in sorted(entries, key=lambda entry: entry[0]):
+      self._sizes[blob_id] = size
+      self._size += size
+
+    for blob_id in self._PopEvicted():
+      self._RemoveFile(self._Filepath(blob_id))
+
+  def _Filepath(self, blob_id: models_blobs.BlobID) -> str:
+    hex_blob_id = bytes(blob_id).hex()
+    # Blobs are spread over subdirectories to keep directory sizes reasonable.
+    return os.path.join(self._path, hex_blob_id[:2], hex_blob_id)
+
+  def Get(self, blob_id: models_blobs.BlobID) -> Optional[bytes]:
+    """Reads a blob from the cache."""
+    with self._lock:
+      if blob_id not in self._sizes:
+        return None
+      self._sizes.move_to_end(blob_id)
+
+    try:
+      with open(self._Filepath(blob_id), "rb") as fd:
+        return fd.read()
+    except OSError as e:
+      logging.warning("Unable to read cached blob %s: %s", blob_id, e)
+      with self._lock:
+        size = self._sizes.pop(blob_id, None)
+        if size is not None:
+          self._size -= size
+      return None
+
+  def Contains(self, blob_id: models_blobs.BlobID) -> bool:
+    with self._lock:
+      return blob_id in self._sizes
+
+  def Put(self, blob_id: models_blobs.BlobID, blob: bytes) -> None:
+    """Writes a blob to the cache, evicting least recently used blobs."""
+    if len(blob) > self._max_size:
+      return
+
+    with self._lock:
+      if blob_id in self._sizes:
+        self._sizes.move_to_end(blob_id)
+        return
+
+    filepath = self._Filepath(blob_id)
+    tmp_filepath = f"{filepath}{self._TMP_INFIX}{threading.get_ident()}"
+    try:
+      os.makedirs(os.path.dirname(filepath), exist_ok=True)
+      with open(tmp_filepath, "wb") as fd:
+        fd.write(blob)
+      # Renaming makes sure that readers never see partially written blobs.
+      os.replace(tmp_filepath, filepath)
+    except OSError as e:
+      logging.warning("Unable to cache blob %s: %s", blob_id, e)
+      if os.path.exists(tmp_filepath):
+        self._RemoveFile(tmp_filepath)
+      return
+
+    with self._lock:
+      # The blob may have been cached by another thread in the meantime.
+      if blob_id not in self._sizes:
+        self._sizes[blob_id] = len(blob)
+        self._size += len(blob)
+      evicted_blob_ids = self._PopEvicted()
+
+    for evicted_blob_id in evicted_blob_ids:
+      self._RemoveFile(self._Filepath(evicted_blob_id))
+
+  def _PopEvicted(self) -> list[models_blobs.BlobID]:
+    """Removes least recently used blobs from the index until it fits."""
+    evicted_blob_ids = []
+    while self._size > self._max_size:
+      blob_id, size = self._sizes.popitem(last=False)
+      self._size -= size
+      BLOB_STORE_CACHE_EVICTIONS.Increment(fields=[_DISK])
+      evicted_blob_ids.append(blob_id)
+    return evicted_blob_ids
+
+  def _RemoveFile(self, filepath: str) -> None:
+    try:
+      os.remove(filepath)
+    except FileNotFoundError:
+      # Already removed, e.g. by a concurrent eviction of the same blob.
+      pass
+    except OSError as e:
+      logging.warning("Unable to remove cached blob file %s: %s", filepath, e)
+
+
+class CachedBlobStore(blob_store.BlobStore):
+  """A blob store that caches blobs of another blob store locally.
+
+  Blobs are immutable and identified by hashes of their content, so cached
+  blobs never need to be invalidated. Writes go through to the delegate blob
+  store and populate the cache.
+  """
+
+  def __init__(
+      self,
+      delegate: Optional[blob_store.BlobStore] = None,
+      cache_dir: Optional[str] = None,
+      max_disk_size: Optional[int] = None,
+      max_memory_size: Optional[int] = None,
+  ) -> None:
+    """Initializes the cached blob store.
+
+    Args:
+      delegate: A blob store to cache blobs of. If none is provided, the blob
+        store specified by the Blobstore.cache.delegate config option is used.
+      cache_dir: A directory to keep cached blobs in. If none is provided, the
+        Blobstore.cache.directory config option is used. If empty, blobs are
+        not cached on disk.
+      max_disk_size: A maximum number of bytes of blobs cached on disk.
+      max_memory_size: A maximum number of bytes of blobs cached in memory. If
+        zero, blobs are not cached in memory.
+    """
+    super().__init__()
+
+    if delegate is None:
+      delegate_name = config.CONFIG["Blobstore.cache.delegate"]
+      if delegate_name == CachedBlobStore.__name__:
+        raise ConfigError("Cached blob store can't delegate to itself")
+      try:
+        delegate = blob_store.REGISTRY[delegate_name]()
+      except KeyError:
+        raise ConfigError(f"No blob store {delegate_name} found") from None
+
+    if cache_dir is None:
+      cache_dir = config.CONFIG["Blobstore.cache.directory"]
+    if max_disk_size is None:
+      max_disk_size = config.CONFIG["Blobstore.cache.max_disk_size"]
+    if max_memory_size is None:
+      max_memory_size = config.CONFIG["Blobstore.cache.max_memory_size"]
+
+    self._delegate = delegate
+
+    self._memory_cache: Optional[_MemoryCache] = None
+    if max_memory_size > 0:
+      self._memory_cache = _MemoryCache(max_memory_size)
+
+    self._disk_cache: Optional[_DiskCache] = None
+    if cache_dir and max_disk_size > 0:
+      self._disk_cache = _DiskCache(cache_dir, max_disk_size)
+
+  def _ReadCached(self, blob_id: models_blobs.BlobID) -> Optional[bytes]:
+    """Reads a blob from the cache, returning None on cache miss."""
+    if self._memory_cache is not None:
+      blob = self._memory_cache.Get(blob_id)
+      if blob is not None:
+        BLOB_STORE_CACHE_HITS.Increment(fields=[_MEMORY])
+        return blob
+
+    if self._disk_cache is not None:
+      blob = self._disk_cache.Get(blob_id)
+      if blob is not None:
+        BLOB_STORE_CACHE_HITS.Increment(fields=[_DISK])
+        if self._memory_cache is not None:
+          self._memory_cache.Put(blob_id, blob)
+        return blob
+
+    BLOB_STORE_CACHE_MISSES.Increment()
+    return None
+
+  def _IsCached(self, blob_id: models_blobs.BlobID) -> bool:
+    if self._memory_cache is not None and self._memory_cache.Contains(blob_id):
+      BLOB_STORE_CACHE_HITS.Increment(fields=[_MEMORY])
+      return True
+
+    if self._disk_cache is not None and self._disk_cache.Contains(blob_id):
+      BLOB_STORE_CACHE_HITS.Increment(fields=[_DISK])
+      return True
+
+    BLOB_STORE_CACHE_MISSES.Increment()
+    return False
+
+  def _Cache(self, blobs: dict[models_blobs.BlobID, bytes]) -> None:
+    for blob_id, blob in blobs.items():
+      if self._memory_cache is not None:
+        self._memory_cache.Put(blob_id, blob)
+      if self._disk_cache is not None:
+        self._disk_cache.Put(blob_id, blob)
+
+  def WriteBlobs(
+      self,
+      blob_id_data_map: dict[models_blobs.BlobID, bytes],
+  ) -> None:
+    """Writes blobs to the delegate blob store and caches them."""
+    self._delegate.WriteBlobs(blob_id_data_map)
+    self._Cache(blob_id_data_map)
+
+  def ReadBlobs(
+      self,
+      blob_ids: Iterable[models_blobs.BlobID],
+  ) -> dict[models_blobs.BlobID, Optional[bytes]]:
+    """Reads blobs from the cache, falling back to the delegate blob store."""
+    result = {}
+    missing_blob_ids = []
+    for blob_id in blob_ids:
+      blob = self._ReadCached(blob_id)
+      if blob is None:
+        missing_blob_ids.append(blob_id)
+      result[blob_id] = blob
+
+    if missing_blob_ids:
+      read_blobs = self._delegate.ReadBlobs(missing_blob_ids)
+      result.update(read_blobs)
+      self._Cache({
+          blob_id: blob
+          for blob_id, blob in read_blobs.items()
+          if blob is not None
+      })
+
+    return result
+
+  def CheckBlobsExist(
+      self,
+      blob_ids: Iterable[models_blobs.BlobID],
+  ) -> dict[models_blobs.BlobID, bool]:
+    """Checks whether blobs exist in the cache or the delegate blob store."""
+    result = {}
+    missing_blob_ids = []
+    for blob_id in blob_ids:
+      cached = self._IsCached(blob_id)
+      if not cached:
+        missing_blob_ids.append(blob_id)
+      result[blob_id] = cached
+
+    if missing_blob_ids:
+      result.update(self._delegate.CheckBlobsExist(missing_blob_ids))
+
+    return result
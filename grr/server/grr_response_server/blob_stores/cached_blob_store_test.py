@@ -0,0 +1,301 @@
+#!/usr/bin/env python
+from collections.abc import Callable
+import os
+import shutil
+import threading
+from typing import Optional
+from unittest import mock
+
+from absl.testing import absltest
+
+from grr_response_core.lib.util import temp
+from grr_response_core.stats import default_stats_collector
+from grr_response_core.stats import stats_collector_instance
+from grr_response_server import blob_store
+from grr_response_server import blob_store_test_mixin
+from grr_response_server.blob_stores import cached_blob_store
+from grr_response_server.databases import mem as mem_db
+from grr_response_server.models import blobs as models_blobs
+
+
+def setUpModule() -> None:
+  stats_collector_instance.Set(default_stats_collector.DefaultStatsCollector())
+
+
+class CachedBlobStoreTest(
+    blob_store_test_mixin.BlobStoreTestMixin,
+    absltest.TestCase,
+):
+  # Test methods are defined in the base mixin class.
+
+  def CreateBlobStore(
+      self,
+  ) -> tuple[blob_store.BlobStore, Optional[Callable[[], None]]]:
+    cache_dir = temp.TempDirPath()
+    bs = cached_blob_store.CachedBlobStore(
+        mem_db.InMemoryDB(),
+        cache_dir=cache_dir,
+        max_disk_size=1024 * 1024,
+        max_memory_size=1024,
+    )
+    return bs, lambda: shutil.rmtree(cache_dir)
+
+
+class CachedBlobStoreCachingTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.delegate = mem_db.InMemoryDB()
+    self.cache_dir = self.create_tempdir().full_path
+
+  def _MakeBlob(self, size: int = 16) -> tuple[models_blobs.BlobID, bytes]:
+    blob = os.urandom(size)
+    return models_blobs.BlobID.Of(blob), blob
+
+  def testWritesThroughToDelegate(self):
+    bs = cached_blob_store.CachedBlobStore(
+        self.delegate,
+        cache_dir=self.cache_dir,
+        max_disk_size=1024,
+        max_memory_size=1024,
+    )
+    blob_id, blob = self._MakeBlob()
+    bs.WriteBlobs({blob_id: blob})
+
+    self.assertEqual(self.delegate.ReadBlobs([blob_id]), {blob_id: blob})
+
+  def testReadsWrittenBlobsFromCache(self):
+    bs = cached_blob_store.CachedBlobStore(
+        self.delegate,
+        cache_dir=self.cache_dir,
+        max_disk_size=1024,
+        max_memory_size=1024,
+    )
+    blob_id, blob = self._MakeBlob()
+    bs.WriteBlobs({blob_id: blob})
+
+    with mock.patch.object(self.delegate, "ReadBlobs") as read_blobs_mock:
+      self.assertEqual(bs.ReadBlobs([blob_id]), {blob_id: blob})
+    read_blobs_mock.assert_not_called()
+
+    with mock.patch.object(
+        self.delegate, "CheckBlobsExist"
+    ) as check_blobs_exist_mock:
+      self.assertEqual(bs.CheckBlobsExist([blob_id]), {blob_id: True})
+    check_blobs_exist_mock.assert_not_called()
+
+  def testCachesBlobsReadFromDelegate(self):
+    bs = cached_blob_store.CachedBlobStore(
+        self.delegate,
+        cache_dir=self.cache_dir,
+        max_disk_size=1024,
+        max_memory_size=0,
+    )
+    blob_id, blob = self._MakeBlob()
+    self.delegate.WriteBlobs({blob_id: blob})
+
+    with mock.patch.object(
+        self.delegate, "ReadBlobs", wraps=self.delegate.ReadBlobs
+    ) as read_blobs_mock:
+      self.assertEqual(bs.ReadBlobs([blob_id]), {blob_id: blob})
+      self.assertEqual(bs.ReadBlobs([blob_id]), {blob_id: blob})
+
+    self.assertEqual(read_blobs_mock.call_count, 1)
+
+  def testReadsOnlyMissingBlobsFromDelegate(self):
+    bs = cached_blob_store.CachedBlobStore(
+        self.delegate,
+        cache_dir=self.cache_dir,
+        max_disk_size=1024,
+        max_memory_size=1024,
+    )
+    cached_blob_id, cached_blob = self._MakeBlob()
+    bs.WriteBlobs({cached_blob_id: cached_blob})
+    other_blob_id, other_blob = self._MakeBlob()
+    self.delegate.WriteBlobs({other_blob_id: other_blob})
+    missing_blob_id, _ = self._MakeBlob()
+
+    with mock.patch.object(
+        self.delegate, "ReadBlobs", wraps=self.delegate.ReadBlobs
+    ) as read_blobs_mock:
+      result = bs.ReadBlobs([cached_blob_id, other_blob_id, missing_blob_id])
+
+    self.assertEqual(
+        result,
+        {
+            cached_blob_id: cached_blob,
+            other_blob_id: other_blob,
+            missing_blob_id: None,
+        },
+    )
+    read_blobs_mock.assert_called_once_with([other_blob_id, missing_blob_id])
+
+  def testEvictsLeastRecentlyUsedBlobsFromDisk(self):
+    bs = cached_blob_store.CachedBlobStore(
+        self.delegate,
+        cache_dir=self.cache_dir,
+        max_disk_size=32,
+        max_memory_size=0,
+    )
+    blob_id_1, blob_1 = self._MakeBlob()
+    blob_id_2, blob_2 = self._MakeBlob()
+    blob_id_3, blob_3 = self._MakeBlob()
+
+    bs.WriteBlobs({blob_id_1: blob_1})
+    bs.WriteBlobs({blob_id_2: blob_2})
+    # Make the first blob the most recently used one.
+    bs.ReadBlobs([blob_id_1])
+    bs.WriteBlobs({blob_id_3: blob_3})
+
+    with mock.patch.object(
+        self.delegate, "ReadBlobs", wraps=self.delegate.ReadBlobs
+    ) as read_blobs_mock:
+      self.assertEqual(
+          bs.ReadBlobs([blob_id_1, blob_id_2, blob_id_3]),
+          {blob_id_1: blob_1, blob_id_2: blob_2, blob_id_3: blob_3},
+      )
+
+    read_blobs_mock.assert_called_once_with([blob_id_2])
+
+  def testEvictsLeastRecentlyUsedBlobsFromMemory(self):
+    bs = cached_blob_store.CachedBlobStore(
+        self.delegate,
+        cache_dir="",
+        max_disk_size=0,
+        max_memory_size=32,
+    )
+    blob_id_1, blob_1 = self._MakeBlob()
+    blob_id_2, blob_2 = self._MakeBlob()
+    blob_id_3, blob_3 = self._MakeBlob()
+
+    bs.WriteBlobs({blob_id_1: blob_1, blob_id_2: blob_2, blob_id_3: blob_3})
+
+    with mock.patch.object(
+        self.delegate, "ReadBlobs", wraps=self.delegate.ReadBlobs
+    ) as read_blobs_mock:
+      bs.ReadBlobs([blob_id_1, blob_id_2, blob_id_3])
+
+    read_blobs_mock.assert_called_once_with([blob_id_1])
+
+  def testDoesNotCacheBlobsLargerThanCache(self):
+    bs = cached_blob_store.CachedBlobStore(
+        self.delegate,
+        cache_dir=self.cache_dir,
+        max_disk_size=8,
+        max_memory_size=8,
+    )
+    blob_id, blob = self._MakeBlob(16)
+    bs.WriteBlobs({blob_id: blob})
+
+    self.assertEqual(bs.ReadBlobs([blob_id]), {blob_id: blob})
+    self.assertEmpty(os.listdir(self.cache_dir))
+
+  def testReusesDiskCacheAcrossInstances(self):
+    blob_id, blob = self._MakeBlob()
+    cached_blob_store.CachedBlobStore(
+        self.delegate,
+        cache_dir=self.cache_dir,
+        max_disk_size=1024,
+        max_memory_size=0,
+    ).WriteBlobs({blob_id: blob})
+
+    bs = cached_blob_store.CachedBlobStore(
+        mem_db.InMemoryDB(),
+        cache_dir=self.cache_dir,
+        max_disk_size=1024,
+        max_memory_size=0,
+    )
+    self.assertEqual(bs.ReadBlobs([blob_id]), {blob_id: blob})
+
+  def testRemovesLeftoverTemporaryFilesOnStartup(self):
+    blob_id, blob = self._MakeBlob()
+    tmp_dir = os.path.join(self.cache_dir, "ab")
+    os.makedirs(tmp_dir)
+    tmp_filepath = os.path.join(tmp_dir, f"{bytes(blob_id).hex()}.tmp.42")
+    with open(tmp_filepath, "wb") as fd:
+      fd.write(blob)
+
+    cached_blob_store.CachedBlobStore(
+        self.delegate,
+        cache_dir=self.cache_dir,
+        max_disk_size=1024,
+        max_memory_size=0,
+    )
+
+    self.assertFalse(os.path.exists(tmp_filepath))
+
+  def testRemovesTemporaryFileIfWriteFails(self):
+    bs = cached_blob_store.CachedBlobStore(
+        self.delegate,
+        cache_dir=self.cache_dir,
+        max_disk_size=1024,
+        max_memory_size=0,
+    )
+    blob_id, blob = self._MakeBlob()
+
+    with mock.patch.object(os, "replace", side_effect=OSError("No space")):
+      bs.WriteBlobs({blob_id: blob})
+
+    for _, _, filenames in os.walk(self.cache_dir):
+      self.assertEmpty(filenames)
+    # The blob is not cached, so it is read from the delegate.
+    self.assertEqual(bs.ReadBlobs([blob_id]), {blob_id: blob})
+
+  def testConcurrentReadsAndWrites(self):
+    bs = cached_blob_store.CachedBlobStore(
+        self.delegate,
+        cache_dir=self.cache_dir,
+        max_disk_size=16 * 8,
+        max_memory_size=0,
+    )
+    blobs = dict(self._MakeBlob() for _ in range(32))
+    self.delegate.WriteBlobs(blobs)
+    blob_ids = list(blobs)
+
+    results = []
+
+    def ReadBlobs(offset: int) -> None:
+      for i in range(len(blob_ids)):
+        blob_id = blob_ids[(offset + i) % len(blob_ids)]
+        results.append(bs.ReadBlobs([blob_id]) == {blob_id: blobs[blob_id]})
+
+    threads = [
+        threading.Thread(target=ReadBlobs, args=(offset,))
+        for offset in range(8)
+    ]
+    for thread in threads:
+      thread.start()
+    for thread in threads:
+      thread.join()
+
+    self.assertLen(results, 8 * len(blob_ids))
+    self.assertTrue(all(results))
+    self.assertEqual(bs.ReadBlobs(blob_ids), blobs)
+
+  def testCountsHitsAndMisses(self):
+    bs = cached_blob_store.CachedBlobStore(
+        self.delegate,
+        cache_dir=self.cache_dir,
+        max_disk_size=1024,
+        max_memory_size=1024,
+    )
+    blob_id, blob = self._MakeBlob()
+    bs.WriteBlobs({blob_id: blob})
+    missing_blob_id, _ = self._MakeBlob()
+
+    hits = cached_blob_store.BLOB_STORE_CACHE_HITS.GetValue(fields=["memory"])
+    misses = cached_blob_store.BLOB_STORE_CACHE_MISSES.GetValue()
+
+    bs.ReadBlobs([blob_id, missing_blob_id])
+
+    self.assertEqual(
+        cached_blob_store.BLOB_STORE_CACHE_HITS.GetValue(fields=["memory"]),
+        hits + 1,
+    )
+    self.assertEqual(
+        cached_blob_store.BLOB_STORE_CACHE_MISSES.GetValue(), misses + 1
+    )
+
+
+if __name__ == "__main__":
+  absltest.main()
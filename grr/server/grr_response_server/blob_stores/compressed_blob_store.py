@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+"""A blob store implementation that compresses blobs of another blob store."""
+
+from collections.abc import Iterable
+import enum
+import logging
+from typing import Optional
+import zlib
+
+from grr_response_core import config
+from grr_response_core.stats import metrics
+from grr_response_server import blob_store
+from grr_response_server.models import blobs as models_blobs
+
+try:
+  # pylint: disable=g-import-not-at-top
+  import zstandard
+  # pylint: enable=g-import-not-at-top
+except ImportError:
+  zstandard = None
+
+
+BLOB_STORE_COMPRESSION_INPUT_BYTES = metrics.Counter(
+    "blob_store_compression_input_bytes", fields=[("codec", str)]
+)
+BLOB_STORE_COMPRESSION_OUTPUT_BYTES = metrics.Counter(
+    "blob_store_compression_output_bytes", fields=[("codec", str)]
+)
+
+
+class Codec(enum.IntEnum):
+  """Codecs that blobs can be stored with."""
+
+  NONE = 0
+  ZLIB = 1
+  ZSTD = 2
+
+
+# Compressed blobs are stored with a header consisting of these magic bytes
+# followed by a single byte identifying the codec. Blobs stored without
+# compression are written verbatim (unless they happen to start with the magic
+# bytes), so blobs written before compression was enabled stay readable.
+_MAGIC = b"\xf0GRZ"
+_HEADER_SIZE = len(_MAGIC) + 1
+
+# Size of the blob prefix that is compressed to estimate compressibility.
+_SAMPLE_SIZE = 64 * 1024
+
+
+class ConfigError(Exception):
+  """Raised when the compressed blob store config is invalid."""
+
+
+class UnsupportedCodecError(Exception):
+  """Raised when a blob was compressed with a codec that is not available."""
+
+  def __init__(self, blob_id: models_blobs.BlobID, codec: Codec) -> None:
+    super().__init__(f"Blob '{blob_id}' compressed with unavailable {codec!r}")
+    self.blob_id = blob_id
+    self.codec = codec
+
+
+def _Compress(codec: Codec, data: bytes, level: int) -> bytes:
+  if codec == Codec.ZLIB:
+    return zlib.compress(data, level)
+  elif codec == Codec.ZSTD:
+    return zstandard.ZstdCompressor(level=level).compress(data)
+  else:
+    raise ValueError(f"Unexpected codec: {codec!r}")
+
+
+def _Decompress(codec: Codec, data: bytes) -> bytes:
+  """Decompresses data, raising if it is not exactly one compressed stream."""
+  if codec == Codec.ZLIB:
+    decompressor = zlib.decompressobj()
+    result = decompressor.decompress(data)
+    if not decompressor.eof or decompressor.unused_data:
+      raise zlib.error("Data is not a single complete zlib stream")
+    return result
+  elif codec == Codec.ZSTD:
+    return zstandard.ZstdDecompressor().decompress(data)
+  else:
+    raise ValueError(f"Unexpected codec: {codec!r}")
+
+
+class CompressedBlobStore(blob_store.BlobStore):
+  """A blob store that compresses blobs before writing them to a delegate.
+
+  Blob identifiers are always computed over the uncompressed content. Every
+  blob is stored with the codec that suits it: a prefix of the blob is
+  compressed first and blobs that don't compress well enough (e.g. already
+  compressed archives) are stored as they are.
+  """
+
+  def __init__(
+      self,
+      delegate: Optional[blob_store.BlobStore] = None,
+      codec: Optional[Codec] = None,
+      level: Optional[int] = None,
+      max_ratio: Optional[float] = None,
+  ) -> None:
+    """Initializes the compressed blob store.
+
+    Args:
+      delegate: A blob store to write compressed blobs to. If none is provided,
+        the blob store specified by the Blobstore.compression.delegate config
+        option is used.
+      codec: A codec to compress blobs with. If none is provided, zstd is used
+        if available and zlib otherwise.
+      level: A compression level of the codec.
+      max_ratio: A maximum ratio of compressed to uncompressed size for the
+        blob to be stored compressed.
+    """
+    super().__init__()
+
+    if delegate is None:
+      delegate_name = config.CONFIG["Blobstore.compression.delegate"]
+      if delegate_name == CompressedBlobStore.__name__:
+        raise ConfigError("Compressed blob store can't delegate to itself")
+      try:
+        delegate = blob_store.REGISTRY[delegate_name]()
+      except KeyError:
+        raise ConfigError(f"No blob store {delegate_name} found") from None
+
+    if codec is None:
+      codec_name = config.CONFIG["Blobstore.compression.codec"]
+      if codec_name == "auto":
+        codec = Codec.ZSTD if zstandard is not None else Codec.ZLIB
+      else:
+        codec = Codec[codec_name.upper()]
+    if codec == Codec.ZSTD and zstandard is None:
+      raise ConfigError("zstd compression requires the zstandard package")
+
+    if level is None:
+      level = config.CONFIG["Blobstore.compression.level"]
+    if max_ratio is None:
+      max_ratio = config.CONFIG["Blobstore.compression.max_ratio"]
+
+    self._delegate = delegate
+    self._codec = codec
+    self._level = level
+    self._max_ratio = max_ratio
+
+  def _IsCompressible(self, data: bytes, compressed: bytes) -> bool:
+    return len(compressed) + _HEADER_SIZE <= len(data) * self._max_ratio
+
+  def _Encode(self, blob: bytes) -> bytes:
+    """Encodes a blob with the codec that suits it."""
+    codec = self._codec
+    encoded = None
+
+    if codec != Codec.NONE and blob:
+      # Large blobs are compressed in full only if their prefix compresses well.
+      sample = blob[:_SAMPLE_SIZE]
+      if len(sample) == len(blob) or self._IsCompressible(
+          sample, _Compress(codec, sample, self._level)
+      ):
+        compressed = _Compress(codec, blob, self._level)
+        if self._IsCompressible(blob, compressed):
+          encoded = _MAGIC + bytes([codec]) + compressed
+
+    if encoded is None:
+      codec = Codec.NONE
+      if blob.startswith(_MAGIC):
+        # Make sure such blob is not mistaken for a compressed one.
+        encoded = _MAGIC + bytes([Codec.NONE]) + blob
+      else:
+        encoded = blob
+
+    BLOB_STORE_COMPRESSION_INPUT_BYTES.Increment(
+        len(blob), fields=[codec.name.lower()]
+    )
+    BLOB_STORE_COMPRESSION_OUTPUT_BYTES.Increment(
+        len(encoded), fields=[codec.name.lower()]
+    )
+    return encoded
+
+  def _Decode(self, blob_id: models_blobs.BlobID, encoded: bytes) -> bytes:
+    """Decodes a blob written by `_Encode` (or written verbatim)."""
+    if not encoded.startswith(_MAGIC) or len(encoded) < _HEADER_SIZE:
+      return encoded
+
+    try:
+      codec = Codec(encoded[len(_MAGIC)])
+    except ValueError:
+      # Not a known codec, so this must be a verbatim blob.
+      return encoded
+
+    payload = encoded[_HEADER_SIZE:]
+    if codec == Codec.NONE:
+      # Verbatim blobs written before compression was enabled might look like
+      # a header followed by payload, only the identifier can tell them apart.
+      if models_blobs.BlobID.Of(payload) == blob_id:
+        return payload
+      return encoded
+
+    if codec == Codec.ZSTD and zstandard is None:
+      raise UnsupportedCodecError(blob_id, codec)
+
+    try:
+      return _Decompress(codec, payload)
+    except Exception:  # pylint: disable=broad-exception-caught
+      if models_blobs.BlobID.Of(encoded) == blob_id:
+        return encoded
+      logging.exception("Unable to decompress blob %s", blob_id)
+      raise
+
+  def WriteBlobs(
+      self,
+      blob_id_data_map: dict[models_blobs.BlobID, bytes],
+  ) -> None:
+    """Compresses blobs and writes them to the delegate blob store."""
+    self._delegate.WriteBlobs({
+        blob_id: self._Encode(blob)
+        for blob_id, blob in blob_id_data_map.items()
+    })
+
+  def ReadBlobs(
+      self,
+      blob_ids: Iterable[models_blobs.BlobID],
+  ) -> dict[models_blobs.BlobID, Optional[bytes]]:
+    """Reads blobs from the delegate blob store and decompresses them."""
+    result = {}
+    for blob_id, encoded in self._delegate.ReadBlobs(blob_ids).items():
+      if encoded is None:
+        result[blob_id] = None
+      else:
+        result[blob_id] = self._Decode(blob_id, encoded)
+
+    return result
+
+  def CheckBlobsExist(
+      self,
+      blob_ids: Iterable[models_blobs.BlobID],
+  ) -> dict[models_blobs.BlobID, bool]:
+    """Checks whether the specified blobs exist in the delegate blob store."""
+    return self._delegate.CheckBlobsExist(blob_ids)
@@ -0,0 +1,145 @@
+#!/usr/bin/env python
+from collections.abc import Callable
+import os
+from typing import Optional
+import unittest
+import zlib
+
+from absl.testing import absltest
+
+from grr_response_core.stats import default_stats_collector
+from grr_response_core.stats import stats_collector_instance
+from grr_response_server import blob_store
+from grr_response_server import blob_store_test_mixin
+from grr_response_server.blob_stores import compressed_blob_store
+from grr_response_server.databases import mem as mem_db
+from grr_response_server.models import blobs as models_blobs
+
+
+def setUpModule() -> None:
+  stats_collector_instance.Set(default_stats_collector.DefaultStatsCollector())
+
+
+class CompressedBlobStoreTest(
+    blob_store_test_mixin.BlobStoreTestMixin,
+    absltest.TestCase,
+):
+  # Test methods are defined in the base mixin class.
+
+  def CreateBlobStore(
+      self,
+  ) -> tuple[blob_store.BlobStore, Optional[Callable[[], None]]]:
+    bs = compressed_blob_store.CompressedBlobStore(
+        mem_db.InMemoryDB(),
+        codec=compressed_blob_store.Codec.ZLIB,
+        level=6,
+        max_ratio=0.9,
+    )
+    return bs, None
+
+
+class CompressedBlobStoreCompressionTest(absltest.TestCase):
+
+  def setUp(self):
+    super().setUp()
+    self.delegate = mem_db.InMemoryDB()
+    self.blob_store = compressed_blob_store.CompressedBlobStore(
+        self.delegate,
+        codec=compressed_blob_store.Codec.ZLIB,
+        level=6,
+        max_ratio=0.9,
+    )
+
+  def _WriteAndRead(self, blob: bytes) -> tuple[bytes, bytes]:
+    blob_id = models_blobs.BlobID.Of(blob)
+    self.blob_store.WriteBlobs({blob_id: blob})
+    return (
+        self.blob_store.ReadBlob(blob_id),
+        self.delegate.ReadBlobs([blob_id])[blob_id],
+    )
+
+  def testCompressesCompressibleBlobs(self):
+    blob = b"foobarbaz" * 1024
+
+    read_blob, stored_blob = self._WriteAndRead(blob)
+
+    self.assertEqual(read_blob, blob)
+    self.assertLess(len(stored_blob), len(blob))
+
+  def testStoresIncompressibleBlobsVerbatim(self):
+    blob = os.urandom(1024)
+
+    read_blob, stored_blob = self._WriteAndRead(blob)
+
+    self.assertEqual(read_blob, blob)
+    self.assertEqual(stored_blob, blob)
+
+  def testStoresBlobsWithIncompressiblePrefixVerbatim(self):
+    sample_size = compressed_blob_store._SAMPLE_SIZE
+    blob = os.urandom(sample_size) + b"\x00" * sample_size * 4
+
+    read_blob, stored_blob = self._WriteAndRead(blob)
+
+    self.assertEqual(read_blob, blob)
+    self.assertEqual(stored_blob, blob)
+
+  def testRoundTripsIncompressibleBlobsStartingWithMagic(self):
+    blob = compressed_blob_store._MAGIC + os.urandom(1024)
+
+    read_blob, stored_blob = self._WriteAndRead(blob)
+
+    self.assertEqual(read_blob, blob)
+    self.assertNotEqual(stored_blob, blob)
+
+  def testRoundTripsEmptyBlobs(self):
+    read_blob, _ = self._WriteAndRead(b"")
+
+    self.assertEqual(read_blob, b"")
+
+  def testReadsBlobsWrittenWithoutCompression(self):
+    blobs = [
+        b"foobarbaz" * 1024,
+        os.urandom(1024),
+        compressed_blob_store._MAGIC + bytes([0]) + os.urandom(1024),
+        compressed_blob_store._MAGIC + bytes([1]) + os.urandom(1024),
+        compressed_blob_store._MAGIC
+        + bytes([1])
+        + zlib.compress(b"foobarbaz" * 1024)
+        + b"quux",
+    ]
+    blobs_by_id = {models_blobs.BlobID.Of(blob): blob for blob in blobs}
+    self.delegate.WriteBlobs(blobs_by_id)
+
+    self.assertEqual(self.blob_store.ReadBlobs(list(blobs_by_id)), blobs_by_id)
+
+  def testCountsCompressedBytes(self):
+    blob = b"foobarbaz" * 1024
+    metric = compressed_blob_store.BLOB_STORE_COMPRESSION_INPUT_BYTES
+    input_bytes = metric.GetValue(fields=["zlib"])
+
+    self._WriteAndRead(blob)
+
+    self.assertEqual(metric.GetValue(fields=["zlib"]), input_bytes + len(blob))
+
+  @unittest.skipIf(
+      compressed_blob_store.zstandard is None, "zstandard is not installed"
+  )
+  def testCompressesWithZstd(self):
+    bs = compressed_blob_store.CompressedBlobStore(
+        self.delegate,
+        codec=compressed_blob_store.Codec.ZSTD,
+        level=3,
+        max_ratio=0.9,
+    )
+    blob = b"foobarbaz" * 1024
+    blob_id = models_blobs.BlobID.Of(blob)
+
+    bs.WriteBlobs({blob_id: blob})
+
+    self.assertEqual(bs.ReadBlob(blob_id), blob)
+    # Blobs compressed with zstd are readable by stores preferring zlib.
+    self.assertEqual(self.blob_store.ReadBlob(blob_id), blob)
+
+
+if __name__ == "__main__":
+  absltest.main()
@@ -2,6 +2,8 @@
 """Load all blob stores so that they are visible in the registry."""
 
 from grr_response_server import blob_store
+from grr_response_server.blob_stores import cached_blob_store
+from grr_response_server.blob_stores import compressed_blob_store
 from grr_response_server.blob_stores import db_blob_store
 from grr_response_server.blob_stores import gcs_blob_store
 
@@ -14,3 +16,9 @@ def RegisterBlobStores():
   blob_store.REGISTRY[gcs_blob_store.GCSBlobStore.__name__] = (
       gcs_blob_store.GCSBlobStore
   )
+  blob_store.REGISTRY[cached_blob_store.CachedBlobStore.__name__] = (
+      cached_blob_store.CachedBlobStore
+  )
+  blob_store.REGISTRY[compressed_blob_store.CompressedBlobStore.__name__] = (
+      compressed_blob_store.CompressedBlobStore
+  )
@@ -4,15 +4,177 @@
 An index of client machines, associating likely identifiers to client IDs.
 """
 
-import functools
-import operator
-from typing import Collection, Iterable, Mapping, Sequence
-
+import bisect
+import collections
+import threading
+from typing import (
+    Collection,
+    Iterable,
+    Iterator,
+    Mapping,
+    Optional,
+    Sequence,
+)
+
+from grr_response_core import config
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib.util import precondition
+from grr_response_core.stats import metrics
 from grr_response_server import data_store
 from grr_response_server.rdfvalues import objects as rdf_objects
 
+CLIENT_INDEX_CACHE_HITS = metrics.Counter("client_index_cache_hits")
+CLIENT_INDEX_CACHE_MISSES = metrics.Counter("client_index_cache_misses")
+
+# The default search window: keywords that were not written within this time
+# are ignored unless the query specifies a start date.
+_DEFAULT_SEARCH_WINDOW = rdfvalue.Duration.From(180, rdfvalue.DAYS)
+
+
+class _PostingList:
+  """A sorted list of client ids associated with a keyword."""
+
+  def __init__(self, client_ids: list[str], read_time: rdfvalue.RDFDatetime):
+    self.client_ids = client_ids
+    self.read_time = read_time
+
+
+class _PostingListCache:
+  """An in-process cache of posting lists read within the default window.
+
+  Posting lists are never modified in place: writes done through the
+  `ClientIndex` of this process replace the lists of the affected keywords, so
+  lookups can keep iterating over lists they got from the cache. Each write
+  also bumps the version of the cache, so that posting lists read from the
+  database concurrently with the write are not stored. Writes done by other
+  processes become visible once the cached lists expire.
+  """
+
+  def __init__(self, max_size: int = 1000):
+    self._lock = threading.Lock()
+    self._entries: "collections.OrderedDict[str, _PostingList]" = (
+        collections.OrderedDict()
+    )
+    self._max_size = max_size
+    self._db = None
+    self._version = 0
+
+  def Version(self) -> int:
+    """Returns a number that changes whenever the index is written to."""
+    with self._lock:
+      return self._version
+
+  def Get(
+      self,
+      keyword: str,
+      now: rdfvalue.RDFDatetime,
+      ttl: rdfvalue.Duration,
+  ) -> Optional[list[str]]:
+    """Returns the cached posting list of a keyword, if it is still fresh."""
+    with self._lock:
+      if self._db is not data_store.REL_DB:
+        self._entries.clear()
+        self._db = data_store.REL_DB
+        return None
+
+      entry = self._entries.get(keyword)
+      if entry is None or not entry.read_time <= now < entry.read_time + ttl:
+        return None
+
+      self._entries.move_to_end(keyword)
+      return entry.client_ids
+
+  def Put(
+      self,
+      keyword: str,
+      client_ids: list[str],
+      read_time: rdfvalue.RDFDatetime,
+      version: int,
+  ) -> None:
+    """Stores a posting list read from the database at the given version."""
+    with self._lock:
+      if self._db is not data_store.REL_DB or self._version != version:
+        return
+
+      self._entries[keyword] = _PostingList(client_ids, read_time)
+      self._entries.move_to_end(keyword)
+      while len(self._entries) > self._max_size:
+        self._entries.popitem(last=False)
+
+  def Add(self, client_ids: Iterable[str], keywords: Iterable[str]) -> None:
+    """Adds clients to the cached posting lists of given keywords."""
+    client_ids = sorted(set(client_ids))
+    with self._lock:
+      self._version += 1
+      for keyword in keywords:
+        entry = self._entries.get(keyword)
+        if entry is None:
+          continue
+
+        missing = [
+            cid for cid in client_ids if not _Contains(entry.client_ids, cid)
+        ]
+        if missing:
+          entry.client_ids = sorted(entry.client_ids + missing)
+
+  def Remove(self, client_id: str, keywords: Iterable[str]) -> None:
+    """Removes a client from the cached posting lists of given keywords."""
+    with self._lock:
+      self._version += 1
+      for keyword in keywords:
+        entry = self._entries.get(keyword)
+        if entry is None or not _Contains(entry.client_ids, client_id):
+          continue
+
+        index = bisect.bisect_left(entry.client_ids, client_id)
+        entry.client_ids = (
+            entry.client_ids[:index] + entry.client_ids[index + 1 :]
+        )
+
+
+_posting_lists = _PostingListCache()
+
+
+def _Contains(sorted_list: Sequence[str], item: str) -> bool:
+  index = bisect.bisect_left(sorted_list, item)
+  return index < len(sorted_list) and sorted_list[index] == item
+
+
+def _Intersect(
+    posting_lists: Sequence[Sequence[str]],
+    after: Optional[str] = None,
+) -> Iterator[str]:
+  """Lazily yields the items present in all of the given sorted lists.
+
+  Items are yielded in ascending order, so callers that need only a page of
+  results can stop iterating once they have it.
+
+  Args:
+    posting_lists: Sorted lists of unique items.
+    after: If set, only items greater than this one are yielded.
+
+  Yields:
+    Items present in all of the lists.
+  """
+  if not posting_lists:
+    return
+
+  # The shortest list drives the iteration, all others are only probed.
+  driver, *others = sorted(posting_lists, key=len)
+  start = 0 if after is None else bisect.bisect_right(driver, after)
+  positions = [0] * len(others)
+
+  for item in driver[start:]:
+    for i, other in enumerate(others):
+      # Items come in ascending order, so probes never need to look back.
+      positions[i] = bisect.bisect_left(other, item, positions[i])
+      if positions[i] == len(other):
+        return
+      if other[positions[i]] != item:
+        break
+    else:
+      yield item
+
 
 def GetClientIDsForHostnames(
     hostnames: Iterable[str],
@@ -51,12 +213,17 @@ class ClientIndex(object):
   def _NormalizeKeyword(self, keyword):
     return str(keyword).lower()
 
-  def _AnalyzeKeywords(self, keywords):
-    """Extracts a start time from a list of keywords if present."""
-    start_time = max(
-        rdfvalue.RDFDatetime.Now() - rdfvalue.Duration.From(180, rdfvalue.DAYS),
+  def _DefaultStartTime(
+      self, now: rdfvalue.RDFDatetime
+  ) -> rdfvalue.RDFDatetime:
+    return max(
+        now - _DEFAULT_SEARCH_WINDOW,
         data_store.REL_DB.MinTimestamp(),
     )
+
+  def _AnalyzeKeywords(self, keywords):
+    """Extracts a start time from a list of keywords if present."""
+    start_time = self._DefaultStartTime(rdfvalue.RDFDatetime.Now())
     filtered_keywords = []
 
     for k in keywords:
@@ -84,6 +251,30 @@ class ClientIndex(object):
     Returns:
       A list of client URNs.
 
+    Raises:
+      ValueError: A string (single keyword) was passed instead of an iterable.
+    """
+    return list(self.IterateClients(keywords))
+
+  def IterateClients(
+      self,
+      keywords: Iterable[str],
+      after_client_id: Optional[str] = None,
+  ) -> Iterator[str]:
+    """Lazily yields ids of clients associated with all given keywords.
+
+    Client ids are yielded in ascending order, so a page of search results can
+    be read by stopping the iteration once the page is full and the next page
+    can be read by passing the last client id of the page as `after_client_id`.
+
+    Args:
+      keywords: The list of keywords to search by.
+      after_client_id: If set, only client ids greater than this one are
+        yielded.
+
+    Returns:
+      An iterator over client ids.
+
     Raises:
       ValueError: A string (single keyword) was passed instead of an iterable.
     """
@@ -92,17 +283,53 @@ class ClientIndex(object):
           "Keywords should be an iterable, not a string (got %s)." % keywords
       )
 
+    keywords = list(keywords)
     start_time, filtered_keywords = self._AnalyzeKeywords(keywords)
+    normalized = set(map(self._NormalizeKeyword, filtered_keywords))
 
-    keyword_map = data_store.REL_DB.ListClientsForKeywords(
-        list(map(self._NormalizeKeyword, filtered_keywords)),
-        start_time=start_time,
-    )
+    ttl = config.CONFIG["Server.client_index_cache_ttl"]
+    has_start_time = any(k.startswith(self.START_TIME_PREFIX) for k in keywords)
+    if has_start_time or not ttl:
+      keyword_map = data_store.REL_DB.ListClientsForKeywords(
+          list(normalized), start_time=start_time
+      )
+      posting_lists = [sorted(set(ids)) for ids in keyword_map.values()]
+    else:
+      posting_lists = self._ReadCachedPostingLists(normalized, ttl)
+
+    return _Intersect(posting_lists, after=after_client_id)
 
-    relevant_set = functools.reduce(
-        operator.and_, map(set, keyword_map.values())
+  def _ReadCachedPostingLists(
+      self,
+      keywords: Collection[str],
+      ttl: rdfvalue.Duration,
+  ) -> list[list[str]]:
+    """Reads posting lists within the default window, using the cache."""
+    now = rdfvalue.RDFDatetime.Now()
+
+    result = []
+    missing = []
+    for keyword in keywords:
+      client_ids = _posting_lists.Get(keyword, now, ttl)
+      if client_ids is None:
+        missing.append(keyword)
+      else:
+        result.append(client_ids)
+
+    CLIENT_INDEX_CACHE_HITS.Increment(len(result))
+    if not missing:
+      return result
+
+    CLIENT_INDEX_CACHE_MISSES.Increment(len(missing))
+    version = _posting_lists.Version()
+    keyword_map = data_store.REL_DB.ListClientsForKeywords(
+        missing, start_time=self._DefaultStartTime(now)
     )
-    return sorted(relevant_set)
+    for keyword, client_ids in keyword_map.items():
+      client_ids = sorted(set(client_ids))
+      _posting_lists.Put(keyword, client_ids, now, version)
+      result.append(client_ids)
+    return result
 
   def ReadClientPostingLists(
       self, keywords: Iterable[str]
@@ -220,6 +447,7 @@ class ClientIndex(object):
     keywords.add(self._NormalizeKeyword(client.client_id))
 
     data_store.REL_DB.AddClientKeywords(client.client_id, keywords)
+    _posting_lists.Add([client.client_id], keywords)
 
   def AddClientLabels(self, client_id: str, labels: Iterable[str]):
     self.MultiAddClientLabels([client_id], labels)
@@ -243,6 +471,7 @@ class ClientIndex(object):
       keywords.add("label:" + keyword_string)
 
     data_store.REL_DB.MultiAddClientKeywords(client_ids, keywords)
+    _posting_lists.Add(client_ids, keywords)
 
   def RemoveAllClientLabels(self, client_id: str):
     """Removes all labels for a given client.
@@ -268,3 +497,4 @@ class ClientIndex(object):
       # there is one).
       data_store.REL_DB.RemoveClientKeyword(client_id, keyword)
       data_store.REL_DB.RemoveClientKeyword(client_id, "label:%s" % keyword)
+      _posting_lists.Remove(client_id, [keyword, "label:%s" % keyword])
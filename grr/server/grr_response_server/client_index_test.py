@@ -1,9 +1,11 @@
 #!/usr/bin/env python
 import binascii
 import ipaddress
+from unittest import mock
 
 from absl import app
 
+from grr_response_core.lib import rdfvalue
 from grr_response_core.lib.rdfvalues import client as rdf_client
 from grr_response_core.lib.rdfvalues import client_network as rdf_client_network
 from grr_response_server import client_index
@@ -210,6 +212,92 @@ class ClientIndexTest(test_lib.GRRBaseTest):
     self.assertIn(client_id_1, label_bar_clients)
     self.assertIn(client_id_2, label_bar_clients)
 
+  def testIterateClientsAfterClientId(self):
+    index = client_index.ClientIndex()
+
+    clients = self._SetupClients(5)
+    for client_id, client in clients.items():
+      data_store.REL_DB.WriteClientMetadata(client_id)
+      index.AddClient(client)
+
+    self.assertEqual(list(index.IterateClients(["windows"])), sorted(clients))
+    self.assertEqual(
+        list(
+            index.IterateClients(
+                ["windows"], after_client_id="C.1000000000000002"
+            )
+        ),
+        ["C.1000000000000003", "C.1000000000000004", "C.1000000000000005"],
+    )
+    self.assertEqual(
+        list(
+            index.IterateClients(
+                ["192.168.0", "windows"], after_client_id="C.1000000000000004"
+            )
+        ),
+        ["C.1000000000000005"],
+    )
+
+  def testIntersectStopsAtShortestList(self):
+    lists = [["a", "b", "c", "d", "e"], ["b", "d"], ["a", "b", "d", "e"]]
+    self.assertEqual(list(client_index._Intersect(lists)), ["b", "d"])
+    self.assertEqual(list(client_index._Intersect(lists, after="b")), ["d"])
+    self.assertEqual(list(client_index._Intersect(lists, after="d")), [])
+    self.assertEqual(list(client_index._Intersect([["a"], []])), [])
+
+  @mock.patch.object(
+      client_index, "_posting_lists", client_index._PostingListCache()
+  )
+  def testCachedPostingListsAreKeptFreshByWrites(self):
+    index = client_index.ClientIndex()
+    client_id_1 = db_test_utils.InitializeClient(data_store.REL_DB)
+    client_id_2 = db_test_utils.InitializeClient(data_store.REL_DB)
+
+    with test_lib.ConfigOverrider({
+        "Server.client_index_cache_ttl": rdfvalue.Duration.From(
+            1, rdfvalue.HOURS
+        )
+    }):
+      index.AddClientLabels(client_id_1, ["foo"])
+      self.assertEqual(index.LookupClients(["label:foo"]), [client_id_1])
+
+      index.AddClientLabels(client_id_2, ["foo"])
+      self.assertEqual(
+          index.LookupClients(["label:foo"]),
+          sorted([client_id_1, client_id_2]),
+      )
+
+      index.RemoveClientLabels(client_id_1, ["foo"])
+      self.assertEqual(index.LookupClients(["label:foo"]), [client_id_2])
+
+  @mock.patch.object(
+      client_index, "_posting_lists", client_index._PostingListCache()
+  )
+  def testCachedPostingListsExpire(self):
+    index = client_index.ClientIndex()
+    client_id_1 = db_test_utils.InitializeClient(data_store.REL_DB)
+    client_id_2 = db_test_utils.InitializeClient(data_store.REL_DB)
+
+    with test_lib.ConfigOverrider({
+        "Server.client_index_cache_ttl": rdfvalue.Duration.From(
+            1, rdfvalue.MINUTES
+        )
+    }):
+      with test_lib.FakeTime("2024-01-01"):
+        index.AddClientLabels(client_id_1, ["foo"])
+        self.assertEqual(index.LookupClients(["label:foo"]), [client_id_1])
+
+        # Writes bypassing the index of this process are not visible until the
+        # cached posting list expires.
+        data_store.REL_DB.AddClientKeywords(client_id_2, ["label:foo"])
+        self.assertEqual(index.LookupClients(["label:foo"]), [client_id_1])
+
+      with test_lib.FakeTime("2024-01-02"):
+        self.assertEqual(
+            index.LookupClients(["label:foo"]),
+            sorted([client_id_1, client_id_2]),
+        )
+
   def _HostsHaveLabel(self, expected_hosts, label, index):
     client_ids = index.LookupClients(["label:%s" % label])
     client_data = data_store.REL_DB.MultiReadClientSnapshot(client_ids)
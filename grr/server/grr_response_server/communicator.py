@@ -6,12 +6,14 @@ import struct
 import time
 import zlib
 
+from google.protobuf import message as proto2_message
 from grr_response_core.lib import communicator
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib import type_info
 from grr_response_core.lib import utils
 from grr_response_core.lib.rdfvalues import flows as rdf_flows
 from grr_response_core.stats import metrics
+from grr_response_proto import jobs_pb2
 
 
 # Although these metrics are never queried on the client, removing them from the
@@ -231,6 +233,45 @@ class Communicator(metaclass=abc.ABCMeta):
 
     return result
 
+  @classmethod
+  def DecompressMessageListProto(
+      cls,
+      packed_message_list: jobs_pb2.PackedMessageList,
+  ) -> jobs_pb2.MessageList:
+    """Decompress the message data from packed_message_list proto.
+
+    This is an equivalent of `DecompressMessageList` that does not go through
+    RDF values.
+
+    Args:
+      packed_message_list: A PackedMessageList proto with some data in it.
+
+    Returns:
+      a MessageList proto.
+
+    Raises:
+      DecodingError: If decompression fails.
+    """
+    compression = packed_message_list.compression
+    if compression == jobs_pb2.PackedMessageList.UNCOMPRESSED:
+      data = packed_message_list.message_list
+
+    elif compression == jobs_pb2.PackedMessageList.ZCOMPRESSION:
+      try:
+        data = zlib.decompress(packed_message_list.message_list)
+      except zlib.error as e:
+        raise DecodingError("Failed to decompress: %s" % e)
+    else:
+      raise DecodingError("Compression scheme not supported")
+
+    result = jobs_pb2.MessageList()
+    try:
+      result.ParseFromString(data)
+    except proto2_message.DecodeError:
+      raise DecodingError("Proto parsing failed.")
+
+    return result
+
   def DecodeMessages(self, response_comms):
     """Extract and verify server message.
 
@@ -510,6 +510,16 @@ FlowStateAndTimestamps = collections.namedtuple(
     ],
 )
 
+# A lightweight flow description, read without the flow object itself.
+FlowSummary = collections.namedtuple(
+    "FlowSummary",
+    [
+        "flow_id",
+        "parent_flow_id",
+        "create_time",
+    ],
+)
+
 
 @dataclasses.dataclass
 class FlowErrorInfo:
@@ -2052,6 +2062,41 @@ class Database(metaclass=abc.ABCMeta):
       UnknownFlowError: The flow cannot be found.
     """
 
+  @abc.abstractmethod
+  def WriteFlowObjects(
+      self,
+      flow_objs: Sequence[flows_pb2.Flow],
+      allow_update: bool = True,
+  ) -> None:
+    """Writes multiple flow objects to the database in one go.
+
+    Either all of the flows are written or none of them is.
+
+    Args:
+      flow_objs: Flow objects to write.
+      allow_update: If False, raises FlowExistsError if any of the flows
+        already exists in the database. If True, existing flows are updated.
+
+    Raises:
+      FlowExistsError: A flow already exists and allow_update is False.
+      AtLeastOneUnknownClientError: A client of the flows does not exist.
+    """
+
+  @abc.abstractmethod
+  def ReadFlowObjects(
+      self,
+      flow_keys: Collection[tuple[str, str]],
+  ) -> dict[tuple[str, str], flows_pb2.Flow]:
+    """Reads multiple flow objects from the database.
+
+    Args:
+      flow_keys: A collection of (client_id, flow_id) tuples of flows to read.
+
+    Returns:
+      A dict mapping (client_id, flow_id) tuples to Flow objects. Flows that
+      can't be found are omitted.
+    """
+
   @abc.abstractmethod
   def ReadAllFlowObjects(
       self,
@@ -2095,6 +2140,49 @@ class Database(metaclass=abc.ABCMeta):
         client_id=client_id, parent_flow_id=flow_id, include_child_flows=True
     )
 
+  @abc.abstractmethod
+  def ReadFlowSummaries(
+      self,
+      client_id: str,
+      min_create_time: Optional[rdfvalue.RDFDatetime] = None,
+      max_create_time: Optional[rdfvalue.RDFDatetime] = None,
+      include_child_flows: bool = True,
+      not_created_by: Optional[Iterable[str]] = None,
+      parent_flow_ids: Optional[Collection[str]] = None,
+      after_flow_id: Optional[str] = None,
+      offset: int = 0,
+      count: Optional[int] = None,
+  ) -> Sequence[FlowSummary]:
+    """Reads summaries of flows of a client, most recently created first.
+
+    Flows are ordered by their creation time and then by their id, both in
+    descending order. Flow objects themselves are not read, so this is much
+    cheaper than `ReadAllFlowObjects` for clients with many flows.
+
+    Args:
+      client_id: The client id.
+      min_create_time: the minimum creation time (inclusive)
+      max_create_time: the maximum creation time (inclusive)
+      include_child_flows: include child flows in the results. If False, only
+        parent flows are returned.
+      not_created_by: exclude flows created by any of the users in this list.
+      parent_flow_ids: If set, only direct child flows of the flows with these
+        ids are returned. Must not be set if child flows are not included.
+      after_flow_id: If set, only flows that come after the flow with this id
+        in the ordering are returned. Can be used to page through flows (by
+        passing the id of the last flow of the previous page) without the cost
+        of large offsets.
+      offset: Number of (matching) flows to skip.
+      count: Maximum number of flows to return. All flows are returned if not
+        set.
+
+    Returns:
+      A list of FlowSummary objects.
+
+    Raises:
+      UnknownFlowError: The flow with `after_flow_id` cannot be found.
+    """
+
   @abc.abstractmethod
   def LeaseFlowForProcessing(
       self,
@@ -2136,6 +2224,45 @@ class Database(metaclass=abc.ABCMeta):
       this method will return false and the flow will not be written.
     """
 
+  @abc.abstractmethod
+  def LeaseFlowsForProcessing(
+      self,
+      flow_keys: Collection[tuple[str, str]],
+      processing_time: rdfvalue.Duration,
+  ) -> dict[tuple[str, str], flows_pb2.Flow]:
+    """Marks multiple flows as being processed on this worker in one go.
+
+    Unlike `LeaseFlowForProcessing`, this method doesn't raise for flows that
+    can't be leased: unknown flows, flows that are already being processed and
+    flows whose parent hunt is not running are left out of the result.
+
+    Args:
+      flow_keys: A collection of (client_id, flow_id) tuples of flows to lease.
+      processing_time: Duration that the worker has to finish processing before
+        the flows are considered stuck.
+
+    Returns:
+      A dict mapping (client_id, flow_id) tuples to leased Flow objects.
+    """
+
+  @abc.abstractmethod
+  def ReleaseProcessedFlows(
+      self,
+      flow_objs: Sequence[flows_pb2.Flow],
+  ) -> dict[tuple[str, str], bool]:
+    """Releases multiple flows that the worker was processing to the database.
+
+    This is a batch version of `ReleaseProcessedFlow`: every flow is released
+    under the same conditions, but all of them are written in one go.
+
+    Args:
+      flow_objs: The Flow objects to return to the database.
+
+    Returns:
+      A dict mapping (client_id, flow_id) tuples to booleans indicating if it
+      was possible to return the corresponding flow to the database.
+    """
+
   @abc.abstractmethod
   def UpdateFlow(
       self,
@@ -2311,6 +2438,38 @@ class Database(metaclass=abc.ABCMeta):
       sorted list of responses for the request).
     """
 
+  @abc.abstractmethod
+  def ReadFlowsRequests(
+      self,
+      flow_keys: Collection[tuple[str, str]],
+  ) -> dict[
+      tuple[str, str],
+      dict[
+          int,
+          tuple[
+              flows_pb2.FlowRequest,
+              Sequence[
+                  Union[
+                      flows_pb2.FlowResponse,
+                      flows_pb2.FlowStatus,
+                      flows_pb2.FlowIterator,
+                  ],
+              ],
+          ],
+      ],
+  ]:
+    """Reads all requests for multiple flows.
+
+    Args:
+      flow_keys: A collection of (client_id, flow_id) tuples of flows to read
+        requests for.
+
+    Returns:
+      A dict mapping (client_id, flow_id) tuples to dicts in the format
+      returned by `ReadFlowRequests`. Flows without requests are mapped to
+      empty dicts.
+    """
+
   @abc.abstractmethod
   def WriteFlowProcessingRequests(
       self,
@@ -2358,6 +2517,26 @@ class Database(metaclass=abc.ABCMeta):
         rdf_flows.FlowProcessingRequest. Required.
     """
 
+  @abc.abstractmethod
+  def RegisterFlowProcessingBatchHandler(
+      self,
+      handler: Callable[[Sequence[flows_pb2.FlowProcessingRequest]], None],
+      max_batch_size: int,
+  ) -> None:
+    """Registers a handler to receive batches of flow processing messages.
+
+    The number of requests passed to a single handler call adapts to the
+    depth of the queue: it grows while there are more requests ready for
+    processing than the handler threads can take and shrinks when the queue
+    drains.
+
+    Args:
+      handler: Method, which will be called repeatedly with lists of at most
+        `max_batch_size` flows_pb2.FlowProcessingRequest. Required.
+      max_batch_size: A maximum number of requests passed to the handler at
+        once.
+    """
+
   @abc.abstractmethod
   def UnregisterFlowProcessingHandler(
       self, timeout: Optional[rdfvalue.Duration] = None
@@ -2928,6 +3107,61 @@ class Database(metaclass=abc.ABCMeta):
           not exist.
     """
 
+  @abc.abstractmethod
+  def WriteHuntOutputPluginRequests(
+      self,
+      requests: Iterable[flows_pb2.HuntOutputPluginRequest],
+  ) -> None:
+    """Queues hunt results to be processed by the hunt output plugins.
+
+    Queued requests are deleted together with their hunt.
+
+    Args:
+      requests: Requests to queue. Each request has to have a unique id.
+    """
+
+  @abc.abstractmethod
+  def ReadHuntOutputPluginRequests(
+      self,
+  ) -> Sequence[flows_pb2.HuntOutputPluginRequest]:
+    """Reads all queued hunt output plugin requests.
+
+    Returns:
+      A list of requests, sorted by timestamp, oldest first.
+    """
+
+  @abc.abstractmethod
+  def LeaseHuntOutputPluginRequests(
+      self,
+      lease_time: rdfvalue.Duration,
+      limit: int,
+  ) -> Sequence[flows_pb2.HuntOutputPluginRequest]:
+    """Leases queued hunt output plugin requests of a single hunt.
+
+    Requests that are due (their delivery time has passed) and not leased (or
+    whose lease has expired) are leased, oldest first. All the leased requests
+    belong to the hunt of the oldest of them, so that they can be processed as
+    a single batch.
+
+    Args:
+      lease_time: How long the requests are leased for.
+      limit: Maximum number of requests to lease.
+
+    Returns:
+      A list of leased requests, sorted by timestamp, oldest first.
+    """
+
+  @abc.abstractmethod
+  def DeleteHuntOutputPluginRequests(
+      self,
+      requests: Iterable[flows_pb2.HuntOutputPluginRequest],
+  ) -> None:
+    """Deletes hunt output plugin requests once they are processed.
+
+    Args:
+      requests: Requests to delete. Requests that don't exist are ignored.
+    """
+
   @abc.abstractmethod
   def DeleteHuntObject(self, hunt_id: str) -> None:
     """Deletes a hunt object with a given id.
@@ -3270,6 +3504,17 @@ class Database(metaclass=abc.ABCMeta):
       A mapping from hunt_ids to HuntCounters objects.
     """
 
+  @abc.abstractmethod
+  def ReconcileHuntCounters(self, hunt_id: str) -> None:
+    """Recomputes hunt counters from the hunt flows.
+
+    Hunt counters are maintained incrementally as hunt flows are written. This
+    method rebuilds them from scratch, fixing any drift.
+
+    Args:
+      hunt_id: The id of the hunt to reconcile counters of.
+    """
+
   @abc.abstractmethod
   def ReadHuntClientResourcesStats(
       self, hunt_id: str
@@ -4328,6 +4573,29 @@ class DatabaseValidationWrapper(Database):
     precondition.ValidateFlowId(flow_id)
     return self.delegate.ReadFlowObject(client_id, flow_id)
 
+  def WriteFlowObjects(
+      self,
+      flow_objs: Sequence[flows_pb2.Flow],
+      allow_update: bool = True,
+  ) -> None:
+    precondition.AssertIterableType(flow_objs, flows_pb2.Flow)
+    precondition.AssertType(allow_update, bool)
+
+    for flow_obj in flow_objs:
+      if flow_obj.HasField("create_time"):
+        raise ValueError(f"Create time set on the flow object: {flow_obj}")
+
+    return self.delegate.WriteFlowObjects(flow_objs, allow_update=allow_update)
+
+  def ReadFlowObjects(
+      self,
+      flow_keys: Collection[tuple[str, str]],
+  ) -> dict[tuple[str, str], flows_pb2.Flow]:
+    for client_id, flow_id in flow_keys:
+      precondition.ValidateClientId(client_id)
+      precondition.ValidateFlowId(flow_id)
+    return self.delegate.ReadFlowObjects(flow_keys)
+
   def ReadAllFlowObjects(
       self,
       client_id: Optional[str] = None,
@@ -4373,6 +4641,46 @@ class DatabaseValidationWrapper(Database):
     precondition.ValidateFlowId(flow_id)
     return self.delegate.ReadChildFlowObjects(client_id, flow_id)
 
+  def ReadFlowSummaries(
+      self,
+      client_id: str,
+      min_create_time: Optional[rdfvalue.RDFDatetime] = None,
+      max_create_time: Optional[rdfvalue.RDFDatetime] = None,
+      include_child_flows: bool = True,
+      not_created_by: Optional[Iterable[str]] = None,
+      parent_flow_ids: Optional[Collection[str]] = None,
+      after_flow_id: Optional[str] = None,
+      offset: int = 0,
+      count: Optional[int] = None,
+  ) -> Sequence[FlowSummary]:
+    precondition.ValidateClientId(client_id)
+    precondition.AssertOptionalType(min_create_time, rdfvalue.RDFDatetime)
+    precondition.AssertOptionalType(max_create_time, rdfvalue.RDFDatetime)
+    precondition.AssertType(include_child_flows, bool)
+    if not_created_by is not None:
+      precondition.AssertIterableType(not_created_by, str)
+    if parent_flow_ids is not None:
+      if not include_child_flows:
+        raise ValueError("Parent flow ids specified in the childless mode")
+      for parent_flow_id in parent_flow_ids:
+        precondition.ValidateFlowId(parent_flow_id)
+    if after_flow_id is not None:
+      precondition.ValidateFlowId(after_flow_id)
+    precondition.AssertType(offset, int)
+    precondition.AssertOptionalType(count, int)
+
+    return self.delegate.ReadFlowSummaries(
+        client_id,
+        min_create_time=min_create_time,
+        max_create_time=max_create_time,
+        include_child_flows=include_child_flows,
+        not_created_by=not_created_by,
+        parent_flow_ids=parent_flow_ids,
+        after_flow_id=after_flow_id,
+        offset=offset,
+        count=count,
+    )
+
   def LeaseFlowForProcessing(
       self,
       client_id: str,
@@ -4390,6 +4698,24 @@ class DatabaseValidationWrapper(Database):
     precondition.AssertType(flow_obj, flows_pb2.Flow)
     return self.delegate.ReleaseProcessedFlow(flow_obj)
 
+  def LeaseFlowsForProcessing(
+      self,
+      flow_keys: Collection[tuple[str, str]],
+      processing_time: rdfvalue.Duration,
+  ) -> dict[tuple[str, str], flows_pb2.Flow]:
+    for client_id, flow_id in flow_keys:
+      precondition.ValidateClientId(client_id)
+      precondition.ValidateFlowId(flow_id)
+    _ValidateDuration(processing_time)
+    return self.delegate.LeaseFlowsForProcessing(flow_keys, processing_time)
+
+  def ReleaseProcessedFlows(
+      self,
+      flow_objs: Sequence[flows_pb2.Flow],
+  ) -> dict[tuple[str, str], bool]:
+    precondition.AssertIterableType(flow_objs, flows_pb2.Flow)
+    return self.delegate.ReleaseProcessedFlows(flow_objs)
+
   def UpdateFlow(
       self,
       client_id: str,
@@ -4539,6 +4865,30 @@ class DatabaseValidationWrapper(Database):
     precondition.ValidateFlowId(flow_id)
     return self.delegate.ReadFlowRequests(client_id, flow_id)
 
+  def ReadFlowsRequests(
+      self,
+      flow_keys: Collection[tuple[str, str]],
+  ) -> dict[
+      tuple[str, str],
+      dict[
+          int,
+          tuple[
+              flows_pb2.FlowRequest,
+              Sequence[
+                  Union[
+                      flows_pb2.FlowResponse,
+                      flows_pb2.FlowStatus,
+                      flows_pb2.FlowIterator,
+                  ],
+              ],
+          ],
+      ],
+  ]:
+    for client_id, flow_id in flow_keys:
+      precondition.ValidateClientId(client_id)
+      precondition.ValidateFlowId(flow_id)
+    return self.delegate.ReadFlowsRequests(flow_keys)
+
   def WriteFlowProcessingRequests(
       self,
       requests: Sequence[flows_pb2.FlowProcessingRequest],
@@ -4567,6 +4917,20 @@ class DatabaseValidationWrapper(Database):
       raise ValueError("handler must be provided")
     return self.delegate.RegisterFlowProcessingHandler(handler)
 
+  def RegisterFlowProcessingBatchHandler(
+      self,
+      handler: Callable[[Sequence[flows_pb2.FlowProcessingRequest]], None],
+      max_batch_size: int,
+  ) -> None:
+    if handler is None:
+      raise ValueError("handler must be provided")
+    precondition.AssertType(max_batch_size, int)
+    if max_batch_size < 1:
+      raise ValueError(f"Invalid max batch size: {max_batch_size}")
+    return self.delegate.RegisterFlowProcessingBatchHandler(
+        handler, max_batch_size
+    )
+
   def UnregisterFlowProcessingHandler(
       self, timeout: Optional[rdfvalue.Duration] = None
   ) -> None:
@@ -4991,6 +5355,46 @@ class DatabaseValidationWrapper(Database):
         hunt_id, state_index, update_fn
     )
 
+  def WriteHuntOutputPluginRequests(
+      self,
+      requests: Iterable[flows_pb2.HuntOutputPluginRequest],
+  ) -> None:
+    requests = list(requests)
+    precondition.AssertIterableType(requests, flows_pb2.HuntOutputPluginRequest)
+    for request in requests:
+      _ValidateHuntId(request.hunt_id)
+      precondition.ValidateClientId(request.client_id)
+      precondition.ValidateFlowId(request.flow_id)
+    if not requests:
+      return
+    return self.delegate.WriteHuntOutputPluginRequests(requests)
+
+  def ReadHuntOutputPluginRequests(
+      self,
+  ) -> Sequence[flows_pb2.HuntOutputPluginRequest]:
+    return self.delegate.ReadHuntOutputPluginRequests()
+
+  def LeaseHuntOutputPluginRequests(
+      self,
+      lease_time: rdfvalue.Duration,
+      limit: int,
+  ) -> Sequence[flows_pb2.HuntOutputPluginRequest]:
+    _ValidateDuration(lease_time)
+    precondition.AssertType(limit, int)
+    if limit <= 0:
+      raise ValueError(f"Limit has to be positive: {limit}")
+    return self.delegate.LeaseHuntOutputPluginRequests(lease_time, limit)
+
+  def DeleteHuntOutputPluginRequests(
+      self,
+      requests: Iterable[flows_pb2.HuntOutputPluginRequest],
+  ) -> None:
+    requests = list(requests)
+    precondition.AssertIterableType(requests, flows_pb2.HuntOutputPluginRequest)
+    if not requests:
+      return
+    return self.delegate.DeleteHuntOutputPluginRequests(requests)
+
   def DeleteHuntObject(self, hunt_id: str) -> None:
     _ValidateHuntId(hunt_id)
     return self.delegate.DeleteHuntObject(hunt_id)
@@ -5190,6 +5594,10 @@ class DatabaseValidationWrapper(Database):
       _ValidateHuntId(hunt_id)
     return self.delegate.ReadHuntsCounters(hunt_ids)
 
+  def ReconcileHuntCounters(self, hunt_id: str) -> None:
+    _ValidateHuntId(hunt_id)
+    return self.delegate.ReconcileHuntCounters(hunt_id)
+
   def ReadHuntClientResourcesStats(
       self, hunt_id: str
   ) -> jobs_pb2.ClientResourcesStats:
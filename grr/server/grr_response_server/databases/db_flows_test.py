@@ -138,6 +138,82 @@ class DatabaseTestFlowMixin(object):
 
     self.assertEqual(read_flow_after_update.next_request_to_process, 4)
 
+  def testWriteFlowObjects(self):
+    client_id_1 = db_test_utils.InitializeClient(self.db)
+    client_id_2 = db_test_utils.InitializeClient(self.db)
+
+    flow_objs = [
+        flows_pb2.Flow(
+            client_id=client_id,
+            flow_id="1234ABCD",
+            next_request_to_process=4,
+            flow_class_name="bar",
+        )
+        for client_id in [client_id_1, client_id_2]
+    ]
+    self.db.WriteFlowObjects(flow_objs, allow_update=False)
+
+    read_flows = self.db.ReadFlowObjects(
+        [(client_id_1, "1234ABCD"), (client_id_2, "1234ABCD")]
+    )
+    self.assertCountEqual(
+        read_flows, [(client_id_1, "1234ABCD"), (client_id_2, "1234ABCD")]
+    )
+    for flow_obj in flow_objs:
+      read_flow = read_flows[(flow_obj.client_id, flow_obj.flow_id)]
+      read_flow.ClearField("create_time")
+      read_flow.ClearField("last_update_time")
+      self.assertEqual(read_flow, flow_obj)
+
+    for flow_obj in flow_objs:
+      flow_obj.next_request_to_process = 5
+    self.db.WriteFlowObjects(flow_objs)
+
+    read_flow = self.db.ReadFlowObject(client_id_2, "1234ABCD")
+    self.assertEqual(read_flow.next_request_to_process, 5)
+
+  def testWriteFlowObjectsFailsWithAllowUpdateFalse(self):
+    client_id_1 = db_test_utils.InitializeClient(self.db)
+    client_id_2 = db_test_utils.InitializeClient(self.db)
+
+    self.db.WriteFlowObject(
+        flows_pb2.Flow(client_id=client_id_2, flow_id="1234ABCD")
+    )
+
+    flow_objs = [
+        flows_pb2.Flow(client_id=client_id, flow_id="1234ABCD")
+        for client_id in [client_id_1, client_id_2]
+    ]
+    with self.assertRaises(db.FlowExistsError) as context:
+      self.db.WriteFlowObjects(flow_objs, allow_update=False)
+    self.assertEqual(context.exception.client_id, client_id_2)
+    self.assertEqual(context.exception.flow_id, "1234ABCD")
+
+    # None of the flows should have been written.
+    with self.assertRaises(db.UnknownFlowError):
+      self.db.ReadFlowObject(client_id_1, "1234ABCD")
+
+  def testWriteFlowObjectsRaisesOnUnknownClient(self):
+    client_id = db_test_utils.InitializeClient(self.db)
+
+    flow_objs = [
+        flows_pb2.Flow(client_id=client_id, flow_id="1234ABCD"),
+        flows_pb2.Flow(client_id="C.1234567890123456", flow_id="1234ABCD"),
+    ]
+    with self.assertRaises(db.AtLeastOneUnknownClientError):
+      self.db.WriteFlowObjects(flow_objs)
+
+  def testReadFlowObjectsOmitsUnknownFlows(self):
+    client_id = db_test_utils.InitializeClient(self.db)
+    flow_id = db_test_utils.InitializeFlow(self.db, client_id)
+
+    read_flows = self.db.ReadFlowObjects(
+        [(client_id, flow_id), (client_id, "1234ABCD")]
+    )
+
+    self.assertCountEqual(read_flows, [(client_id, flow_id)])
+    self.assertEmpty(self.db.ReadFlowObjects([]))
+
   def testFlowTimestamp(self):
     client_id = "C.0123456789012345"
     flow_id = "0F00B430"
@@ -512,6 +588,163 @@ class DatabaseTestFlowMixin(object):
     )
     self.assertEqual([f.flow_id for f in flows], ["0000000A"])
 
+  def testReadFlowSummariesReturnsNewestFlowsFirst(self):
+    client_id = db_test_utils.InitializeClient(self.db)
+
+    self.db.WriteFlowObject(
+        flows_pb2.Flow(client_id=client_id, flow_id="0000000A")
+    )
+    self.db.WriteFlowObject(
+        flows_pb2.Flow(
+            client_id=client_id, flow_id="0000000B", parent_flow_id="0000000A"
+        )
+    )
+    self.db.WriteFlowObject(
+        flows_pb2.Flow(client_id=client_id, flow_id="0000000C")
+    )
+
+    summaries = self.db.ReadFlowSummaries(client_id)
+    self.assertEqual(
+        [s.flow_id for s in summaries], ["0000000C", "0000000B", "0000000A"]
+    )
+    self.assertEqual(
+        [s.parent_flow_id for s in summaries], [None, "0000000A", None]
+    )
+    for summary in summaries:
+      flow_obj = self.db.ReadFlowObject(client_id, summary.flow_id)
+      self.assertEqual(
+          summary.create_time.AsMicrosecondsSinceEpoch(), flow_obj.create_time
+      )
+
+  def testReadFlowSummariesWithoutChildren(self):
+    client_id = db_test_utils.InitializeClient(self.db)
+
+    self.db.WriteFlowObject(
+        flows_pb2.Flow(client_id=client_id, flow_id="0000000A")
+    )
+    self.db.WriteFlowObject(
+        flows_pb2.Flow(
+            client_id=client_id, flow_id="0000000B", parent_flow_id="0000000A"
+        )
+    )
+
+    summaries = self.db.ReadFlowSummaries(client_id, include_child_flows=False)
+    self.assertEqual([s.flow_id for s in summaries], ["0000000A"])
+
+  def testReadFlowSummariesWithParentFlowIds(self):
+    client_id = db_test_utils.InitializeClient(self.db)
+
+    for flow_id in ["0000000A", "0000000B", "0000000C"]:
+      self.db.WriteFlowObject(
+          flows_pb2.Flow(client_id=client_id, flow_id=flow_id)
+      )
+    for flow_id, parent_flow_id in [
+        ("0000000D", "0000000A"),
+        ("0000000E", "0000000B"),
+        ("0000000F", "0000000C"),
+        ("00000010", "0000000D"),
+    ]:
+      self.db.WriteFlowObject(
+          flows_pb2.Flow(
+              client_id=client_id,
+              flow_id=flow_id,
+              parent_flow_id=parent_flow_id,
+          )
+      )
+
+    summaries = self.db.ReadFlowSummaries(
+        client_id, parent_flow_ids=["0000000A", "0000000B"]
+    )
+    self.assertEqual([s.flow_id for s in summaries], ["0000000E", "0000000D"])
+    self.assertEqual(
+        [s.parent_flow_id for s in summaries], ["0000000B", "0000000A"]
+    )
+
+    summaries = self.db.ReadFlowSummaries(client_id, parent_flow_ids=[])
+    self.assertEmpty(summaries)
+
+  def testReadFlowSummariesWithParentFlowIdsWithoutChildrenRaises(self):
+    client_id = db_test_utils.InitializeClient(self.db)
+
+    with self.assertRaises(ValueError):
+      self.db.ReadFlowSummaries(
+          client_id, include_child_flows=False, parent_flow_ids=["0000000A"]
+      )
+
+  def testReadFlowSummariesWithConditions(self):
+    client_id_1 = db_test_utils.InitializeClient(self.db)
+    client_id_2 = db_test_utils.InitializeClient(self.db)
+
+    self.db.WriteFlowObject(
+        flows_pb2.Flow(client_id=client_id_1, flow_id="0000000A", creator="foo")
+    )
+
+    min_timestamp = self.db.Now()
+
+    self.db.WriteFlowObject(
+        flows_pb2.Flow(client_id=client_id_1, flow_id="0000000B", creator="foo")
+    )
+    self.db.WriteFlowObject(
+        flows_pb2.Flow(client_id=client_id_1, flow_id="0000000C", creator="bar")
+    )
+    self.db.WriteFlowObject(
+        flows_pb2.Flow(client_id=client_id_2, flow_id="0000000D", creator="foo")
+    )
+
+    max_timestamp = self.db.Now()
+
+    self.db.WriteFlowObject(
+        flows_pb2.Flow(client_id=client_id_1, flow_id="0000000E", creator="foo")
+    )
+
+    summaries = self.db.ReadFlowSummaries(
+        client_id_1,
+        min_create_time=min_timestamp,
+        max_create_time=max_timestamp,
+        not_created_by=frozenset(["bar"]),
+    )
+    self.assertEqual([s.flow_id for s in summaries], ["0000000B"])
+
+  def testReadFlowSummariesWithOffsetAndCount(self):
+    client_id = db_test_utils.InitializeClient(self.db)
+    for flow_id in ["0000000A", "0000000B", "0000000C", "0000000D"]:
+      self.db.WriteFlowObject(
+          flows_pb2.Flow(client_id=client_id, flow_id=flow_id)
+      )
+
+    summaries = self.db.ReadFlowSummaries(client_id, offset=1, count=2)
+    self.assertEqual([s.flow_id for s in summaries], ["0000000C", "0000000B"])
+
+    summaries = self.db.ReadFlowSummaries(client_id, offset=3)
+    self.assertEqual([s.flow_id for s in summaries], ["0000000A"])
+
+    summaries = self.db.ReadFlowSummaries(client_id, count=0)
+    self.assertEmpty(summaries)
+
+  def testReadFlowSummariesAfterFlowId(self):
+    client_id = db_test_utils.InitializeClient(self.db)
+    for flow_id in ["0000000A", "0000000B", "0000000C", "0000000D"]:
+      self.db.WriteFlowObject(
+          flows_pb2.Flow(client_id=client_id, flow_id=flow_id)
+      )
+
+    summaries = self.db.ReadFlowSummaries(client_id, after_flow_id="0000000C")
+    self.assertEqual([s.flow_id for s in summaries], ["0000000B", "0000000A"])
+
+    summaries = self.db.ReadFlowSummaries(
+        client_id, after_flow_id="0000000D", offset=1, count=1
+    )
+    self.assertEqual([s.flow_id for s in summaries], ["0000000B"])
+
+    summaries = self.db.ReadFlowSummaries(client_id, after_flow_id="0000000A")
+    self.assertEmpty(summaries)
+
+  def testReadFlowSummariesAfterUnknownFlowIdRaises(self):
+    client_id = db_test_utils.InitializeClient(self.db)
+
+    with self.assertRaises(db.UnknownFlowError):
+      self.db.ReadFlowSummaries(client_id, after_flow_id="0000000A")
+
   def testUpdateUnknownFlow(self):
     client_id = db_test_utils.InitializeClient(self.db)
     flow_id = db_test_utils.InitializeFlow(self.db, client_id)
@@ -1546,6 +1779,60 @@ class DatabaseTestFlowMixin(object):
       # Should work again.
       self.db.LeaseFlowForProcessing(client_id, flow_id, processing_time)
 
+  def testLeaseFlowsForProcessing(self):
+    client_id = db_test_utils.InitializeClient(self.db)
+    flow_id_1 = db_test_utils.InitializeFlow(self.db, client_id)
+    flow_id_2 = db_test_utils.InitializeFlow(self.db, client_id)
+    processing_time = rdfvalue.Duration.From(60, rdfvalue.SECONDS)
+
+    flows = self.db.LeaseFlowsForProcessing(
+        [(client_id, flow_id_1), (client_id, flow_id_2)], processing_time
+    )
+
+    self.assertCountEqual(
+        flows, [(client_id, flow_id_1), (client_id, flow_id_2)]
+    )
+    for (_, flow_id), flow in flows.items():
+      self.assertEqual(flow.flow_id, flow_id)
+      self.assertEqual(flow.processing_on, utils.ProcessIdString())
+      read_flow = self.db.ReadFlowObject(client_id, flow_id)
+      self.assertEqual(read_flow.processing_on, utils.ProcessIdString())
+      self.assertEqual(read_flow.processing_deadline, flow.processing_deadline)
+
+  def testLeaseFlowsForProcessingSkipsFlowsThatCanNotBeLeased(self):
+    hunt_id = db_test_utils.InitializeHunt(self.db)
+    self.db.UpdateHuntObject(
+        hunt_id, hunt_state=hunts_pb2.Hunt.HuntState.STOPPED
+    )
+
+    client_id = db_test_utils.InitializeClient(self.db)
+    hunt_flow_id = db_test_utils.InitializeFlow(
+        self.db, client_id, parent_hunt_id=hunt_id
+    )
+    leased_flow_id = db_test_utils.InitializeFlow(self.db, client_id)
+    flow_id = db_test_utils.InitializeFlow(self.db, client_id)
+    processing_time = rdfvalue.Duration.From(60, rdfvalue.SECONDS)
+
+    self.db.LeaseFlowForProcessing(client_id, leased_flow_id, processing_time)
+
+    flows = self.db.LeaseFlowsForProcessing(
+        [
+            (client_id, hunt_flow_id),
+            (client_id, leased_flow_id),
+            (client_id, flow_id),
+            (client_id, "ABCDEF42"),
+        ],
+        processing_time,
+    )
+
+    self.assertEqual(list(flows), [(client_id, flow_id)])
+    read_flow = self.db.ReadFlowObject(client_id, hunt_flow_id)
+    self.assertFalse(read_flow.processing_on)
+
+  def testLeaseFlowsForProcessingEmpty(self):
+    processing_time = rdfvalue.Duration.From(60, rdfvalue.SECONDS)
+    self.assertEqual(self.db.LeaseFlowsForProcessing([], processing_time), {})
+
   def testLeaseFlowForProcessingUpdatesHuntCounters(self):
     hunt_id = db_test_utils.InitializeHunt(self.db)
 
@@ -1737,6 +2024,40 @@ class DatabaseTestFlowMixin(object):
     ])
     self.assertTrue(self.db.ReleaseProcessedFlow(processed_flow))
 
+  def testReleaseProcessedFlows(self):
+    client_id = db_test_utils.InitializeClient(self.db)
+    flow_id_1 = db_test_utils.InitializeFlow(self.db, client_id)
+    flow_id_2 = db_test_utils.InitializeFlow(self.db, client_id)
+    processing_time = rdfvalue.Duration.From(60, rdfvalue.SECONDS)
+
+    flows = self.db.LeaseFlowsForProcessing(
+        [(client_id, flow_id_1), (client_id, flow_id_2)], processing_time
+    )
+    for flow in flows.values():
+      flow.next_request_to_process = 2
+
+    # Request 2 of the second flow is ready for processing in the meantime.
+    self.db.WriteFlowRequests([
+        flows_pb2.FlowRequest(
+            client_id=client_id,
+            flow_id=flow_id_2,
+            request_id=2,
+            needs_processing=True,
+        )
+    ])
+
+    released = self.db.ReleaseProcessedFlows(list(flows.values()))
+
+    self.assertEqual(
+        released,
+        {(client_id, flow_id_1): True, (client_id, flow_id_2): False},
+    )
+    read_flow = self.db.ReadFlowObject(client_id, flow_id_1)
+    self.assertFalse(read_flow.processing_on)
+    self.assertEqual(read_flow.next_request_to_process, 2)
+    read_flow = self.db.ReadFlowObject(client_id, flow_id_2)
+    self.assertTrue(read_flow.processing_on)
+
   def testReleaseProcessedFlowWithProcessedFlowRequest(self):
     client_id = db_test_utils.InitializeClient(self.db)
     flow_id = db_test_utils.InitializeFlow(self.db, client_id)
@@ -1972,6 +2293,57 @@ class DatabaseTestFlowMixin(object):
     self.assertEqual(responses[0].flow_id, flow_id_1)
     self.assertEqual(responses[0].response_id, 2)
 
+  def testReadFlowsRequests(self):
+    client_id = db_test_utils.InitializeClient(self.db)
+    flow_id_1 = db_test_utils.InitializeFlow(self.db, client_id)
+    flow_id_2 = db_test_utils.InitializeFlow(self.db, client_id)
+    flow_id_3 = db_test_utils.InitializeFlow(self.db, client_id)
+
+    requests = []
+    responses = []
+    for flow_id in (flow_id_1, flow_id_2):
+      for request_id in (1, 2):
+        requests.append(
+            flows_pb2.FlowRequest(
+                client_id=client_id,
+                flow_id=flow_id,
+                request_id=request_id,
+            )
+        )
+      for response_id in (2, 1):
+        responses.append(
+            flows_pb2.FlowResponse(
+                client_id=client_id,
+                flow_id=flow_id,
+                request_id=1,
+                response_id=response_id,
+            )
+        )
+    self.db.WriteFlowRequests(requests)
+    self.db.WriteFlowResponses(responses)
+
+    flow_keys = [
+        (client_id, flow_id_1),
+        (client_id, flow_id_2),
+        (client_id, flow_id_3),
+    ]
+    flows_requests = self.db.ReadFlowsRequests(flow_keys)
+
+    self.assertCountEqual(flows_requests, flow_keys)
+    self.assertEmpty(flows_requests[(client_id, flow_id_3)])
+    for flow_id in (flow_id_1, flow_id_2):
+      flow_requests = flows_requests[(client_id, flow_id)]
+      self.assertCountEqual(flow_requests, [1, 2])
+
+      request, responses = flow_requests[1]
+      self.assertEqual(request.flow_id, flow_id)
+      self.assertEqual([r.response_id for r in responses], [1, 2])
+      for response in responses:
+        self.assertEqual(response.flow_id, flow_id)
+
+      _, responses = flow_requests[2]
+      self.assertEmpty(responses)
+
   def testUpdateIncrementalFlowRequests(self):
     client_id = db_test_utils.InitializeClient(self.db)
     flow_id = db_test_utils.InitializeFlow(self.db, client_id)
@@ -24,6 +24,7 @@ from grr_response_server.rdfvalues import hunt_objects as rdf_hunt_objects
 from grr_response_server.rdfvalues import mig_flow_objects
 from grr_response_server.rdfvalues import mig_objects
 from grr_response_server.rdfvalues import objects as rdf_objects
+from grr.test_lib import test_lib
 
 
 class DatabaseTestHuntMixin(object):
@@ -1004,6 +1005,159 @@ class DatabaseTestHuntMixin(object):
         ),
     )
 
+  def _HuntOutputPluginRequest(
+      self,
+      hunt_id: str,
+      request_id: int,
+      delivery_time: Optional[rdfvalue.RDFDatetime] = None,
+  ) -> flows_pb2.HuntOutputPluginRequest:
+    client_id = db_test_utils.InitializeClient(self.db)
+    request = flows_pb2.HuntOutputPluginRequest(
+        request_id=request_id,
+        hunt_id=hunt_id,
+        client_id=client_id,
+        flow_id=hunt_id,
+        long_flow_id=f"{client_id}/flows/{hunt_id}",
+        results=[
+            flows_pb2.FlowResult(
+                client_id=client_id, flow_id=hunt_id, hunt_id=hunt_id
+            )
+        ],
+    )
+    if delivery_time is not None:
+      request.delivery_time = delivery_time.AsMicrosecondsSinceEpoch()
+    return request
+
+  def testWritingAndReadingHuntOutputPluginRequestsWorks(self):
+    hunt_id = db_test_utils.InitializeHunt(self.db)
+    requests = [self._HuntOutputPluginRequest(hunt_id, i) for i in range(3)]
+    requests[1].output_plugin_ids.append("0")
+    requests[1].failed_attempts = 2
+
+    before = rdfvalue.RDFDatetime.Now().AsMicrosecondsSinceEpoch()
+    self.db.WriteHuntOutputPluginRequests(requests)
+
+    read = self.db.ReadHuntOutputPluginRequests()
+    self.assertLen(read, 3)
+    for r in read:
+      self.assertGreaterEqual(r.timestamp, before)
+      self.assertGreaterEqual(r.delivery_time, before)
+      self.assertFalse(r.HasField("leased_until"))
+      r.ClearField("timestamp")
+      r.ClearField("delivery_time")
+    self.assertCountEqual(read, requests)
+
+  def testWritingHuntOutputPluginRequestsIgnoresDuplicates(self):
+    hunt_id = db_test_utils.InitializeHunt(self.db)
+    request = self._HuntOutputPluginRequest(hunt_id, 42)
+
+    self.db.WriteHuntOutputPluginRequests([request])
+    self.db.WriteHuntOutputPluginRequests([request])
+
+    self.assertLen(self.db.ReadHuntOutputPluginRequests(), 1)
+
+  def testDeletingHuntOutputPluginRequestsWorks(self):
+    hunt_id = db_test_utils.InitializeHunt(self.db)
+    requests = [self._HuntOutputPluginRequest(hunt_id, i) for i in range(3)]
+    self.db.WriteHuntOutputPluginRequests(requests)
+
+    self.db.DeleteHuntOutputPluginRequests(requests[:2])
+    # Deleting requests that don't exist (anymore) is fine.
+    self.db.DeleteHuntOutputPluginRequests(requests[:1])
+
+    read = self.db.ReadHuntOutputPluginRequests()
+    self.assertEqual([r.request_id for r in read], [2])
+
+  def testLeasingHuntOutputPluginRequestsLeasesRequestsOfSingleHunt(self):
+    hunt_id_1 = db_test_utils.InitializeHunt(self.db)
+    hunt_id_2 = db_test_utils.InitializeHunt(self.db)
+    self.db.WriteHuntOutputPluginRequests(
+        [self._HuntOutputPluginRequest(hunt_id_1, 1)]
+    )
+    self.db.WriteHuntOutputPluginRequests(
+        [self._HuntOutputPluginRequest(hunt_id_2, 2)]
+    )
+    self.db.WriteHuntOutputPluginRequests(
+        [self._HuntOutputPluginRequest(hunt_id_1, 3)]
+    )
+
+    lease_time = rdfvalue.Duration.From(5, rdfvalue.MINUTES)
+    leased = self.db.LeaseHuntOutputPluginRequests(lease_time, limit=10)
+    self.assertEqual([r.request_id for r in leased], [1, 3])
+    for r in leased:
+      self.assertEqual(r.hunt_id, hunt_id_1)
+      self.assertTrue(r.leased_by)
+      self.assertGreater(
+          r.leased_until, rdfvalue.RDFDatetime.Now().AsMicrosecondsSinceEpoch()
+      )
+
+    leased = self.db.LeaseHuntOutputPluginRequests(lease_time, limit=10)
+    self.assertEqual([r.request_id for r in leased], [2])
+
+    self.assertEmpty(self.db.LeaseHuntOutputPluginRequests(lease_time, 10))
+
+  def testLeasingHuntOutputPluginRequestsRespectsLimit(self):
+    hunt_id = db_test_utils.InitializeHunt(self.db)
+    for i in range(5):
+      self.db.WriteHuntOutputPluginRequests(
+          [self._HuntOutputPluginRequest(hunt_id, i)]
+      )
+
+    lease_time = rdfvalue.Duration.From(5, rdfvalue.MINUTES)
+    leased = self.db.LeaseHuntOutputPluginRequests(lease_time, limit=3)
+    self.assertEqual([r.request_id for r in leased], [0, 1, 2])
+    leased = self.db.LeaseHuntOutputPluginRequests(lease_time, limit=3)
+    self.assertEqual([r.request_id for r in leased], [3, 4])
+
+  def testLeasingHuntOutputPluginRequestsRespectsDeliveryTime(self):
+    hunt_id = db_test_utils.InitializeHunt(self.db)
+    delivery_time = rdfvalue.RDFDatetime.Now() + rdfvalue.Duration.From(
+        1, rdfvalue.HOURS
+    )
+    self.db.WriteHuntOutputPluginRequests(
+        [self._HuntOutputPluginRequest(hunt_id, 1, delivery_time)]
+    )
+
+    lease_time = rdfvalue.Duration.From(5, rdfvalue.MINUTES)
+    self.assertEmpty(self.db.LeaseHuntOutputPluginRequests(lease_time, 10))
+
+    with test_lib.FakeTime(delivery_time):
+      leased = self.db.LeaseHuntOutputPluginRequests(lease_time, 10)
+    self.assertEqual([r.request_id for r in leased], [1])
+    self.assertEqual(
+        leased[0].delivery_time, delivery_time.AsMicrosecondsSinceEpoch()
+    )
+
+  def testLeasingHuntOutputPluginRequestsReleasesExpiredLeases(self):
+    hunt_id = db_test_utils.InitializeHunt(self.db)
+    self.db.WriteHuntOutputPluginRequests(
+        [self._HuntOutputPluginRequest(hunt_id, 1)]
+    )
+
+    lease_time = rdfvalue.Duration.From(5, rdfvalue.MINUTES)
+    self.assertLen(self.db.LeaseHuntOutputPluginRequests(lease_time, 10), 1)
+    self.assertEmpty(self.db.LeaseHuntOutputPluginRequests(lease_time, 10))
+
+    after_lease = rdfvalue.RDFDatetime.Now() + rdfvalue.Duration.From(
+        6, rdfvalue.MINUTES
+    )
+    with test_lib.FakeTime(after_lease):
+      leased = self.db.LeaseHuntOutputPluginRequests(lease_time, 10)
+    self.assertEqual([r.request_id for r in leased], [1])
+
+  def testDeletingHuntObjectDeletesHuntOutputPluginRequests(self):
+    hunt_id_1 = db_test_utils.InitializeHunt(self.db)
+    hunt_id_2 = db_test_utils.InitializeHunt(self.db)
+    self.db.WriteHuntOutputPluginRequests([
+        self._HuntOutputPluginRequest(hunt_id_1, 1),
+        self._HuntOutputPluginRequest(hunt_id_2, 2),
+    ])
+
+    self.db.DeleteHuntObject(hunt_id_1)
+
+    read = self.db.ReadHuntOutputPluginRequests()
+    self.assertEqual([r.request_id for r in read], [2])
+
   def testReadHuntLogEntriesReturnsEntryFromSingleHuntFlow(self):
     hunt_id = db_test_utils.InitializeHunt(self.db)
 
@@ -2359,6 +2513,109 @@ class DatabaseTestHuntMixin(object):
     self.assertAlmostEqual(hunt_counters.total_cpu_seconds, 14.5)
     self.assertEqual(hunt_counters.total_network_bytes_sent, 42)
 
+  def testReadHuntCountersReflectsHuntFlowUpdates(self):
+    hunt_id = db_test_utils.InitializeHunt(self.db)
+    client_id, flow_id = self._SetupHuntClientAndFlow(
+        hunt_id=hunt_id,
+        flow_state=rdf_flow_objects.Flow.FlowState.RUNNING,
+    )
+
+    hunt_counters = self.db.ReadHuntCounters(hunt_id)
+    self.assertEqual(hunt_counters.num_clients, 1)
+    self.assertEqual(hunt_counters.num_running_clients, 1)
+    self.assertEqual(hunt_counters.num_successful_clients, 0)
+
+    flow_obj = self.db.ReadFlowObject(client_id, flow_id)
+    flow_obj.flow_state = flows_pb2.Flow.FlowState.FINISHED
+    flow_obj.cpu_time_used.user_cpu_time = 1.5
+    flow_obj.cpu_time_used.system_cpu_time = 2
+    flow_obj.network_bytes_sent = 1337
+    self.db.UpdateFlow(client_id, flow_id, flow_obj=flow_obj)
+
+    hunt_counters = self.db.ReadHuntCounters(hunt_id)
+    self.assertEqual(hunt_counters.num_clients, 1)
+    self.assertEqual(hunt_counters.num_running_clients, 0)
+    self.assertEqual(hunt_counters.num_successful_clients, 1)
+    self.assertAlmostEqual(hunt_counters.total_cpu_seconds, 3.5)
+    self.assertEqual(hunt_counters.total_network_bytes_sent, 1337)
+
+    self.db.UpdateFlow(
+        client_id, flow_id, flow_state=flows_pb2.Flow.FlowState.ERROR
+    )
+
+    hunt_counters = self.db.ReadHuntCounters(hunt_id)
+    self.assertEqual(hunt_counters.num_clients, 1)
+    self.assertEqual(hunt_counters.num_successful_clients, 0)
+    self.assertEqual(hunt_counters.num_failed_clients, 1)
+    self.assertAlmostEqual(hunt_counters.total_cpu_seconds, 3.5)
+
+  def testReadHuntCountersReflectsDeletedClients(self):
+    hunt_id = db_test_utils.InitializeHunt(self.db)
+    client_id_1, flow_id_1 = self._SetupHuntClientAndFlow(hunt_id=hunt_id)
+    self._SetupHuntClientAndFlow(hunt_id=hunt_id)
+    self._WriteHuntResults(
+        self._SampleSingleTypeHuntResults(
+            client_id=client_id_1, flow_id=flow_id_1, hunt_id=hunt_id, count=3
+        )
+    )
+
+    hunt_counters = self.db.ReadHuntCounters(hunt_id)
+    self.assertEqual(hunt_counters.num_clients, 2)
+    self.assertEqual(hunt_counters.num_clients_with_results, 1)
+    self.assertEqual(hunt_counters.num_results, 3)
+
+    self.db.DeleteClient(client_id_1)
+
+    hunt_counters = self.db.ReadHuntCounters(hunt_id)
+    self.assertEqual(hunt_counters.num_clients, 1)
+    self.assertEqual(hunt_counters.num_clients_with_results, 0)
+    self.assertEqual(hunt_counters.num_results, 0)
+
+  def testDeletingHuntObjectDeletesHuntCounters(self):
+    hunt_id = db_test_utils.InitializeHunt(self.db)
+    other_hunt_id = db_test_utils.InitializeHunt(self.db)
+    self._SetupHuntClientAndFlow(hunt_id=hunt_id)
+    self._SetupHuntClientAndFlow(hunt_id=other_hunt_id)
+    self.assertEqual(self.db.ReadHuntCounters(hunt_id).num_clients, 1)
+
+    self.db.DeleteHuntObject(hunt_id)
+
+    self.assertEqual(self.db.ReadHuntCounters(hunt_id).num_clients, 0)
+    self.assertEqual(self.db.ReadHuntCounters(other_hunt_id).num_clients, 1)
+
+  def testReconcileHuntCountersKeepsUpToDateCounters(self):
+    hunt_id = db_test_utils.InitializeHunt(self.db)
+    self._BuildFilterConditionExpectations(hunt_id)
+    hunt_counters = self.db.ReadHuntCounters(hunt_id)
+
+    self.db.ReconcileHuntCounters(hunt_id)
+
+    self.assertEqual(self.db.ReadHuntCounters(hunt_id), hunt_counters)
+
+  def testReconcileHuntCountersDoesNotAffectOtherHunts(self):
+    hunt_id_1 = db_test_utils.InitializeHunt(self.db)
+    hunt_id_2 = db_test_utils.InitializeHunt(self.db)
+    self._SetupHuntClientAndFlow(hunt_id=hunt_id_1)
+    self._SetupHuntClientAndFlow(hunt_id=hunt_id_2)
+
+    self.db.ReconcileHuntCounters(hunt_id_1)
+
+    self.assertEqual(self.db.ReadHuntCounters(hunt_id_1).num_clients, 1)
+    self.assertEqual(self.db.ReadHuntCounters(hunt_id_2).num_clients, 1)
+
+  def testReconcileHuntCountersUpdatesCountersOfSubsequentWrites(self):
+    hunt_id = db_test_utils.InitializeHunt(self.db)
+    client_id, flow_id = self._SetupHuntClientAndFlow(hunt_id=hunt_id)
+
+    self.db.ReconcileHuntCounters(hunt_id)
+    self.db.UpdateFlow(
+        client_id, flow_id, flow_state=flows_pb2.Flow.FlowState.CRASHED
+    )
+
+    hunt_counters = self.db.ReadHuntCounters(hunt_id)
+    self.assertEqual(hunt_counters.num_clients, 1)
+    self.assertEqual(hunt_counters.num_crashed_clients, 1)
+
   def testReadHuntClientResourcesStatsIgnoresSubflows(self):
     hunt_id = db_test_utils.InitializeHunt(self.db)
 
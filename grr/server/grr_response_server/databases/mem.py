@@ -147,6 +147,18 @@ class InMemoryDB(
     self.hunts: dict[str, hunts_pb2.Hunt] = {}
     # Maps hunt_id to a list of serialized output_plugin_pb2.OutputPluginState.
     self.hunt_output_plugins_states: dict[str, list[bytes]] = {}
+    # Maps request_id to a queued flows_pb2.HuntOutputPluginRequest.
+    self.hunt_output_plugin_requests: dict[
+        int, flows_pb2.HuntOutputPluginRequest
+    ] = {}
+    # Maps hunt_id to counters of its flows (see `db.HuntCounters`), kept up to
+    # date as hunt flows and their results are written.
+    self.hunt_counters: dict[str, collections.Counter[str]] = {}
+    # Maps (client_id, flow_id) of top-level hunt flows to the hunt_id and the
+    # counters that were last added to the hunt counters for the flow.
+    self.hunt_flow_counters: dict[
+        tuple[str, str], tuple[str, collections.Counter[str]]
+    ] = {}
     # Maps (binary-type, binary-path) to (objects_pb2.BlobReferences, timestamp)
     self.signed_binary_references: dict[
         tuple[int, str], tuple[objects_pb2.BlobReferences, rdfvalue.RDFDatetime]
@@ -531,6 +531,7 @@ class InMemoryDBClientMixin(object):
 
     for key in [k for k in self.flows if k[0] == client_id]:
       self.flows.pop(key)
+      self._UpdateHuntCounters(*key)  # pytype: disable=attribute-error
     for key in [k for k in self.flow_requests if k[0] == client_id]:
       self.flow_requests.pop(key)
     for key in [k for k in self.flow_processing_requests if k[0] == client_id]:
@@ -221,6 +221,30 @@ class InMemoryDBFlowMixin(object):
     clone.create_time = now
 
     self.flows[key] = clone
+    self._UpdateHuntCounters(*key)  # pytype: disable=attribute-error
+
+  @utils.Synchronized
+  def WriteFlowObjects(
+      self,
+      flow_objs: Sequence[flows_pb2.Flow],
+      allow_update: bool = True,
+  ) -> None:
+    """Writes multiple flow objects to the database in one go."""
+    unknown_client_ids = [
+        flow_obj.client_id
+        for flow_obj in flow_objs
+        if flow_obj.client_id not in self.metadatas
+    ]
+    if unknown_client_ids:
+      raise db.AtLeastOneUnknownClientError(unknown_client_ids)
+
+    if not allow_update:
+      for flow_obj in flow_objs:
+        if (flow_obj.client_id, flow_obj.flow_id) in self.flows:
+          raise db.FlowExistsError(flow_obj.client_id, flow_obj.flow_id)
+
+    for flow_obj in flow_objs:
+      self.WriteFlowObject(flow_obj, allow_update=allow_update)
 
   @utils.Synchronized
   def ReadFlowObject(self, client_id: str, flow_id: str) -> flows_pb2.Flow:
@@ -230,6 +254,20 @@ class InMemoryDBFlowMixin(object):
     except KeyError:
       raise db.UnknownFlowError(client_id, flow_id)
 
+  @utils.Synchronized
+  def ReadFlowObjects(
+      self,
+      flow_keys: Collection[tuple[str, str]],
+  ) -> dict[tuple[str, str], flows_pb2.Flow]:
+    """Reads multiple flow objects from the database."""
+    res = {}
+    for client_id, flow_id in flow_keys:
+      try:
+        res[(client_id, flow_id)] = self.flows[(client_id, flow_id)]
+      except KeyError:
+        continue
+    return res
+
   @utils.Synchronized
   def ReadAllFlowObjects(
       self,
@@ -267,6 +305,59 @@ class InMemoryDBFlowMixin(object):
       res.append(flow)
     return res
 
+  @utils.Synchronized
+  def ReadFlowSummaries(
+      self,
+      client_id: str,
+      min_create_time: Optional[rdfvalue.RDFDatetime] = None,
+      max_create_time: Optional[rdfvalue.RDFDatetime] = None,
+      include_child_flows: bool = True,
+      not_created_by: Optional[Iterable[str]] = None,
+      parent_flow_ids: Optional[Collection[str]] = None,
+      after_flow_id: Optional[str] = None,
+      offset: int = 0,
+      count: Optional[int] = None,
+  ) -> Sequence[db.FlowSummary]:
+    """Reads summaries of flows of a client, most recently created first."""
+
+    def SortKey(flow: flows_pb2.Flow) -> tuple[int, int]:
+      return (flow.create_time, db_utils.FlowIDToInt(flow.flow_id))
+
+    flows = self.ReadAllFlowObjects(
+        client_id=client_id,
+        min_create_time=min_create_time,
+        max_create_time=max_create_time,
+        include_child_flows=include_child_flows,
+        not_created_by=not_created_by,
+    )
+    if parent_flow_ids is not None:
+      flows = [flow for flow in flows if flow.parent_flow_id in parent_flow_ids]
+    flows.sort(key=SortKey, reverse=True)
+
+    if after_flow_id is not None:
+      try:
+        after_flow = self.flows[(client_id, after_flow_id)]
+      except KeyError as e:
+        raise db.UnknownFlowError(client_id, after_flow_id) from e
+
+      after_key = SortKey(after_flow)
+      flows = [flow for flow in flows if SortKey(flow) < after_key]
+
+    flows = flows[offset:]
+    if count is not None:
+      flows = flows[:count]
+
+    return [
+        db.FlowSummary(
+            flow_id=flow.flow_id,
+            parent_flow_id=flow.parent_flow_id or None,
+            create_time=rdfvalue.RDFDatetime.FromMicrosecondsSinceEpoch(
+                flow.create_time
+            ),
+        )
+        for flow in flows
+    ]
+
   @utils.Synchronized
   def LeaseFlowForProcessing(
       self,
@@ -308,6 +399,23 @@ class InMemoryDBFlowMixin(object):
     flow.processing_deadline = int(processing_deadline)
     return flow
 
+  @utils.Synchronized
+  def LeaseFlowsForProcessing(
+      self,
+      flow_keys: Collection[tuple[str, str]],
+      processing_time: rdfvalue.Duration,
+  ) -> dict[tuple[str, str], flows_pb2.Flow]:
+    """Marks multiple flows as being processed on this worker in one go."""
+    res = {}
+    for client_id, flow_id in flow_keys:
+      try:
+        res[(client_id, flow_id)] = self.LeaseFlowForProcessing(
+            client_id, flow_id, processing_time
+        )
+      except (db.UnknownFlowError, db.ParentHuntIsNotRunningError, ValueError):
+        continue
+    return res
+
   @utils.Synchronized
   def UpdateFlow(
       self,
@@ -379,6 +487,7 @@ class InMemoryDBFlowMixin(object):
     flow.last_update_time = int(rdfvalue.RDFDatetime.Now())
 
     self.flows[(ClientID(client_id), FlowID(flow_id))] = flow
+    self._UpdateHuntCounters(client_id, flow_id)  # pytype: disable=attribute-error
 
   @utils.Synchronized
   def WriteFlowRequests(
@@ -681,6 +790,32 @@ class InMemoryDBFlowMixin(object):
 
     return res
 
+  @utils.Synchronized
+  def ReadFlowsRequests(
+      self,
+      flow_keys: Collection[tuple[str, str]],
+  ) -> dict[
+      tuple[str, str],
+      dict[
+          int,
+          tuple[
+              flows_pb2.FlowRequest,
+              Sequence[
+                  Union[
+                      flows_pb2.FlowResponse,
+                      flows_pb2.FlowStatus,
+                      flows_pb2.FlowIterator,
+                  ],
+              ],
+          ],
+      ],
+  ]:
+    """Reads all requests for multiple flows."""
+    return {
+        (client_id, flow_id): self.ReadFlowRequests(client_id, flow_id)
+        for client_id, flow_id in flow_keys
+    }
+
   @utils.Synchronized
   def ReleaseProcessedFlow(self, flow_obj: flows_pb2.Flow) -> bool:
     """Releases a flow that the worker was processing to the database."""
@@ -705,6 +840,19 @@ class InMemoryDBFlowMixin(object):
     )
     return True
 
+  @utils.Synchronized
+  def ReleaseProcessedFlows(
+      self,
+      flow_objs: Sequence[flows_pb2.Flow],
+  ) -> dict[tuple[str, str], bool]:
+    """Releases multiple flows that the worker was processing in one go."""
+    return {
+        (flow_obj.client_id, flow_obj.flow_id): self.ReleaseProcessedFlow(
+            flow_obj
+        )
+        for flow_obj in flow_objs
+    }
+
   def _InlineProcessingOK(
       self, requests: Sequence[flows_pb2.FlowProcessingRequest]
   ) -> bool:
@@ -784,6 +932,18 @@ class InMemoryDBFlowMixin(object):
             (request.client_id, request.flow_id), None
         )
 
+  def RegisterFlowProcessingBatchHandler(
+      self,
+      handler: Callable[[Sequence[flows_pb2.FlowProcessingRequest]], None],
+      max_batch_size: int,
+  ) -> None:
+    """Registers a handler to receive batches of flow processing messages."""
+    del max_batch_size  # Unused.
+
+    # The in memory db processes requests inline as soon as they are written,
+    # so there is never a backlog worth batching.
+    self.RegisterFlowProcessingHandler(lambda request: handler([request]))
+
   def _RegisterFlowProcessingHandler(
       self, handler: Callable[[flows_pb2.FlowProcessingRequest], None]
   ) -> None:
@@ -891,9 +1051,13 @@ class InMemoryDBFlowMixin(object):
       to_write.timestamp = rdfvalue.RDFDatetime.Now().AsMicrosecondsSinceEpoch()
       dest.append(to_write)
 
+  @utils.Synchronized
   def WriteFlowResults(self, results: Sequence[flows_pb2.FlowResult]) -> None:
     """Writes flow results for a given flow."""
     self._WriteFlowResultsOrErrors(self.flow_results, results)
+    # Number of results of a flow contributes to its hunt counters.
+    for client_id, flow_id in set((r.client_id, r.flow_id) for r in results):
+      self._UpdateHuntCounters(client_id, flow_id)  # pytype: disable=attribute-error
 
   @utils.Synchronized
   def _ReadFlowResultsOrErrors(
@@ -91,6 +91,10 @@ class InMemoryDBHuntMixin(object):
   hunts: dict[str, hunts_pb2.Hunt]
   flows: dict[str, flows_pb2.Flow]
   hunt_output_plugins_states: dict[str, list[bytes]]
+  hunt_counters: dict[str, collections.Counter[str]]
+  hunt_flow_counters: dict[
+      tuple[str, str], tuple[str, collections.Counter[str]]
+  ]
   approvals_by_username: dict[str, dict[str, objects_pb2.ApprovalRequest]]
   flow_results: dict[tuple[str, str], list[flows_pb2.FlowResult]]
 
@@ -209,6 +213,87 @@ class InMemoryDBHuntMixin(object):
         state_index
     ] = state.SerializeToString()
 
+  @utils.Synchronized
+  def WriteHuntOutputPluginRequests(
+      self,
+      requests: Iterable[flows_pb2.HuntOutputPluginRequest],
+  ) -> None:
+    """Queues hunt results to be processed by the hunt output plugins."""
+    now = rdfvalue.RDFDatetime.Now().AsMicrosecondsSinceEpoch()
+    for request in requests:
+      if request.request_id in self.hunt_output_plugin_requests:
+        continue
+
+      stored = flows_pb2.HuntOutputPluginRequest()
+      stored.CopyFrom(request)
+      stored.timestamp = now
+      if not stored.HasField("delivery_time"):
+        stored.delivery_time = now
+      stored.ClearField("leased_until")
+      stored.ClearField("leased_by")
+      self.hunt_output_plugin_requests[stored.request_id] = stored
+
+  @utils.Synchronized
+  def ReadHuntOutputPluginRequests(
+      self,
+  ) -> Sequence[flows_pb2.HuntOutputPluginRequest]:
+    """Reads all queued hunt output plugin requests."""
+    result = []
+    for request in self.hunt_output_plugin_requests.values():
+      request_copy = flows_pb2.HuntOutputPluginRequest()
+      request_copy.CopyFrom(request)
+      result.append(request_copy)
+    return sorted(result, key=lambda r: (r.timestamp, r.request_id))
+
+  @utils.Synchronized
+  def LeaseHuntOutputPluginRequests(
+      self,
+      lease_time: rdfvalue.Duration,
+      limit: int,
+  ) -> Sequence[flows_pb2.HuntOutputPluginRequest]:
+    """Leases queued hunt output plugin requests of a single hunt."""
+    now = rdfvalue.RDFDatetime.Now()
+    now_micros = now.AsMicrosecondsSinceEpoch()
+    expiry_micros = (now + lease_time).AsMicrosecondsSinceEpoch()
+
+    available = [
+        request
+        for request in self.hunt_output_plugin_requests.values()
+        if request.delivery_time <= now_micros
+        and request.leased_until < now_micros
+    ]
+    if not available:
+      return []
+    available.sort(key=lambda r: (r.timestamp, r.request_id))
+
+    hunt_id = available[0].hunt_id
+    leased_by = utils.ProcessIdString()
+
+    result = []
+    for request in available:
+      if request.hunt_id != hunt_id:
+        continue
+
+      request.leased_until = expiry_micros
+      request.leased_by = leased_by
+
+      request_copy = flows_pb2.HuntOutputPluginRequest()
+      request_copy.CopyFrom(request)
+      result.append(request_copy)
+      if len(result) >= limit:
+        break
+
+    return result
+
+  @utils.Synchronized
+  def DeleteHuntOutputPluginRequests(
+      self,
+      requests: Iterable[flows_pb2.HuntOutputPluginRequest],
+  ) -> None:
+    """Deletes hunt output plugin requests once they are processed."""
+    for request in requests:
+      self.hunt_output_plugin_requests.pop(request.request_id, None)
+
   @utils.Synchronized
   def DeleteHuntObject(self, hunt_id: str) -> None:
     """Deletes a hunt object with a given id."""
@@ -217,6 +302,15 @@ class InMemoryDBHuntMixin(object):
     except KeyError:
       raise db.UnknownHuntError(hunt_id)
 
+    for request_id, request in list(self.hunt_output_plugin_requests.items()):
+      if request.hunt_id == hunt_id:
+        del self.hunt_output_plugin_requests[request_id]
+
+    self.hunt_counters.pop(hunt_id, None)
+    for key, (flow_hunt_id, _) in list(self.hunt_flow_counters.items()):
+      if flow_hunt_id == hunt_id:
+        del self.hunt_flow_counters[key]
+
     for approvals in self.approvals_by_username.values():
       # We use `list` around dictionary items iterator to avoid errors about
       # dictionary modification during iteration.
@@ -492,6 +586,64 @@ class InMemoryDBHuntMixin(object):
         )
     )
 
+  def _HuntFlowCounters(self, flow: flows_pb2.Flow) -> collections.Counter[str]:
+    """Returns the contribution of a hunt flow to the hunt counters."""
+    results = self.flow_results.get((flow.client_id, flow.flow_id), [])
+    num_results = len(results)
+    flow_state = flow.flow_state
+    return collections.Counter(
+        num_clients=1,
+        num_successful_clients=int(
+            flow_state == flows_pb2.Flow.FlowState.FINISHED
+        ),
+        num_failed_clients=int(flow_state == flows_pb2.Flow.FlowState.ERROR),
+        num_crashed_clients=int(
+            flow_state == flows_pb2.Flow.FlowState.CRASHED
+        ),
+        num_running_clients=int(
+            flow_state == flows_pb2.Flow.FlowState.RUNNING
+        ),
+        num_clients_with_results=int(num_results > 0),
+        num_results=num_results,
+        total_cpu_micros=(
+            db_utils.SecondsToMicros(flow.cpu_time_used.user_cpu_time)
+            + db_utils.SecondsToMicros(flow.cpu_time_used.system_cpu_time)
+        ),
+        total_network_bytes_sent=flow.network_bytes_sent,
+    )
+
+  def _UpdateHuntCounters(self, client_id: str, flow_id: str) -> None:
+    """Brings hunt counters up to date with the stored state of a flow.
+
+    Should be called after a flow or its results are written or deleted. Flows
+    that are not top-level hunt flows are ignored.
+
+    Args:
+      client_id: The client id of the flow.
+      flow_id: The id of the flow.
+    """
+    key = (client_id, flow_id)
+    flow = self.flows.get(key)
+
+    # Stored flow objects might be modified in place, so the last applied
+    # contribution of every flow is kept to compute the difference.
+    old_hunt_id, old_counters = self.hunt_flow_counters.pop(
+        key, (None, collections.Counter())
+    )
+    if old_hunt_id is not None:
+      self.hunt_counters[old_hunt_id].subtract(old_counters)
+
+    if flow is None or not flow.parent_hunt_id:
+      return
+    if flow.flow_id != flow.parent_hunt_id:
+      return
+
+    new_counters = self._HuntFlowCounters(flow)
+    self.hunt_counters.setdefault(
+        flow.parent_hunt_id, collections.Counter()
+    ).update(new_counters)
+    self.hunt_flow_counters[key] = (flow.parent_hunt_id, new_counters)
+
   @utils.Synchronized
   def ReadHuntsCounters(
       self,
@@ -500,49 +652,39 @@ class InMemoryDBHuntMixin(object):
     """Reads hunt counters for several hunt ids."""
     hunt_counters = {}
     for hunt_id in hunt_ids:
-      num_clients = self.CountHuntFlows(hunt_id)
-      num_successful_clients = self.CountHuntFlows(
-          hunt_id, filter_condition=db.HuntFlowsCondition.SUCCEEDED_FLOWS_ONLY
-      )
-      num_failed_clients = self.CountHuntFlows(
-          hunt_id, filter_condition=db.HuntFlowsCondition.FAILED_FLOWS_ONLY
-      )
-      num_clients_with_results = len(
-          set(
-              r[0].client_id
-              for r in self.flow_results.values()
-              if r and r[0].hunt_id == hunt_id
-          )
-      )
-      num_crashed_clients = self.CountHuntFlows(
-          hunt_id, filter_condition=db.HuntFlowsCondition.CRASHED_FLOWS_ONLY
-      )
-      num_running_clients = self.CountHuntFlows(
-          hunt_id, filter_condition=db.HuntFlowsCondition.FLOWS_IN_PROGRESS_ONLY
-      )
-      num_results = self.CountHuntResults(hunt_id)
-
-      total_cpu_seconds = 0
-      total_network_bytes_sent = 0
-      for f in self.ReadHuntFlows(hunt_id, 0, sys.maxsize):
-        total_cpu_seconds += (
-            f.cpu_time_used.user_cpu_time + f.cpu_time_used.system_cpu_time
-        )
-        total_network_bytes_sent += f.network_bytes_sent
-
+      counters = self.hunt_counters.get(hunt_id, collections.Counter())
       hunt_counters[hunt_id] = db.HuntCounters(
-          num_clients=num_clients,
-          num_successful_clients=num_successful_clients,
-          num_failed_clients=num_failed_clients,
-          num_clients_with_results=num_clients_with_results,
-          num_crashed_clients=num_crashed_clients,
-          num_running_clients=num_running_clients,
-          num_results=num_results,
-          total_cpu_seconds=total_cpu_seconds,
-          total_network_bytes_sent=total_network_bytes_sent,
+          num_clients=counters["num_clients"],
+          num_successful_clients=counters["num_successful_clients"],
+          num_failed_clients=counters["num_failed_clients"],
+          num_clients_with_results=counters["num_clients_with_results"],
+          num_crashed_clients=counters["num_crashed_clients"],
+          num_running_clients=counters["num_running_clients"],
+          num_results=counters["num_results"],
+          total_cpu_seconds=db_utils.MicrosToSeconds(
+              counters["total_cpu_micros"]
+          ),
+          total_network_bytes_sent=counters["total_network_bytes_sent"],
       )
     return hunt_counters
 
+  @utils.Synchronized
+  def ReconcileHuntCounters(self, hunt_id: str) -> None:
+    """Recomputes counters of a given hunt from its flows."""
+    for key, (flow_hunt_id, _) in list(self.hunt_flow_counters.items()):
+      if flow_hunt_id == hunt_id:
+        del self.hunt_flow_counters[key]
+
+    counters = collections.Counter()
+    for flow in self._GetHuntFlows(hunt_id):
+      flow_counters = self._HuntFlowCounters(flow)
+      counters.update(flow_counters)
+      self.hunt_flow_counters[(flow.client_id, flow.flow_id)] = (
+          hunt_id,
+          flow_counters,
+      )
+    self.hunt_counters[hunt_id] = counters
+
   @utils.Synchronized
   def ReadHuntClientResourcesStats(
       self,
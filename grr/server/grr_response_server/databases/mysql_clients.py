@@ -1026,6 +1026,17 @@ class MySQLDBClientMixin(object):
         [db_utils.ClientIDToInt(client_id)],
     )
 
+    # Foreign key cascades don't activate triggers, so top-level hunt flows are
+    # deleted explicitly for the hunt counters to be updated.
+    cursor.execute(
+        """
+    DELETE FROM flows
+    WHERE client_id = %s
+      AND parent_hunt_id IS NOT NULL
+      AND parent_flow_id IS NULL""",
+        [db_utils.ClientIDToInt(client_id)],
+    )
+
     cursor.execute(
         "DELETE FROM clients WHERE client_id = %s",
         [db_utils.ClientIDToInt(client_id)],
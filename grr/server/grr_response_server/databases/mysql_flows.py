@@ -206,19 +206,7 @@ class MySQLDBFlowMixin:
       res.append(req)
     return res
 
-  @db_utils.CallLogged
-  @db_utils.CallAccounted
-  @mysql_utils.WithTransaction()
-  def WriteFlowObject(
-      self,
-      flow_obj: flows_pb2.Flow,
-      allow_update: bool = True,
-      cursor: Optional[cursors.Cursor] = None,
-  ) -> None:
-    """Writes a flow object to the database."""
-    assert cursor is not None
-
-    query = """
+  _WRITE_FLOW_QUERY = """
     INSERT INTO flows (client_id, flow_id, long_flow_id, parent_flow_id,
                        parent_hunt_id, name, creator, flow, flow_state,
                        next_request_to_process, timestamp,
@@ -230,14 +218,15 @@ class MySQLDBFlowMixin:
             %(network_bytes_sent)s, %(user_cpu_time_used_micros)s,
             %(system_cpu_time_used_micros)s, %(num_replies_sent)s, NOW(6))"""
 
-    if allow_update:
-      query += """
+  _WRITE_FLOW_UPDATE_CLAUSE = """
         ON DUPLICATE KEY UPDATE
           flow=VALUES(flow),
           flow_state=VALUES(flow_state),
           next_request_to_process=VALUES(next_request_to_process),
           last_update=VALUES(last_update)"""
 
+  def _FlowObjectToArgs(self, flow_obj: flows_pb2.Flow) -> dict[str, object]:
+    """Generates arguments of the flow write query for a flow object."""
     user_cpu_time_used_micros = db_utils.SecondsToMicros(
         flow_obj.cpu_time_used.user_cpu_time
     )
@@ -270,14 +259,69 @@ class MySQLDBFlowMixin:
     else:
       args["parent_hunt_id"] = None
 
+    return args
+
+  @db_utils.CallLogged
+  @db_utils.CallAccounted
+  @mysql_utils.WithTransaction()
+  def WriteFlowObject(
+      self,
+      flow_obj: flows_pb2.Flow,
+      allow_update: bool = True,
+      cursor: Optional[cursors.Cursor] = None,
+  ) -> None:
+    """Writes a flow object to the database."""
+    assert cursor is not None
+
+    query = self._WRITE_FLOW_QUERY
+    if allow_update:
+      query += self._WRITE_FLOW_UPDATE_CLAUSE
+
     try:
-      cursor.execute(query, args)
+      cursor.execute(query, self._FlowObjectToArgs(flow_obj))
     except MySQLdb.IntegrityError as e:
       if e.args[0] == mysql_errors.DUP_ENTRY:
         raise db.FlowExistsError(flow_obj.client_id, flow_obj.flow_id)
       else:
         raise db.UnknownClientError(flow_obj.client_id, cause=e)
 
+  @db_utils.CallLogged
+  @db_utils.CallAccounted
+  @mysql_utils.WithTransaction()
+  def WriteFlowObjects(
+      self,
+      flow_objs: Sequence[flows_pb2.Flow],
+      allow_update: bool = True,
+      cursor: Optional[cursors.Cursor] = None,
+  ) -> None:
+    """Writes multiple flow objects to the database in one go."""
+    assert cursor is not None
+
+    if not flow_objs:
+      return
+
+    query = self._WRITE_FLOW_QUERY
+    if allow_update:
+      query += self._WRITE_FLOW_UPDATE_CLAUSE
+
+    # Inserts with a single `VALUES` clause are sent as a single multi-row
+    # statement by `executemany`.
+    args = [self._FlowObjectToArgs(flow_obj) for flow_obj in flow_objs]
+    try:
+      cursor.executemany(query, args)
+    except MySQLdb.IntegrityError as e:
+      if e.args[0] != mysql_errors.DUP_ENTRY:
+        client_ids = [flow_obj.client_id for flow_obj in flow_objs]
+        raise db.AtLeastOneUnknownClientError(client_ids, cause=e)
+
+      # Find out which of the flows caused the conflict.
+      flow_keys = [(f.client_id, f.flow_id) for f in flow_objs]
+      existing_flow_keys = list(self._ReadFlowObjects(flow_keys, cursor))
+      if not existing_flow_keys:
+        raise
+      client_id, flow_id = existing_flow_keys[0]
+      raise db.FlowExistsError(client_id, flow_id) from e
+
   def _FlowObjectFromRow(self, row) -> flows_pb2.Flow:
     """Generates a flow object from a database row."""
     datetime = mysql_utils.TimestampToRDFDatetime
@@ -396,6 +440,45 @@ class MySQLDBFlowMixin:
     (row,) = result
     return self._FlowObjectFromRow(row)
 
+  @db_utils.CallLogged
+  @db_utils.CallAccounted
+  @mysql_utils.WithTransaction(readonly=True)
+  def ReadFlowObjects(
+      self,
+      flow_keys: Collection[tuple[str, str]],
+      cursor: Optional[cursors.Cursor] = None,
+  ) -> dict[tuple[str, str], flows_pb2.Flow]:
+    """Reads multiple flow objects from the database."""
+    assert cursor is not None
+    return self._ReadFlowObjects(flow_keys, cursor)
+
+  def _ReadFlowObjects(
+      self,
+      flow_keys: Collection[tuple[str, str]],
+      cursor: cursors.Cursor,
+  ) -> dict[tuple[str, str], flows_pb2.Flow]:
+    """Reads multiple flow objects using the given cursor."""
+    if not flow_keys:
+      return {}
+
+    conditions = []
+    args = []
+    for client_id, flow_id in flow_keys:
+      conditions.append("(client_id=%s AND flow_id=%s)")
+      args.append(db_utils.ClientIDToInt(client_id))
+      args.append(db_utils.FlowIDToInt(flow_id))
+
+    query = f"SELECT {self.FLOW_DB_FIELDS} FROM flows WHERE " + " OR ".join(
+        conditions
+    )
+    cursor.execute(query, args)
+
+    res = {}
+    for row in cursor.fetchall():
+      flow_obj = self._FlowObjectFromRow(row)
+      res[(flow_obj.client_id, flow_obj.flow_id)] = flow_obj
+    return res
+
   @db_utils.CallLogged
   @db_utils.CallAccounted
   @mysql_utils.WithTransaction(readonly=True)
@@ -453,6 +536,107 @@ class MySQLDBFlowMixin:
     cursor.execute(query, args)
     return [self._FlowObjectFromRow(row) for row in cursor.fetchall()]
 
+  @db_utils.CallLogged
+  @db_utils.CallAccounted
+  @mysql_utils.WithTransaction(readonly=True)
+  def ReadFlowSummaries(
+      self,
+      client_id: str,
+      min_create_time: Optional[rdfvalue.RDFDatetime] = None,
+      max_create_time: Optional[rdfvalue.RDFDatetime] = None,
+      include_child_flows: bool = True,
+      not_created_by: Optional[Iterable[str]] = None,
+      parent_flow_ids: Optional[Collection[str]] = None,
+      after_flow_id: Optional[str] = None,
+      offset: int = 0,
+      count: Optional[int] = None,
+      cursor: Optional[cursors.Cursor] = None,
+  ) -> Sequence[db.FlowSummary]:
+    """Reads summaries of flows of a client, most recently created first."""
+    assert cursor is not None
+
+    client_id_int = db_utils.ClientIDToInt(client_id)
+
+    conditions = ["client_id = %s"]
+    args = [client_id_int]
+
+    if min_create_time is not None:
+      conditions.append("timestamp >= FROM_UNIXTIME(%s)")
+      args.append(mysql_utils.RDFDatetimeToTimestamp(min_create_time))
+
+    if max_create_time is not None:
+      conditions.append("timestamp <= FROM_UNIXTIME(%s)")
+      args.append(mysql_utils.RDFDatetimeToTimestamp(max_create_time))
+
+    if not include_child_flows:
+      conditions.append("parent_flow_id IS NULL")
+
+    if not_created_by is not None:
+      conditions.append("creator NOT IN %s")
+      # We explicitly convert not_created_by into a list because the cursor
+      # implementation does not know how to convert a `frozenset` to a string.
+      args.append(list(not_created_by))
+
+    index = "flows_by_client_id_timestamp"
+    if parent_flow_ids is not None:
+      if not parent_flow_ids:
+        return []
+      conditions.append("parent_flow_id IN %s")
+      args.append([db_utils.FlowIDToInt(i) for i in parent_flow_ids])
+      # Child flows of a few flows are cheaper to find by their parent than by
+      # scanning all flows of the client.
+      index = "flows_by_client_id_parent_flow_id"
+
+    if after_flow_id is not None:
+      after_flow_id_int = db_utils.FlowIDToInt(after_flow_id)
+      cursor.execute(
+          "SELECT UNIX_TIMESTAMP(timestamp) FROM flows "
+          "WHERE client_id = %s AND flow_id = %s",
+          [client_id_int, after_flow_id_int],
+      )
+      row = cursor.fetchone()
+      if row is None:
+        raise db.UnknownFlowError(client_id, after_flow_id)
+      (after_timestamp,) = row
+
+      conditions.append(
+          "(timestamp < FROM_UNIXTIME(%s) OR "
+          "(timestamp = FROM_UNIXTIME(%s) AND flow_id < %s))"
+      )
+      args.extend([after_timestamp, after_timestamp, after_flow_id_int])
+
+    query = f"""
+      SELECT flow_id, parent_flow_id, UNIX_TIMESTAMP(timestamp)
+      FROM flows
+      FORCE INDEX ({index})
+      WHERE {" AND ".join(conditions)}
+      ORDER BY timestamp DESC, flow_id DESC
+    """
+    if count is not None:
+      query += " LIMIT %s OFFSET %s"
+      args.extend([count, offset])
+    elif offset:
+      # MySQL doesn't support `OFFSET` without a `LIMIT`.
+      query += " LIMIT 18446744073709551615 OFFSET %s"
+      args.append(offset)
+
+    cursor.execute(query, args)
+
+    result = []
+    for flow_id, parent_flow_id, timestamp in cursor.fetchall():
+      result.append(
+          db.FlowSummary(
+              flow_id=db_utils.IntToFlowID(flow_id),
+              parent_flow_id=(
+                  db_utils.IntToFlowID(parent_flow_id)
+                  if parent_flow_id is not None
+                  else None
+              ),
+              create_time=mysql_utils.TimestampToRDFDatetime(timestamp),
+          )
+      )
+    return result
+
   @db_utils.CallLogged
   @db_utils.CallAccounted
   @mysql_utils.WithTransaction()
@@ -528,6 +712,89 @@ class MySQLDBFlowMixin:
     flow.processing_deadline = int(processing_deadline)
     return flow
 
+  @db_utils.CallLogged
+  @db_utils.CallAccounted
+  @mysql_utils.WithTransaction()
+  def LeaseFlowsForProcessing(
+      self,
+      flow_keys: Collection[tuple[str, str]],
+      processing_time: rdfvalue.Duration,
+      cursor: Optional[cursors.Cursor] = None,
+  ) -> dict[tuple[str, str], flows_pb2.Flow]:
+    """Marks multiple flows as being processed on this worker in one go."""
+    assert cursor is not None
+
+    if not flow_keys:
+      return {}
+
+    conditions = []
+    args = []
+    for client_id, flow_id in flow_keys:
+      conditions.append("(client_id=%s AND flow_id=%s)")
+      args.append(db_utils.ClientIDToInt(client_id))
+      args.append(db_utils.FlowIDToInt(flow_id))
+
+    query = f"SELECT {self.FLOW_DB_FIELDS} FROM flows WHERE "
+    query += " OR ".join(conditions)
+    cursor.execute(query, args)
+
+    now = rdfvalue.RDFDatetime.Now()
+    flows = []
+    for row in cursor.fetchall():
+      flow = self._FlowObjectFromRow(row)
+      if flow.processing_on and flow.processing_deadline > int(now):
+        continue
+      flows.append(flow)
+
+    hunt_ids = set(flow.parent_hunt_id for flow in flows if flow.parent_hunt_id)
+    if hunt_ids:
+      query = "SELECT hunt_id, hunt_state FROM hunts WHERE hunt_id IN %s"
+      cursor.execute(query, [[db_utils.HuntIDToInt(h) for h in hunt_ids]])
+      unsuitable_hunt_ids = set()
+      for hunt_id, hunt_state in cursor.fetchall():
+        if (
+            hunt_state is not None
+            and not models_hunts.IsHuntSuitableForFlowProcessing(hunt_state)
+        ):
+          unsuitable_hunt_ids.add(db_utils.IntToHuntID(hunt_id))
+      flows = [f for f in flows if f.parent_hunt_id not in unsuitable_hunt_ids]
+
+    if not flows:
+      return {}
+
+    processing_deadline = now + processing_time
+    process_id_string = utils.ProcessIdString()
+
+    conditions = []
+    args = [
+        process_id_string,
+        mysql_utils.RDFDatetimeToTimestamp(now),
+        mysql_utils.RDFDatetimeToTimestamp(processing_deadline),
+    ]
+    for flow in flows:
+      conditions.append("(client_id=%s AND flow_id=%s)")
+      args.append(db_utils.ClientIDToInt(flow.client_id))
+      args.append(db_utils.FlowIDToInt(flow.flow_id))
+
+    update_query = (
+        "UPDATE flows SET "
+        "processing_on=%s, "
+        "processing_since=FROM_UNIXTIME(%s), "
+        "processing_deadline=FROM_UNIXTIME(%s) "
+        "WHERE "
+    )
+    update_query += " OR ".join(conditions)
+    cursor.execute(update_query, args)
+
+    # This needs to happen after we are sure that the write has succeeded.
+    res = {}
+    for flow in flows:
+      flow.processing_on = process_id_string
+      flow.processing_since = int(now)
+      flow.processing_deadline = int(processing_deadline)
+      res[(flow.client_id, flow.flow_id)] = flow
+    return res
+
   @db_utils.CallLogged
   @db_utils.CallAccounted
   @mysql_utils.WithTransaction()
@@ -1244,17 +1511,81 @@ class MySQLDBFlowMixin:
     """Reads all requests for a flow that can be processed by the worker."""
     assert cursor is not None
 
-    args = [db_utils.ClientIDToInt(client_id), db_utils.FlowIDToInt(flow_id)]
+    flow_key = (client_id, flow_id)
+    return self._ReadFlowsRequests([flow_key], cursor)[flow_key]
+
+  @db_utils.CallLogged
+  @db_utils.CallAccounted
+  @mysql_utils.WithTransaction(readonly=True)
+  def ReadFlowsRequests(
+      self,
+      flow_keys: Collection[tuple[str, str]],
+      cursor: Optional[cursors.Cursor] = None,
+  ) -> dict[
+      tuple[str, str],
+      dict[
+          int,
+          tuple[
+              flows_pb2.FlowRequest,
+              Sequence[
+                  Union[
+                      flows_pb2.FlowResponse,
+                      flows_pb2.FlowStatus,
+                      flows_pb2.FlowIterator,
+                  ],
+              ],
+          ],
+      ],
+  ]:
+    """Reads all requests for multiple flows."""
+    assert cursor is not None
+
+    if not flow_keys:
+      return {}
+
+    return self._ReadFlowsRequests(flow_keys, cursor)
+
+  def _ReadFlowsRequests(
+      self,
+      flow_keys: Collection[tuple[str, str]],
+      cursor: cursors.Cursor,
+  ) -> dict[
+      tuple[str, str],
+      dict[
+          int,
+          tuple[
+              flows_pb2.FlowRequest,
+              Sequence[
+                  Union[
+                      flows_pb2.FlowResponse,
+                      flows_pb2.FlowStatus,
+                      flows_pb2.FlowIterator,
+                  ],
+              ],
+          ],
+      ],
+  ]:
+    """Reads requests and responses of given flows with two queries."""
+    conditions = []
+    args = []
+    for client_id, flow_id in flow_keys:
+      conditions.append("(client_id=%s AND flow_id=%s)")
+      args.append(db_utils.ClientIDToInt(client_id))
+      args.append(db_utils.FlowIDToInt(flow_id))
+    condition = " OR ".join(conditions)
 
     query = (
-        "SELECT response, status, iterator, UNIX_TIMESTAMP(timestamp) "
+        "SELECT client_id, flow_id, response, status, iterator, "
+        "UNIX_TIMESTAMP(timestamp) "
         "FROM flow_responses "
-        "WHERE client_id=%s AND flow_id=%s"
+        f"WHERE {condition}"
     )
     cursor.execute(query, args)
 
     responses = {}
-    for res, status, iterator, ts in cursor.fetchall():
+    for client_id_int, flow_id_int, res, status, iterator, ts in (
+        cursor.fetchall()
+    ):
       if status:
         response = flows_pb2.FlowStatus()
         response.ParseFromString(status)
@@ -1265,19 +1596,27 @@ class MySQLDBFlowMixin:
         response = flows_pb2.FlowResponse()
         response.ParseFromString(res)
       response.timestamp = int(mysql_utils.TimestampToRDFDatetime(ts))
-      responses.setdefault(response.request_id, []).append(response)
+      flow_key = (
+          db_utils.IntToClientID(client_id_int),
+          db_utils.IntToFlowID(flow_id_int),
+      )
+      responses.setdefault((flow_key, response.request_id), []).append(
+          response
+      )
 
     query = (
-        "SELECT request, needs_processing, responses_expected, "
-        "callback_state, next_response_id, "
+        "SELECT client_id, flow_id, request, needs_processing, "
+        "responses_expected, callback_state, next_response_id, "
         "UNIX_TIMESTAMP(timestamp) "
         "FROM flow_requests "
-        "WHERE client_id=%s AND flow_id=%s"
+        f"WHERE {condition}"
     )
     cursor.execute(query, args)
 
-    requests = {}
+    requests = {flow_key: {} for flow_key in flow_keys}
     for (
+        client_id_int,
+        flow_id_int,
         req,
         needs_processing,
         responses_expected,
@@ -1293,10 +1632,15 @@ class MySQLDBFlowMixin:
       request.callback_state = callback_state
       request.next_response_id = next_response_id
       request.timestamp = int(mysql_utils.TimestampToRDFDatetime(ts))
-      requests[request.request_id] = (
+      flow_key = (
+          db_utils.IntToClientID(client_id_int),
+          db_utils.IntToFlowID(flow_id_int),
+      )
+      requests.setdefault(flow_key, {})[request.request_id] = (
           request,
           sorted(
-              responses.get(request.request_id, []), key=lambda r: r.response_id
+              responses.get((flow_key, request.request_id), []),
+              key=lambda r: r.response_id,
           ),
       )
 
@@ -1313,6 +1657,32 @@ class MySQLDBFlowMixin:
     """Releases a flow that the worker was processing to the database."""
     assert cursor is not None
 
+    return self._ReleaseProcessedFlow(flow_obj, cursor)
+
+  @db_utils.CallLogged
+  @db_utils.CallAccounted
+  @mysql_utils.WithTransaction()
+  def ReleaseProcessedFlows(
+      self,
+      flow_objs: Sequence[flows_pb2.Flow],
+      cursor: Optional[cursors.Cursor] = None,
+  ) -> dict[tuple[str, str], bool]:
+    """Releases multiple flows that the worker was processing in one go."""
+    assert cursor is not None
+
+    return {
+        (flow_obj.client_id, flow_obj.flow_id): self._ReleaseProcessedFlow(
+            flow_obj, cursor
+        )
+        for flow_obj in flow_objs
+    }
+
+  def _ReleaseProcessedFlow(
+      self,
+      flow_obj: flows_pb2.Flow,
+      cursor: cursors.Cursor,
+  ) -> bool:
+    """Releases a flow using the given cursor."""
     update_query = """
     UPDATE flows
     LEFT OUTER JOIN (
@@ -1514,11 +1884,22 @@ class MySQLDBFlowMixin:
   _FLOW_REQUEST_POLL_TIME_SECS = 3
 
   def _FlowProcessingRequestHandlerLoop(
-      self, handler: Callable[[flows_pb2.FlowProcessingRequest], None]
+      self,
+      handler: Callable[..., None],
+      max_batch_size: Optional[int] = None,
   ) -> None:
-    """The main loop for the flow processing request queue."""
+    """The main loop for the flow processing request queue.
+
+    Args:
+      handler: A callback to pass the leased requests to.
+      max_batch_size: If set, the handler is called with lists of at most that
+        many requests instead of individual requests. The number of requests
+        leased per handler thread doubles every time the queue can fill all
+        free threads and falls back to what the queue can supply otherwise.
+    """
     self.flow_processing_request_handler_pool.Start()
 
+    batch_size = 1
     while not self.flow_processing_request_handler_stop:
       thread_pool = self.flow_processing_request_handler_pool
       free_threads = thread_pool.max_threads - thread_pool.busy_threads
@@ -1526,13 +1907,27 @@ class MySQLDBFlowMixin:
         time.sleep(self._FLOW_REQUEST_POLL_TIME_SECS)
         continue
       try:
-        msgs = self._LeaseFlowProcessingRequests(free_threads)
-        if msgs:
+        limit = free_threads * batch_size
+        msgs = self._LeaseFlowProcessingRequests(limit)
+        if msgs and max_batch_size is None:
           for m in msgs:
             self.flow_processing_request_handler_pool.AddTask(
                 target=handler, args=(m,)
             )
+        elif msgs:
+          # Spread the leased requests evenly over the free threads.
+          task_size = -(-len(msgs) // free_threads)
+          for batch in collection.Batch(msgs, task_size):
+            self.flow_processing_request_handler_pool.AddTask(
+                target=handler, args=(batch,)
+            )
+
+          if len(msgs) == limit:
+            batch_size = min(batch_size * 2, max_batch_size)
+          else:
+            batch_size = task_size
         else:
+          batch_size = 1
           time.sleep(self._FLOW_REQUEST_POLL_TIME_SECS)
 
       except Exception as e:  # pylint: disable=broad-except
@@ -1545,6 +1940,22 @@ class MySQLDBFlowMixin:
       self, handler: Callable[[flows_pb2.FlowProcessingRequest], None]
   ) -> None:
     """Registers a handler to receive flow processing messages."""
+    self._StartFlowProcessingRequestHandlerThread(handler)
+
+  def RegisterFlowProcessingBatchHandler(
+      self,
+      handler: Callable[[Sequence[flows_pb2.FlowProcessingRequest]], None],
+      max_batch_size: int,
+  ) -> None:
+    """Registers a handler to receive batches of flow processing messages."""
+    self._StartFlowProcessingRequestHandlerThread(handler, max_batch_size)
+
+  def _StartFlowProcessingRequestHandlerThread(
+      self,
+      handler: Callable[..., None],
+      max_batch_size: Optional[int] = None,
+  ) -> None:
+    """Starts the flow processing request handler loop in a thread."""
     self.UnregisterFlowProcessingHandler()
 
     if handler:
@@ -1552,7 +1963,7 @@ class MySQLDBFlowMixin:
       self.flow_processing_request_handler_thread = threading.Thread(
           name="flow_processing_request_handler",
           target=self._FlowProcessingRequestHandlerLoop,
-          args=(handler,),
+          args=(handler, max_batch_size),
       )
       self.flow_processing_request_handler_thread.daemon = True
       self.flow_processing_request_handler_thread.start()
@@ -1,7 +1,14 @@
 #!/usr/bin/env python
 """The MySQL database methods for flow handling."""
 
-from collections.abc import Callable, Collection, Mapping, Sequence, Set
+from collections.abc import (
+    Callable,
+    Collection,
+    Iterable,
+    Mapping,
+    Sequence,
+    Set,
+)
 from typing import Optional
 
 import MySQLdb
@@ -9,7 +16,9 @@ from MySQLdb import cursors
 
 from google.protobuf import any_pb2
 from grr_response_core.lib import rdfvalue
+from grr_response_core.lib import utils
 from grr_response_core.lib.rdfvalues import client as rdf_client
+from grr_response_core.lib.util import random
 from grr_response_proto import flows_pb2
 from grr_response_proto import hunts_pb2
 from grr_response_proto import jobs_pb2
@@ -157,6 +166,180 @@ class MySQLDBHuntMixin(object):
     if rows_modified == 0:
       raise db.UnknownHuntError(hunt_id)
 
+  @db_utils.CallLogged
+  @db_utils.CallAccounted
+  @mysql_utils.WithTransaction()
+  def WriteHuntOutputPluginRequests(
+      self,
+      requests: Iterable[flows_pb2.HuntOutputPluginRequest],
+      cursor: Optional[cursors.Cursor] = None,
+  ) -> None:
+    """Queues hunt results to be processed by the hunt output plugins."""
+    assert cursor is not None
+
+    templates = []
+    args = []
+    for request in requests:
+      if request.HasField("delivery_time"):
+        delivery_time = mysql_utils.RDFDatetimeToTimestamp(
+            rdfvalue.RDFDatetime.FromMicrosecondsSinceEpoch(
+                request.delivery_time
+            )
+        )
+      else:
+        delivery_time = None
+
+      stored = flows_pb2.HuntOutputPluginRequest()
+      stored.CopyFrom(request)
+      stored.ClearField("delivery_time")
+      stored.ClearField("timestamp")
+      stored.ClearField("leased_until")
+      stored.ClearField("leased_by")
+
+      templates.append("(%s, %s, IFNULL(FROM_UNIXTIME(%s), NOW(6)), %s)")
+      args.extend([
+          request.request_id,
+          db_utils.HuntIDToInt(request.hunt_id),
+          delivery_time,
+          stored.SerializeToString(),
+      ])
+
+    query = (
+        "INSERT IGNORE INTO hunt_output_plugin_requests "
+        "(request_id, hunt_id, delivery_time, request) VALUES "
+    )
+    query += ", ".join(templates)
+    cursor.execute(query, args)
+
+  def _HuntOutputPluginRequestFromRow(
+      self, row
+  ) -> flows_pb2.HuntOutputPluginRequest:
+    """Generates a hunt output plugin request from a database row."""
+    request, timestamp, delivery_time, leased_until, leased_by = row
+
+    result = flows_pb2.HuntOutputPluginRequest()
+    result.ParseFromString(request)
+    result.timestamp = mysql_utils.TimestampToMicrosecondsSinceEpoch(timestamp)
+    result.delivery_time = mysql_utils.TimestampToMicrosecondsSinceEpoch(
+        delivery_time
+    )
+    if leased_until is not None:
+      result.leased_until = mysql_utils.TimestampToMicrosecondsSinceEpoch(
+          leased_until
+      )
+    if leased_by is not None:
+      result.leased_by = leased_by
+    return result
+
+  _HUNT_OUTPUT_PLUGIN_REQUESTS_COLUMNS = (
+      "request, UNIX_TIMESTAMP(timestamp), UNIX_TIMESTAMP(delivery_time), "
+      "UNIX_TIMESTAMP(leased_until), leased_by"
+  )
+
+  @db_utils.CallLogged
+  @db_utils.CallAccounted
+  @mysql_utils.WithTransaction(readonly=True)
+  def ReadHuntOutputPluginRequests(
+      self,
+      cursor: Optional[cursors.Cursor] = None,
+  ) -> Sequence[flows_pb2.HuntOutputPluginRequest]:
+    """Reads all queued hunt output plugin requests."""
+    assert cursor is not None
+
+    query = (
+        f"SELECT {self._HUNT_OUTPUT_PLUGIN_REQUESTS_COLUMNS} "
+        "FROM hunt_output_plugin_requests "
+        "ORDER BY timestamp, request_id"
+    )
+    cursor.execute(query)
+    return [self._HuntOutputPluginRequestFromRow(r) for r in cursor.fetchall()]
+
+  @db_utils.CallLogged
+  @db_utils.CallAccounted
+  @mysql_utils.WithTransaction()
+  def LeaseHuntOutputPluginRequests(
+      self,
+      lease_time: rdfvalue.Duration,
+      limit: int,
+      cursor: Optional[cursors.Cursor] = None,
+  ) -> Sequence[flows_pb2.HuntOutputPluginRequest]:
+    """Leases queued hunt output plugin requests of a single hunt."""
+    assert cursor is not None
+
+    now = rdfvalue.RDFDatetime.Now()
+    now_str = mysql_utils.RDFDatetimeToTimestamp(now)
+    expiry_str = mysql_utils.RDFDatetimeToTimestamp(now + lease_time)
+
+    available = """
+      delivery_time <= FROM_UNIXTIME(%(now)s)
+      AND (leased_until IS NULL OR leased_until < FROM_UNIXTIME(%(now)s))
+    """
+
+    query = f"""
+      SELECT hunt_id
+        FROM hunt_output_plugin_requests
+       WHERE {available}
+    ORDER BY timestamp
+       LIMIT 1
+    """
+    cursor.execute(query, {"now": now_str})
+    row = cursor.fetchone()
+    if row is None:
+      return []
+    (hunt_id_int,) = row
+
+    # Several threads of the same process lease requests concurrently, so the
+    # process id alone doesn't identify the leases of this call.
+    id_str = "%s:%d" % (utils.ProcessIdString(), random.UInt16())
+    args = {
+        "now": now_str,
+        "expiry": expiry_str,
+        "leased_by": id_str,
+        "hunt_id": hunt_id_int,
+        "limit": limit,
+    }
+
+    query = f"""
+      UPDATE hunt_output_plugin_requests
+         SET leased_until = FROM_UNIXTIME(%(expiry)s),
+             leased_by = %(leased_by)s
+       WHERE hunt_id = %(hunt_id)s
+         AND {available}
+    ORDER BY timestamp
+       LIMIT %(limit)s
+    """
+    updated = cursor.execute(query, args)
+    if updated == 0:
+      return []
+
+    query = f"""
+      SELECT {self._HUNT_OUTPUT_PLUGIN_REQUESTS_COLUMNS}
+        FROM hunt_output_plugin_requests
+       WHERE hunt_id = %(hunt_id)s
+         AND leased_by = %(leased_by)s
+         AND leased_until = FROM_UNIXTIME(%(expiry)s)
+    ORDER BY timestamp, request_id
+    """
+    cursor.execute(query, args)
+    return [self._HuntOutputPluginRequestFromRow(r) for r in cursor.fetchall()]
+
+  @db_utils.CallLogged
+  @db_utils.CallAccounted
+  @mysql_utils.WithTransaction()
+  def DeleteHuntOutputPluginRequests(
+      self,
+      requests: Iterable[flows_pb2.HuntOutputPluginRequest],
+      cursor: Optional[cursors.Cursor] = None,
+  ) -> None:
+    """Deletes hunt output plugin requests once they are processed."""
+    assert cursor is not None
+
+    request_ids = [request.request_id for request in requests]
+    query = (
+        "DELETE FROM hunt_output_plugin_requests WHERE request_id IN ({})"
+    ).format(", ".join(["%s"] * len(request_ids)))
+    cursor.execute(query, request_ids)
+
   @db_utils.CallLogged
   @db_utils.CallAccounted
   @mysql_utils.WithTransaction()
@@ -177,6 +360,12 @@ class MySQLDBHuntMixin(object):
     query = "DELETE FROM hunt_output_plugins_states WHERE hunt_id = %s"
     cursor.execute(query, [hunt_id_int])
 
+    query = "DELETE FROM hunt_output_plugin_requests WHERE hunt_id = %s"
+    cursor.execute(query, [hunt_id_int])
+
+    query = "DELETE FROM hunt_counters WHERE hunt_id = %s"
+    cursor.execute(query, [hunt_id_int])
+
     query = """
     DELETE
       FROM approval_request
@@ -987,20 +1176,25 @@ class MySQLDBHuntMixin(object):
 
     hunt_ids_ints = [db_utils.HuntIDToInt(hunt_id) for hunt_id in hunt_ids]
 
+    # Counters are maintained by triggers on the `flows` table (see the
+    # 0032.sql migration), so only a handful of shard rows is read per hunt.
     query = """
-      SELECT parent_hunt_id, flow_state, COUNT(*)
-          FROM flows
-          FORCE INDEX(flows_by_hunt)
-          WHERE parent_hunt_id IN %(hunt_ids)s
-            AND parent_flow_id IS NULL
-          GROUP BY parent_hunt_id, flow_state
+      SELECT hunt_id,
+             SUM(num_clients),
+             SUM(num_successful_clients),
+             SUM(num_failed_clients),
+             SUM(num_clients_with_results),
+             SUM(num_crashed_clients),
+             SUM(num_running_clients),
+             SUM(num_results),
+             SUM(total_cpu_micros),
+             SUM(total_network_bytes_sent)
+        FROM hunt_counters
+       WHERE hunt_id IN %(hunt_ids)s
+       GROUP BY hunt_id
     """
     cursor.execute(query, {"hunt_ids": tuple(hunt_ids_ints)})
 
-    counts_by_state_per_hunt = dict.fromkeys(hunt_ids_ints, {})
-    for hunt_id, state, count in cursor.fetchall():
-      counts_by_state_per_hunt[hunt_id][state] = count
-
     hunt_counters = dict.fromkeys(
         hunt_ids,
         db.HuntCounters(
@@ -1016,58 +1210,80 @@ class MySQLDBHuntMixin(object):
         ),
     )
 
-    query = """
-        SELECT
-          parent_hunt_id,
-          SUM(user_cpu_time_used_micros + system_cpu_time_used_micros),
-          SUM(network_bytes_sent),
-          SUM(num_replies_sent),
-          COUNT(IF(num_replies_sent > 0, client_id, NULL))
-        FROM flows
-        FORCE INDEX(flows_by_hunt)
-        WHERE parent_hunt_id IN %(hunt_ids)s
-          AND parent_flow_id IS NULL
-        GROUP BY parent_hunt_id
-    """
-    cursor.execute(query, {"hunt_ids": tuple(hunt_ids_ints)})
-
     for (
         hunt_id,
-        total_cpu_seconds,
-        total_network_bytes_sent,
-        num_results,
+        num_clients,
+        num_successful_clients,
+        num_failed_clients,
         num_clients_with_results,
+        num_crashed_clients,
+        num_running_clients,
+        num_results,
+        total_cpu_micros,
+        total_network_bytes_sent,
     ) in cursor.fetchall():
-      counts_by_state = counts_by_state_per_hunt[hunt_id]
-      num_successful_clients = counts_by_state.get(
-          int(flows_pb2.Flow.FlowState.FINISHED), 0
-      )
-      num_failed_clients = counts_by_state.get(
-          int(flows_pb2.Flow.FlowState.ERROR), 0
-      )
-      num_crashed_clients = counts_by_state.get(
-          int(flows_pb2.Flow.FlowState.CRASHED), 0
-      )
-      num_running_clients = counts_by_state.get(
-          int(flows_pb2.Flow.FlowState.RUNNING), 0
-      )
-      num_clients = sum(counts_by_state_per_hunt[hunt_id].values())
-
       hunt_counters[db_utils.IntToHuntID(hunt_id)] = db.HuntCounters(
-          num_clients=num_clients,
-          num_successful_clients=num_successful_clients,
-          num_failed_clients=num_failed_clients,
-          num_clients_with_results=num_clients_with_results,
-          num_crashed_clients=num_crashed_clients,
-          num_running_clients=num_running_clients,
-          num_results=int(num_results or 0),
-          total_cpu_seconds=db_utils.MicrosToSeconds(
-              int(total_cpu_seconds or 0)
-          ),
-          total_network_bytes_sent=int(total_network_bytes_sent or 0),
+          num_clients=int(num_clients),
+          num_successful_clients=int(num_successful_clients),
+          num_failed_clients=int(num_failed_clients),
+          num_clients_with_results=int(num_clients_with_results),
+          num_crashed_clients=int(num_crashed_clients),
+          num_running_clients=int(num_running_clients),
+          num_results=int(num_results),
+          total_cpu_seconds=db_utils.MicrosToSeconds(int(total_cpu_micros)),
+          total_network_bytes_sent=int(total_network_bytes_sent),
       )
     return hunt_counters
 
+  @db_utils.CallLogged
+  @db_utils.CallAccounted
+  @mysql_utils.WithTransaction()
+  def ReconcileHuntCounters(
+      self,
+      hunt_id: str,
+      cursor: Optional[cursors.Cursor] = None,
+  ) -> None:
+    """Recomputes counters of a given hunt from its flows."""
+    assert cursor is not None
+    hunt_id_int = db_utils.HuntIDToInt(hunt_id)
+
+    cursor.execute(
+        "DELETE FROM hunt_counters WHERE hunt_id = %s", [hunt_id_int]
+    )
+
+    # Shards have to be assigned the same way as in the `flows` triggers.
+    query = """
+      INSERT INTO hunt_counters(
+          hunt_id, shard,
+          num_clients, num_successful_clients, num_failed_clients,
+          num_crashed_clients, num_running_clients, num_clients_with_results,
+          num_results, total_cpu_micros, total_network_bytes_sent)
+      SELECT parent_hunt_id, MOD(client_id, 16),
+             COUNT(*),
+             SUM(IF(flow_state = %(finished)s, 1, 0)),
+             SUM(IF(flow_state = %(error)s, 1, 0)),
+             SUM(IF(flow_state = %(crashed)s, 1, 0)),
+             SUM(IF(flow_state = %(running)s, 1, 0)),
+             SUM(IF(num_replies_sent > 0, 1, 0)),
+             SUM(IFNULL(num_replies_sent, 0)),
+             SUM(IFNULL(user_cpu_time_used_micros, 0) +
+                 IFNULL(system_cpu_time_used_micros, 0)),
+             SUM(IFNULL(network_bytes_sent, 0))
+        FROM flows
+        FORCE INDEX(flows_by_hunt)
+       WHERE parent_hunt_id = %(hunt_id)s
+         AND parent_flow_id IS NULL
+       GROUP BY parent_hunt_id, MOD(client_id, 16)
+    """
+    args = {
+        "hunt_id": hunt_id_int,
+        "finished": int(flows_pb2.Flow.FlowState.FINISHED),
+        "error": int(flows_pb2.Flow.FlowState.ERROR),
+        "crashed": int(flows_pb2.Flow.FlowState.CRASHED),
+        "running": int(flows_pb2.Flow.FlowState.RUNNING),
+    }
+    cursor.execute(query, args)
+
   def _BinsToQuery(self, bins: list[int], column_name: str) -> str:
     """Builds an SQL query part to fetch counts corresponding to given bins."""
     result = []
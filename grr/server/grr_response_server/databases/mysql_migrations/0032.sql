@@ -0,0 +1,188 @@
+-- Materialized per-hunt counters, so that reading hunt counters doesn't
+-- require aggregating all the hunt flows.
+--
+-- Counters of every hunt are split between several rows (shards, selected by
+-- the client id) to reduce lock contention when flows of many clients are
+-- updated concurrently. Readers sum the shards up.
+--
+-- Counter columns are signed, since the triggers below apply (possibly
+-- negative) deltas to them.
+CREATE TABLE hunt_counters(
+    hunt_id BIGINT UNSIGNED NOT NULL,
+    shard INT UNSIGNED NOT NULL,
+    num_clients BIGINT NOT NULL DEFAULT 0,
+    num_successful_clients BIGINT NOT NULL DEFAULT 0,
+    num_failed_clients BIGINT NOT NULL DEFAULT 0,
+    num_crashed_clients BIGINT NOT NULL DEFAULT 0,
+    num_running_clients BIGINT NOT NULL DEFAULT 0,
+    num_clients_with_results BIGINT NOT NULL DEFAULT 0,
+    num_results BIGINT NOT NULL DEFAULT 0,
+    total_cpu_micros BIGINT NOT NULL DEFAULT 0,
+    total_network_bytes_sent BIGINT NOT NULL DEFAULT 0,
+    PRIMARY KEY (hunt_id, shard)
+);
+
+-- Backfill the counters of existing hunts.
+INSERT INTO hunt_counters(
+    hunt_id, shard,
+    num_clients, num_successful_clients, num_failed_clients,
+    num_crashed_clients, num_running_clients, num_clients_with_results,
+    num_results, total_cpu_micros, total_network_bytes_sent)
+SELECT
+    parent_hunt_id, MOD(client_id, 16),
+    COUNT(*),
+    SUM(IF(flow_state = 2, 1, 0)),
+    SUM(IF(flow_state = 3, 1, 0)),
+    SUM(IF(flow_state = 4, 1, 0)),
+    SUM(IF(flow_state = 1, 1, 0)),
+    SUM(IF(num_replies_sent > 0, 1, 0)),
+    SUM(IFNULL(num_replies_sent, 0)),
+    SUM(IFNULL(user_cpu_time_used_micros, 0) +
+        IFNULL(system_cpu_time_used_micros, 0)),
+    SUM(IFNULL(network_bytes_sent, 0))
+FROM flows
+WHERE parent_hunt_id IS NOT NULL AND parent_flow_id IS NULL
+GROUP BY parent_hunt_id, MOD(client_id, 16);
+
+-- Flow states used below are the values of `Flow.FlowState`:
+-- RUNNING = 1, FINISHED = 2, ERROR = 3, CRASHED = 4.
+--
+-- Note: triggers are not activated by foreign key actions, so flows that are
+-- deleted through a cascade (e.g. when a client is deleted) have to be deleted
+-- explicitly first.
+
+-- Add the contribution of a new top-level hunt flow.
+CREATE
+  TRIGGER
+    hunt_counters_flows_insert
+      AFTER INSERT
+ON
+  flows
+    FOR EACH ROW
+INSERT INTO hunt_counters(
+    hunt_id, shard,
+    num_clients, num_successful_clients, num_failed_clients,
+    num_crashed_clients, num_running_clients, num_clients_with_results,
+    num_results, total_cpu_micros, total_network_bytes_sent)
+SELECT
+    NEW.parent_hunt_id, MOD(NEW.client_id, 16),
+    1,
+    IF(NEW.flow_state = 2, 1, 0),
+    IF(NEW.flow_state = 3, 1, 0),
+    IF(NEW.flow_state = 4, 1, 0),
+    IF(NEW.flow_state = 1, 1, 0),
+    IF(NEW.num_replies_sent > 0, 1, 0),
+    CAST(IFNULL(NEW.num_replies_sent, 0) AS SIGNED),
+    CAST(IFNULL(NEW.user_cpu_time_used_micros, 0) AS SIGNED) +
+    CAST(IFNULL(NEW.system_cpu_time_used_micros, 0) AS SIGNED),
+    CAST(IFNULL(NEW.network_bytes_sent, 0) AS SIGNED)
+FROM DUAL
+WHERE NEW.parent_hunt_id IS NOT NULL AND NEW.parent_flow_id IS NULL
+ON DUPLICATE KEY UPDATE
+  num_clients = num_clients + VALUES(num_clients),
+  num_successful_clients =
+    num_successful_clients + VALUES(num_successful_clients),
+  num_failed_clients = num_failed_clients + VALUES(num_failed_clients),
+  num_crashed_clients = num_crashed_clients + VALUES(num_crashed_clients),
+  num_running_clients = num_running_clients + VALUES(num_running_clients),
+  num_clients_with_results =
+    num_clients_with_results + VALUES(num_clients_with_results),
+  num_results = num_results + VALUES(num_results),
+  total_cpu_micros = total_cpu_micros + VALUES(total_cpu_micros),
+  total_network_bytes_sent =
+    total_network_bytes_sent + VALUES(total_network_bytes_sent);
+
+-- Apply the difference between the old and the new version of an updated
+-- top-level hunt flow. Hunt, parent flow and client ids of a flow never change.
+-- Updates that don't touch any of the counted columns (e.g. flow leasing) are
+-- skipped, so that they don't contend for the counter rows.
+CREATE
+  TRIGGER
+    hunt_counters_flows_update
+      AFTER UPDATE
+ON
+  flows
+    FOR EACH ROW
+INSERT INTO hunt_counters(
+    hunt_id, shard,
+    num_clients, num_successful_clients, num_failed_clients,
+    num_crashed_clients, num_running_clients, num_clients_with_results,
+    num_results, total_cpu_micros, total_network_bytes_sent)
+SELECT
+    NEW.parent_hunt_id, MOD(NEW.client_id, 16),
+    0,
+    IF(NEW.flow_state = 2, 1, 0) - IF(OLD.flow_state = 2, 1, 0),
+    IF(NEW.flow_state = 3, 1, 0) - IF(OLD.flow_state = 3, 1, 0),
+    IF(NEW.flow_state = 4, 1, 0) - IF(OLD.flow_state = 4, 1, 0),
+    IF(NEW.flow_state = 1, 1, 0) - IF(OLD.flow_state = 1, 1, 0),
+    IF(NEW.num_replies_sent > 0, 1, 0) - IF(OLD.num_replies_sent > 0, 1, 0),
+    CAST(IFNULL(NEW.num_replies_sent, 0) AS SIGNED) -
+    CAST(IFNULL(OLD.num_replies_sent, 0) AS SIGNED),
+    CAST(IFNULL(NEW.user_cpu_time_used_micros, 0) AS SIGNED) +
+    CAST(IFNULL(NEW.system_cpu_time_used_micros, 0) AS SIGNED) -
+    CAST(IFNULL(OLD.user_cpu_time_used_micros, 0) AS SIGNED) -
+    CAST(IFNULL(OLD.system_cpu_time_used_micros, 0) AS SIGNED),
+    CAST(IFNULL(NEW.network_bytes_sent, 0) AS SIGNED) -
+    CAST(IFNULL(OLD.network_bytes_sent, 0) AS SIGNED)
+FROM DUAL
+WHERE NEW.parent_hunt_id IS NOT NULL AND NEW.parent_flow_id IS NULL
+  AND NOT (
+    NEW.flow_state <=> OLD.flow_state
+    AND NEW.num_replies_sent <=> OLD.num_replies_sent
+    AND NEW.user_cpu_time_used_micros <=> OLD.user_cpu_time_used_micros
+    AND NEW.system_cpu_time_used_micros <=> OLD.system_cpu_time_used_micros
+    AND NEW.network_bytes_sent <=> OLD.network_bytes_sent)
+ON DUPLICATE KEY UPDATE
+  num_clients = num_clients + VALUES(num_clients),
+  num_successful_clients =
+    num_successful_clients + VALUES(num_successful_clients),
+  num_failed_clients = num_failed_clients + VALUES(num_failed_clients),
+  num_crashed_clients = num_crashed_clients + VALUES(num_crashed_clients),
+  num_running_clients = num_running_clients + VALUES(num_running_clients),
+  num_clients_with_results =
+    num_clients_with_results + VALUES(num_clients_with_results),
+  num_results = num_results + VALUES(num_results),
+  total_cpu_micros = total_cpu_micros + VALUES(total_cpu_micros),
+  total_network_bytes_sent =
+    total_network_bytes_sent + VALUES(total_network_bytes_sent);
+
+-- Subtract the contribution of a deleted top-level hunt flow.
+CREATE
+  TRIGGER
+    hunt_counters_flows_delete
+      AFTER DELETE
+ON
+  flows
+    FOR EACH ROW
+INSERT INTO hunt_counters(
+    hunt_id, shard,
+    num_clients, num_successful_clients, num_failed_clients,
+    num_crashed_clients, num_running_clients, num_clients_with_results,
+    num_results, total_cpu_micros, total_network_bytes_sent)
+SELECT
+    OLD.parent_hunt_id, MOD(OLD.client_id, 16),
+    -1,
+    -IF(OLD.flow_state = 2, 1, 0),
+    -IF(OLD.flow_state = 3, 1, 0),
+    -IF(OLD.flow_state = 4, 1, 0),
+    -IF(OLD.flow_state = 1, 1, 0),
+    -IF(OLD.num_replies_sent > 0, 1, 0),
+    -CAST(IFNULL(OLD.num_replies_sent, 0) AS SIGNED),
+    -CAST(IFNULL(OLD.user_cpu_time_used_micros, 0) AS SIGNED) -
+    CAST(IFNULL(OLD.system_cpu_time_used_micros, 0) AS SIGNED),
+    -CAST(IFNULL(OLD.network_bytes_sent, 0) AS SIGNED)
+FROM DUAL
+WHERE OLD.parent_hunt_id IS NOT NULL AND OLD.parent_flow_id IS NULL
+ON DUPLICATE KEY UPDATE
+  num_clients = num_clients + VALUES(num_clients),
+  num_successful_clients =
+    num_successful_clients + VALUES(num_successful_clients),
+  num_failed_clients = num_failed_clients + VALUES(num_failed_clients),
+  num_crashed_clients = num_crashed_clients + VALUES(num_crashed_clients),
+  num_running_clients = num_running_clients + VALUES(num_running_clients),
+  num_clients_with_results =
+    num_clients_with_results + VALUES(num_clients_with_results),
+  num_results = num_results + VALUES(num_results),
+  total_cpu_micros = total_cpu_micros + VALUES(total_cpu_micros),
+  total_network_bytes_sent =
+    total_network_bytes_sent + VALUES(total_network_bytes_sent);
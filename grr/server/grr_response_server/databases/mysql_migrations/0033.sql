@@ -0,0 +1,4 @@
+-- Index used to list flows of a client ordered by their creation time (rows
+-- with equal timestamps are ordered by flow_id, which is part of the primary
+-- key and thus implicitly appended to the index).
+CREATE INDEX flows_by_client_id_timestamp ON flows(client_id, timestamp);
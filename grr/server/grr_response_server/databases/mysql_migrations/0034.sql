@@ -0,0 +1,19 @@
+-- Queue of hunt results waiting to be processed by the hunt output plugins.
+-- Requests are only deleted once they have been processed, so that results are
+-- not lost if processing fails (expired leases make them available again).
+CREATE TABLE hunt_output_plugin_requests(
+    request_id BIGINT UNSIGNED NOT NULL,
+    hunt_id BIGINT UNSIGNED NOT NULL,
+    timestamp TIMESTAMP(6) NOT NULL DEFAULT NOW(6),
+    delivery_time TIMESTAMP(6) NOT NULL DEFAULT NOW(6),
+    request MEDIUMBLOB NOT NULL,
+    leased_until TIMESTAMP(6) NULL DEFAULT NULL,
+    leased_by VARCHAR(128),
+    PRIMARY KEY (request_id)
+);
+
+CREATE INDEX hunt_output_plugin_requests_by_timestamp
+    ON hunt_output_plugin_requests(timestamp);
+
+CREATE INDEX hunt_output_plugin_requests_by_hunt_id_timestamp
+    ON hunt_output_plugin_requests(hunt_id, timestamp);
@@ -0,0 +1,3 @@
+-- Index used to list child flows of given flows of a client.
+CREATE INDEX flows_by_client_id_parent_flow_id
+    ON flows(client_id, parent_flow_id);
@@ -8,15 +8,23 @@ ExportConverters convert various complex RDFValues to simple RDFValues
 easily be written to a relational database or just to a set of files.
 """
 
+import atexit
+import collections
+from concurrent import futures
 import logging
-from typing import Iterable, Iterator, Optional
+import multiprocessing
+import threading
+from typing import Collection, Iterable, Iterator, Optional
 
 from google.protobuf import any_pb2
 from google.protobuf import message
+from grr_response_core import config
 from grr_response_core.lib import rdfvalue
+from grr_response_core.lib import utils
 from grr_response_core.lib.rdfvalues import client as rdf_client
 from grr_response_core.lib.util import collection
 from grr_response_core.lib.util import text
+from grr_response_core.stats import metrics
 from grr_response_proto import export_pb2
 from grr_response_proto import flows_pb2
 from grr_response_proto import objects_pb2
@@ -24,6 +32,11 @@ from grr_response_server import data_store
 from grr_response_server import export_converters_registry
 from grr_response_server.export_converters import base
 
+EXPORTED_METADATA_CACHE_HITS = metrics.Counter("exported_metadata_cache_hits")
+EXPORTED_METADATA_CACHE_MISSES = metrics.Counter(
+    "exported_metadata_cache_misses"
+)
+
 
 class Error(Exception):
   """Errors generated by export converters."""
@@ -229,11 +242,202 @@ def ConvertValuesWithMetadata(metadata_value_pairs, options=None):
     raise NoConverterFound(no_converter_found_error)
 
 
+_EXPORTED_METADATA_CACHE: Optional[utils.AgeBasedCache] = None
+_EXPORTED_METADATA_CACHE_LOCK = threading.Lock()
+
+
+def _GetExportedMetadataCache() -> Optional[utils.AgeBasedCache]:
+  """Returns the process-wide ExportedMetadata cache, if it is enabled."""
+  global _EXPORTED_METADATA_CACHE
+
+  max_size = config.CONFIG["AdminUI.exported_metadata_cache_size"]
+  if max_size <= 0:
+    return None
+
+  with _EXPORTED_METADATA_CACHE_LOCK:
+    if _EXPORTED_METADATA_CACHE is None:
+      max_age = config.CONFIG["AdminUI.exported_metadata_cache_max_age"]
+      _EXPORTED_METADATA_CACHE = utils.AgeBasedCache(
+          max_size=max_size, max_age=max_age.ToInt(rdfvalue.SECONDS)
+      )
+
+    return _EXPORTED_METADATA_CACHE
+
+
+def _ReadExportedMetadataProtos(
+    client_ids: Collection[str],
+) -> dict[str, export_pb2.ExportedMetadata]:
+  """Builds ExportedMetadata of given clients, caching it across exports.
+
+  The cache is shared by all exports in the process, so returned protos are
+  always copies that the caller is free to modify.
+
+  Args:
+    client_ids: Ids of clients to build the metadata for.
+
+  Returns:
+    A dict mapping client ids to ExportedMetadata. Clients that are not in the
+    database are omitted.
+  """
+  cache = _GetExportedMetadataCache()
+
+  result: dict[str, export_pb2.ExportedMetadata] = {}
+  client_ids_to_read = []
+  for client_id in client_ids:
+    if cache is not None:
+      try:
+        cached = cache.Get(client_id)
+      except KeyError:
+        EXPORTED_METADATA_CACHE_MISSES.Increment()
+      else:
+        EXPORTED_METADATA_CACHE_HITS.Increment()
+        result[client_id] = export_pb2.ExportedMetadata()
+        result[client_id].CopyFrom(cached)
+        continue
+
+    client_ids_to_read.append(client_id)
+
+  if not client_ids_to_read:
+    return result
+
+  infos = data_store.REL_DB.MultiReadClientFullInfo(client_ids_to_read)
+  for client_id, info in infos.items():
+    metadata = GetExportedMetadataProto(client_id, info)
+    if cache is not None:
+      cached = export_pb2.ExportedMetadata()
+      cached.CopyFrom(metadata)
+      cache.Put(client_id, cached)
+    result[client_id] = metadata
+
+  return result
+
+
+def _ConvertSerializedBatch(
+    converter_cls: type[base.ExportConverterProto],
+    serialized_options: bytes,
+    serialized_metadatas: list[bytes],
+    serialized_payloads: list[bytes],
+) -> list[tuple[type[message.Message], bytes]]:
+  """Converts a batch of serialized values with a given converter.
+
+  Note that this function is executed in conversion processes.
+
+  Args:
+    converter_cls: Export converter class to convert the values with.
+    serialized_options: Serialized ExportOptions proto.
+    serialized_metadatas: Serialized ExportedMetadata protos of the values.
+    serialized_payloads: Serialized values of the converter's input type.
+
+  Returns:
+    Pairs of classes and serialized converted values.
+  """
+  options = export_pb2.ExportOptions.FromString(serialized_options)
+  converter = converter_cls(options=options)
+  metadatas = map(export_pb2.ExportedMetadata.FromString, serialized_metadatas)
+  payloads = map(converter.input_proto_type.FromString, serialized_payloads)
+
+  return [
+      (converted.__class__, converted.SerializeToString())
+      for converted in converter.BatchConvert(zip(metadatas, payloads))
+  ]
+
+
+class ConversionPool:
+  """A pool of workers converting flow results to exported values."""
+
+  def __init__(
+      self,
+      executor: futures.Executor,
+      max_pending_batches: int,
+      batch_size: int,
+  ) -> None:
+    """Initializes the pool.
+
+    Args:
+      executor: An executor to run conversions on. Values are passed to it
+        serialized, so it can be a process pool.
+      max_pending_batches: Maximum number of batches submitted for conversion
+        and not yet consumed by the caller.
+      batch_size: Number of flow results converted by a worker at once.
+    """
+    self._executor = executor
+    self.max_pending_batches = max_pending_batches
+    self.batch_size = batch_size
+
+  def Submit(
+      self,
+      converter_cls: type[base.ExportConverterProto],
+      options: export_pb2.ExportOptions,
+      metadatas: Iterable[export_pb2.ExportedMetadata],
+      payloads: Iterable[any_pb2.Any],
+  ) -> "futures.Future[list[tuple[type[message.Message], bytes]]]":
+    """Submits a batch of values for conversion."""
+    return self._executor.submit(
+        _ConvertSerializedBatch,
+        converter_cls,
+        options.SerializeToString(),
+        [metadata.SerializeToString() for metadata in metadatas],
+        [payload.value for payload in payloads],
+    )
+
+  def Shutdown(self) -> None:
+    """Cancels pending conversions and waits for the workers to exit."""
+    self._executor.shutdown(wait=True, cancel_futures=True)
+
+  def __enter__(self) -> "ConversionPool":
+    return self
+
+  def __exit__(self, exc_type, exc_value, traceback) -> None:
+    self.Shutdown()
+
+
+_CONVERSION_POOL: Optional[ConversionPool] = None
+_CONVERSION_POOL_LOCK = threading.Lock()
+
+
+def GetConversionPool() -> Optional[ConversionPool]:
+  """Returns the export conversion process pool, if it is enabled."""
+  global _CONVERSION_POOL
+
+  num_processes = config.CONFIG["AdminUI.export_conversion_processes"]
+  if num_processes <= 0:
+    return None
+
+  with _CONVERSION_POOL_LOCK:
+    if _CONVERSION_POOL is None:
+      executor = futures.ProcessPoolExecutor(
+          max_workers=num_processes,
+          # Forking a process that runs server threads is not safe.
+          mp_context=multiprocessing.get_context("spawn"),
+      )
+      _CONVERSION_POOL = ConversionPool(
+          executor,
+          # Keep every worker busy while the caller consumes results.
+          max_pending_batches=2 * num_processes,
+          batch_size=config.CONFIG["AdminUI.export_conversion_batch_size"],
+      )
+      # Worker processes have to be stopped before the interpreter exits.
+      atexit.register(ShutdownConversionPool)
+
+    return _CONVERSION_POOL
+
+
+def ShutdownConversionPool() -> None:
+  """Shuts the export conversion process pool down, if it was started."""
+  global _CONVERSION_POOL
+
+  with _CONVERSION_POOL_LOCK:
+    if _CONVERSION_POOL is not None:
+      _CONVERSION_POOL.Shutdown()
+      _CONVERSION_POOL = None
+
+
 def FetchMetadataAndConvertFlowResults(
     source_urn: rdfvalue.RDFURN,
     options: export_pb2.ExportOptions,
     flow_results: Iterable[flows_pb2.FlowResult],
     cached_metadata: Optional[dict[str, export_pb2.ExportedMetadata]] = None,
+    pool: Optional[ConversionPool] = None,
 ) -> Iterator[message.Message]:
   """Fetches client metadata and converts FlowResults to export-friendly protos.
 
@@ -242,6 +446,8 @@ def FetchMetadataAndConvertFlowResults(
     options: ExportOptions instance.
     flow_results: Iterable of FlowResult protos.
     cached_metadata: Optional dict for caching metadata.
+    pool: Optional pool to convert the values on. Converted messages are
+      yielded in the same order as without the pool.
 
   Yields:
     Converted messages.
@@ -265,16 +471,9 @@ def FetchMetadataAndConvertFlowResults(
         metadata_to_fetch.add(client_id)
 
     if metadata_to_fetch:
-      # Copy `client_ids` to avoid mutating `metadata_to_fetch`.
-      unique_client_ids = set(metadata_to_fetch)
-      fetched_infos = data_store.REL_DB.MultiReadClientFullInfo(
-          unique_client_ids
-      )
-
-      fetched_exported_metadatas = [
-          GetExportedMetadataProto(client_id, info)
-          for client_id, info in fetched_infos.items()
-      ]
+      fetched_exported_metadatas = _ReadExportedMetadataProtos(
+          metadata_to_fetch
+      ).values()
 
       timestamp_to_add = rdfvalue.RDFDatetime.Now().AsMicrosecondsSinceEpoch()
       annotations_to_add = ",".join(options.annotations)
@@ -303,47 +502,85 @@ def FetchMetadataAndConvertFlowResults(
 
     return [result[client_id] for client_id in client_ids]
 
-  def _TryUnpackingPayload(
+  def _CheckPayloadType(
       payload: any_pb2.Any, proto_type: type[message.Message]
-  ) -> message.Message:
-    """Tries to unpack payload into a proto of the given type."""
-    res = proto_type()
+  ) -> None:
+    """Checks that payload can be unpacked into a proto of the given type."""
     if not payload.Is(proto_type.DESCRIPTOR):
       raise TypeError(
           "There's a mismatch between the flow result payload type"
           f" {payload.type_url} and the selected export converter's input type:"
           f" {proto_type.DESCRIPTOR.full_name}"
       )
+
+  def _TryUnpackingPayload(
+      payload: any_pb2.Any, proto_type: type[message.Message]
+  ) -> message.Message:
+    """Tries to unpack payload into a proto of the given type."""
+    res = proto_type()
+    _CheckPayloadType(payload, proto_type)
     res.ParseFromString(payload.value)
     return res
 
-  for batch in collection.Batch(flow_results, 5000):
-    # Group results by type URL
-    results_by_type = collection.Group(batch, lambda r: r.payload.type_url)
-
-    for type_url, results in results_by_type.items():
-      converter_classes = export_converters_registry.GetConvertersByTypeUrl(
-          type_url
-      )
-      if not converter_classes:
-        logging.warning("No export converters found for type url: %s", type_url)
-        continue
-
-      for converter_cls in converter_classes:
-        converter = converter_cls(options=options)
-        unpacked_payloads = [
-            _TryUnpackingPayload(result.payload, converter.input_proto_type)
-            for result in results
-        ]
-        current_metadata_items = _GetMetadataForClients(
-            [result.client_id for result in results]
-        )
-        batch_with_metadata = zip(
-            current_metadata_items,
-            unpacked_payloads,
+  def _BatchesToConvert() -> Iterator[
+      tuple[
+          type[base.ExportConverterProto],
+          list[export_pb2.ExportedMetadata],
+          list[any_pb2.Any],
+      ]
+  ]:
+    """Yields batches of results with metadata for every converter."""
+    batch_size = pool.batch_size if pool is not None else 5000
+    for batch in collection.Batch(flow_results, batch_size):
+      # Group results by type URL
+      results_by_type = collection.Group(batch, lambda r: r.payload.type_url)
+
+      for type_url, results in results_by_type.items():
+        converter_classes = export_converters_registry.GetConvertersByTypeUrl(
+            type_url
         )
-
-        yield from converter.BatchConvert(batch_with_metadata)
+        if not converter_classes:
+          logging.warning(
+              "No export converters found for type url: %s", type_url
+          )
+          continue
+
+        for converter_cls in converter_classes:
+          current_metadata_items = _GetMetadataForClients(
+              [result.client_id for result in results]
+          )
+          payloads = [result.payload for result in results]
+          yield converter_cls, current_metadata_items, payloads
+
+  if pool is None:
+    for converter_cls, metadatas, payloads in _BatchesToConvert():
+      converter = converter_cls(options=options)
+      unpacked_payloads = [
+          _TryUnpackingPayload(payload, converter.input_proto_type)
+          for payload in payloads
+      ]
+      yield from converter.BatchConvert(zip(metadatas, unpacked_payloads))
+    return
+
+  pending = collections.deque()
+  try:
+    for converter_cls, metadatas, payloads in _BatchesToConvert():
+      for payload in payloads:
+        _CheckPayloadType(payload, converter_cls.input_proto_type)
+
+      # Block on the oldest batch if too many are in flight.
+      while len(pending) >= pool.max_pending_batches:
+        for cls, serialized in pending.popleft().result():
+          yield cls.FromString(serialized)
+
+      pending.append(pool.Submit(converter_cls, options, metadatas, payloads))
+
+    while pending:
+      for cls, serialized in pending.popleft().result():
+        yield cls.FromString(serialized)
+  finally:
+    for future in pending:
+      future.cancel()
 
 
 def ConvertValues(default_metadata, values, options=None):
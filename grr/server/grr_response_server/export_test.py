@@ -1,5 +1,8 @@
 #!/usr/bin/env python
 """Tests for export converters."""
+import atexit
+from concurrent import futures
+import multiprocessing
 from typing import Optional
 from unittest import mock
 
@@ -15,6 +18,7 @@ from grr_response_proto import jobs_pb2
 from grr_response_proto import objects_pb2
 from grr_response_server import data_store
 from grr_response_server import export
+from grr_response_server import export_converters_registry
 from grr_response_server.databases import db as abstract_db
 from grr_response_server.databases import db_test_utils
 from grr_response_server.export_converters import base
@@ -744,6 +748,193 @@ class FetchMetadataAndConvertFlowResultsTest(export_test_lib.ExportTestBase):
       self.assertLen(results2, 1)
       mock_read.assert_not_called()
 
+  @export_test_lib.WithExportConverterProto(
+      proto_wrappers.StringValueToExportedStringConverter
+  )
+  def testExportedMetadataCacheIsSharedAcrossExports(self):
+    client_id = self.SetupClient(0)
+    flow_result = self._GetPackedFlowResult(
+        wrappers_pb2.StringValue(value="foo"), client_id
+    )
+
+    hits = export.EXPORTED_METADATA_CACHE_HITS.GetValue()
+    misses = export.EXPORTED_METADATA_CACHE_MISSES.GetValue()
+
+    with test_lib.ConfigOverrider({"AdminUI.exported_metadata_cache_size": 10}):
+      with mock.patch.object(export, "_EXPORTED_METADATA_CACHE", None):
+        with mock.patch.object(
+            data_store.REL_DB,
+            "MultiReadClientFullInfo",
+            wraps=data_store.REL_DB.MultiReadClientFullInfo,
+        ) as mock_read:
+          results1 = list(
+              export.FetchMetadataAndConvertFlowResults(
+                  source_urn=rdfvalue.RDFURN("aff4:/hunts/H:111111"),
+                  options=export_pb2.ExportOptions(annotations=["foo"]),
+                  flow_results=[flow_result],
+              )
+          )
+          results2 = list(
+              export.FetchMetadataAndConvertFlowResults(
+                  source_urn=rdfvalue.RDFURN("aff4:/hunts/H:222222"),
+                  options=export_pb2.ExportOptions(annotations=["bar"]),
+                  flow_results=[flow_result],
+              )
+          )
+
+    mock_read.assert_called_once()
+    self.assertEqual(export.EXPORTED_METADATA_CACHE_HITS.GetValue(), hits + 1)
+    self.assertEqual(
+        export.EXPORTED_METADATA_CACHE_MISSES.GetValue(), misses + 1
+    )
+
+    # Export-specific fields are not shared through the cache.
+    self.assertEqual(results1[0].metadata.source_urn, "aff4:/hunts/H:111111")
+    self.assertEqual(results1[0].metadata.annotations, "foo")
+    self.assertEqual(results2[0].metadata.source_urn, "aff4:/hunts/H:222222")
+    self.assertEqual(results2[0].metadata.annotations, "bar")
+    self.assertEqual(results1[0].metadata.client_id, client_id)
+    self.assertEqual(results2[0].metadata.client_id, client_id)
+
+  @export_test_lib.WithExportConverterProto(
+      proto_wrappers.StringValueToExportedStringConverter
+  )
+  @export_test_lib.WithExportConverterProto(Int64Converter)
+  def testConversionPool(self):
+    client_id = self.SetupClient(0)
+    source_urn = rdfvalue.RDFURN(f"aff4:/clients/{client_id}/flows/F:1")
+
+    flow_results = []
+    for i in range(5):
+      flow_results.append(
+          self._GetPackedFlowResult(
+              wrappers_pb2.StringValue(value=f"foo{i}"), client_id
+          )
+      )
+      flow_results.append(
+          self._GetPackedFlowResult(wrappers_pb2.Int64Value(value=i), client_id)
+      )
+
+    expected_results = list(
+        export.FetchMetadataAndConvertFlowResults(
+            source_urn=source_urn,
+            options=export_pb2.ExportOptions(),
+            flow_results=flow_results,
+        )
+    )
+
+    with futures.ThreadPoolExecutor(max_workers=2) as executor:
+      pool = export.ConversionPool(
+          executor, max_pending_batches=1, batch_size=3
+      )
+      results = list(
+          export.FetchMetadataAndConvertFlowResults(
+              source_urn=source_urn,
+              options=export_pb2.ExportOptions(),
+              flow_results=flow_results,
+              pool=pool,
+          )
+      )
+
+    self.assertLen(results, 15)
+    self.assertCountEqual(results, expected_results)
+    # Values of the same type are yielded in the order of flow results.
+    self.assertEqual(
+        [r.data for r in results if isinstance(r, export_pb2.ExportedBytes)],
+        [str(i).encode("utf-8") for i in range(5)],
+    )
+
+  @export_test_lib.WithExportConverterProto(
+      proto_wrappers.StringValueToExportedStringConverter
+  )
+  def testConversionPoolWithProcessPool(self):
+    client_id = self.SetupClient(0)
+    source_urn = rdfvalue.RDFURN(f"aff4:/clients/{client_id}/flows/F:1")
+
+    flow_results = [
+        self._GetPackedFlowResult(
+            wrappers_pb2.StringValue(value=f"foo{i}"), client_id
+        )
+        for i in range(10)
+    ]
+
+    expected_results = list(
+        export.FetchMetadataAndConvertFlowResults(
+            source_urn=source_urn,
+            options=export_pb2.ExportOptions(),
+            flow_results=flow_results,
+        )
+    )
+
+    executor = futures.ProcessPoolExecutor(
+        max_workers=2, mp_context=multiprocessing.get_context("spawn")
+    )
+    with export.ConversionPool(
+        executor, max_pending_batches=2, batch_size=3
+    ) as pool:
+      results = list(
+          export.FetchMetadataAndConvertFlowResults(
+              source_urn=source_urn,
+              options=export_pb2.ExportOptions(),
+              flow_results=flow_results,
+              pool=pool,
+          )
+      )
+
+    self.assertEqual(results, expected_results)
+
+    # The pool is shut down when leaving the context.
+    with self.assertRaises(RuntimeError):
+      executor.submit(int)
+
+  def testGetConversionPoolRegistersShutdown(self):
+    self.addCleanup(export.ShutdownConversionPool)
+
+    with test_lib.ConfigOverrider(
+        {"AdminUI.export_conversion_processes": 1}
+    ):
+      with mock.patch.object(atexit, "register") as register_mock:
+        pool = export.GetConversionPool()
+        self.assertIs(export.GetConversionPool(), pool)
+
+    self.assertIsNotNone(pool)
+    register_mock.assert_called_once_with(export.ShutdownConversionPool)
+
+    export.ShutdownConversionPool()
+    with test_lib.ConfigOverrider(
+        {"AdminUI.export_conversion_processes": 1}
+    ):
+      self.assertIsNot(export.GetConversionPool(), pool)
+
+  @export_test_lib.WithExportConverterProto(
+      proto_wrappers.StringValueToExportedStringConverter
+  )
+  def testConversionPoolPayloadTypeMismatch(self):
+    client_id = self.SetupClient(0)
+    flow_result = self._GetPackedFlowResult(
+        wrappers_pb2.StringValue(value="foo"), client_id
+    )
+    flow_result.payload.type_url = "type.googleapis.com/foo.Bar"
+
+    with mock.patch.object(
+        export_converters_registry,
+        "GetConvertersByTypeUrl",
+        return_value={proto_wrappers.StringValueToExportedStringConverter},
+    ):
+      with futures.ThreadPoolExecutor(max_workers=1) as executor:
+        pool = export.ConversionPool(
+            executor, max_pending_batches=1, batch_size=1
+        )
+        with self.assertRaises(TypeError):
+          list(
+              export.FetchMetadataAndConvertFlowResults(
+                  source_urn=rdfvalue.RDFURN("aff4:/hunts/H:123456"),
+                  options=export_pb2.ExportOptions(),
+                  flow_results=[flow_result],
+                  pool=pool,
+              )
+          )
+
 
 def main(argv):
   test_lib.main(argv)
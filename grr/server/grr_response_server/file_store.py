@@ -2,18 +2,23 @@
 """REL_DB-based file store implementation."""
 
 import abc
+import bisect
 import collections
 from collections.abc import Sequence
 import hashlib
 import io
 import os
-from typing import Collection, Dict, Iterable, NamedTuple, Optional
+import queue
+import threading
+import time
+from typing import Collection, Dict, Iterable, Iterator, NamedTuple, Optional
 
 from grr_response_core import config
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib import utils
 from grr_response_core.lib.util import collection
 from grr_response_core.lib.util import precondition
+from grr_response_core.stats import metrics
 from grr_response_server import data_store
 from grr_response_server.databases import db
 from grr_response_server.models import blobs as models_blob
@@ -129,57 +134,233 @@ class CompositeExternalFileStore(ExternalFileStore):
 EXTERNAL_FILE_STORE = CompositeExternalFileStore()
 
 
-# TODO(user): this is a naive implementation as it reads one chunk
-# per REL_DB call. It has to be optimized.
+class _BlobPrefetch(threading.Thread):
+  """A background thread fetching a batch of blobs from the blob store."""
+
+  def __init__(
+      self,
+      indices: Sequence[int],
+      blob_ids: Sequence[models_blob.BlobID],
+  ):
+    super().__init__(daemon=True)
+    self.indices = indices
+    self.blob_ids = blob_ids
+    self.blobs: Optional[Dict[models_blob.BlobID, Optional[bytes]]] = None
+    self.exception: Optional[Exception] = None
+
+  def run(self):
+    try:
+      self.blobs = data_store.BLOBS.ReadBlobs(self.blob_ids)
+    except Exception as e:  # pylint: disable=broad-except
+      self.exception = e
+
+
 class BlobStream:
-  """File-like object for reading from blobs."""
+  """File-like object for reading from blobs.
+
+  Whenever a blob that is not cached is needed, it is read together with up to
+  `read_ahead` following blobs in a single blob store call. Fetched blobs are
+  kept in a size-bounded LRU cache, so seeking back and forth within the file
+  doesn't refetch them.
+  """
 
   def __init__(
       self,
       client_path: db.ClientPath,
       blob_refs: Sequence[rdf_objects.BlobReference],
       hash_id: Optional[rdf_objects.HashID],
+      read_ahead: Optional[int] = None,
+      cache_size: Optional[int] = None,
+      background_read_ahead: Optional[bool] = None,
   ) -> None:
+    """Initializes the stream.
+
+    Args:
+      client_path: A path to a file the blobs correspond to.
+      blob_refs: Blob references (sorted by offset) making up the file.
+      hash_id: Hash ID identifying the file's content.
+      read_ahead: The number of blobs following the requested one that are
+        fetched in the same blob store call. Defaults to the
+        Server.blob_stream_read_ahead config option.
+      cache_size: The maximum number of bytes of blob data to keep cached.
+        Defaults to the Server.blob_stream_cache_size config option.
+      background_read_ahead: If true, the next read-ahead window is fetched in
+        a background thread while the current one is being consumed. Defaults
+        to the Server.blob_stream_background_read_ahead config option.
+    """
     self._client_path = client_path
     self._blob_refs = blob_refs
     self._hash_id = hash_id
 
     self._max_unbound_read = config.CONFIG["Server.max_unbound_read_size"]
 
+    if read_ahead is None:
+      read_ahead = config.CONFIG["Server.blob_stream_read_ahead"]
+    if cache_size is None:
+      cache_size = config.CONFIG["Server.blob_stream_cache_size"]
+    if background_read_ahead is None:
+      background_read_ahead = config.CONFIG[
+          "Server.blob_stream_background_read_ahead"
+      ]
+    self._read_ahead = max(read_ahead, 0)
+    self._cache_size = cache_size
+    self._background_read_ahead = background_read_ahead
+
     self._offset = 0
     self._length = 0
     if self._blob_refs:
       self._length = self._blob_refs[-1].offset + self._blob_refs[-1].size
 
-    self._current_ref = None
-    self._current_chunk = None
+    self._ref_offsets = [ref.offset for ref in self._blob_refs]
 
-  def _GetChunk(
+    # Blob data keyed by the index of the blob reference, in LRU order.
+    self._cache: collections.OrderedDict[int, bytes] = (
+        collections.OrderedDict()
+    )
+    self._cached_bytes = 0
+    self._prefetch: Optional[_BlobPrefetch] = None
+
+  def _FindRefIndex(self, offset: int) -> Optional[int]:
+    """Returns an index of the blob reference covering a given offset."""
+    index = bisect.bisect_right(self._ref_offsets, offset) - 1
+    if index < 0:
+      return None
+
+    ref = self._blob_refs[index]
+    if offset >= ref.offset + ref.size:
+      return None
+
+    return index
+
+  def _CacheBlob(self, index: int, data: bytes) -> None:
+    """Puts blob data into the cache, evicting least recently used blobs."""
+    if index in self._cache:
+      self._cache.move_to_end(index)
+      return
+
+    self._cache[index] = data
+    self._cached_bytes += len(data)
+
+    while self._cached_bytes > self._cache_size and len(self._cache) > 1:
+      _, evicted = self._cache.popitem(last=False)
+      self._cached_bytes -= len(evicted)
+
+  def _CacheFetchedBlobs(
       self,
-  ) -> tuple[Optional[bytes], Optional[rdf_objects.BlobReference]]:
-    """Fetches a chunk corresponding to the current offset."""
+      indices: Sequence[int],
+      blobs: Dict[models_blob.BlobID, Optional[bytes]],
+      requested: Optional[int] = None,
+  ) -> None:
+    # The requested blob is cached last, so that caching the other fetched
+    # blobs can't evict it before it is read.
+    if requested in indices:
+      indices = [i for i in indices if i != requested] + [requested]
+
+    for index in indices:
+      data = blobs.get(models_blob.BlobID(self._blob_refs[index].blob_id))
+      # Missing blobs are not cached: BlobNotFoundError is raised only when
+      # such a blob is actually read.
+      if data is not None:
+        self._CacheBlob(index, data)
+
+  def _WindowToFetch(self, start: int) -> list[int]:
+    """Returns indices of uncached blobs of a read-ahead window.
 
-    found_ref = None
-    for ref in self._blob_refs:
-      if self._offset >= ref.offset and self._offset < (ref.offset + ref.size):
-        found_ref = ref
+    The window is shrunk to fit into the cache (but always includes its first
+    blob), as blobs that don't fit would be evicted before being read.
+
+    Args:
+      start: Index of the first blob of the window.
+
+    Returns:
+      Indices of blobs of the window that are not cached.
+    """
+    end = min(start + self._read_ahead + 1, len(self._blob_refs))
+
+    indices = []
+    window_size = 0
+    for i in range(start, end):
+      window_size += self._blob_refs[i].size
+      if i > start and window_size > self._cache_size:
         break
+      if i not in self._cache:
+        indices.append(i)
+    return indices
+
+  def _CollectPrefetch(self, requested: Optional[int] = None) -> None:
+    """Waits for the background fetch to finish and caches its results."""
+    prefetch = self._prefetch
+    if prefetch is None:
+      return
+
+    self._prefetch = None
+    prefetch.join()
+    if prefetch.exception is not None:
+      raise prefetch.exception
+
+    self._CacheFetchedBlobs(prefetch.indices, prefetch.blobs, requested)
+
+  def _StartPrefetch(self, start: int) -> None:
+    if self._prefetch is not None:
+      return
+
+    indices = self._WindowToFetch(start)
+    if not indices:
+      return
+
+    blob_ids = [
+        models_blob.BlobID(self._blob_refs[i].blob_id) for i in indices
+    ]
+    self._prefetch = _BlobPrefetch(indices, blob_ids)
+    self._prefetch.start()
+
+  def _ReadBlob(self, index: int) -> bytes:
+    """Reads blob data for a blob reference with a given index."""
+    try:
+      data = self._cache[index]
+      self._cache.move_to_end(index)
+      return data
+    except KeyError:
+      pass
+
+    # The pending prefetch is collected even if the read is outside of its
+    # window (e.g. after a seek): read-ahead then resumes from the new
+    # position and blobs being prefetched are not fetched again below.
+    self._CollectPrefetch(index)
+
+    if index not in self._cache:
+      indices = self._WindowToFetch(index)
+      blob_ids = [
+          models_blob.BlobID(self._blob_refs[i].blob_id) for i in indices
+      ]
+      self._CacheFetchedBlobs(
+          indices, data_store.BLOBS.ReadBlobs(blob_ids), index
+      )
 
-    if not found_ref:
-      return None, None
+    try:
+      data = self._cache[index]
+    except KeyError:
+      raise BlobNotFoundError(
+          models_blob.BlobID(self._blob_refs[index].blob_id)
+      ) from None
+    # Make sure the requested blob is the most recently used one.
+    self._cache.move_to_end(index)
 
-    # If self._current_ref == found_ref, then simply return previously found
-    # chunk. Otherwise, update self._current_chunk value.
-    if self._current_ref != found_ref:
-      self._current_ref = found_ref
+    if self._background_read_ahead:
+      self._StartPrefetch(index + self._read_ahead + 1)
 
-      blob_id = models_blob.BlobID(found_ref.blob_id)
-      data = data_store.BLOBS.ReadBlobs([blob_id])
-      if data[blob_id] is None:
-        raise BlobNotFoundError(blob_id)
-      self._current_chunk = data[blob_id]
+    return data
 
-    return self._current_chunk, self._current_ref
+  def _GetChunk(
+      self,
+  ) -> tuple[Optional[bytes], Optional[rdf_objects.BlobReference]]:
+    """Fetches a chunk corresponding to the current offset."""
+
+    index = self._FindRefIndex(self._offset)
+    if index is None:
+      return None, None
+
+    return self._ReadBlob(index), self._blob_refs[index]
 
   def Read(self, length: Optional[int] = None) -> bytes:
     """Reads data."""
@@ -444,6 +625,18 @@ def OpenFile(
 
 
 STREAM_CHUNKS_READ_AHEAD = 500
+STREAM_CHUNKS_READ_AHEAD_BYTES = 64 * 1024 * 1024
+
+# Time the consumer of StreamFilesChunks spent waiting for blobs to be read.
+STREAM_CHUNKS_IO_STALL_LATENCY = metrics.Event(
+    "file_store_stream_chunks_io_stall_latency",
+    bins=[0.001, 0.01, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50],
+)
+# Time the StreamFilesChunks prefetcher spent waiting for the consumer.
+STREAM_CHUNKS_CONSUMER_STALL_LATENCY = metrics.Event(
+    "file_store_stream_chunks_consumer_stall_latency",
+    bins=[0.001, 0.01, 0.05, 0.1, 0.2, 0.5, 1, 2, 5, 10, 20, 50],
+)
 
 
 class StreamedFileChunk:
@@ -477,13 +670,149 @@ class StreamedFileChunk:
     self.total_chunks = total_chunks
 
 
+class _StreamedChunkRef(NamedTuple):
+  client_path: db.ClientPath
+  blob_id: models_blob.BlobID
+  chunk_index: int
+  total_chunks: int
+  offset: int
+  size: int
+  total_size: int
+
+
+def _BatchChunkRefs(
+    chunk_refs: Iterable[_StreamedChunkRef],
+    max_count: int,
+    max_bytes: int,
+) -> Iterator[list[_StreamedChunkRef]]:
+  """Batches chunk references by both the number of blobs and their size."""
+  batch = []
+  batch_bytes = 0
+  for chunk_ref in chunk_refs:
+    if batch and (
+        len(batch) >= max_count or batch_bytes + chunk_ref.size > max_bytes
+    ):
+      yield batch
+      batch = []
+      batch_bytes = 0
+
+    batch.append(chunk_ref)
+    batch_bytes += chunk_ref.size
+
+  if batch:
+    yield batch
+
+
+def _ReadChunkRefsBatch(
+    batch: Sequence[_StreamedChunkRef],
+) -> Dict[models_blob.BlobID, Optional[bytes]]:
+  return data_store.BLOBS.ReadBlobs([chunk_ref.blob_id for chunk_ref in batch])
+
+
+class _ChunksPrefetcher(threading.Thread):
+  """A thread reading batches of blobs ahead of the StreamFilesChunks consumer.
+
+  At most `max_batches` read batches are kept in the queue. Together with the
+  batch being read by the thread (which waits for a free slot in the queue once
+  read) and the batch being consumed, up to `max_batches + 2` batches of blobs
+  are held in memory at once.
+  """
+
+  _PUT_TIMEOUT_SECS = 0.5
+
+  def __init__(
+      self,
+      batches: Iterator[list[_StreamedChunkRef]],
+      max_batches: int,
+  ) -> None:
+    super().__init__(name="StreamFilesChunksPrefetcher", daemon=True)
+    self._batches = batches
+    self._stop_event = threading.Event()
+    self.results = queue.Queue(maxsize=max_batches)
+
+  def run(self):
+    try:
+      for batch in self._batches:
+        blobs = _ReadChunkRefsBatch(batch)
+        if not self._Put((batch, blobs, None)):
+          return
+    except Exception as e:  # pylint: disable=broad-except
+      self._Put((None, None, e))
+      return
+
+    self._Put(None)
+
+  def _Put(self, item) -> bool:
+    """Puts an item into the queue unless the prefetcher is stopped."""
+    start_time = time.time()
+    try:
+      while not self._stop_event.is_set():
+        try:
+          self.results.put(item, timeout=self._PUT_TIMEOUT_SECS)
+          return True
+        except queue.Full:
+          pass
+
+      return False
+    finally:
+      STREAM_CHUNKS_CONSUMER_STALL_LATENCY.RecordEvent(
+          time.time() - start_time
+      )
+
+  def Stop(self) -> None:
+    self._stop_event.set()
+    self.join()
+
+
+def _ReadChunkRefsBatches(
+    batches: Iterator[list[_StreamedChunkRef]],
+) -> Iterator[
+    tuple[list[_StreamedChunkRef], Dict[models_blob.BlobID, Optional[bytes]]]
+]:
+  """Reads batches of blobs sequentially."""
+  for batch in batches:
+    with STREAM_CHUNKS_IO_STALL_LATENCY.Timed():
+      blobs = _ReadChunkRefsBatch(batch)
+    yield batch, blobs
+
+
+def _PrefetchChunkRefsBatches(
+    batches: Iterator[list[_StreamedChunkRef]],
+    prefetch_batches: int,
+) -> Iterator[
+    tuple[list[_StreamedChunkRef], Dict[models_blob.BlobID, Optional[bytes]]]
+]:
+  """Reads batches of blobs in a background thread ahead of the consumer."""
+  prefetcher = _ChunksPrefetcher(batches, prefetch_batches)
+  prefetcher.start()
+  try:
+    while True:
+      with STREAM_CHUNKS_IO_STALL_LATENCY.Timed():
+        item = prefetcher.results.get()
+      if item is None:
+        return
+
+      batch, blobs, exception = item
+      if exception is not None:
+        raise exception
+
+      yield batch, blobs
+  finally:
+    prefetcher.Stop()
+
+
 def StreamFilesChunks(
     client_paths: Collection[db.ClientPath],
     max_timestamp: Optional[rdfvalue.RDFDatetime] = None,
     max_size: Optional[int] = None,
+    prefetch_batches: int = 0,
 ) -> Iterable[StreamedFileChunk]:
   """Streams contents of given files.
 
+  Blobs are read in batches limited both by the number of blobs
+  (STREAM_CHUNKS_READ_AHEAD) and by their total size
+  (STREAM_CHUNKS_READ_AHEAD_BYTES).
+
   Args:
     client_paths: db.ClientPath objects describing paths to files.
     max_timestamp: If specified, then for every requested file will open the
@@ -492,6 +821,12 @@ def StreamFilesChunks(
       each file.
     max_size: If specified, only the chunks covering max_size bytes will be
       returned.
+    prefetch_batches: If positive, batches of blobs are read in a background
+      thread while chunks of the current batch are being consumed. Up to this
+      many read batches are queued, so up to `prefetch_batches + 2` batches
+      (the queued ones, one being read and one being consumed) are held in
+      memory at once. Otherwise batches are read sequentially and only one
+      batch is held in memory.
 
   Yields:
     StreamedFileChunk objects for every file read. Chunks will be returned
@@ -544,19 +879,42 @@ def StreamFilesChunks(
     cur_size = 0
     for i, ref in enumerate(blob_refs):
       blob_id = models_blob.BlobID(ref.blob_id)
-      all_chunks.append((cp, blob_id, i, num_blobs, ref.offset, total_size))
+      all_chunks.append(
+          _StreamedChunkRef(
+              client_path=cp,
+              blob_id=blob_id,
+              chunk_index=i,
+              total_chunks=num_blobs,
+              offset=ref.offset,
+              size=ref.size,
+              total_size=total_size,
+          )
+      )
 
       cur_size += ref.size
       if max_size is not None and cur_size >= max_size:
         break
 
-  for batch in collection.Batch(all_chunks, STREAM_CHUNKS_READ_AHEAD):
-    blobs = data_store.BLOBS.ReadBlobs(
-        [blob_id for _, blob_id, _, _, _, _ in batch]
-    )
-    for cp, blob_id, i, num_blobs, offset, total_size in batch:
-      blob_data = blobs[blob_id]
-      if blob_data is None:
-        raise BlobNotFoundError(blob_id)
+  batches = _BatchChunkRefs(
+      all_chunks, STREAM_CHUNKS_READ_AHEAD, STREAM_CHUNKS_READ_AHEAD_BYTES
+  )
+
+  if prefetch_batches > 0:
+    read_batches = _PrefetchChunkRefsBatches(batches, prefetch_batches)
+  else:
+    read_batches = _ReadChunkRefsBatches(batches)
 
-      yield StreamedFileChunk(cp, blob_data, i, num_blobs, offset, total_size)
+  for batch, blobs in read_batches:
+    for chunk_ref in batch:
+      blob_data = blobs[chunk_ref.blob_id]
+      if blob_data is None:
+        raise BlobNotFoundError(chunk_ref.blob_id)
+
+      yield StreamedFileChunk(
+          chunk_ref.client_path,
+          blob_data,
+          chunk_ref.chunk_index,
+          chunk_ref.total_chunks,
+          chunk_ref.offset,
+          chunk_ref.total_size,
+      )
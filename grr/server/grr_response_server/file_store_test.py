@@ -2,6 +2,7 @@
 """Tests for REL_DB-based file store."""
 
 import itertools
+import threading
 from unittest import mock
 
 from absl import app
@@ -94,6 +95,166 @@ class BlobStreamTest(test_lib.GRRBaseTest):
       self.blob_stream = file_store.BlobStream(None, self.blob_refs, None)
       self.blob_stream.read(self.blob_size)
 
+  def testReadsAheadInSingleBlobStoreCall(self):
+    blob_stream = file_store.BlobStream(
+        None, self.blob_refs, None, read_ahead=4
+    )
+    with mock.patch.object(
+        data_store.BLOBS, "ReadBlobs", wraps=data_store.BLOBS.ReadBlobs
+    ) as read_blobs_mock:
+      self.assertEqual(
+          blob_stream.read(self.blob_size * 5), b"".join(self.blob_data[:5])
+      )
+      self.assertEqual(read_blobs_mock.call_count, 1)
+      self.assertLen(read_blobs_mock.call_args[0][0], 5)
+
+      self.assertEqual(blob_stream.read(self.blob_size), self.blob_data[5])
+      self.assertEqual(read_blobs_mock.call_count, 2)
+
+  def testReadsWholeFileWithReadAhead(self):
+    for read_ahead in [0, 1, 3, 9, 100]:
+      blob_stream = file_store.BlobStream(
+          None, self.blob_refs, None, read_ahead=read_ahead
+      )
+      self.assertEqual(blob_stream.read(), b"".join(self.blob_data))
+
+  def testDoesNotRefetchCachedBlobsWhenSeeking(self):
+    blob_stream = file_store.BlobStream(
+        None, self.blob_refs, None, read_ahead=0
+    )
+    with mock.patch.object(
+        data_store.BLOBS, "ReadBlobs", wraps=data_store.BLOBS.ReadBlobs
+    ) as read_blobs_mock:
+      blob_stream.read(1)
+      blob_stream.seek(-1, 2)
+      blob_stream.read(1)
+      blob_stream.seek(0)
+      self.assertEqual(blob_stream.read(1), b"a")
+      blob_stream.seek(-1, 2)
+      self.assertEqual(blob_stream.read(1), b"5")
+
+      self.assertEqual(read_blobs_mock.call_count, 2)
+
+  def testEvictsLeastRecentlyUsedBlobsWhenCacheIsFull(self):
+    blob_stream = file_store.BlobStream(
+        None,
+        self.blob_refs,
+        None,
+        read_ahead=0,
+        cache_size=self.blob_size * 2,
+    )
+    with mock.patch.object(
+        data_store.BLOBS, "ReadBlobs", wraps=data_store.BLOBS.ReadBlobs
+    ) as read_blobs_mock:
+      blob_stream.read(self.blob_size * 3)
+      self.assertEqual(read_blobs_mock.call_count, 3)
+
+      # Two most recently read blobs are still cached.
+      blob_stream.seek(self.blob_size)
+      blob_stream.read(self.blob_size * 2)
+      self.assertEqual(read_blobs_mock.call_count, 3)
+
+      # The first blob was evicted.
+      blob_stream.seek(0)
+      self.assertEqual(blob_stream.read(1), b"a")
+      self.assertEqual(read_blobs_mock.call_count, 4)
+
+  def testReadAheadWindowIsCappedAtCacheSize(self):
+    blob_stream = file_store.BlobStream(
+        None,
+        self.blob_refs,
+        None,
+        read_ahead=4,
+        cache_size=self.blob_size * 2,
+    )
+    with mock.patch.object(
+        data_store.BLOBS, "ReadBlobs", wraps=data_store.BLOBS.ReadBlobs
+    ) as read_blobs_mock:
+      self.assertEqual(blob_stream.read(self.blob_size), self.blob_data[0])
+      self.assertEqual(read_blobs_mock.call_count, 1)
+      self.assertLen(read_blobs_mock.call_args[0][0], 2)
+
+  def testReadsWholeFileWithCacheSmallerThanReadAheadWindow(self):
+    for cache_size in [1, self.blob_size, self.blob_size * 3]:
+      blob_stream = file_store.BlobStream(
+          None,
+          self.blob_refs,
+          None,
+          read_ahead=4,
+          cache_size=cache_size,
+      )
+      self.assertEqual(blob_stream.read(), b"".join(self.blob_data))
+
+      blob_stream.seek(self.blob_size * 7)
+      self.assertEqual(blob_stream.read(self.blob_size), self.blob_data[7])
+
+  def testReadsWholeFileWithBackgroundReadAheadAndSmallCache(self):
+    blob_stream = file_store.BlobStream(
+        None,
+        self.blob_refs,
+        None,
+        read_ahead=4,
+        cache_size=self.blob_size,
+        background_read_ahead=True,
+    )
+    self.assertEqual(blob_stream.read(), b"".join(self.blob_data))
+
+  def testReadsWholeFileWithBackgroundReadAhead(self):
+    blob_stream = file_store.BlobStream(
+        None,
+        self.blob_refs,
+        None,
+        read_ahead=2,
+        background_read_ahead=True,
+    )
+    self.assertEqual(blob_stream.read(), b"".join(self.blob_data))
+
+  def testBackgroundReadAheadResumesAfterSeek(self):
+    blob_stream = file_store.BlobStream(
+        None,
+        self.blob_refs,
+        None,
+        read_ahead=1,
+        background_read_ahead=True,
+    )
+
+    read_blobs = data_store.BLOBS.ReadBlobs
+    prefetched_blob_ids = []
+
+    def ReadBlobs(blob_ids):
+      if threading.current_thread() is not threading.main_thread():
+        prefetched_blob_ids.append(list(blob_ids))
+      return read_blobs(blob_ids)
+
+    with mock.patch.object(
+        data_store.BLOBS, "ReadBlobs", side_effect=ReadBlobs
+    ) as read_blobs_mock:
+      # Reads blobs 0 and 1, and prefetches blobs 2 and 3.
+      self.assertEqual(blob_stream.read(1), b"a")
+
+      # Reads blobs 6 and 7, and prefetches blobs 8 and 9.
+      blob_stream.seek(self.blob_size * 6)
+      self.assertEqual(blob_stream.read(), b"".join(self.blob_data[6:]))
+
+      # Blobs 2 and 3 were prefetched before the seek.
+      blob_stream.seek(self.blob_size * 2)
+      self.assertEqual(
+          blob_stream.read(self.blob_size * 2), b"".join(self.blob_data[2:4])
+      )
+
+      self.assertEqual(read_blobs_mock.call_count, 4)
+
+    blob_ids = [models_blobs.BlobID(ref.blob_id) for ref in self.blob_refs]
+    self.assertEqual(prefetched_blob_ids, [blob_ids[2:4], blob_ids[8:10]])
+
+  def testRaisesIfBlobIsMissingWithBackgroundReadAhead(self):
+    _, missing_blob_refs = vfs_test_lib.GenerateBlobRefs(self.blob_size, "01")
+    blob_stream = file_store.BlobStream(
+        None, missing_blob_refs, None, read_ahead=0, background_read_ahead=True
+    )
+    with self.assertRaises(file_store.BlobNotFoundError):
+      blob_stream.read()
+
 
 class AddFileWithUnknownHashTest(test_lib.GRRBaseTest):
   """Tests for AddFileWithUnknownHash."""
@@ -700,6 +861,98 @@ class StreamFilesChunksTest(test_lib.GRRBaseTest):
     self.assertEqual(chunks[0].data, blob_data[0])
     self.assertEqual(chunks[1].data, blob_data[1])
 
+  def testBatchesReadsByBlobCount(self):
+    client_path = db.ClientPath.OS(self.client_id, ("foo", "bar"))
+    blob_data, _ = self._WriteFile(client_path, (0, 5))
+
+    with mock.patch.object(file_store, "STREAM_CHUNKS_READ_AHEAD", 2):
+      with mock.patch.object(
+          data_store.BLOBS, "ReadBlobs", wraps=data_store.BLOBS.ReadBlobs
+      ) as read_blobs_mock:
+        chunks = list(file_store.StreamFilesChunks([client_path]))
+
+    self.assertEqual([c.data for c in chunks], blob_data)
+    self.assertEqual(read_blobs_mock.call_count, 3)
+
+  def testBatchesReadsByBlobSize(self):
+    client_path = db.ClientPath.OS(self.client_id, ("foo", "bar"))
+    blob_data, _ = self._WriteFile(client_path, (0, 5))
+
+    with mock.patch.object(
+        file_store, "STREAM_CHUNKS_READ_AHEAD_BYTES", self.blob_size * 2 + 1
+    ):
+      with mock.patch.object(
+          data_store.BLOBS, "ReadBlobs", wraps=data_store.BLOBS.ReadBlobs
+      ) as read_blobs_mock:
+        chunks = list(file_store.StreamFilesChunks([client_path]))
+
+    self.assertEqual([c.data for c in chunks], blob_data)
+    self.assertEqual(read_blobs_mock.call_count, 3)
+
+  def testStreamsTwoFilesWithPrefetching(self):
+    client_path_1 = db.ClientPath.OS(self.client_id, ("foo", "bar"))
+    blob_data_1, _ = self._WriteFile(client_path_1, (0, 3))
+
+    client_path_2 = db.ClientPath.OS(self.client_id_other, ("foo", "bar"))
+    blob_data_2, _ = self._WriteFile(client_path_2, (3, 6))
+
+    with mock.patch.object(file_store, "STREAM_CHUNKS_READ_AHEAD", 1):
+      chunks = list(
+          file_store.StreamFilesChunks(
+              [client_path_1, client_path_2], prefetch_batches=2
+          )
+      )
+
+    self.assertLen(chunks, 6)
+    self.assertEqual(
+        [c.client_path for c in chunks],
+        [client_path_1] * 3 + [client_path_2] * 3,
+    )
+    self.assertEqual([c.data for c in chunks], blob_data_1 + blob_data_2)
+    self.assertEqual([c.chunk_index for c in chunks], [0, 1, 2, 0, 1, 2])
+
+  def testRaisesIfChunkIsMissingWithPrefetching(self):
+    _, missing_blob_refs = vfs_test_lib.GenerateBlobRefs(self.blob_size, "0")
+    missing_blob_refs = list(
+        map(mig_objects.ToProtoBlobReference, missing_blob_refs)
+    )
+
+    hash_id = rdf_objects.SHA256HashID.FromSerializedBytes(
+        missing_blob_refs[0].blob_id
+    )
+    data_store.REL_DB.WriteHashBlobReferences({hash_id: missing_blob_refs})
+
+    client_path = db.ClientPath.OS(self.client_id, ("foo", "bar"))
+    path_info = rdf_objects.PathInfo.OS(components=client_path.components)
+    path_info.hash_entry.sha256 = hash_id.AsBytes()
+    data_store.REL_DB.WritePathInfos(
+        client_path.client_id, [mig_objects.ToProtoPathInfo(path_info)]
+    )
+
+    chunks = file_store.StreamFilesChunks([client_path], prefetch_batches=1)
+    with self.assertRaises(file_store.BlobNotFoundError):
+      list(chunks)
+
+  def testPropagatesBlobStoreErrorsWithPrefetching(self):
+    client_path = db.ClientPath.OS(self.client_id, ("foo", "bar"))
+    self._WriteFile(client_path, (0, 2))
+
+    with mock.patch.object(
+        data_store.BLOBS, "ReadBlobs", side_effect=RuntimeError("foo")
+    ):
+      with self.assertRaises(RuntimeError):
+        list(file_store.StreamFilesChunks([client_path], prefetch_batches=1))
+
+  def testStopsPrefetchingWhenConsumerStopsEarly(self):
+    client_path = db.ClientPath.OS(self.client_id, ("foo", "bar"))
+    blob_data, _ = self._WriteFile(client_path, (0, 6))
+
+    with mock.patch.object(file_store, "STREAM_CHUNKS_READ_AHEAD", 1):
+      chunks = file_store.StreamFilesChunks([client_path], prefetch_batches=1)
+      self.assertEqual(next(chunks).data, blob_data[0])
+      # Closing the generator stops and joins the prefetching thread.
+      chunks.close()
+
 
 def main(argv):
   # Run the full test suite
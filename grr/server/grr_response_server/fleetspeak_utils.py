@@ -2,8 +2,9 @@
 """FS GRR server side integration utility functions."""
 
 import binascii
+from concurrent import futures
 import datetime
-from typing import Collection, List
+from typing import Collection, List, Sequence
 
 from google.protobuf import timestamp_pb2
 from grr_response_core import config
@@ -41,27 +42,17 @@ RRG_REQUEST_COUNT = metrics.Counter(
 )
 
 
-@FLEETSPEAK_CALL_LATENCY.Timed(fields=["InsertMessage"])
-def SendGrrMessageThroughFleetspeak(
-    grr_id: str,
-    grr_msg: rdf_flows.GrrMessage,
-    labels: Collection[str],  # TODO: Remove once RRG rollout done.
-) -> None:
-  """Sends the given GrrMessage through FS with retrying.
-
-  The send operation is retried if a `grpc.RpcError` occurs.
-
-  The maximum number of retries corresponds to the config value
-  `Server.fleetspeak_send_retry_attempts`.
+FLEETSPEAK_SEND_BATCH_SIZE = metrics.Event(
+    "fleetspeak_send_batch_size",
+    bins=[1, 2, 5, 10, 20, 50, 100, 200, 500, 1000],
+)
 
-  A retry is delayed by the number of seconds specified in the config value
-  `Server.fleetspeak_send_retry_sleep_time_secs`.
 
-  Args:
-    grr_id: ID of grr client to send message to.
-    grr_msg: GRR message to send.
-    labels: Labels of the endpoint to send the message to.
-  """
+def _GrrMessageToFleetspeak(
+    grr_id: str,
+    grr_msg: rdf_flows.GrrMessage,
+) -> fs_common_pb2.Message:
+  """Wraps the given GrrMessage into a Fleetspeak message."""
   fs_msg = fs_common_pb2.Message(
       message_type="GrrMessage",
       destination=fs_common_pb2.Address(
@@ -75,41 +66,14 @@ def SendGrrMessageThroughFleetspeak(
   if grr_msg.request_id is not None:
     annotation = fs_msg.annotations.entries.add()
     annotation.key, annotation.value = "request_id", str(grr_msg.request_id)
-  fleetspeak_connector.CONN.outgoing.InsertMessage(
-      fs_msg,
-      single_try_timeout=WRITE_SINGLE_TRY_TIMEOUT,
-      timeout=WRITE_TOTAL_TIMEOUT,
-  )
-
-  GRR_REQUEST_COUNT.Increment(
-      fields=[
-          grr_msg.name,
-          ",".join(sorted(labels)),
-      ]
-  )
+  return fs_msg
 
 
-@FLEETSPEAK_CALL_LATENCY.Timed(fields=["InsertMessage"])
-def SendGrrMessageProtoThroughFleetspeak(
+def _GrrMessageProtoToFleetspeak(
     grr_id: str,
     grr_msg: jobs_pb2.GrrMessage,
-    labels: Collection[str],  # TODO: Remove once RRG rollout done.
-) -> None:
-  """Sends the given GrrMessage through FS with retrying.
-
-  The send operation is retried if a `grpc.RpcError` occurs.
-
-  The maximum number of retries corresponds to the config value
-  `Server.fleetspeak_send_retry_attempts`.
-
-  A retry is delayed by the number of seconds specified in the config value
-  `Server.fleetspeak_send_retry_sleep_time_secs`.
-
-  Args:
-    grr_id: ID of grr client to send message to.
-    grr_msg: GRR message to send.
-    labels: Labels of the endpoint to send the message to.
-  """
+) -> fs_common_pb2.Message:
+  """Wraps the given GrrMessage proto into a Fleetspeak message."""
   fs_msg = fs_common_pb2.Message(
       message_type="GrrMessage",
       destination=fs_common_pb2.Address(
@@ -125,33 +89,14 @@ def SendGrrMessageProtoThroughFleetspeak(
     annotation = fs_msg.annotations.entries.add()
     annotation.key = "request_id"
     annotation.value = str(grr_msg.request_id)
-  fleetspeak_connector.CONN.outgoing.InsertMessage(
-      fs_msg,
-      single_try_timeout=WRITE_SINGLE_TRY_TIMEOUT,
-      timeout=WRITE_TOTAL_TIMEOUT,
-  )
-
-  GRR_REQUEST_COUNT.Increment(
-      fields=[
-          grr_msg.name,
-          ",".join(sorted(labels)),
-      ]
-  )
+  return fs_msg
 
 
-@FLEETSPEAK_CALL_LATENCY.Timed(fields=["InsertMessage"])
-def SendRrgRequest(
+def _RrgRequestToFleetspeak(
     client_id: str,
     request: rrg_pb2.Request,
-    labels: Collection[str],  # TODO: Remove once RRG rollout done.
-) -> None:
-  """Sends a RRG action request to the specified endpoint.
-
-  Args:
-    client_id: A unique endpoint identifier as recognized by GRR.
-    request: A request to send to the endpoint.
-    labels: Labels of the endpoint to send the message to.
-  """
+) -> fs_common_pb2.Message:
+  """Wraps the given RRG action request into a Fleetspeak message."""
   message = fs_common_pb2.Message()
   message.message_type = "rrg.Request"
   message.destination.service_name = "RRG"
@@ -168,19 +113,121 @@ def SendRrgRequest(
       key="request_id",
       value=str(request.request_id),
   )
+  return message
+
 
+def _InsertMessage(fs_msg: fs_common_pb2.Message) -> None:
   fleetspeak_connector.CONN.outgoing.InsertMessage(
-      message,
+      fs_msg,
       single_try_timeout=WRITE_SINGLE_TRY_TIMEOUT,
       timeout=WRITE_TOTAL_TIMEOUT,
   )
 
-  RRG_REQUEST_COUNT.Increment(
-      fields=[
-          rrg_pb2.Action.Name(request.action),
-          ",".join(sorted(labels)),
-      ]
+
+class OutboundMessageBatch:
+  """A batch of messages to be sent to clients through Fleetspeak.
+
+  Messages can be collected from multiple flows (e.g. all flows processed
+  together by a worker) and are sent with a single `Send` call. Depending on
+  the `Server.fleetspeak_send_parallelism` config option, messages of a batch
+  are sent sequentially or concurrently.
+  """
+
+  def __init__(self) -> None:
+    # Messages paired with the request counter (and its fields) to increment
+    # once the message is sent.
+    self._messages: list[
+        tuple[fs_common_pb2.Message, metrics.Counter, list[str]]
+    ] = []
+
+  def __len__(self) -> int:
+    return len(self._messages)
+
+  def AddGrrMessage(
+      self,
+      grr_id: str,
+      grr_msg: rdf_flows.GrrMessage,
+      labels: Collection[str],
+  ) -> None:
+    """Adds a GrrMessage to the batch."""
+    self._messages.append((
+        _GrrMessageToFleetspeak(grr_id, grr_msg),
+        GRR_REQUEST_COUNT,
+        [grr_msg.name, ",".join(sorted(labels))],
+    ))
+
+  def AddGrrMessageProto(
+      self,
+      grr_id: str,
+      grr_msg: jobs_pb2.GrrMessage,
+      labels: Collection[str],
+  ) -> None:
+    """Adds a GrrMessage proto to the batch."""
+    self._messages.append((
+        _GrrMessageProtoToFleetspeak(grr_id, grr_msg),
+        GRR_REQUEST_COUNT,
+        [grr_msg.name, ",".join(sorted(labels))],
+    ))
+
+  def AddRrgRequest(
+      self,
+      client_id: str,
+      request: rrg_pb2.Request,
+      labels: Collection[str],
+  ) -> None:
+    """Adds a RRG action request to the batch."""
+    self._messages.append((
+        _RrgRequestToFleetspeak(client_id, request),
+        RRG_REQUEST_COUNT,
+        [rrg_pb2.Action.Name(request.action), ",".join(sorted(labels))],
+    ))
+
+  def Send(self) -> None:
+    """Sends all the messages of the batch and clears it.
+
+    Raises:
+      Exception: The first error that occurred when sending a message. When
+        messages are sent concurrently, all the other messages are still
+        attempted to be sent.
+    """
+    messages = self._messages
+    self._messages = []
+    if not messages:
+      return
+
+    FLEETSPEAK_SEND_BATCH_SIZE.RecordEvent(len(messages))
+    _SendMessages(messages)
+
+
+@FLEETSPEAK_CALL_LATENCY.Timed(fields=["InsertMessageBatch"])
+def _SendMessages(
+    messages: Sequence[
+        tuple[fs_common_pb2.Message, metrics.Counter, list[str]]
+    ],
+) -> None:
+  """Sends messages of a batch to Fleetspeak."""
+
+  def Send(
+      message: tuple[fs_common_pb2.Message, metrics.Counter, list[str]],
+  ) -> None:
+    fs_msg, counter, fields = message
+    _InsertMessage(fs_msg)
+    counter.Increment(fields=fields)
+
+  parallelism = min(
+      config.CONFIG["Server.fleetspeak_send_parallelism"], len(messages)
   )
+  if parallelism <= 1:
+    for message in messages:
+      Send(message)
+    return
+
+  with futures.ThreadPoolExecutor(max_workers=parallelism) as executor:
+    send_futures = [executor.submit(Send, message) for message in messages]
+
+  for future in send_futures:
+    # Re-raises the first error, if any.
+    future.result()
 
 
 @FLEETSPEAK_CALL_LATENCY.Timed(fields=["InsertMessage"])
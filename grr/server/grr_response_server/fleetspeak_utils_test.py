@@ -8,6 +8,7 @@ from absl import app
 from google.protobuf import timestamp_pb2
 from grr_response_core.lib.rdfvalues import flows as rdf_flows
 from grr_response_proto import jobs_pb2
+from grr_response_proto import rrg_pb2
 from grr_response_server import fleetspeak_connector
 from grr_response_server import fleetspeak_utils
 from grr.test_lib import test_lib
@@ -105,7 +106,9 @@ class FleetspeakUtilsTest(test_lib.GRRBaseTest):
         name="TestClientAction",
         request_id=1,
     )
-    fleetspeak_utils.SendGrrMessageThroughFleetspeak(client_id, grr_message, [])
+    batch = fleetspeak_utils.OutboundMessageBatch()
+    batch.AddGrrMessage(client_id, grr_message, [])
+    batch.Send()
     mock_conn.outgoing.InsertMessage.assert_called_once()
     insert_args, _ = mock_conn.outgoing.InsertMessage.call_args
     fs_message = insert_args[0]
@@ -129,9 +132,9 @@ class FleetspeakUtilsTest(test_lib.GRRBaseTest):
         name="TestClientAction",
         request_id=1,
     )
-    fleetspeak_utils.SendGrrMessageProtoThroughFleetspeak(
-        client_id, grr_message, []
-    )
+    batch = fleetspeak_utils.OutboundMessageBatch()
+    batch.AddGrrMessageProto(client_id, grr_message, [])
+    batch.Send()
     mock_conn.outgoing.InsertMessage.assert_called_once()
     insert_args, _ = mock_conn.outgoing.InsertMessage.call_args
     fs_message = insert_args[0]
@@ -264,6 +267,97 @@ class FleetspeakUtilsTest(test_lib.GRRBaseTest):
       )
 
 
+class OutboundMessageBatchTest(test_lib.GRRBaseTest):
+
+  def _MakeBatch(self, count: int) -> fleetspeak_utils.OutboundMessageBatch:
+    batch = fleetspeak_utils.OutboundMessageBatch()
+    for i in range(count):
+      batch.AddGrrMessageProto(
+          _TEST_CLIENT_ID,
+          jobs_pb2.GrrMessage(
+              session_id="%s/01234567" % _TEST_CLIENT_ID,
+              name="TestClientAction",
+              request_id=i,
+          ),
+          [],
+      )
+    return batch
+
+  def _SentRequestIds(self, mock_conn) -> list[int]:
+    request_ids = []
+    for insert_args, _ in mock_conn.outgoing.InsertMessage.call_args_list:
+      grr_message = jobs_pb2.GrrMessage()
+      insert_args[0].data.Unpack(grr_message)
+      request_ids.append(grr_message.request_id)
+    return request_ids
+
+  @mock.patch.object(fleetspeak_connector, "CONN")
+  def testSendEmpty(self, mock_conn):
+    fleetspeak_utils.OutboundMessageBatch().Send()
+    mock_conn.outgoing.InsertMessage.assert_not_called()
+
+  @mock.patch.object(fleetspeak_connector, "CONN")
+  def testSendSequentiallyPreservesOrder(self, mock_conn):
+    batch = self._MakeBatch(10)
+    self.assertLen(batch, 10)
+
+    batch.Send()
+
+    self.assertEqual(self._SentRequestIds(mock_conn), list(range(10)))
+    self.assertEmpty(batch)
+
+  @mock.patch.object(fleetspeak_connector, "CONN")
+  def testSendConcurrently(self, mock_conn):
+    with test_lib.ConfigOverrider({"Server.fleetspeak_send_parallelism": 4}):
+      self._MakeBatch(10).Send()
+
+    self.assertCountEqual(self._SentRequestIds(mock_conn), list(range(10)))
+
+  @mock.patch.object(fleetspeak_connector, "CONN")
+  def testSendConcurrentlyRaisesAfterSendingOtherMessages(self, mock_conn):
+    def InsertMessage(fs_msg, **_):
+      grr_message = jobs_pb2.GrrMessage()
+      fs_msg.data.Unpack(grr_message)
+      if grr_message.request_id == 3:
+        raise RuntimeError()
+
+    mock_conn.outgoing.InsertMessage.side_effect = InsertMessage
+
+    with test_lib.ConfigOverrider({"Server.fleetspeak_send_parallelism": 4}):
+      with self.assertRaises(RuntimeError):
+        self._MakeBatch(10).Send()
+
+    self.assertEqual(mock_conn.outgoing.InsertMessage.call_count, 10)
+
+  @mock.patch.object(fleetspeak_connector, "CONN")
+  def testSendRrgRequest(self, mock_conn):
+    batch = fleetspeak_utils.OutboundMessageBatch()
+    batch.AddRrgRequest(
+        _TEST_CLIENT_ID, rrg_pb2.Request(flow_id=42, request_id=1), []
+    )
+
+    batch.Send()
+
+    mock_conn.outgoing.InsertMessage.assert_called_once()
+    insert_args, _ = mock_conn.outgoing.InsertMessage.call_args
+    self.assertEqual(insert_args[0].destination.service_name, "RRG")
+    request = rrg_pb2.Request()
+    self.assertTrue(insert_args[0].data.Unpack(request))
+    self.assertEqual(request.flow_id, 42)
+
+  @mock.patch.object(fleetspeak_connector, "CONN")
+  def testSendIncrementsRequestCount(self, mock_conn):
+    del mock_conn  # Unused.
+    fields = ["TestClientAction", ""]
+    count = fleetspeak_utils.GRR_REQUEST_COUNT.GetValue(fields=fields)
+
+    self._MakeBatch(3).Send()
+
+    self.assertEqual(
+        fleetspeak_utils.GRR_REQUEST_COUNT.GetValue(fields=fields), count + 3
+    )
+
+
 def main(argv):
   test_lib.main(argv)
 
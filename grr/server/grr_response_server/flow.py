@@ -181,59 +181,25 @@ class FlowParent(object):
     return cls(_ParentType.SCHEDULED_FLOW, scheduled_flow_id)
 
 
-def StartFlow(
-    client_id: Optional[str] = None,
-    cpu_limit: Optional[int] = None,
-    creator: Optional[str] = None,
-    flow_args: Optional[rdf_structs.RDFStruct] = None,
-    flow_cls=None,
-    network_bytes_limit: Optional[int] = None,
-    original_flow: Optional[rdf_objects.FlowReference] = None,
+def _CreateRDFFlow(
+    client_id: Optional[str],
+    cpu_limit: Optional[int],
+    creator: Optional[str],
+    flow_args: Optional[rdf_structs.RDFStruct],
+    flow_cls,
+    network_bytes_limit: Optional[int],
+    original_flow: Optional[rdf_objects.FlowReference],
     output_plugins: Optional[
         Sequence[rdf_output_plugin.OutputPluginDescriptor]
-    ] = None,
+    ],
     proto_output_plugins: Optional[
         Sequence[output_plugin_pb2.OutputPluginDescriptor]
-    ] = None,
-    # We use a timestamp in the past as a default value here to, by default,
-    # start the flow on the worker immediately. Instead of using `None`, which
-    # would schedule the flow for execution immediately in the current binary
-    # (this code can be executed in the AdminUI or Frontend too). Using a
-    # value here forces the flow to be schedule for execution, which only the
-    # worker picks up.
-    start_at: Optional[rdfvalue.RDFDatetime] = rdfvalue.RDFDatetime(0),
-    parent: Optional[FlowParent] = None,
-    runtime_limit: Optional[rdfvalue.Duration] = None,
-    disable_rrg_support: bool = False,
-) -> str:
-  """The main factory function for creating and executing a new flow.
-
-  Args:
-    client_id: ID of the client this flow should run on.
-    cpu_limit: CPU limit in seconds for this flow.
-    creator: Username that requested this flow.
-    flow_args: An arg protocol buffer which is an instance of the required
-      flow's args_type class attribute.
-    flow_cls: Class of the flow that should be started.
-    network_bytes_limit: Limit on the network traffic this flow can generated.
-    original_flow: A FlowReference object in case this flow was copied from
-      another flow.
-    output_plugins: An OutputPluginDescriptor object indicating what output
-      plugins should be used for this flow.
-    proto_output_plugins: Sequence of OutputPluginDescriptor objects indicating
-      what output plugins should be used for this flow.
-    start_at: If specified, flow will be started not immediately, but at a given
-      time.
-    parent: A FlowParent referencing the parent, or None for top-level flows.
-    runtime_limit: Runtime limit as Duration for all ClientActions.
-    disable_rrg_support: Whether to completely disable usage of RRG actions.
-
-  Returns:
-    the flow id of the new flow.
-
-  Raises:
-    ValueError: Unknown or invalid parameters were provided.
-  """
+    ],
+    parent: FlowParent,
+    runtime_limit: Optional[rdfvalue.Duration],
+    disable_rrg_support: bool,
+) -> rdf_flow_objects.Flow:
+  """Validates flow parameters and creates a flow object for `StartFlow`."""
   # Is the required flow a known flow?
   try:
     registry.FlowRegistry.FlowClassByName(flow_cls.__name__)
@@ -267,9 +233,6 @@ def StartFlow(
       disable_rrg_support=disable_rrg_support,
   )
 
-  if parent is None:
-    parent = FlowParent.FromRoot()
-
   if parent.is_hunt or parent.is_scheduled_flow:
     # When starting a flow from a hunt or ScheduledFlow, re-use the parent's id
     # to make it easy to find flows. For hunts, every client has a top-level
@@ -278,14 +241,6 @@ def StartFlow(
   else:  # For new top-level and child flows, assign a random ID.
     rdf_flow.flow_id = RandomFlowId()
 
-  # For better performance, only do conflicting IDs check for top-level flows.
-  if not parent.is_flow:
-    try:
-      data_store.REL_DB.ReadFlowObject(client_id, rdf_flow.flow_id)
-      raise CanNotStartFlowWithExistingIdError(client_id, rdf_flow.flow_id)
-    except db.UnknownFlowError:
-      pass
-
   if parent.is_flow:  # A flow is a nested flow.
     parent_rdf_flow = parent.flow_obj.rdf_flow
     rdf_flow.long_flow_id = "%s/%s" % (
@@ -375,6 +330,111 @@ def StartFlow(
   if runtime_limit is not None:
     rdf_flow.runtime_limit_us = runtime_limit
 
+  return rdf_flow
+
+
+def _RunStartInline(flow_obj) -> None:
+  """Runs the first state of a flow on the current thread."""
+  try:
+    # Just run the first state inline. NOTE: Running synchronously means
+    # that this runs on the thread that starts the flow. The advantage is
+    # that that Start method can raise any errors immediately.
+    flow_obj.Start()
+
+    # The flow does not need to actually remain running.
+    if not flow_obj.outstanding_requests:
+      flow_obj.RunStateMethod("End")
+      # Additional check for the correct state in case the End method raised
+      # and terminated the flow.
+      if flow_obj.IsRunning():
+        flow_obj.MarkDone()
+  except Exception as e:  # pylint: disable=broad-except
+    # We catch all exceptions that happen in Start() and mark the flow as
+    # failed.
+    msg = str(e)
+
+    flow_obj.Error(error_message=msg, backtrace=traceback.format_exc())
+
+
+def StartFlow(
+    client_id: Optional[str] = None,
+    cpu_limit: Optional[int] = None,
+    creator: Optional[str] = None,
+    flow_args: Optional[rdf_structs.RDFStruct] = None,
+    flow_cls=None,
+    network_bytes_limit: Optional[int] = None,
+    original_flow: Optional[rdf_objects.FlowReference] = None,
+    output_plugins: Optional[
+        Sequence[rdf_output_plugin.OutputPluginDescriptor]
+    ] = None,
+    proto_output_plugins: Optional[
+        Sequence[output_plugin_pb2.OutputPluginDescriptor]
+    ] = None,
+    # We use a timestamp in the past as a default value here to, by default,
+    # start the flow on the worker immediately. Instead of using `None`, which
+    # would schedule the flow for execution immediately in the current binary
+    # (this code can be executed in the AdminUI or Frontend too). Using a
+    # value here forces the flow to be schedule for execution, which only the
+    # worker picks up.
+    start_at: Optional[rdfvalue.RDFDatetime] = rdfvalue.RDFDatetime(0),
+    parent: Optional[FlowParent] = None,
+    runtime_limit: Optional[rdfvalue.Duration] = None,
+    disable_rrg_support: bool = False,
+) -> str:
+  """The main factory function for creating and executing a new flow.
+
+  Args:
+    client_id: ID of the client this flow should run on.
+    cpu_limit: CPU limit in seconds for this flow.
+    creator: Username that requested this flow.
+    flow_args: An arg protocol buffer which is an instance of the required
+      flow's args_type class attribute.
+    flow_cls: Class of the flow that should be started.
+    network_bytes_limit: Limit on the network traffic this flow can generated.
+    original_flow: A FlowReference object in case this flow was copied from
+      another flow.
+    output_plugins: An OutputPluginDescriptor object indicating what output
+      plugins should be used for this flow.
+    proto_output_plugins: Sequence of OutputPluginDescriptor objects indicating
+      what output plugins should be used for this flow.
+    start_at: If specified, flow will be started not immediately, but at a given
+      time.
+    parent: A FlowParent referencing the parent, or None for top-level flows.
+    runtime_limit: Runtime limit as Duration for all ClientActions.
+    disable_rrg_support: Whether to completely disable usage of RRG actions.
+
+  Returns:
+    the flow id of the new flow.
+
+  Raises:
+    ValueError: Unknown or invalid parameters were provided.
+  """
+  if parent is None:
+    parent = FlowParent.FromRoot()
+
+  rdf_flow = _CreateRDFFlow(
+      client_id=client_id,
+      cpu_limit=cpu_limit,
+      creator=creator,
+      flow_args=flow_args,
+      flow_cls=flow_cls,
+      network_bytes_limit=network_bytes_limit,
+      original_flow=original_flow,
+      output_plugins=output_plugins,
+      proto_output_plugins=proto_output_plugins,
+      parent=parent,
+      runtime_limit=runtime_limit,
+      disable_rrg_support=disable_rrg_support,
+  )
+
+  # For better performance, only do conflicting IDs check for top-level flows.
+  if not parent.is_flow:
+    try:
+      data_store.REL_DB.ReadFlowObject(client_id, rdf_flow.flow_id)
+      raise CanNotStartFlowWithExistingIdError(client_id, rdf_flow.flow_id)
+    except db.UnknownFlowError:
+      pass
+
   logging.info(
       "Starting %s(%s) on %s (%s)",
       rdf_flow.long_flow_id,
@@ -402,27 +462,7 @@ def StartFlow(
       raise CanNotStartFlowWithExistingIdError(client_id, rdf_flow.flow_id)
 
     allow_update = True
-
-    try:
-      # Just run the first state inline. NOTE: Running synchronously means
-      # that this runs on the thread that starts the flow. The advantage is
-      # that that Start method can raise any errors immediately.
-      flow_obj.Start()
-
-      # The flow does not need to actually remain running.
-      if not flow_obj.outstanding_requests:
-        flow_obj.RunStateMethod("End")
-        # Additional check for the correct state in case the End method raised
-        # and terminated the flow.
-        if flow_obj.IsRunning():
-          flow_obj.MarkDone()
-    except Exception as e:  # pylint: disable=broad-except
-      # We catch all exceptions that happen in Start() and mark the flow as
-      # failed.
-      msg = str(e)
-
-      flow_obj.Error(error_message=msg, backtrace=traceback.format_exc())
-
+    _RunStartInline(flow_obj)
   else:
     flow_obj.CallState("Start", start_time=start_at)
 
@@ -444,6 +484,137 @@ def StartFlow(
   return rdf_flow.flow_id
 
 
+def StartFlowsOnClients(
+    client_ids_and_start_times: Sequence[
+        tuple[str, Optional[rdfvalue.RDFDatetime]]
+    ],
+    flow_cls,
+    parent: FlowParent,
+    flow_args: Optional[rdf_structs.RDFStruct] = None,
+    creator: Optional[str] = None,
+    cpu_limit: Optional[int] = None,
+    network_bytes_limit: Optional[int] = None,
+    output_plugins: Optional[
+        Sequence[rdf_output_plugin.OutputPluginDescriptor]
+    ] = None,
+) -> list[str]:
+  """Starts flows of the same kind on multiple clients in one go.
+
+  This is a bulk version of `StartFlow` for flows that re-use the id of their
+  hunt or ScheduledFlow parent. Instead of a handful of database calls per
+  client, flows of all the clients are checked, written and flushed with a
+  handful of database calls in total.
+
+  Args:
+    client_ids_and_start_times: Pairs of ids of clients to start the flow on
+      and times to start the flow at (None to run the first state inline, see
+      `StartFlow`).
+    flow_cls: Class of the flow that should be started.
+    parent: A FlowParent referencing a hunt or a ScheduledFlow.
+    flow_args: An arg protocol buffer which is an instance of the required
+      flow's args_type class attribute.
+    creator: Username that requested the flows.
+    cpu_limit: CPU limit in seconds for every flow.
+    network_bytes_limit: Limit on the network traffic every flow can generate.
+    output_plugins: OutputPluginDescriptor objects indicating what output
+      plugins should be used for the flows.
+
+  Returns:
+    Ids of the clients the flow was started on. Clients that already have a
+    flow with the parent's id are skipped.
+
+  Raises:
+    ValueError: Unknown or invalid parameters were provided.
+  """
+  if not parent.is_hunt and not parent.is_scheduled_flow:
+    raise ValueError(f"Can't start flows with parent {parent} in bulk")
+
+  rdf_flows = []
+  for client_id, _ in client_ids_and_start_times:
+    rdf_flows.append(
+        _CreateRDFFlow(
+            client_id=client_id,
+            cpu_limit=cpu_limit,
+            creator=creator,
+            flow_args=flow_args.Copy() if flow_args is not None else None,
+            flow_cls=flow_cls,
+            network_bytes_limit=network_bytes_limit,
+            original_flow=None,
+            output_plugins=output_plugins,
+            proto_output_plugins=None,
+            parent=parent,
+            runtime_limit=None,
+            disable_rrg_support=False,
+        )
+    )
+
+  existing_flow_keys = data_store.REL_DB.ReadFlowObjects(
+      [(rdf_flow.client_id, rdf_flow.flow_id) for rdf_flow in rdf_flows]
+  )
+
+  flow_objs = []
+  inline_flow_objs = []
+  for rdf_flow, (client_id, start_at) in zip(
+      rdf_flows, client_ids_and_start_times
+  ):
+    if (client_id, rdf_flow.flow_id) in existing_flow_keys:
+      logging.info(
+          "Not starting %s on %s: flow already exists",
+          rdf_flow.long_flow_id,
+          client_id,
+      )
+      continue
+
+    logging.info(
+        "Starting %s(%s) on %s (%s)",
+        rdf_flow.long_flow_id,
+        rdf_flow.flow_class_name,
+        client_id,
+        start_at or "now",
+    )
+
+    rdf_flow.current_state = "Start"
+    flow_obj = flow_cls(rdf_flow)
+    if start_at is None:
+      inline_flow_objs.append(flow_obj)
+    else:
+      flow_obj.CallState("Start", start_time=start_at)
+      flow_obj.PersistState()
+    flow_objs.append(flow_obj)
+
+  # Flows that are started inline are stored straight away too, see
+  # `StartFlow` for details.
+  while flow_objs:
+    try:
+      data_store.REL_DB.WriteFlowObjects(
+          [mig_flow_objects.ToProtoFlow(f.rdf_flow) for f in flow_objs],
+          allow_update=False,
+      )
+      break
+    except db.FlowExistsError as e:
+      # Another process has started the flow on this client in the meantime.
+      logging.info(
+          "Not starting %s on %s: flow already exists", e.flow_id, e.client_id
+      )
+      flow_objs = [f for f in flow_objs if f.rdf_flow.client_id != e.client_id]
+      inline_flow_objs = [
+          f for f in inline_flow_objs if f.rdf_flow.client_id != e.client_id
+      ]
+
+  if inline_flow_objs:
+    for flow_obj in inline_flow_objs:
+      _RunStartInline(flow_obj)
+      flow_obj.PersistState()
+
+    data_store.REL_DB.WriteFlowObjects(
+        [mig_flow_objects.ToProtoFlow(f.rdf_flow) for f in inline_flow_objs]
+    )
+
+  flow_cls.FlushQueuedMessagesOfFlows(flow_objs)
+
+  return [flow_obj.rdf_flow.client_id for flow_obj in flow_objs]
+
+
 def ScheduleFlow(
     client_id: str,
     creator: str,
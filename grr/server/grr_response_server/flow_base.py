@@ -20,6 +20,7 @@ from grr_response_core.lib.rdfvalues import mig_protodict
 from grr_response_core.lib.rdfvalues import protodict as rdf_protodict
 from grr_response_core.lib.rdfvalues import structs as rdf_structs
 from grr_response_core.lib.registry import FlowRegistry
+from grr_response_core.lib.util import random
 from grr_response_core.stats import metrics
 from grr_response_proto import flows_pb2
 from grr_response_proto import jobs_pb2
@@ -1479,7 +1480,10 @@ class FlowBase(
       # TODO: Remove when no more RDF-based output plugins exist.
       if self.replies_to_process:
         if self.rdf_flow.parent_hunt_id and not self.rdf_flow.parent_flow_id:
-          self._ProcessRepliesWithHuntOutputPlugins(self.replies_to_process)
+          if config.CONFIG["Worker.async_hunt_output_plugins"]:
+            self._QueueRepliesForHuntOutputPlugins(self.replies_to_process)
+          else:
+            self._ProcessRepliesWithHuntOutputPlugins(self.replies_to_process)
         else:
           self._ProcessRepliesWithFlowOutputPlugins(self.replies_to_process)
 
@@ -1499,17 +1503,39 @@ class FlowBase(
       msg = str(e)
       self.Error(error_message=msg, backtrace=traceback.format_exc())
 
-  def ProcessAllReadyRequests(self) -> tuple[int, int]:
+  def ProcessAllReadyRequests(
+      self,
+      request_dict: Optional[
+          Mapping[
+              int,
+              tuple[
+                  flows_pb2.FlowRequest,
+                  Sequence[
+                      Union[
+                          flows_pb2.FlowResponse,
+                          flows_pb2.FlowStatus,
+                          flows_pb2.FlowIterator,
+                      ],
+                  ],
+              ],
+          ]
+      ] = None,
+  ) -> tuple[int, int]:
     """Processes all requests that are due to run.
 
+    Args:
+      request_dict: Requests of this flow as returned by `ReadFlowRequests`.
+        If not provided, requests are read from the database.
+
     Returns:
       (processed, incrementally_processed) The number of completed processed
       requests and the number of incrementally processed ones.
     """
-    request_dict = data_store.REL_DB.ReadFlowRequests(
-        self.rdf_flow.client_id,
-        self.rdf_flow.flow_id,
-    )
+    if request_dict is None:
+      request_dict = data_store.REL_DB.ReadFlowRequests(
+          self.rdf_flow.client_id,
+          self.rdf_flow.flow_id,
+      )
 
     completed_requests = FindCompletedRequestsToProcess(
         request_dict,
@@ -1645,23 +1671,45 @@ class FlowBase(
     return self.rdf_flow.response_count
 
   def FlushQueuedMessages(self) -> None:
-    """Flushes queued messages."""
+    """Flushes queued messages.
+
+    Completed requests are deleted last: if flushing fails, results and
+    messages to the client that are still queued can't get lost, because the
+    requests that produced them are processed again.
+    """
     # TODO(amoser): This could be done in a single db call, might be worth
     # optimizing.
 
-    if self.flow_requests or self.proto_flow_requests:
-      all_requests = [
-          mig_flow_objects.ToProtoFlowRequest(r) for r in self.flow_requests
-      ] + self.proto_flow_requests
+    all_requests = self._GetQueuedRequests()
+    if all_requests:
       # We make a single DB call to write all requests. Contrary to what the
       # name suggests, this method does more than writing the requests to the
       # DB. It also tallies the flows that need processing and updates the
       # next request to process. Writing the requests in separate calls can
       # interfere with this process.
       data_store.REL_DB.WriteFlowRequests(all_requests)
-      self.flow_requests = []
-      self.proto_flow_requests = []
+      self._ClearQueuedRequests()
 
+    self._WriteQueuedResponses()
+
+    all_results = self._GetQueuedResults()
+    if all_results:
+      # Write flow results to REL_DB, even if the flow is a nested flow.
+      data_store.REL_DB.WriteFlowResults(all_results)
+      self._ClearQueuedResults()
+
+    batch = fleetspeak_utils.OutboundMessageBatch()
+    self._AddQueuedClientMessages(batch)
+    batch.Send()
+    self._ClearQueuedClientMessages()
+
+    self._DeleteCompletedRequests()
+
+    if all_results and self.rdf_flow.parent_hunt_id:
+      hunt.StopHuntIfCPUOrNetworkLimitsExceeded(self.rdf_flow.parent_hunt_id)
+
+  def _WriteQueuedResponses(self) -> None:
+    """Writes queued flow responses and clears the queue."""
     if self.flow_responses:
       flow_responses_proto = []
       for r in self.flow_responses:
@@ -1678,50 +1726,108 @@ class FlowBase(
       data_store.REL_DB.WriteFlowResponses(self.proto_flow_responses)
       self.proto_flow_responses = []
 
-    if self.client_action_requests:
-      client_id = self.rdf_flow.client_id
-      for request in self.client_action_requests:
-        fleetspeak_utils.SendGrrMessageThroughFleetspeak(
-            client_id,
-            request,
-            self.client_labels,
-        )
-
-      self.client_action_requests = []
+  def _AddQueuedClientMessages(
+      self, batch: fleetspeak_utils.OutboundMessageBatch
+  ) -> None:
+    """Adds queued messages to the client to a batch."""
+    client_id = self.rdf_flow.client_id
+    for request in self.client_action_requests:
+      batch.AddGrrMessage(client_id, request, self.client_labels)
 
-    if self.proto_client_action_requests:
-      client_id = self.rdf_flow.client_id
-      for request in self.proto_client_action_requests:
-        fleetspeak_utils.SendGrrMessageProtoThroughFleetspeak(
-            client_id,
-            request,
-            self.client_labels,
-        )
-      self.proto_client_action_requests = []
+    for request in self.proto_client_action_requests:
+      batch.AddGrrMessageProto(client_id, request, self.client_labels)
 
     for request in self.rrg_requests:
-      fleetspeak_utils.SendRrgRequest(
-          self.rdf_flow.client_id,
-          request,
-          self.client_labels,
-      )
+      batch.AddRrgRequest(client_id, request, self.client_labels)
 
+  def _ClearQueuedClientMessages(self) -> None:
+    self.client_action_requests = []
+    self.proto_client_action_requests = []
     self.rrg_requests = []
 
+  def _DeleteCompletedRequests(self) -> None:
     if self.completed_requests:
       data_store.REL_DB.DeleteFlowRequests(self.completed_requests)
       self.completed_requests = []
 
-    if self.proto_replies_to_write or self.replies_to_write:
-      all_results = self.proto_replies_to_write + [
-          mig_flow_objects.ToProtoFlowResult(r) for r in self.replies_to_write
-      ]
-      # Write flow results to REL_DB, even if the flow is a nested flow.
+  def _GetQueuedRequests(self) -> list[flows_pb2.FlowRequest]:
+    """Returns queued flow requests."""
+    return [
+        mig_flow_objects.ToProtoFlowRequest(r) for r in self.flow_requests
+    ] + self.proto_flow_requests
+
+  def _ClearQueuedRequests(self) -> None:
+    self.flow_requests = []
+    self.proto_flow_requests = []
+
+  def _GetQueuedResults(self) -> list[flows_pb2.FlowResult]:
+    """Returns queued flow results."""
+    return self.proto_replies_to_write + [
+        mig_flow_objects.ToProtoFlowResult(r) for r in self.replies_to_write
+    ]
+
+  def _ClearQueuedResults(self) -> None:
+    self.proto_replies_to_write = []
+    self.replies_to_write = []
+
+  @classmethod
+  def FlushQueuedMessagesOfFlows(cls, flow_objs: Sequence["FlowBase"]) -> None:
+    """Flushes queued messages of multiple flows.
+
+    Requests, results and completed requests of all the flows are written (or
+    deleted) with a single database call each and messages to clients of all
+    the flows are sent as a single batch. Responses are written flow by flow.
+
+    Queued messages are only cleared once they are written or sent, and
+    completed requests are deleted last. If this method raises, nothing that
+    is still queued is lost: the flows can be flushed one by one with
+    `FlushQueuedMessages`.
+
+    Args:
+      flow_objs: Flows to flush queued messages of.
+    """
+    all_requests = []
+    for flow_obj in flow_objs:
+      all_requests.extend(flow_obj._GetQueuedRequests())
+    if all_requests:
+      # Requests have to be written before responses and results that might
+      # refer to them.
+      data_store.REL_DB.WriteFlowRequests(all_requests)
+    for flow_obj in flow_objs:
+      flow_obj._ClearQueuedRequests()
+
+    for flow_obj in flow_objs:
+      flow_obj._WriteQueuedResponses()
+
+    all_results = []
+    hunt_ids = set()
+    for flow_obj in flow_objs:
+      results = flow_obj._GetQueuedResults()
+      if results and flow_obj.rdf_flow.parent_hunt_id:
+        hunt_ids.add(flow_obj.rdf_flow.parent_hunt_id)
+      all_results.extend(results)
+    if all_results:
       data_store.REL_DB.WriteFlowResults(all_results)
-      if self.rdf_flow.parent_hunt_id:
-        hunt.StopHuntIfCPUOrNetworkLimitsExceeded(self.rdf_flow.parent_hunt_id)
-      self.proto_replies_to_write = []
-      self.replies_to_write = []
+    for flow_obj in flow_objs:
+      flow_obj._ClearQueuedResults()
+
+    outbound_messages = fleetspeak_utils.OutboundMessageBatch()
+    for flow_obj in flow_objs:
+      flow_obj._AddQueuedClientMessages(outbound_messages)
+    outbound_messages.Send()
+    for flow_obj in flow_objs:
+      flow_obj._ClearQueuedClientMessages()
+
+    completed_requests = []
+    for flow_obj in flow_objs:
+      completed_requests.extend(flow_obj.completed_requests)
+    if completed_requests:
+      data_store.REL_DB.DeleteFlowRequests(completed_requests)
+    for flow_obj in flow_objs:
+      flow_obj.completed_requests = []
+
+    for hunt_id in sorted(hunt_ids):
+      hunt.StopHuntIfCPUOrNetworkLimitsExceeded(hunt_id)
 
   def _ProcessRepliesWithOutputPluginProto(
       self, replies: Sequence[flows_pb2.FlowResult]
@@ -1832,6 +1938,33 @@ class FlowBase(
       if logs_to_write:
         data_store.REL_DB.WriteMultipleFlowOutputPluginLogEntries(logs_to_write)
 
+  def _QueueRepliesForHuntOutputPlugins(
+      self, replies: Sequence[rdf_flow_objects.FlowResult]
+  ) -> None:
+    """Queues hunt results to be processed by the hunt output plugins.
+
+    Queued results are picked up by the worker's hunt output plugin queue
+    threads, which process results of many hunt flows at once (see
+    `hunt_output_plugin_queue`).
+
+    Args:
+      replies: Results of the flow to be queued.
+    """
+    # Hunt flows are started with the hunt output plugins, so there is nothing
+    # to queue if the hunt doesn't have any RDF-based output plugins.
+    if not self.rdf_flow.output_plugins_states:
+      return
+
+    request = flows_pb2.HuntOutputPluginRequest(
+        request_id=random.UInt64(),
+        hunt_id=self.rdf_flow.parent_hunt_id,
+        client_id=self.rdf_flow.client_id,
+        flow_id=self.rdf_flow.flow_id,
+        long_flow_id=self.rdf_flow.long_flow_id,
+        results=[mig_flow_objects.ToProtoFlowResult(r) for r in replies],
+    )
+    data_store.REL_DB.WriteHuntOutputPluginRequests([request])
+
   def _ProcessRepliesWithHuntOutputPlugins(
       self, replies: Sequence[rdf_flow_objects.FlowResult]
   ) -> None:
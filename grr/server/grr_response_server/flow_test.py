@@ -2616,6 +2616,111 @@ class WorkerTest(BasicFlowTest):
       with self.assertRaises(worker_lib.FlowHasNothingToProcessError):
         worker.ProcessFlow(fpr)
 
+  def testProcessFlowsProcessesAllFlowsOfBatch(self):
+    start_at = rdfvalue.RDFDatetime.Now() + rdfvalue.Duration("1m")
+    flow_ids = [
+        flow.StartFlow(
+            flow_cls=CallClientParentFlow,
+            client_id=self.client_id,
+            start_at=start_at,
+        )
+        for _ in range(3)
+    ]
+    fprs = [
+        flows_pb2.FlowProcessingRequest(client_id=self.client_id, flow_id=f)
+        for f in flow_ids
+    ]
+
+    with test_lib.FakeTime(start_at + rdfvalue.Duration("1s")):
+      worker_lib.GRRWorker().ProcessFlows(fprs)
+
+    for flow_id in flow_ids:
+      flow_obj = data_store.REL_DB.ReadFlowObject(self.client_id, flow_id)
+      self.assertFalse(flow_obj.processing_on)
+      self.assertEqual(flow_obj.next_request_to_process, 2)
+      self.assertLen(
+          data_store.REL_DB.ReadChildFlowObjects(self.client_id, flow_id), 1
+      )
+
+  def testProcessFlowsIsolatesFlowsWithNothingToProcess(self):
+    flow_id_1 = flow.StartFlow(
+        flow_cls=CallClientParentFlow,
+        client_id=self.client_id,
+        start_at=None,
+    )
+    start_at = rdfvalue.RDFDatetime.Now() + rdfvalue.Duration("1m")
+    flow_id_2 = flow.StartFlow(
+        flow_cls=CallClientParentFlow,
+        client_id=self.client_id,
+        start_at=start_at,
+    )
+    fprs = [
+        flows_pb2.FlowProcessingRequest(client_id=self.client_id, flow_id=f)
+        for f in (flow_id_1, flow_id_2)
+    ]
+
+    with test_lib.FakeTime(start_at + rdfvalue.Duration("1s")):
+      worker_lib.GRRWorker().ProcessFlows(fprs)
+
+    flow_obj = data_store.REL_DB.ReadFlowObject(self.client_id, flow_id_2)
+    self.assertFalse(flow_obj.processing_on)
+    self.assertEqual(flow_obj.next_request_to_process, 2)
+
+  def testProcessFlowsFallsBackToSingleFlowsIfBulkFlushFails(self):
+    start_at = rdfvalue.RDFDatetime.Now() + rdfvalue.Duration("1m")
+    flow_ids = [
+        flow.StartFlow(
+            flow_cls=CallClientParentFlow,
+            client_id=self.client_id,
+            start_at=start_at,
+        )
+        for _ in range(2)
+    ]
+    fprs = [
+        flows_pb2.FlowProcessingRequest(client_id=self.client_id, flow_id=f)
+        for f in flow_ids
+    ]
+
+    with test_lib.FakeTime(start_at + rdfvalue.Duration("1s")):
+      with mock.patch.object(
+          flow_base.FlowBase,
+          "FlushQueuedMessagesOfFlows",
+          side_effect=RuntimeError(),
+      ):
+        worker_lib.GRRWorker().ProcessFlows(fprs)
+
+    for flow_id in flow_ids:
+      flow_obj = data_store.REL_DB.ReadFlowObject(self.client_id, flow_id)
+      self.assertFalse(flow_obj.processing_on)
+      self.assertEqual(flow_obj.next_request_to_process, 2)
+
+  def testProcessFlowsReturnsLeaseOfFlowsFailingToFlush(self):
+    start_at = rdfvalue.RDFDatetime.Now() + rdfvalue.Duration("1m")
+    flow_id = flow.StartFlow(
+        flow_cls=CallClientParentFlow,
+        client_id=self.client_id,
+        start_at=start_at,
+    )
+    fpr = flows_pb2.FlowProcessingRequest(
+        client_id=self.client_id, flow_id=flow_id
+    )
+
+    with test_lib.FakeTime(start_at + rdfvalue.Duration("1s")):
+      with mock.patch.object(
+          data_store.REL_DB, "DeleteFlowRequests", side_effect=RuntimeError()
+      ):
+        worker_lib.GRRWorker().ProcessFlows([fpr])
+
+    # The flow is not leased anymore and its request is still there to be
+    # processed again.
+    flow_obj = data_store.REL_DB.ReadFlowObject(self.client_id, flow_id)
+    self.assertFalse(flow_obj.processing_on)
+    self.assertEqual(flow_obj.next_request_to_process, 1)
+    requests = data_store.REL_DB.ReadAllFlowRequestsAndResponses(
+        self.client_id, flow_id
+    )
+    self.assertLen(requests, 1)
+
 
 def main(argv):
   # Run the full test suite
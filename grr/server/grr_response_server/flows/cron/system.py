@@ -1,10 +1,13 @@
 #!/usr/bin/env python
 """These flows are system-specific GRR cron flows."""
 
+import sys
 
 from grr_response_core import config
 from grr_response_core.lib import rdfvalue
+from grr_response_proto import hunts_pb2
 from grr_response_server import cronjobs
+from grr_response_server import data_store
 from grr_response_server import hunt
 from grr_response_server.flows.general import discovery as flows_discovery
 
@@ -56,3 +59,29 @@ class InterrogateClientsCronJob(cronjobs.SystemCronJobBase,
 
   def Run(self):
     self.StartInterrogationHunt()
+
+
+class ReconcileHuntCountersCronJob(cronjobs.SystemCronJobBase):
+  """A cron job which recomputes counters of active hunts.
+
+  Hunt counters are maintained incrementally as hunt flows are written. This
+  job rebuilds them from the hunt flows to fix any drift (e.g. caused by flows
+  modified directly in the database).
+  """
+
+  frequency = rdfvalue.Duration.From(1, rdfvalue.DAYS)
+  lifetime = rdfvalue.Duration.From(12, rdfvalue.HOURS)
+
+  def Run(self):
+    hunt_objs = data_store.REL_DB.ReadHuntObjects(
+        0,
+        sys.maxsize,
+        with_states=[
+            hunts_pb2.Hunt.HuntState.PAUSED,
+            hunts_pb2.Hunt.HuntState.STARTED,
+        ])
+    for hunt_obj in hunt_objs:
+      self.HeartBeat()
+      data_store.REL_DB.ReconcileHuntCounters(hunt_obj.hunt_id)
+
+    self.Log("Reconciled counters of %d hunts.", len(hunt_objs))
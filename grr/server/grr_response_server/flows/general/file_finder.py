@@ -11,6 +11,7 @@ from typing import Optional, cast
 from google.protobuf import any_pb2
 from google.protobuf import timestamp_pb2
 from grr_response_core.lib import artifact_utils
+from grr_response_core.lib import constants
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib.rdfvalues import file_finder as rdf_file_finder
 from grr_response_core.lib.rdfvalues import mig_client_fs
@@ -161,6 +162,20 @@ class ClientFileFinder(
     ):
       return self._StartRRG()
 
+    download = self.proto_args.action.download
+    if (
+        self.proto_args.action.action_type
+        == flows_pb2.FileFinderAction.DOWNLOAD
+        and download.deduplicate_chunks
+        and download.chunk_size > constants.CLIENT_MAX_BUFFER_SIZE
+    ):
+      # Missing chunks are read with client buffer reads, which can't be
+      # larger than `CLIENT_MAX_BUFFER_SIZE`.
+      raise ValueError(
+          f"Chunk size {download.chunk_size} can't be larger than"
+          f" {constants.CLIENT_MAX_BUFFER_SIZE} when deduplicating chunks"
+      )
+
     if self.proto_args.pathtype == jobs_pb2.PathSpec.PathType.OS:
       stub = server_stubs.FileFinderOS
     else:
@@ -675,12 +690,134 @@ class ClientFileFinder(
     for r in stat_entry_responses:
       self.SendReplyProto(r)
 
-    if transferred_file_responses:
+    if not transferred_file_responses:
+      return
+
+    if self.proto_args.action.download.deduplicate_chunks:
+      self._RequestMissingChunks(transferred_file_responses)
+      # Requests are processed in order, so the results are stored only after
+      # the missing chunks are transferred.
+      self.CallStateProto(
+          next_state=self.StoreResultsWithBlobs.__name__,
+          responses=transferred_file_responses,
+      )
+    else:
       self.CallStateInlineProto(
           next_state=self.StoreResultsWithBlobs.__name__,
           messages=transferred_file_responses,
       )
 
+  def _RequestMissingChunks(
+      self,
+      responses: Sequence[flows_pb2.FileFinderResult],
+  ) -> None:
+    """Requests contents of reported chunks missing from the blob store.
+
+    Adjacent missing chunks of a file are read with a single client buffer
+    read, as long as they fit into `CLIENT_MAX_BUFFER_SIZE` bytes.
+
+    Args:
+      responses: File finder results with chunks that were only digested (and
+        not uploaded) by the client.
+    """
+    blob_ids = set()
+    for response in responses:
+      for chunk in response.transferred_file.chunks:
+        blob_ids.add(models_blobs.BlobID(chunk.digest))
+
+    blobs_exist = data_store.BLOBS.CheckBlobsExist(blob_ids)
+
+    requested_blob_ids = set()
+    num_requests = 0
+    for response in responses:
+      run: list[jobs_pb2.BlobImageChunkDescriptor] = []
+      run_length = 0
+      for chunk in response.transferred_file.chunks:
+        blob_id = models_blobs.BlobID(chunk.digest)
+        if blobs_exist[blob_id] or blob_id in requested_blob_ids:
+          continue
+
+        requested_blob_ids.add(blob_id)
+        if run and (
+            run[-1].offset + run[-1].length != chunk.offset
+            or run_length + chunk.length > constants.CLIENT_MAX_BUFFER_SIZE
+        ):
+          self._RequestChunks(response.stat_entry.pathspec, run)
+          num_requests += 1
+          run, run_length = [], 0
+
+        run.append(chunk)
+        run_length += chunk.length
+
+      if run:
+        self._RequestChunks(response.stat_entry.pathspec, run)
+        num_requests += 1
+
+    self.Log(
+        "Requesting %d out of %d chunks missing from the blob store in %d"
+        " reads",
+        len(requested_blob_ids),
+        len(blob_ids),
+        num_requests,
+    )
+
+  def _RequestChunks(
+      self,
+      pathspec: jobs_pb2.PathSpec,
+      chunks: Sequence[jobs_pb2.BlobImageChunkDescriptor],
+  ) -> None:
+    """Requests contents of adjacent chunks of a file with a single read."""
+    self.CallClientProto(
+        server_stubs.ReadBuffer,
+        jobs_pb2.BufferReference(
+            pathspec=pathspec,
+            offset=chunks[0].offset,
+            length=sum(chunk.length for chunk in chunks),
+        ),
+        next_state=self._ReceiveMissingChunks.__name__,
+        request_data=dict(
+            path=pathspec.path,
+            lengths=[chunk.length for chunk in chunks],
+            digests=[chunk.digest.hex() for chunk in chunks],
+        ),
+    )
+
+  @flow_base.UseProto2AnyResponses
+  def _ReceiveMissingChunks(
+      self,
+      responses: flow_responses.Responses[any_pb2.Any],
+  ) -> None:
+    """Stores requested chunks after verifying they were read as digested."""
+    path = responses.request_data["path"]
+
+    if not responses.success:
+      raise flow_base.FlowError(
+          f"Failed to collect chunks of '{path}': {responses.status}",
+      )
+
+    blobs = {}
+    for response_any in responses:
+      response = jobs_pb2.BufferReference()
+      response_any.Unpack(response)
+
+      offset = 0
+      for length, digest in zip(
+          responses.request_data["lengths"], responses.request_data["digests"]
+      ):
+        data = response.data[offset : offset + length]
+        offset += length
+
+        # The chunk would never appear in the blob store if its content
+        # changed since the client reported its digest.
+        blob_id = models_blobs.BlobID.Of(data)
+        if bytes(blob_id).hex() != digest:
+          raise flow_base.FlowError(
+              f"File '{path}' changed while its chunks were being collected",
+          )
+        blobs[blob_id] = data
+
+    data_store.BLOBS.WriteBlobs(blobs)
+
   @flow_base.UseProto2AnyResponses
   def StoreResultsWithBlobs(
       self,
@@ -17,6 +17,7 @@ from absl import app
 
 from google.protobuf import any_pb2
 from grr_response_client import vfs
+from grr_response_client.client_actions import standard
 from grr_response_client.client_actions.file_finder_utils import uploading
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib.rdfvalues import client_fs as rdf_client_fs
@@ -1430,6 +1431,71 @@ class TestClientFileFinderFlow(flow_test_lib.FlowTestsBaseclass):
 
     self._VerifyDownloadedFiles(results)
 
+  def testClientFileFinderDownloadDeduplicateChunks(self):
+    paths = [
+        os.path.join(self.base_path, "History.plist"),
+        os.path.join(self.base_path, "test.plist"),
+    ]
+    action = rdf_file_finder.FileFinderAction(
+        action_type=rdf_file_finder.FileFinderAction.Action.DOWNLOAD
+    )
+    action.download.deduplicate_chunks = True
+    action.download.chunk_size = 64
+
+    def RunFlow() -> tuple[Sequence[Any], int]:
+      with mock.patch.object(
+          standard.ReadBuffer,
+          "Run",
+          autospec=True,
+          side_effect=standard.ReadBuffer.Run,
+      ) as read_buffer_run:
+        flow_id = flow_test_lib.StartAndRunFlow(
+            file_finder.ClientFileFinder,
+            action_mocks.ClientFileFinderClientMock(standard.ReadBuffer),
+            client_id=self.client_id,
+            flow_args=rdf_file_finder.FileFinderArgs(
+                paths=paths,
+                pathtype=rdf_paths.PathSpec.PathType.OS,
+                action=action,
+            ),
+            creator=self.test_username,
+        )
+
+      results = flow_test_lib.GetFlowResults(self.client_id, flow_id)
+      return results, read_buffer_run.call_count
+
+    results, read_count = RunFlow()
+    self.assertLen(results, 2)
+    self._VerifyDownloadedFiles(results)
+    # All (adjacent) chunks of a file are read at once.
+    self.assertEqual(read_count, 2)
+
+    # Chunks are in the blob store now, so none of them is transferred again.
+    results, read_count = RunFlow()
+    self.assertLen(results, 2)
+    self._VerifyDownloadedFiles(results)
+    self.assertEqual(read_count, 0)
+
+  def testClientFileFinderDeduplicateChunksRejectsLargeChunks(self):
+    action = rdf_file_finder.FileFinderAction(
+        action_type=rdf_file_finder.FileFinderAction.Action.DOWNLOAD
+    )
+    action.download.deduplicate_chunks = True
+    action.download.chunk_size = constants.CLIENT_MAX_BUFFER_SIZE + 1
+
+    with self.assertRaisesRegex(RuntimeError, "Chunk size"):
+      flow_test_lib.StartAndRunFlow(
+          file_finder.ClientFileFinder,
+          action_mocks.ClientFileFinderClientMock(),
+          client_id=self.client_id,
+          flow_args=rdf_file_finder.FileFinderArgs(
+              paths=[os.path.join(self.base_path, "test.plist")],
+              pathtype=rdf_paths.PathSpec.PathType.OS,
+              action=action,
+          ),
+          creator=self.test_username,
+      )
+
   def testClientFileFinderPathCasing(self):
     paths = [
         os.path.join(self.base_path, "PARSER_TEST/*.plist"),
@@ -3,12 +3,15 @@
 
 import collections
 from collections.abc import Iterable
+import hashlib
 import logging
 import re
+from typing import Any, Optional
 
 import yara
 
 from google.protobuf import any_pb2
+from grr_response_core import config
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib.rdfvalues import client_fs as rdf_client_fs
 from grr_response_core.lib.rdfvalues import memory as rdf_memory
@@ -114,17 +117,44 @@ class YaraProcessScan(
     else:
       request_data = None
 
+    signature_bytes = self._ReadSignature()
+
+    if config.CONFIG["Server.yara_signature_cache_probe"]:
+      # The client scans right away if it has the signature cached. Otherwise
+      # it replies with `signature_missing` and the signature is sent in
+      # shards when processing the reply.
+      client_request = flows_pb2.YaraProcessScanRequest()
+      client_request.CopyFrom(self.proto_args)
+      client_request.ClearField("yara_signature")
+      client_request.signature_sha256 = hashlib.sha256(signature_bytes).digest()
+      self.CallClientProto(
+          server_stubs.YaraProcessScan,
+          client_request,
+          request_data=request_data,
+          next_state=self.ProcessScanResults.__name__,
+      )
+    else:
+      self._SendSignatureShards(signature_bytes, request_data)
+
+  def _ReadSignature(self) -> bytes:
+    """Returns the UTF-8-encoded signature to scan with."""
     if self.proto_args.yara_signature:
-      signature_bytes = str(self.proto_args.yara_signature).encode("utf-8")
+      return str(self.proto_args.yara_signature).encode("utf-8")
     elif self.proto_args.yara_signature_blob_id:
       blob_id = models_blobs.BlobID(self.proto_args.yara_signature_blob_id)
-      signature_bytes = data_store.BLOBS.ReadBlob(blob_id)
+      return data_store.BLOBS.ReadBlob(blob_id)
     else:
       raise flow_base.FlowError(
           "We should have one or the other set _ValidateFlowArgs should have"
           " caught this."
       )
 
+  def _SendSignatureShards(
+      self,
+      signature_bytes: bytes,
+      request_data: Optional[dict[str, Any]],
+  ) -> None:
+    """Sends scan requests with shards of the signature to the client."""
     offsets = range(0, len(signature_bytes), _YARA_SIGNATURE_SHARD_SIZE)
     for i, offset in enumerate(offsets):
       client_request = flows_pb2.YaraProcessScanRequest()
@@ -162,6 +192,17 @@ class YaraProcessScan(
       # the full signature has been received.
       return
 
+    for response_any in responses:
+      response = flows_pb2.YaraProcessScanResponse()
+      response.ParseFromString(response_any.value)
+      if response.signature_missing:
+        # The client doesn't have the signature cached.
+        self._SendSignatureShards(
+            self._ReadSignature(),
+            responses.request_data.ToDict() or None,
+        )
+        return
+
     # Restore original runtime limit in case it was overridden.
     if "runtime_limit_us" in responses.request_data:
       self.rdf_flow.runtime_limit_us = responses.request_data[
@@ -4,6 +4,7 @@
 from collections.abc import Iterable, Sequence
 import contextlib
 import functools
+import hashlib
 import inspect
 import os
 import platform
@@ -331,6 +332,10 @@ class BaseYaraFlowsTest(flow_test_lib.FlowTestsBaseclass):
     self.addCleanup(stack.close)
     self._tmp_dir = stack.enter_context(utils.TempDirectory())
 
+    # Make sure rules compiled (or mocked) in other tests are not reused.
+    memory_actions._YARA_RULES_CACHE.Clear()
+    self.addCleanup(memory_actions._YARA_RULES_CACHE.Clear)
+
     self.client_id = self.SetupClient(0)
     self.procs = [
         client_test_lib.MockWindowsProcess(pid=101, name="proc101.exe"),
@@ -448,6 +453,37 @@ class YaraFlowsTest(BaseYaraFlowsTest):
     )
     self.assertListEqual(scan_requests, [expected_request])
 
+  @mock.patch.object(memory, "_YARA_SIGNATURE_SHARD_SIZE", 30)
+  def testYaraProcessScan_SignatureCacheProbe(self):
+    procs = [p for p in self.procs if p.pid in [101, 102, 103]]
+    signature_sha256 = hashlib.sha256(
+        _TEST_YARA_SIGNATURE.encode("utf-8")
+    ).digest()
+
+    with test_lib.ConfigOverrider({"Server.yara_signature_cache_probe": True}):
+      action_mock = action_mocks.ActionMock(memory_actions.YaraProcessScan)
+      matches, _, _ = self._RunYaraProcessScan(procs, action_mock=action_mock)
+
+      self.assertLen(matches, 1)
+      scan_requests = action_mock.recorded_args["YaraProcessScan"]
+      # The probe is followed by all the shards of the signature.
+      self.assertEqual(scan_requests[0].signature_sha256, signature_sha256)
+      self.assertFalse(scan_requests[0].HasField("signature_shard"))
+      num_shards = len(range(0, len(_TEST_YARA_SIGNATURE.encode("utf-8")), 30))
+      self.assertLen(scan_requests, 1 + num_shards)
+      for scan_request in scan_requests[1:]:
+        self.assertTrue(scan_request.HasField("signature_shard"))
+
+      # The client has the signature cached now, so it is not sent again.
+      action_mock = action_mocks.ActionMock(memory_actions.YaraProcessScan)
+      matches, _, _ = self._RunYaraProcessScan(procs, action_mock=action_mock)
+
+      self.assertLen(matches, 1)
+      scan_requests = action_mock.recorded_args["YaraProcessScan"]
+      self.assertLen(scan_requests, 1)
+      self.assertEqual(scan_requests[0].signature_sha256, signature_sha256)
+      self.assertFalse(scan_requests[0].HasField("signature_shard"))
+
   @mock.patch.object(memory, "_YARA_SIGNATURE_SHARD_SIZE", 30)
   def testYaraProcessScan_MultipleSignatureShards(self):
     action_mock = action_mocks.ActionMock(memory_actions.YaraProcessScan)
@@ -1,13 +1,17 @@
 #!/usr/bin/env python
 """A module that defines the timeline flow."""
 
-from collections.abc import Iterator
+from collections.abc import Iterable, Iterator, Sequence
+import dataclasses
+import os
 from typing import Optional
 
 from google.protobuf import any_pb2
+from grr_response_core import config
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib.rdfvalues import mig_timeline
 from grr_response_core.lib.rdfvalues import timeline as rdf_timeline
+from grr_response_core.lib.util import collection
 from grr_response_core.lib.util import timeline
 from grr_response_proto import flows_pb2
 from grr_response_proto import timeline_pb2
@@ -110,6 +114,9 @@ class TimelineFlow(
 
     data_store.BLOBS.WaitForBlobs(blob_ids, timeout=_BLOB_STORE_TIMEOUT)
 
+    if config.CONFIG["Server.timeline_indexing"]:
+      _IndexEntryBatches(unpacked_responses)
+
     for response in unpacked_responses:
       self.SendReplyProto(response)
       self.progress.total_entry_count += response.entry_count
@@ -142,6 +149,9 @@ class TimelineFlow(
 
     data_store.BLOBS.WaitForBlobs(blob_ids, timeout=_BLOB_STORE_TIMEOUT)
 
+    if config.CONFIG["Server.timeline_indexing"]:
+      _IndexEntryBatches(flow_results)
+
     for flow_result in flow_results:
       self.SendReplyProto(flow_result)
 
@@ -153,6 +163,72 @@ class TimelineFlow(
     return self.progress
 
 
+@dataclasses.dataclass(frozen=True)
+class EntryFilter:
+  """A filter of timeline entries.
+
+  Attributes:
+    path_prefix: A prefix that paths of matching entries have to start with.
+    min_time_ns: If set, the modification, change or birth time of matching
+      entries has to be at least this value.
+    max_time_ns: If set, the modification, change or birth time of matching
+      entries has to be at most this value.
+  """
+
+  path_prefix: bytes = b""
+  min_time_ns: Optional[int] = None
+  max_time_ns: Optional[int] = None
+
+  def _HasTimeRange(self) -> bool:
+    return self.min_time_ns is not None or self.max_time_ns is not None
+
+  def _InTimeRange(self, time_ns: int) -> bool:
+    if self.min_time_ns is not None and time_ns < self.min_time_ns:
+      return False
+    if self.max_time_ns is not None and time_ns > self.max_time_ns:
+      return False
+    return True
+
+  def Matches(self, entry: timeline_pb2.TimelineEntry) -> bool:
+    """Checks whether the given entry matches the filter."""
+    if not entry.path.startswith(self.path_prefix):
+      return False
+
+    if not self._HasTimeRange():
+      return True
+
+    return any(map(self._InTimeRange, _EntryTimesNs(entry)))
+
+  def MatchesBatch(
+      self,
+      path_prefix: bytes,
+      min_time_ns: int,
+      max_time_ns: int,
+  ) -> bool:
+    """Checks whether any entry of an indexed batch can match the filter.
+
+    Args:
+      path_prefix: A common path prefix of all entries in the batch.
+      min_time_ns: The earliest timestamp of entries in the batch.
+      max_time_ns: The latest timestamp of entries in the batch.
+
+    Returns:
+      False if no entry in the batch can match the filter, True otherwise.
+    """
+    if not (
+        path_prefix.startswith(self.path_prefix)
+        or self.path_prefix.startswith(path_prefix)
+    ):
+      return False
+
+    if self.min_time_ns is not None and max_time_ns < self.min_time_ns:
+      return False
+    if self.max_time_ns is not None and min_time_ns > self.max_time_ns:
+      return False
+
+    return True
+
+
 def ProtoEntries(
     client_id: str,
     flow_id: str,
@@ -170,6 +246,68 @@ def ProtoEntries(
   return timeline.DeserializeTimelineEntryProtoStream(blobs)
 
 
+def FilteredProtoEntries(
+    client_id: str,
+    flow_id: str,
+    entry_filter: EntryFilter,
+) -> Iterator[timeline_pb2.TimelineEntry]:
+  """Retrieves timeline entries of the specified flow matching the filter.
+
+  Args:
+    client_id: An identifier of a client of the flow to retrieve the blobs for.
+    flow_id: An identifier of the flow to retrieve the blobs for.
+    entry_filter: A filter that the retrieved entries have to match.
+
+  Returns:
+    An iterator over timeline entries protos matching the filter.
+  """
+  blobs = FilteredBlobs(client_id, flow_id, entry_filter)
+  entries = timeline.DeserializeTimelineEntryProtoStream(blobs)
+  return filter(entry_filter.Matches, entries)
+
+
+def FilteredBlobs(
+    client_id: str,
+    flow_id: str,
+    entry_filter: EntryFilter,
+) -> Iterator[bytes]:
+  """Retrieves timeline blobs of the specified flow that can match the filter.
+
+  Batches of entries that were indexed when the flow received them are read
+  only if their index says they can contain a matching entry. Note that the
+  blobs can still contain entries that do not match the filter.
+
+  Args:
+    client_id: An identifier of a client of the flow to retrieve the blobs for.
+    flow_id: An identifier of the flow to retrieve the blobs for.
+    entry_filter: A filter that the entries of retrieved blobs can match.
+
+  Yields:
+    Blobs of the timeline data in the gzchunked format for the specified flow.
+  """
+  blob_ids = []
+
+  for result in _Results(client_id, flow_id):
+    batch_count = len(result.entry_batch_blob_ids)
+    indexed = (
+        len(result.entry_batch_path_prefixes) == batch_count
+        and len(result.entry_batch_min_time_ns) == batch_count
+        and len(result.entry_batch_max_time_ns) == batch_count
+    )
+
+    for idx, blob_id in enumerate(result.entry_batch_blob_ids):
+      if indexed and not entry_filter.MatchesBatch(
+          path_prefix=result.entry_batch_path_prefixes[idx],
+          min_time_ns=result.entry_batch_min_time_ns[idx],
+          max_time_ns=result.entry_batch_max_time_ns[idx],
+      ):
+        continue
+
+      blob_ids.append(models_blobs.BlobID(blob_id))
+
+  yield from _ReadBlobs(blob_ids)
+
+
 def Blobs(
     client_id: str,
     flow_id: str,
@@ -183,32 +321,52 @@ def Blobs(
   Yields:
     Blobs of the timeline data in the gzchunked format for the specified flow.
   """
-  results = data_store.REL_DB.ReadFlowResults(
+  blob_ids = []
+
+  for result in _Results(client_id, flow_id):
+    for entry_batch_blob_id in result.entry_batch_blob_ids:
+      blob_ids.append(models_blobs.BlobID(entry_batch_blob_id))
+
+  yield from _ReadBlobs(blob_ids)
+
+
+def _Results(client_id: str, flow_id: str) -> list[timeline_pb2.TimelineResult]:
+  """Reads all timeline results of the specified flow."""
+  flow_results = data_store.REL_DB.ReadFlowResults(
       client_id=client_id,
       flow_id=flow_id,
       offset=0,
       count=_READ_FLOW_MAX_RESULTS_COUNT,
   )
-  results = [mig_flow_objects.ToRDFFlowResult(r) for r in results]
 
   # `_READ_FLOW_MAX_RESULTS_COUNT` is far too much than we should ever get. If
   # we really got this many results that it means this assumption is not correct
   # and we should fail loudly to investigate this issue.
-  if len(results) >= _READ_FLOW_MAX_RESULTS_COUNT:
-    message = f"Unexpected number of timeline results: {len(results)}"
+  if len(flow_results) >= _READ_FLOW_MAX_RESULTS_COUNT:
+    message = f"Unexpected number of timeline results: {len(flow_results)}"
     raise AssertionError(message)
 
-  for result in results:
-    payload = result.payload
-
-    if not isinstance(payload, rdf_timeline.TimelineResult):
-      message = "Unexpected timeline result of type '{}'".format(type(payload))
+  results = []
+  for flow_result in flow_results:
+    result = timeline_pb2.TimelineResult()
+    if not flow_result.payload.Unpack(result):
+      message = "Unexpected timeline result of type '{}'".format(
+          flow_result.payload.type_url
+      )
       raise TypeError(message)
 
-    for entry_batch_blob_id in payload.entry_batch_blob_ids:
-      blob_id = models_blobs.BlobID(entry_batch_blob_id)
-      blob = data_store.BLOBS.ReadBlob(blob_id)
+    results.append(result)
+
+  return results
 
+
+def _ReadBlobs(blob_ids: Sequence[models_blobs.BlobID]) -> Iterator[bytes]:
+  """Reads the specified blobs in batches, yielding them in the given order."""
+  for batch in collection.Batch(blob_ids, _READ_BLOBS_BATCH_SIZE):
+    blobs = data_store.BLOBS.ReadBlobs(batch)
+
+    for blob_id in batch:
+      blob = blobs.get(blob_id)
       if blob is None:
         message = "Reference to non-existing blob: '{}'".format(blob_id)
         raise AssertionError(message)
@@ -216,6 +374,40 @@ def Blobs(
       yield blob
 
 
+def _EntryTimesNs(entry: timeline_pb2.TimelineEntry) -> Iterator[int]:
+  """Yields the modification, change and birth timestamps set in the entry."""
+  for field in ("mtime_ns", "ctime_ns", "btime_ns"):
+    if entry.HasField(field):
+      yield getattr(entry, field)
+
+
+def _IndexEntryBatches(results: Iterable[timeline_pb2.TimelineResult]) -> None:
+  """Indexes batches of entries referenced by the given timeline results."""
+  for result in results:
+    blob_ids = list(map(models_blobs.BlobID, result.entry_batch_blob_ids))
+
+    for blob in _ReadBlobs(blob_ids):
+      path_prefix = None
+      min_time_ns = None
+      max_time_ns = None
+
+      for entry in timeline.DeserializeTimelineEntryProtoStream(iter([blob])):
+        if path_prefix is None:
+          path_prefix = entry.path
+        else:
+          path_prefix = os.path.commonprefix([path_prefix, entry.path])
+
+        for time_ns in _EntryTimesNs(entry):
+          if min_time_ns is None or time_ns < min_time_ns:
+            min_time_ns = time_ns
+          if max_time_ns is None or time_ns > max_time_ns:
+            max_time_ns = time_ns
+
+      result.entry_batch_path_prefixes.append(path_prefix or b"")
+      result.entry_batch_min_time_ns.append(min_time_ns or 0)
+      result.entry_batch_max_time_ns.append(max_time_ns or 0)
+
+
 def FilesystemType(client_id: str, flow_id: str) -> Optional[str]:
   """Retrieves a filesystem type information of the specified timeline flow.
 
@@ -247,6 +439,11 @@ def FilesystemType(client_id: str, flow_id: str) -> Optional[str]:
 # bigger.
 _READ_FLOW_MAX_RESULTS_COUNT = 1024
 
+# Number of blobs with timeline entries to read from the blob store in a single
+# call. Blobs are no bigger than a few megabytes each, so this keeps the memory
+# usage reasonable while avoiding a round trip per blob.
+_READ_BLOBS_BATCH_SIZE = 16
+
 # An amount of time to wait for the blobs with timeline entries to appear in the
 # blob store. This is needed, because blobs are not guaranteed to be processed
 # before the flow receives results from the client. This delay should usually be
@@ -2,6 +2,7 @@
 from collections.abc import Iterator
 import os
 import stat as stat_mode
+from unittest import mock
 
 from absl.testing import absltest
 
@@ -27,6 +28,7 @@ from grr.test_lib import db_test_lib
 from grr.test_lib import filesystem_test_lib
 from grr.test_lib import flow_test_lib
 from grr.test_lib import rrg_test_lib
+from grr.test_lib import test_lib
 from grr.test_lib import testing_startup
 from grr_response_proto.rrg import os_pb2 as rrg_os_pb2
 from grr_response_proto.rrg.action import get_filesystem_timeline_pb2 as rrg_get_filesystem_timeline_pb2
@@ -254,6 +256,74 @@ class TimelineTest(flow_test_lib.FlowTestsBaseclass):
       self.assertEqual(file_entry.mtime_ns / 1e9, mtime)
       self.assertGreater(file_entry.ctime_ns, 0)
 
+  def testIndexing(self) -> None:
+    with temp.AutoTempDirPath(remove_non_empty=True) as dirpath:
+      filesystem_test_lib.CreateFile(os.path.join(dirpath, "foo", "bar"))
+      filesystem_test_lib.CreateFile(os.path.join(dirpath, "foo", "baz"))
+
+      args = rdf_timeline.TimelineArgs(root=dirpath.encode("utf-8"))
+
+      with test_lib.ConfigOverrider({"Server.timeline_indexing": True}):
+        flow_id = flow_test_lib.StartAndRunFlow(
+            timeline_flow.TimelineFlow,
+            action_mocks.ActionMock(timeline_action.Timeline),
+            client_id=self.client_id,
+            creator=self.test_username,
+            flow_args=args,
+        )
+
+    entries = list(timeline_flow.ProtoEntries(self.client_id, flow_id))
+    self.assertLen(entries, 4)
+
+    times_ns = []
+    for entry in entries:
+      times_ns.extend([entry.mtime_ns, entry.ctime_ns])
+      if entry.HasField("btime_ns"):
+        times_ns.append(entry.btime_ns)
+
+    flow_results = data_store.REL_DB.ReadFlowResults(
+        self.client_id, flow_id, offset=0, count=1024
+    )
+    self.assertNotEmpty(flow_results)
+
+    min_times_ns = []
+    max_times_ns = []
+    for flow_result in flow_results:
+      result = timeline_pb2.TimelineResult()
+      self.assertTrue(flow_result.payload.Unpack(result))
+
+      self.assertLen(
+          result.entry_batch_path_prefixes, len(result.entry_batch_blob_ids)
+      )
+      for path_prefix in result.entry_batch_path_prefixes:
+        self.assertTrue(path_prefix.startswith(dirpath.encode("utf-8")))
+
+      min_times_ns.extend(result.entry_batch_min_time_ns)
+      max_times_ns.extend(result.entry_batch_max_time_ns)
+
+    self.assertEqual(min(min_times_ns), min(times_ns))
+    self.assertEqual(max(max_times_ns), max(times_ns))
+
+  def testNoIndexingByDefault(self) -> None:
+    with temp.AutoTempDirPath(remove_non_empty=True) as dirpath:
+      args = rdf_timeline.TimelineArgs(root=dirpath.encode("utf-8"))
+
+      flow_id = flow_test_lib.StartAndRunFlow(
+          timeline_flow.TimelineFlow,
+          action_mocks.ActionMock(timeline_action.Timeline),
+          client_id=self.client_id,
+          creator=self.test_username,
+          flow_args=args,
+      )
+
+    flow_results = data_store.REL_DB.ReadFlowResults(
+        self.client_id, flow_id, offset=0, count=1024
+    )
+    for flow_result in flow_results:
+      result = timeline_pb2.TimelineResult()
+      self.assertTrue(flow_result.payload.Unpack(result))
+      self.assertEmpty(result.entry_batch_path_prefixes)
+
   def _Collect(self, root: bytes) -> Iterator[timeline_pb2.TimelineEntry]:
     args = rdf_timeline.TimelineArgs(root=root)
 
@@ -397,5 +467,166 @@ class FilesystemTypeTest(absltest.TestCase):
     self.assertEqual(timeline_flow.FilesystemType(client_id, flow_id), "ntfs")
 
 
+class FilteredProtoEntriesTest(absltest.TestCase):
+
+  def _WriteResult(
+      self,
+      db: abstract_db.Database,
+      bs: abstract_bs.BlobStore,
+      client_id: str,
+      flow_id: str,
+      entries: list[timeline_pb2.TimelineEntry],
+      index: bool = False,
+  ) -> list[bytes]:
+    blobs = list(rdf_timeline.SerializeTimelineEntryStream(entries))
+    blob_ids = list(map(bytes, bs.WriteBlobsWithUnknownHashes(blobs)))
+
+    result = timeline_pb2.TimelineResult()
+    result.entry_batch_blob_ids.extend(blob_ids)
+    if index:
+      timeline_flow._IndexEntryBatches([result])
+
+    flow_result = flows_pb2.FlowResult()
+    flow_result.client_id = client_id
+    flow_result.flow_id = flow_id
+    flow_result.payload.Pack(result)
+    db.WriteFlowResults([flow_result])
+
+    return blob_ids
+
+  @db_test_lib.WithDatabase
+  @db_test_lib.WithDatabaseBlobstore
+  def testPathPrefix(
+      self,
+      db: abstract_db.Database,
+      bs: abstract_bs.BlobStore,
+  ) -> None:
+    client_id = db_test_utils.InitializeClient(db)
+    flow_id = db_test_utils.InitializeFlow(db, client_id)
+
+    entries = []
+    for path in [b"/foo/bar", b"/foo/baz", b"/foobar", b"/quux"]:
+      entries.append(timeline_pb2.TimelineEntry(path=path))
+    self._WriteResult(db, bs, client_id, flow_id, entries)
+
+    entry_filter = timeline_flow.EntryFilter(path_prefix=b"/foo/")
+    filtered = timeline_flow.FilteredProtoEntries(
+        client_id, flow_id, entry_filter
+    )
+
+    self.assertEqual(
+        [entry.path for entry in filtered], [b"/foo/bar", b"/foo/baz"]
+    )
+
+  @db_test_lib.WithDatabase
+  @db_test_lib.WithDatabaseBlobstore
+  def testTimeRange(
+      self,
+      db: abstract_db.Database,
+      bs: abstract_bs.BlobStore,
+  ) -> None:
+    client_id = db_test_utils.InitializeClient(db)
+    flow_id = db_test_utils.InitializeFlow(db, client_id)
+
+    entries = [
+        timeline_pb2.TimelineEntry(path=b"/foo", mtime_ns=10, ctime_ns=10),
+        timeline_pb2.TimelineEntry(path=b"/bar", mtime_ns=10, ctime_ns=25),
+        timeline_pb2.TimelineEntry(path=b"/baz", btime_ns=30),
+        timeline_pb2.TimelineEntry(path=b"/quux", atime_ns=25),
+    ]
+    self._WriteResult(db, bs, client_id, flow_id, entries)
+
+    entry_filter = timeline_flow.EntryFilter(min_time_ns=20, max_time_ns=30)
+    filtered = timeline_flow.FilteredProtoEntries(
+        client_id, flow_id, entry_filter
+    )
+
+    self.assertEqual([entry.path for entry in filtered], [b"/bar", b"/baz"])
+
+  @db_test_lib.WithDatabase
+  @db_test_lib.WithDatabaseBlobstore
+  def testSkipsNonMatchingIndexedBatches(
+      self,
+      db: abstract_db.Database,
+      bs: abstract_bs.BlobStore,
+  ) -> None:
+    client_id = db_test_utils.InitializeClient(db)
+    flow_id = db_test_utils.InitializeFlow(db, client_id)
+
+    foo_blob_ids = self._WriteResult(
+        db,
+        bs,
+        client_id,
+        flow_id,
+        [
+            timeline_pb2.TimelineEntry(path=b"/foo/bar", mtime_ns=10),
+            timeline_pb2.TimelineEntry(path=b"/foo/baz", mtime_ns=20),
+        ],
+        index=True,
+    )
+    quux_blob_ids = self._WriteResult(
+        db,
+        bs,
+        client_id,
+        flow_id,
+        [
+            timeline_pb2.TimelineEntry(path=b"/quux/norf", mtime_ns=10),
+            timeline_pb2.TimelineEntry(path=b"/quux/thud", mtime_ns=20),
+        ],
+        index=True,
+    )
+    late_blob_ids = self._WriteResult(
+        db,
+        bs,
+        client_id,
+        flow_id,
+        [timeline_pb2.TimelineEntry(path=b"/foo/blargh", mtime_ns=50)],
+        index=True,
+    )
+
+    entry_filter = timeline_flow.EntryFilter(
+        path_prefix=b"/foo/", max_time_ns=30
+    )
+    with mock.patch.object(bs, "ReadBlobs", wraps=bs.ReadBlobs) as read_blobs:
+      filtered = list(
+          timeline_flow.FilteredProtoEntries(client_id, flow_id, entry_filter)
+      )
+
+    self.assertEqual(
+        [entry.path for entry in filtered], [b"/foo/bar", b"/foo/baz"]
+    )
+
+    read_blob_ids = set()
+    for call in read_blobs.call_args_list:
+      read_blob_ids.update(map(bytes, call.args[0]))
+
+    self.assertContainsSubset(foo_blob_ids, read_blob_ids)
+    self.assertNoCommonElements(quux_blob_ids, read_blob_ids)
+    self.assertNoCommonElements(late_blob_ids, read_blob_ids)
+
+  @db_test_lib.WithDatabase
+  @db_test_lib.WithDatabaseBlobstore
+  def testReadsBlobsInBatches(
+      self,
+      db: abstract_db.Database,
+      bs: abstract_bs.BlobStore,
+  ) -> None:
+    client_id = db_test_utils.InitializeClient(db)
+    flow_id = db_test_utils.InitializeFlow(db, client_id)
+
+    entries = []
+    for idx in range(5):
+      entry = timeline_pb2.TimelineEntry(path=f"/foo/{idx}".encode("utf-8"))
+      entries.append(entry)
+      self._WriteResult(db, bs, client_id, flow_id, [entry])
+
+    with mock.patch.object(timeline_flow, "_READ_BLOBS_BATCH_SIZE", 2):
+      with mock.patch.object(bs, "ReadBlobs", wraps=bs.ReadBlobs) as read_blobs:
+        read_entries = list(timeline_flow.ProtoEntries(client_id, flow_id))
+
+    self.assertCountEqual(read_entries, entries)
+    self.assertEqual(read_blobs.call_count, 3)
+
+
 if __name__ == "__main__":
   absltest.main()
@@ -2,15 +2,47 @@
 """The GRR Foreman."""
 
 import logging
+import threading
+from typing import Optional
 
+from grr_response_core import config
 from grr_response_core.lib import rdfvalue
+from grr_response_core.stats import metrics
+from grr_response_proto import objects_pb2
 from grr_response_server import data_store
 from grr_response_server import flow
+from grr_response_server import foreman_rules
 from grr_response_server import hunt
 from grr_response_server import message_handlers
 from grr_response_server import mig_foreman_rules
 from grr_response_server.databases import db
 from grr_response_server.rdfvalues import mig_objects
+from grr_response_server.rdfvalues import objects as rdf_objects
+
+
+FOREMAN_CHECK_IN_LATENCY = metrics.Event("foreman_check_in_latency")
+FOREMAN_CHECK_IN_BATCH_LATENCY = metrics.Event(
+    "foreman_check_in_batch_latency"
+)
+FOREMAN_RULES_CACHE_HITS = metrics.Counter("foreman_rules_cache_hits")
+FOREMAN_RULES_CACHE_MISSES = metrics.Counter("foreman_rules_cache_misses")
+FOREMAN_CLIENT_DATA_READS = metrics.Counter(
+    "foreman_client_data_reads", fields=[("tier", str)]
+)
+
+# Tiers of client data that foreman client rules are evaluated against, from
+# the cheapest to the most expensive one to read. Every tier includes the data
+# of all the cheaper ones.
+_CLIENT_ID = 0
+_LABELS = 1
+_STARTUP_INFO = 2
+_FULL_INFO = 3
+
+_TIER_NAMES = {
+    _LABELS: "labels",
+    _STARTUP_INFO: "startup_info",
+    _FULL_INFO: "full_info",
+}
 
 
 class Error(Exception):
@@ -21,12 +53,223 @@ class UnknownHuntTypeError(Error):
   pass
 
 
+def _ClientRuleTier(rule: foreman_rules.ForemanClientRule) -> int:
+  """Returns the cheapest tier of client data a client rule can be run on."""
+  if rule.rule_type == foreman_rules.ForemanClientRule.Type.LABEL:
+    return _LABELS
+
+  if rule.rule_type == foreman_rules.ForemanClientRule.Type.INTEGER:
+    field = rule.integer.field
+    fields = foreman_rules.ForemanIntegerClientRule.ForemanIntegerField
+    if field == fields.CLIENT_VERSION:
+      return _STARTUP_INFO
+
+  if rule.rule_type == foreman_rules.ForemanClientRule.Type.REGEX:
+    field = rule.regex.field
+    fields = foreman_rules.ForemanRegexClientRule.ForemanStringField
+    if field == fields.CLIENT_ID:
+      return _CLIENT_ID
+    if field in (fields.CLIENT_NAME, fields.CLIENT_DESCRIPTION):
+      return _STARTUP_INFO
+
+  # Operating system and all the other fields are only known from the client
+  # snapshot.
+  return _FULL_INFO
+
+
+def _RequiredLabels(
+    rule: foreman_rules.ForemanCondition,
+) -> Optional[frozenset[str]]:
+  """Returns labels out of which a client must have one to match the rule."""
+  rule_set = rule.client_rule_set
+  match_modes = foreman_rules.ForemanClientRuleSet.MatchMode
+  if rule_set.match_mode != match_modes.MATCH_ALL:
+    return None
+
+  label_modes = foreman_rules.ForemanLabelClientRule.MatchMode
+  for client_rule in rule_set.rules:
+    if client_rule.rule_type != foreman_rules.ForemanClientRule.Type.LABEL:
+      continue
+    label_rule = client_rule.label
+    if label_rule.label_names and label_rule.match_mode in (
+        label_modes.MATCH_ALL,
+        label_modes.MATCH_ANY,
+    ):
+      return frozenset(label_rule.label_names)
+
+  return None
+
+
+class _ClientData:
+  """Client data that foreman rules are evaluated against, read lazily.
+
+  Only the tiers of client data that rules ask for are read from the database.
+  Cheaper tiers are read separately, the full tier is read at once.
+  """
+
+  def __init__(self, client_id: str) -> None:
+    self._client_id = client_id
+    self._tier = _CLIENT_ID
+    self._info = objects_pb2.ClientFullInfo(
+        last_snapshot=objects_pb2.ClientSnapshot(client_id=client_id)
+    )
+    self._rdf_info = mig_objects.ToRDFClientFullInfo(self._info)
+
+  def Get(self, tier: int) -> Optional[rdf_objects.ClientFullInfo]:
+    """Returns client data including (at least) the given tier."""
+    if tier <= self._tier:
+      return self._rdf_info
+
+    FOREMAN_CLIENT_DATA_READS.Increment(fields=[_TIER_NAMES[tier]])
+    if tier == _FULL_INFO:
+      full_info = data_store.REL_DB.ReadClientFullInfo(self._client_id)
+      self._tier = _FULL_INFO
+      if full_info is None:
+        self._rdf_info = None
+      else:
+        self._rdf_info = mig_objects.ToRDFClientFullInfo(full_info)
+      return self._rdf_info
+
+    if self._tier < _LABELS:
+      self._info.labels.extend(
+          data_store.REL_DB.ReadClientLabels(self._client_id)
+      )
+    if tier >= _STARTUP_INFO:
+      startup_info = data_store.REL_DB.ReadClientStartupInfo(self._client_id)
+      if startup_info is not None:
+        self._info.last_startup_info.CopyFrom(startup_info)
+
+    self._tier = tier
+    self._rdf_info = mig_objects.ToRDFClientFullInfo(self._info)
+    return self._rdf_info
+
+  def Labels(self) -> frozenset[str]:
+    client_info = self.Get(_LABELS)
+    return frozenset(label.name for label in client_info.labels)
+
+
+class _CompiledRule:
+  """A foreman rule with client rules ordered by the cost of running them."""
+
+  def __init__(self, rule: foreman_rules.ForemanCondition) -> None:
+    self.rule = rule
+
+    rule_set = rule.client_rule_set
+    self._match_mode = rule_set.match_mode
+    self._client_rules = [
+        (_ClientRuleTier(client_rule), client_rule)
+        for client_rule in rule_set.rules
+    ]
+    self._client_rules.sort(key=lambda item: item[0])
+
+  def Evaluate(self, client_data: _ClientData) -> bool:
+    """Evaluates the rule, reading only as much client data as needed."""
+    match_modes = foreman_rules.ForemanClientRuleSet.MatchMode
+    if self._match_mode == match_modes.MATCH_ALL:
+      quantifier = all
+    elif self._match_mode == match_modes.MATCH_ANY:
+      quantifier = any
+    else:
+      raise ValueError("Unexpected match mode value: %s" % self._match_mode)
+
+    def Results():
+      for tier, client_rule in self._client_rules:
+        client_info = client_data.Get(tier)
+        yield client_info is not None and client_rule.Evaluate(client_info)
+
+    return quantifier(Results())
+
+
+class _ForemanRuleSet:
+  """Foreman rules compiled for fast evaluation.
+
+  Rules that can only match clients having one of a set of labels are indexed
+  by these labels, so that checking them against clients without such labels
+  costs a single set lookup.
+  """
+
+  def __init__(self, rules: list[foreman_rules.ForemanCondition]) -> None:
+    self.rules = rules
+    self._compiled = [_CompiledRule(rule) for rule in rules]
+    self._required_labels = [_RequiredLabels(rule) for rule in rules]
+
+  def Evaluate(
+      self,
+      indices: list[int],
+      client_data: _ClientData,
+  ) -> list[foreman_rules.ForemanCondition]:
+    """Returns rules with given indices that match the client."""
+    client_labels = None
+    matching = []
+    for i in indices:
+      required_labels = self._required_labels[i]
+      if required_labels is not None:
+        if client_labels is None:
+          client_labels = client_data.Labels()
+        if required_labels.isdisjoint(client_labels):
+          continue
+
+      if self._compiled[i].Evaluate(client_data):
+        matching.append(self.rules[i])
+
+    return matching
+
+
 # TODO(amoser): Now that Foreman rules are directly stored in the db,
 # consider removing this class altogether once the AFF4 Foreman has
 # been removed.
 class Foreman(object):
   """The foreman starts flows for clients depending on rules."""
 
+  def __init__(self, rules_cache_ttl: Optional[rdfvalue.Duration] = None):
+    """Initializes the foreman.
+
+    Args:
+      rules_cache_ttl: How long foreman rules read from the database are
+        reused for. If not provided, the Foreman.rules_cache_ttl config option
+        is used.
+    """
+    if rules_cache_ttl is None:
+      rules_cache_ttl = config.CONFIG["Foreman.rules_cache_ttl"]
+
+    self._rules_cache_ttl = rules_cache_ttl
+    self._rules_lock = threading.Lock()
+    self._rules: Optional[_ForemanRuleSet] = None
+    self._rules_db: Optional[db.Database] = None
+    self._rules_version: Optional[int] = None
+    self._rules_read_time: Optional[rdfvalue.RDFDatetime] = None
+
+  def _GetRules(self) -> _ForemanRuleSet:
+    """Returns cached foreman rules, reading them again when outdated."""
+    now = rdfvalue.RDFDatetime.Now()
+    version = hunt.ForemanRulesVersion()
+    with self._rules_lock:
+      if (
+          self._rules is not None
+          and self._rules_db is data_store.REL_DB
+          and self._rules_version == version
+          and self._rules_read_time <= now
+          and now < self._rules_read_time + self._rules_cache_ttl
+      ):
+        FOREMAN_RULES_CACHE_HITS.Increment()
+        return self._rules
+
+    FOREMAN_RULES_CACHE_MISSES.Increment()
+    proto_rules = data_store.REL_DB.ReadAllForemanRules()
+    rules = _ForemanRuleSet([
+        mig_foreman_rules.ToRDFForemanCondition(cond) for cond in proto_rules
+    ])
+    with self._rules_lock:
+      self._rules = rules
+      self._rules_db = data_store.REL_DB
+      self._rules_version = version
+      self._rules_read_time = now
+    return rules
+
+  def _InvalidateRules(self) -> None:
+    with self._rules_lock:
+      self._rules = None
+
   def _CheckIfHuntTaskWasAssigned(self, client_id, hunt_id):
     """Will return True if hunt's task was assigned to this client before."""
     flow_id = hunt_id
@@ -88,21 +331,23 @@ class Foreman(object):
   def _SetLastForemanRunTime(self, client_id, latest_rule):
     data_store.REL_DB.WriteClientMetadata(client_id, last_foreman=latest_rule)
 
-  def AssignTasksToClient(self, client_id):
-    """Examines our rules and starts up flows based on the client.
+  def _EvaluateRules(
+      self,
+      rule_set: _ForemanRuleSet,
+      client_id: str,
+  ) -> tuple[
+      list[foreman_rules.ForemanCondition], list[foreman_rules.ForemanCondition]
+  ]:
+    """Finds rules not yet run on a client that match it.
 
     Args:
-      client_id: Client id of the client for tasks to be assigned.
+      rule_set: Rules to evaluate.
+      client_id: Client id of the client to evaluate the rules for.
 
     Returns:
-      Number of assigned tasks.
+      A tuple of the matching rules and the expired rules.
     """
-    proto_rules = data_store.REL_DB.ReadAllForemanRules()
-    rules = [
-        mig_foreman_rules.ToRDFForemanCondition(cond) for cond in proto_rules
-    ]
-    if not rules:
-      return 0
+    rules = rule_set.rules
 
     last_foreman_run = self._GetLastForemanRunTime(client_id)
 
@@ -117,41 +362,121 @@ class Foreman(object):
 
     now = rdfvalue.RDFDatetime.Now()
 
-    for rule in rules:
+    for i, rule in enumerate(rules):
       if rule.expiration_time < now:
         expired_rules.append(rule)
       elif rule.creation_time > last_foreman_run:
-        relevant_rules.append(rule)
+        relevant_rules.append(i)
 
-    actions_count = 0
+    matching_rules = []
     if relevant_rules:
-      client_data = data_store.REL_DB.ReadClientFullInfo(client_id)
-      if client_data is None:
-        return
+      client_data = _ClientData(client_id)
+      matching_rules = list(rule_set.Evaluate(relevant_rules, client_data))
 
-      client_data = mig_objects.ToRDFClientFullInfo(client_data)
-      for rule in relevant_rules:
-        if rule.Evaluate(client_data):
-          actions_count += self._RunAction(rule, client_id)
+    return matching_rules, expired_rules
 
+  def _RemoveExpiredRules(
+      self,
+      expired_rules: list[foreman_rules.ForemanCondition],
+  ) -> None:
     if expired_rules:
       for rule in expired_rules:
         hunt.CompleteHuntIfExpirationTimeReached(rule.hunt_id)
       data_store.REL_DB.RemoveExpiredForemanRules()
+      self._InvalidateRules()
+
+  @FOREMAN_CHECK_IN_LATENCY.Timed()
+  def AssignTasksToClient(self, client_id):
+    """Examines our rules and starts up flows based on the client.
+
+    Args:
+      client_id: Client id of the client for tasks to be assigned.
+
+    Returns:
+      Number of assigned tasks.
+    """
+    rule_set = self._GetRules()
+    if not rule_set.rules:
+      return 0
+
+    matching_rules, expired_rules = self._EvaluateRules(rule_set, client_id)
+
+    actions_count = 0
+    for rule in matching_rules:
+      actions_count += self._RunAction(rule, client_id)
+
+    self._RemoveExpiredRules(expired_rules)
 
     return actions_count
 
+  @FOREMAN_CHECK_IN_BATCH_LATENCY.Timed()
+  def AssignTasksToClients(self, client_ids):
+    """Examines our rules and starts up flows based on multiple clients.
+
+    Unlike calling `AssignTasksToClient` for every client, flows of all the
+    matching hunts are started with a few batched database calls.
+
+    Args:
+      client_ids: Client ids of the clients for tasks to be assigned.
+
+    Returns:
+      Number of assigned tasks.
+    """
+    rule_set = self._GetRules()
+    if not rule_set.rules:
+      return 0
+
+    client_hunt_ids = []
+    expired_rules = {}
+    for client_id in client_ids:
+      try:
+        matching_rules, client_expired_rules = self._EvaluateRules(
+            rule_set, client_id
+        )
+      # There could be all kinds of errors we don't know about when evaluating
+      # the rules so we catch everything here to not affect other clients.
+      except Exception as e:  # pylint: disable=broad-except
+        logging.exception(
+            "Failure evaluating foreman rules on client %s: %s", client_id, e
+        )
+        continue
+
+      for rule in matching_rules:
+        client_hunt_ids.append((client_id, rule.hunt_id))
+      for rule in client_expired_rules:
+        expired_rules[rule.hunt_id] = rule
+
+    started = []
+    if client_hunt_ids:
+      started = hunt.StartHuntFlowsOnClients(client_hunt_ids)
+      for client_id, hunt_id in started:
+        logging.info(
+            "Foreman: Started hunt %s on client %s.", hunt_id, client_id
+        )
+
+    self._RemoveExpiredRules(list(expired_rules.values()))
+
+    return len(started)
+
 
 class ForemanMessageHandler(message_handlers.MessageHandler):
   """A handler for Foreman messages."""
 
   handler_name = "ForemanHandler"
 
-  def ProcessMessages(self, msgs):
-    # TODO(amoser): The foreman reads the rules from the database for each
-    # client. In the old implementation we used to have a cache. If this is a
-    # performance hit, lets consider putting the cache back.
+  # The foreman is shared between messages, so foreman rules it caches are
+  # reused across client check-ins.
+  _foreman_obj: Optional[Foreman] = None
+  _foreman_obj_lock = threading.Lock()
+
+  @classmethod
+  def _GetForeman(cls) -> Foreman:
+    with cls._foreman_obj_lock:
+      if cls._foreman_obj is None:
+        cls._foreman_obj = Foreman()
+      return cls._foreman_obj
 
-    foreman_obj = Foreman()
-    for msg in msgs:
-      foreman_obj.AssignTasksToClient(msg.client_id)
+  def ProcessMessages(self, msgs):
+    # Deduplicate clients that checked in more than once in the same batch.
+    client_ids = list(dict.fromkeys(msg.client_id for msg in msgs))
+    self._GetForeman().AssignTasksToClients(client_ids)
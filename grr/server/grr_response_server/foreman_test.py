@@ -25,6 +25,11 @@ class ForemanTests(test_lib.GRRBaseTest):
     # Keep a record of all the clients
     self.clients_started.append((hunt_id, client_id))
 
+  def StartHuntFlowsOnClients(self, client_hunt_ids):
+    for client_id, hunt_id in client_hunt_ids:
+      self.StartHuntFlowOnClient(client_id, hunt_id)
+    return list(client_hunt_ids)
+
   def testAssigningTasksToClientDoesNotEraseFleetspeakValidationInfo(self):
     client_id = self.SetupClient(0)
     data_store.REL_DB.WriteClientMetadata(
@@ -300,6 +305,177 @@ class ForemanTests(test_lib.GRRBaseTest):
         rules = data_store.REL_DB.ReadAllForemanRules()
         self.assertLen(rules, num_rules)
 
+  def _WriteRule(self, hunt_id, client_rule_set=None):
+    now = rdfvalue.RDFDatetime.Now()
+    rule = foreman_rules.ForemanCondition(
+        creation_time=now,
+        expiration_time=now + rdfvalue.Duration.From(1, rdfvalue.HOURS),
+        description="Test rule",
+        hunt_id=hunt_id,
+        client_rule_set=client_rule_set,
+    )
+    proto_foreman_condition = mig_foreman_rules.ToProtoForemanCondition(rule)
+    data_store.REL_DB.WriteForemanRule(proto_foreman_condition)
+
+  def testRulesAreCachedUntilTheyExpire(self):
+    client_id_1 = self.SetupClient(1)
+    client_id_2 = self.SetupClient(2)
+    ttl = rdfvalue.Duration.From(10, rdfvalue.SECONDS)
+
+    with mock.patch.object(
+        hunt, "StartHuntFlowOnClient", self.StartHuntFlowOnClient
+    ):
+      self.clients_started = []
+      foreman_obj = foreman.Foreman(rules_cache_ttl=ttl)
+      foreman_obj.AssignTasksToClient(client_id_1)
+
+      self._WriteRule("11111111")
+      foreman_obj.AssignTasksToClient(client_id_2)
+      self.assertEmpty(self.clients_started)
+
+      with test_lib.FakeTime(rdfvalue.RDFDatetime.Now() + ttl):
+        foreman_obj.AssignTasksToClient(client_id_2)
+
+      self.assertEqual(self.clients_started, [("11111111", client_id_2)])
+
+  def testRulesCacheIsInvalidatedWhenHuntsChangeRules(self):
+    client_id = self.SetupClient(1)
+    ttl = rdfvalue.Duration.From(1, rdfvalue.HOURS)
+    foreman_obj = foreman.Foreman(rules_cache_ttl=ttl)
+    foreman_obj.AssignTasksToClient(client_id)
+
+    self._WriteRule("11111111")
+    hunt._ForemanRulesChanged()  # pylint: disable=protected-access
+
+    with mock.patch.object(
+        hunt, "StartHuntFlowOnClient", self.StartHuntFlowOnClient
+    ):
+      self.clients_started = []
+      foreman_obj.AssignTasksToClient(client_id)
+
+    self.assertEqual(self.clients_started, [("11111111", client_id)])
+
+  def testLabelRulesDoNotReadFullClientInfo(self):
+    client_id_1 = self.SetupClient(1, labels=["foo"])
+    client_id_2 = self.SetupClient(2, labels=["bar"])
+
+    self._WriteRule(
+        "11111111",
+        client_rule_set=foreman_rules.ForemanClientRuleSet(
+            rules=[
+                foreman_rules.ForemanClientRule(
+                    rule_type=foreman_rules.ForemanClientRule.Type.OS,
+                    os=foreman_rules.ForemanOsClientRule(os_linux=True),
+                ),
+                foreman_rules.ForemanClientRule(
+                    rule_type=foreman_rules.ForemanClientRule.Type.LABEL,
+                    label=foreman_rules.ForemanLabelClientRule(
+                        label_names=["foo"]
+                    ),
+                ),
+            ]
+        ),
+    )
+
+    with mock.patch.object(
+        hunt, "StartHuntFlowOnClient", self.StartHuntFlowOnClient
+    ):
+      with mock.patch.object(
+          data_store.REL_DB,
+          "ReadClientFullInfo",
+          wraps=data_store.REL_DB.ReadClientFullInfo,
+      ) as read_client_full_info:
+        self.clients_started = []
+        foreman_obj = foreman.Foreman()
+        foreman_obj.AssignTasksToClient(client_id_1)
+        foreman_obj.AssignTasksToClient(client_id_2)
+
+    self.assertEqual(self.clients_started, [("11111111", client_id_1)])
+    read_client_full_info.assert_called_once_with(client_id_1)
+
+  def testAssignTasksToClientsStartsMatchingHuntsInOneCall(self):
+    client_id_1 = self.SetupClient(1, labels=["foo"])
+    client_id_2 = self.SetupClient(2, labels=["bar"])
+    client_id_3 = self.SetupClient(3, labels=["foo"])
+
+    self._WriteRule("11111111")
+    self._WriteRule(
+        "22222222",
+        client_rule_set=foreman_rules.ForemanClientRuleSet(
+            rules=[
+                foreman_rules.ForemanClientRule(
+                    rule_type=foreman_rules.ForemanClientRule.Type.LABEL,
+                    label=foreman_rules.ForemanLabelClientRule(
+                        label_names=["foo"]
+                    ),
+                ),
+            ]
+        ),
+    )
+
+    with mock.patch.object(
+        hunt,
+        "StartHuntFlowsOnClients",
+        side_effect=self.StartHuntFlowsOnClients,
+    ) as start_hunt_flows_on_clients:
+      self.clients_started = []
+      foreman_obj = foreman.Foreman()
+      num_assigned = foreman_obj.AssignTasksToClients(
+          [client_id_1, client_id_2, client_id_3]
+      )
+      # Rules are run only once on every client.
+      foreman_obj.AssignTasksToClients([client_id_1, client_id_2, client_id_3])
+
+    self.assertEqual(num_assigned, 5)
+    start_hunt_flows_on_clients.assert_called_once()
+    self.assertCountEqual(
+        self.clients_started,
+        [
+            ("11111111", client_id_1),
+            ("11111111", client_id_2),
+            ("11111111", client_id_3),
+            ("22222222", client_id_1),
+            ("22222222", client_id_3),
+        ],
+    )
+
+  def testClientVersionRulesDoNotReadFullClientInfo(self):
+    client_id = self.SetupClient(1)
+    startup_info = data_store.REL_DB.ReadClientStartupInfo(client_id)
+    self.assertIsNotNone(startup_info)
+
+    self._WriteRule(
+        "11111111",
+        client_rule_set=foreman_rules.ForemanClientRuleSet(
+            rules=[
+                foreman_rules.ForemanClientRule(
+                    rule_type=foreman_rules.ForemanClientRule.Type.INTEGER,
+                    integer=foreman_rules.ForemanIntegerClientRule(
+                        field="CLIENT_VERSION",
+                        operator=foreman_rules.ForemanIntegerClientRule.Operator.GREATER_THAN,
+                        value=startup_info.client_info.client_version,
+                    ),
+                ),
+                foreman_rules.ForemanClientRule(
+                    rule_type=foreman_rules.ForemanClientRule.Type.OS,
+                    os=foreman_rules.ForemanOsClientRule(os_linux=True),
+                ),
+            ]
+        ),
+    )
+
+    with mock.patch.object(
+        hunt, "StartHuntFlowOnClient", self.StartHuntFlowOnClient
+    ):
+      with mock.patch.object(
+          data_store.REL_DB, "ReadClientFullInfo"
+      ) as read_client_full_info:
+        self.clients_started = []
+        foreman.Foreman().AssignTasksToClient(client_id)
+
+    self.assertEmpty(self.clients_started)
+    read_client_full_info.assert_not_called()
+
 
 def main(argv):
   # Run the full test suite
@@ -8,10 +8,12 @@ from typing import Mapping, Optional, Sequence, Union
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib.rdfvalues import client as rdf_client
 from grr_response_core.lib.rdfvalues import flows as rdf_flows
+from grr_response_core.lib.rdfvalues import mig_flows
 from grr_response_core.lib.util import collection
 from grr_response_core.lib.util import random
 from grr_response_core.stats import metrics
 from grr_response_proto import flows_pb2
+from grr_response_proto import jobs_pb2
 from grr_response_proto import objects_pb2
 from grr_response_server import data_store
 from grr_response_server import events
@@ -20,6 +22,7 @@ from grr_response_server import sinks
 from grr_response_server import worker_lib
 from grr_response_server.databases import db
 from grr_response_server.flows.general import transfer
+from grr_response_server.models import flows as models_flows
 from grr_response_server.rdfvalues import flow_objects as rdf_flow_objects
 from grr_response_server.rdfvalues import mig_flow_objects
 from grr_response_server.rdfvalues import mig_objects
@@ -237,24 +240,153 @@ class FrontEndServer(object):
                 "ClientCrash", crash_details, username=FRONTEND_USERNAME
             )
 
+    self._DispatchMessageHandlerRequests(
+        [
+            mig_objects.ToProtoMessageHandlerRequest(r)
+            for r in worker_message_handler_requests
+        ],
+        [
+            mig_objects.ToProtoMessageHandlerRequest(r)
+            for r in frontend_message_handler_requests
+        ],
+    )
+
+    logging.debug(
+        "Received %s messages from %s in %s sec",
+        len(messages),
+        client_id,
+        time.time() - now,
+    )
+
+  def _DispatchMessageHandlerRequests(
+      self,
+      worker_message_handler_requests: list[
+          objects_pb2.MessageHandlerRequest
+      ],
+      frontend_message_handler_requests: list[
+          objects_pb2.MessageHandlerRequest
+      ],
+  ) -> None:
     if worker_message_handler_requests:
-      worker_message_handler_requests = [
-          mig_objects.ToProtoMessageHandlerRequest(r)
-          for r in worker_message_handler_requests
-      ]
       data_store.REL_DB.WriteMessageHandlerRequests(
           worker_message_handler_requests
       )
 
     if frontend_message_handler_requests:
-      frontend_message_handler_requests = [
-          mig_objects.ToProtoMessageHandlerRequest(r)
-          for r in frontend_message_handler_requests
-      ]
       worker_lib.ProcessMessageHandlerRequests(
           frontend_message_handler_requests
       )
 
+  def ReceiveMessagesProto(
+      self,
+      client_id: str,
+      messages: Sequence[jobs_pb2.GrrMessage],
+  ) -> None:
+    """Receives and processes messages without converting them to RDF values.
+
+    This is an equivalent of `ReceiveMessages` for messages that come in as
+    protos. Messages are only decoded if they can't be handled otherwise.
+
+    Args:
+      client_id: The client which sent the messages.
+      messages: A list of GrrMessage protos. Messages are assumed to be
+        authenticated as coming from the client.
+    """
+    now = time.time()
+    unprocessed_msgs = []
+    worker_message_handler_requests = []
+    frontend_message_handler_requests = []
+
+    # TODO: Remove once old clients have been migrated (see
+    # `ReceiveMessages`).
+    for message in messages:
+      if (
+          message.type != jobs_pb2.GrrMessage.STATUS
+          or message.args_rdf_name != rdf_flows.GrrStatus.__name__
+      ):
+        continue
+
+      stat = jobs_pb2.GrrStatus()
+      stat.ParseFromString(message.args)
+      cpu_time_used = stat.cpu_time_used
+      if not cpu_time_used.HasField(
+          "deprecated_user_cpu_time"
+      ) and not cpu_time_used.HasField("deprecated_system_cpu_time"):
+        continue
+
+      if cpu_time_used.HasField("deprecated_user_cpu_time"):
+        cpu_time_used.user_cpu_time = cpu_time_used.deprecated_user_cpu_time
+        cpu_time_used.ClearField("deprecated_user_cpu_time")
+      if cpu_time_used.HasField("deprecated_system_cpu_time"):
+        cpu_time_used.system_cpu_time = cpu_time_used.deprecated_system_cpu_time
+        cpu_time_used.ClearField("deprecated_system_cpu_time")
+      message.args = stat.SerializeToString()
+
+    msgs_by_session_id = collection.Group(messages, lambda m: m.session_id)
+    for session_id, msgs in msgs_by_session_id.items():
+      # Session ids are normalized the same way `ReceiveMessages` does it.
+      session_id_str = str(rdfvalue.SessionID(session_id))
+      if session_id_str in message_handlers.session_id_map:
+        handler_name = message_handlers.session_id_map[session_id_str]
+        for msg in msgs:
+          request = objects_pb2.MessageHandlerRequest(
+              client_id=client_id,
+              handler_name=handler_name,
+              request_id=msg.response_id or random.UInt32(),
+          )
+          request.request.name = msg.args_rdf_name
+          request.request.data = msg.args
+          if handler_name in self._SHORTCUT_HANDLERS:
+            frontend_message_handler_requests.append(request)
+          else:
+            worker_message_handler_requests.append(request)
+      elif session_id_str in self.legacy_well_known_session_ids:
+        logging.debug(
+            "Dropping message for legacy well known session id %s",
+            session_id,
+        )
+      else:
+        unprocessed_msgs.extend(msgs)
+
+    if unprocessed_msgs:
+      flow_responses = []
+      for message in unprocessed_msgs:
+        try:
+          response = models_flows.FlowResponseForLegacyResponse(message)
+          if response is None:
+            response = self._FlowResponseForLegacyResponseRDF(message)
+        except ValueError as e:
+          logging.warning(
+              "Failed to parse legacy FlowResponse:\n%s\n%s", e, message
+          )
+        else:
+          flow_responses.append(response)
+
+      data_store.REL_DB.WriteFlowResponses(flow_responses)
+
+      for msg in unprocessed_msgs:
+        if msg.type != jobs_pb2.GrrMessage.STATUS:
+          continue
+
+        stat = jobs_pb2.GrrStatus()
+        stat.ParseFromString(msg.args)
+        if stat.status == jobs_pb2.GrrStatus.CLIENT_KILLED:
+          # A client crashed while performing an action, fire an event.
+          crash_details = rdf_client.ClientCrash(
+              client_id=client_id,
+              session_id=msg.session_id,
+              backtrace=stat.backtrace,
+              crash_message=stat.error_message,
+              timestamp=rdfvalue.RDFDatetime.Now(),
+          )
+          events.Events.PublishEvent(
+              "ClientCrash", crash_details, username=FRONTEND_USERNAME
+          )
+
+    self._DispatchMessageHandlerRequests(
+        worker_message_handler_requests, frontend_message_handler_requests
+    )
+
     logging.debug(
         "Received %s messages from %s in %s sec",
         len(messages),
@@ -262,6 +394,20 @@ class FrontEndServer(object):
         time.time() - now,
     )
 
+  def _FlowResponseForLegacyResponseRDF(
+      self,
+      message: jobs_pb2.GrrMessage,
+  ) -> models_flows.FlowResponse:
+    """Converts a legacy client reply to a flow response using RDF values."""
+    response = rdf_flow_objects.FlowResponseForLegacyResponse(
+        mig_flows.ToRDFGrrMessage(message)
+    )
+    if isinstance(response, rdf_flow_objects.FlowStatus):
+      return mig_flow_objects.ToProtoFlowStatus(response)
+    if isinstance(response, rdf_flow_objects.FlowIterator):
+      return mig_flow_objects.ToProtoFlowIterator(response)
+    return mig_flow_objects.ToProtoFlowResponse(response)
+
   # TODO: Remove once no longer needed.
   def ReceiveRRGResponse(
       self,
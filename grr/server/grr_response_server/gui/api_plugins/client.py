@@ -2,7 +2,9 @@
 """API handlers for accessing and searching clients and managing labels."""
 
 from collections.abc import Sequence
+import heapq
 import ipaddress
+import itertools
 import re
 import shlex
 from typing import Optional
@@ -129,8 +131,12 @@ class ApiSearchClientsHandler(api_call_handler_base.ApiCallHandler):
 
     index = client_index.ClientIndex()
 
-    # LookupClients returns a sorted list of client ids.
-    clients = index.LookupClients(keywords)[args.offset : args.offset + end]
+    # IterateClients yields client ids in ascending order and stops reading
+    # the posting lists once the requested page is complete.
+    client_ids = index.IterateClients(
+        keywords, after_client_id=args.after_client_id or None
+    )
+    clients = list(itertools.islice(client_ids, args.offset, args.offset + end))
 
     client_infos = data_store.REL_DB.MultiReadClientFullInfo(clients)
     for client_id, client_info in client_infos.items():
@@ -183,13 +189,23 @@ class ApiLabelsRestrictedSearchClientsHandler(
     # database making this method more efficient. Label restrictions
     # should be on small subsets though so this might not be worth
     # it.
-    all_client_ids = set()
-    for label in self.allow_labels:
+    per_label_client_ids = []
+    for label in sorted(self.allow_labels):
       label_filter = ["label:" + label] + keywords
-      all_client_ids.update(index.LookupClients(label_filter))
+      per_label_client_ids.append(
+          index.IterateClients(
+              label_filter, after_client_id=args.after_client_id or None
+          )
+      )
+
+    # Results for every label are sorted, so merging them yields all matching
+    # client ids in order, with clients having several labels next to each
+    # other.
+    all_client_ids = heapq.merge(*per_label_client_ids)
+    all_client_ids = (cid for cid, _ in itertools.groupby(all_client_ids))
 
     index = 0
-    for cid_batch in collection.Batch(sorted(all_client_ids), batch_size):
+    for cid_batch in collection.Batch(all_client_ids, batch_size):
       client_infos = data_store.REL_DB.MultiReadClientFullInfo(cid_batch)
 
       for client_id, client_info in sorted(client_infos.items()):
@@ -786,6 +786,26 @@ class ApiSearchClientsHandlerTest(api_test_lib.ApiCallHandlerTest):
         int(rdfvalue.RDFDatetime.FromSecondsSinceEpoch(13)),
     )
 
+  def testSearchWithAfterClientId(self):
+    client_ids = sorted(self.SetupClients(5))
+    for client_id in client_ids:
+      self._AddLabels(client_id, labels=["foo"])
+
+    args = client_pb2.ApiSearchClientsArgs(query="label:foo", count=2)
+    result = self.search_handler.Handle(args, context=self.context)
+    result_ids = [item.client_id for item in result.items]
+    self.assertCountEqual(result_ids, client_ids[:2])
+
+    args.after_client_id = max(result_ids)
+    result = self.search_handler.Handle(args, context=self.context)
+    result_ids = [item.client_id for item in result.items]
+    self.assertCountEqual(result_ids, client_ids[2:4])
+
+    args.after_client_id = max(result_ids)
+    result = self.search_handler.Handle(args, context=self.context)
+    result_ids = [item.client_id for item in result.items]
+    self.assertCountEqual(result_ids, client_ids[4:])
+
   def testUnicode(self):
     client_a_id = self.SetupClient(0)
     self._AddLabels(client_a_id, labels=["gżegżółka"])
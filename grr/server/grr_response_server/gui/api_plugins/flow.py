@@ -1058,10 +1058,14 @@ class ApiListFlowsHandler(api_call_handler_base.ApiCallHandler):
   proto_args_type = flow_pb2.ApiListFlowsArgs
   proto_result_type = flow_pb2.ApiListFlowsResult
 
-  def _HandleTopFlowsOnly(
+  def _ReadFlowSummaries(
       self,
       args: flow_pb2.ApiListFlowsArgs,
-  ) -> flow_pb2.ApiListFlowsResult:
+      include_child_flows: bool,
+      paginate: bool,
+      parent_flow_ids: Optional[Sequence[str]] = None,
+  ) -> Sequence[db.FlowSummary]:
+    """Reads summaries of flows matching the filtering criteria of args."""
     min_started_at, max_started_at = None, None
     if args.HasField("min_started_at"):
       min_started_at = rdfvalue.RDFDatetime.FromMicrosecondsSinceEpoch(
@@ -1071,77 +1075,104 @@ class ApiListFlowsHandler(api_call_handler_base.ApiCallHandler):
       max_started_at = rdfvalue.RDFDatetime.FromMicrosecondsSinceEpoch(
           args.max_started_at
       )
-    top_flows = data_store.REL_DB.ReadAllFlowObjects(
-        client_id=args.client_id,
-        min_create_time=min_started_at,
-        max_create_time=max_started_at,
-        include_child_flows=False,
-        not_created_by=access_control.SYSTEM_USERS
-        if args.human_flows_only
-        else None,
+
+    after_flow_id, offset, count = None, 0, None
+    if paginate:
+      after_flow_id = args.after_flow_id or None
+      offset = args.offset
+      if args.HasField("count"):
+        count = args.count
+
+    try:
+      return data_store.REL_DB.ReadFlowSummaries(
+          client_id=args.client_id,
+          min_create_time=min_started_at,
+          max_create_time=max_started_at,
+          include_child_flows=include_child_flows,
+          not_created_by=access_control.SYSTEM_USERS
+          if args.human_flows_only
+          else None,
+          parent_flow_ids=parent_flow_ids,
+          after_flow_id=after_flow_id,
+          offset=offset,
+          count=count,
+      )
+    except db.UnknownFlowError as e:
+      raise FlowNotFoundError(
+          "Flow with client id %s and flow id %s could not be found"
+          % (args.client_id, args.after_flow_id)
+      ) from e
+
+  def _HandleTopFlowsOnly(
+      self,
+      args: flow_pb2.ApiListFlowsArgs,
+  ) -> flow_pb2.ApiListFlowsResult:
+    # Flows are ordered and paginated by the database, so flow objects are only
+    # read (and their progress computed) for the returned page.
+    summaries = self._ReadFlowSummaries(
+        args, include_child_flows=False, paginate=True
     )
-    result = [
-        InitApiFlowFromFlowObject(
-            f_data,
-            with_progress=True,
-        )
-        for f_data in top_flows
-    ]
-    # TODO(hanuszczak): Consult with the team what should we do in case of flows
-    # with missing information.
-    # TODO: Refactor sorting andfiltering of flows to DB layer.
-    result.sort(key=lambda f: f.started_at or 0, reverse=True)
-    result = result[args.offset :]
-    if args.HasField("count"):
-      result = result[: args.count]
+    flow_objs = data_store.REL_DB.ReadFlowObjects(
+        [(args.client_id, s.flow_id) for s in summaries]
+    )
+
+    result = []
+    for summary in summaries:
+      flow_obj = flow_objs.get((args.client_id, summary.flow_id))
+      # The flow could have been deleted in the meantime.
+      if flow_obj is not None:
+        result.append(InitApiFlowFromFlowObject(flow_obj, with_progress=True))
     return flow_pb2.ApiListFlowsResult(items=result)
 
   def _HandleAllFlows(
       self,
       args: flow_pb2.ApiListFlowsArgs,
   ) -> flow_pb2.ApiListFlowsResult:
-    min_started_at, max_started_at = None, None
-    if args.HasField("min_started_at"):
-      min_started_at = rdfvalue.RDFDatetime.FromMicrosecondsSinceEpoch(
-          args.min_started_at
-      )
-    if args.HasField("max_started_at"):
-      max_started_at = rdfvalue.RDFDatetime.FromMicrosecondsSinceEpoch(
-          args.max_started_at
-      )
-    all_flows = data_store.REL_DB.ReadAllFlowObjects(
-        client_id=args.client_id,
-        min_create_time=min_started_at,
-        max_create_time=max_started_at,
-        include_child_flows=True,
-        not_created_by=access_control.SYSTEM_USERS
-        if args.human_flows_only
-        else None,
+    root_summaries = self._ReadFlowSummaries(
+        args, include_child_flows=False, paginate=True
     )
 
-    root_flows: list[flow_pb2.ApiFlow] = []
-    parent_to_children_map: dict[str, list[flow_pb2.ApiFlow]] = (
-        collections.defaultdict(list)
+    # Descendants of the flows of the page are read one level of nesting at a
+    # time, so that only flows nested in the page are read. Summaries are
+    # sorted from the newest, nested flows are listed from the oldest.
+    children_by_parent_id: dict[str, list[str]] = collections.defaultdict(list)
+    flow_ids = []
+    pending_flow_ids = [s.flow_id for s in root_summaries]
+    while pending_flow_ids:
+      flow_ids.extend(pending_flow_ids)
+      child_summaries = self._ReadFlowSummaries(
+          args,
+          include_child_flows=True,
+          paginate=False,
+          parent_flow_ids=pending_flow_ids,
+      )
+      pending_flow_ids = []
+      for summary in reversed(child_summaries):
+        children_by_parent_id[summary.parent_flow_id].append(summary.flow_id)
+        pending_flow_ids.append(summary.flow_id)
+
+    flow_objs = data_store.REL_DB.ReadFlowObjects(
+        [(args.client_id, flow_id) for flow_id in flow_ids]
     )
-    for f in all_flows:
-      api_flow = InitApiFlowFromFlowObject(f, with_progress=True)
-      if not f.parent_flow_id:
-        root_flows.append(api_flow)
-      else:
-        parent_to_children_map[f.parent_flow_id].append(api_flow)
-
-    root_flows.sort(key=lambda f: f.started_at or 0, reverse=True)
-    root_flows = root_flows[args.offset :]
-    if args.HasField("count"):
-      root_flows = root_flows[: args.count]
+    api_flows: dict[str, flow_pb2.ApiFlow] = {
+        flow_id: InitApiFlowFromFlowObject(flow_obj, with_progress=True)
+        for (_, flow_id), flow_obj in flow_objs.items()
+    }
 
     def _AddNestedFlows(f: flow_pb2.ApiFlow):
-      for child in parent_to_children_map[f.flow_id]:
+      for child_id in children_by_parent_id[f.flow_id]:
+        child = api_flows.get(child_id)
+        if child is None:
+          continue
         _AddNestedFlows(child)
         f.nested_flows.append(child)
 
-    for root in root_flows:
-      _AddNestedFlows(root)
+    root_flows: list[flow_pb2.ApiFlow] = []
+    for summary in root_summaries:
+      root = api_flows.get(summary.flow_id)
+      if root is not None:
+        _AddNestedFlows(root)
+        root_flows.append(root)
 
     # TODO(hanuszczak): Consult with the team what should we do in case of flows
     # with missing information.
@@ -786,6 +786,88 @@ class ApiExplainGlobExpressionHandlerTest(absltest.TestCase):
     )
 
 
+class ApiListFlowsHandlerTest(absltest.TestCase):
+
+  def _InitializeFlows(self, db: abstract_db.Database, client_id: str):
+    for flow_id in ["0000000A", "0000000B", "0000000C"]:
+      db_test_utils.InitializeFlow(db, client_id, flow_id=flow_id)
+    db_test_utils.InitializeFlow(
+        db, client_id, flow_id="000000AA", parent_flow_id="0000000A"
+    )
+    db_test_utils.InitializeFlow(
+        db, client_id, flow_id="00000AAA", parent_flow_id="000000AA"
+    )
+
+  @db_test_lib.WithDatabase
+  def testTopFlowsOnlyArePaginated(self, db: abstract_db.Database):
+    client_id = db_test_utils.InitializeClient(db)
+    self._InitializeFlows(db, client_id)
+
+    handler = flow_plugin.ApiListFlowsHandler()
+    args = flow_pb2.ApiListFlowsArgs(
+        client_id=client_id, top_flows_only=True, offset=1, count=1
+    )
+    result = handler.Handle(args, context=_CreateContext(db))
+    self.assertEqual([f.flow_id for f in result.items], ["0000000B"])
+
+    args = flow_pb2.ApiListFlowsArgs(
+        client_id=client_id, top_flows_only=True, after_flow_id="0000000B"
+    )
+    result = handler.Handle(args, context=_CreateContext(db))
+    self.assertEqual([f.flow_id for f in result.items], ["0000000A"])
+
+  @db_test_lib.WithDatabase
+  def testAllFlowsAreNestedInPaginatedRootFlows(
+      self, db: abstract_db.Database
+  ):
+    client_id = db_test_utils.InitializeClient(db)
+    self._InitializeFlows(db, client_id)
+
+    handler = flow_plugin.ApiListFlowsHandler()
+    args = flow_pb2.ApiListFlowsArgs(client_id=client_id, offset=2, count=5)
+    result = handler.Handle(args, context=_CreateContext(db))
+
+    self.assertEqual([f.flow_id for f in result.items], ["0000000A"])
+    (root,) = result.items
+    self.assertEqual([f.flow_id for f in root.nested_flows], ["000000AA"])
+    self.assertEqual(
+        [f.flow_id for f in root.nested_flows[0].nested_flows], ["00000AAA"]
+    )
+
+  @db_test_lib.WithDatabase
+  def testOnlyFlowsNestedInPageAreRead(self, db: abstract_db.Database):
+    client_id = db_test_utils.InitializeClient(db)
+    self._InitializeFlows(db, client_id)
+
+    handler = flow_plugin.ApiListFlowsHandler()
+    args = flow_pb2.ApiListFlowsArgs(client_id=client_id, count=1)
+    with mock.patch.object(
+        data_store.REL_DB,
+        "ReadFlowSummaries",
+        wraps=data_store.REL_DB.ReadFlowSummaries,
+    ) as read_flow_summaries:
+      result = handler.Handle(args, context=_CreateContext(db))
+
+    self.assertEqual([f.flow_id for f in result.items], ["0000000C"])
+    self.assertEmpty(result.items[0].nested_flows)
+    # Root flows of the page and their (missing) child flows.
+    self.assertEqual(read_flow_summaries.call_count, 2)
+    self.assertEqual(
+        read_flow_summaries.call_args.kwargs["parent_flow_ids"], ["0000000C"]
+    )
+
+  @db_test_lib.WithDatabase
+  def testUnknownAfterFlowIdRaises(self, db: abstract_db.Database):
+    client_id = db_test_utils.InitializeClient(db)
+
+    handler = flow_plugin.ApiListFlowsHandler()
+    args = flow_pb2.ApiListFlowsArgs(
+        client_id=client_id, after_flow_id="0000000A"
+    )
+    with self.assertRaises(flow_plugin.FlowNotFoundError):
+      handler.Handle(args, context=_CreateContext(db))
+
+
 class ApiCreateFlowTest(absltest.TestCase):
 
   @db_test_lib.WithDatabase
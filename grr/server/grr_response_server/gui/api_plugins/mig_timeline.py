@@ -19,6 +19,20 @@ def ToRDFApiTimelineBodyOpts(
   )
 
 
+def ToProtoApiTimelineFilter(
+    rdf: timeline.ApiTimelineFilter,
+) -> timeline_pb2.ApiTimelineFilter:
+  return rdf.AsPrimitiveProto()
+
+
+def ToRDFApiTimelineFilter(
+    proto: timeline_pb2.ApiTimelineFilter,
+) -> timeline.ApiTimelineFilter:
+  return timeline.ApiTimelineFilter.FromSerializedBytes(
+      proto.SerializeToString()
+  )
+
+
 def ToProtoApiGetCollectedTimelineArgs(
     rdf: timeline.ApiGetCollectedTimelineArgs,
 ) -> timeline_pb2.ApiGetCollectedTimelineArgs:
@@ -1,13 +1,24 @@
 #!/usr/bin/env python
 """A module with API handlers related to the timeline colllection."""
+import atexit
+import collections
 from collections.abc import Iterator
+from concurrent import futures
+import multiprocessing
+import tempfile
+import threading
 from typing import Optional
 
+from grr_response_core import config
+from grr_response_core.lib import rdfvalue
 from grr_response_core.lib import utils
 from grr_response_core.lib.rdfvalues import structs as rdf_structs
 from grr_response_core.lib.util import body
 from grr_response_core.lib.util import chunked
+from grr_response_core.lib.util import gzchunked
+from grr_response_core.lib.util import timeline as util_timeline
 from grr_response_proto import objects_pb2
+from grr_response_proto import timeline_pb2 as flows_timeline_pb2
 from grr_response_proto.api import timeline_pb2
 from grr_response_server import data_store
 from grr_response_server.flows.general import timeline
@@ -24,6 +35,15 @@ class ApiTimelineBodyOpts(rdf_structs.RDFProtoStruct):
   rdf_deps = []
 
 
+class ApiTimelineFilter(rdf_structs.RDFProtoStruct):
+  """An RDF wrapper class for the timeline export filter."""
+
+  protobuf = timeline_pb2.ApiTimelineFilter
+  rdf_deps = [
+      rdfvalue.RDFDatetime,
+  ]
+
+
 class ApiGetCollectedTimelineArgs(rdf_structs.RDFProtoStruct):
   """An RDF wrapper class for the arguments of timeline exporter arguments."""
 
@@ -32,6 +52,7 @@ class ApiGetCollectedTimelineArgs(rdf_structs.RDFProtoStruct):
       api_client.ApiClientId,
       api_flow.ApiFlowId,
       ApiTimelineBodyOpts,
+      ApiTimelineFilter,
   ]
 
 
@@ -41,6 +62,7 @@ class ApiGetCollectedHuntTimelinesArgs(rdf_structs.RDFProtoStruct):
   protobuf = timeline_pb2.ApiGetCollectedHuntTimelinesArgs
   rdf_deps = [
       ApiTimelineBodyOpts,
+      ApiTimelineFilter,
   ]
 
 
@@ -66,7 +88,7 @@ class ApiGetCollectedTimelineHandler(api_call_handler_base.ApiCallHandler):
     if args.format == timeline_pb2.ApiGetCollectedTimelineArgs.BODY:
       return self._StreamBody(args)
     if args.format == timeline_pb2.ApiGetCollectedTimelineArgs.RAW_GZCHUNKED:
-      return self._StreamRawGzchunked(client_id=client_id, flow_id=flow_id)
+      return self._StreamRawGzchunked(args)
 
     message = "Incorrect timeline export format: {}".format(args.format)
     raise ValueError(message)
@@ -75,39 +97,28 @@ class ApiGetCollectedTimelineHandler(api_call_handler_base.ApiCallHandler):
       self,
       args: timeline_pb2.ApiGetCollectedTimelineArgs,
   ) -> api_call_handler_base.ApiBinaryStream:
-    client_id = args.client_id
-    flow_id = args.flow_id
+    entries = _ProtoEntries(args)
+    content = body.Stream(entries, opts=_BodyOpts(args))
 
-    opts = body.Opts()
-    opts.timestamp_subsecond_precision = (
-        args.body_opts.timestamp_subsecond_precision
-    )
-    opts.backslash_escape = args.body_opts.backslash_escape
-    opts.carriage_return_escape = args.body_opts.carriage_return_escape
-    opts.non_printable_escape = args.body_opts.non_printable_escape
-
-    if args.body_opts.HasField("inode_ntfs_file_reference_format"):
-      # If the field is set explicitly, we respect the choice no matter what
-      # filesystem we detected.
-      if args.body_opts.inode_ntfs_file_reference_format:
-        opts.inode_format = body.Opts.InodeFormat.NTFS_FILE_REFERENCE
-    else:
-      fstype = timeline.FilesystemType(client_id=client_id, flow_id=flow_id)
-      if fstype is not None and fstype.lower() == "ntfs":
-        opts.inode_format = body.Opts.InodeFormat.NTFS_FILE_REFERENCE
-
-    entries = timeline.ProtoEntries(client_id=client_id, flow_id=flow_id)
-    content = body.Stream(entries, opts=opts)
-
-    filename = "timeline_{}.body".format(flow_id)
+    filename = "timeline_{}.body".format(args.flow_id)
     return api_call_handler_base.ApiBinaryStream(filename, content)
 
   def _StreamRawGzchunked(
       self,
-      client_id: str,
-      flow_id: str,
+      args: timeline_pb2.ApiGetCollectedTimelineArgs,
   ) -> api_call_handler_base.ApiBinaryStream:
-    content = timeline.Blobs(client_id=client_id, flow_id=flow_id)
+    client_id = args.client_id
+    flow_id = args.flow_id
+
+    if args.HasField("filter"):
+      # Filtered entries have to be serialized again, so only the unfiltered
+      # timeline can be streamed directly from the stored blobs.
+      entries = _ProtoEntries(args)
+      content = gzchunked.Serialize(
+          entry.SerializeToString() for entry in entries
+      )
+    else:
+      content = timeline.Blobs(client_id=client_id, flow_id=flow_id)
     content = map(chunked.Encode, content)
 
     filename = "timeline_{}.gzchunked".format(flow_id)
@@ -161,7 +172,47 @@ class ApiGetCollectedHuntTimelinesHandler(api_call_handler_base.ApiCallHandler):
       args: timeline_pb2.ApiGetCollectedHuntTimelinesArgs,
       zipgen: utils.StreamingZipGenerator,
   ) -> Iterator[bytes]:
-
+    prefetch = config.CONFIG["AdminUI.hunt_timeline_export_prefetch"]
+    if prefetch <= 0:
+      for filename, subargs in self._HuntTimelinesArgs(args):
+        yield zipgen.WriteFileHeader(filename)
+        yield from map(zipgen.WriteFileChunk, self._GenerateTimeline(subargs))
+        yield zipgen.WriteFileFooter()
+      return
+
+    # Timelines are prefetched in order and written in the same order, so the
+    # archive is the same no matter how long it takes to generate each of them.
+    # At most `prefetch` timelines are generated while one is being written.
+    executor = futures.ThreadPoolExecutor(
+        max_workers=prefetch,
+        thread_name_prefix="HuntTimelinePrefetch",
+    )
+    pending: collections.deque[
+        tuple[str, futures.Future[tempfile.SpooledTemporaryFile]]
+    ] = collections.deque()
+
+    try:
+      for filename, subargs in self._HuntTimelinesArgs(args):
+        future = executor.submit(self._PrefetchTimeline, subargs)
+        pending.append((filename, future))
+
+        if len(pending) > prefetch:
+          yield from self._WritePrefetchedTimeline(zipgen, *pending.popleft())
+
+      while pending:
+        yield from self._WritePrefetchedTimeline(zipgen, *pending.popleft())
+    finally:
+      executor.shutdown(wait=False, cancel_futures=True)
+      # The archive generation might have been interrupted, in which case the
+      # already prefetched timelines have to be discarded.
+      for _, future in pending:
+        future.add_done_callback(_ClosePrefetchedTimeline)
+
+  def _HuntTimelinesArgs(
+      self,
+      args: timeline_pb2.ApiGetCollectedHuntTimelinesArgs,
+  ) -> Iterator[tuple[str, timeline_pb2.ApiGetCollectedTimelineArgs]]:
+    """Yields archive filenames and export arguments of all hunt timelines."""
     offset = 0
     while True:
       flows = data_store.REL_DB.ReadHuntFlows(
@@ -180,20 +231,215 @@ class ApiGetCollectedHuntTimelinesHandler(api_call_handler_base.ApiCallHandler):
         subargs.flow_id = flow.flow_id
         subargs.format = args.format
         subargs.body_opts.CopyFrom(args.body_opts)
+        if args.HasField("filter"):
+          subargs.filter.CopyFrom(args.filter)
 
-        yield zipgen.WriteFileHeader(filename)
-        yield from map(zipgen.WriteFileChunk, self._GenerateTimeline(subargs))
-        yield zipgen.WriteFileFooter()
+        yield filename, subargs
 
       if len(flows) < _FLOW_BATCH_SIZE:
         break
 
+      offset += _FLOW_BATCH_SIZE
+
   def _GenerateTimeline(
       self,
       args: timeline_pb2.ApiGetCollectedTimelineArgs,
   ) -> Iterator[bytes]:
+    pool = _GetBodyFormattingPool()
+    if (
+        pool is not None
+        and args.format == timeline_pb2.ApiGetCollectedTimelineArgs.BODY
+    ):
+      return _FormatBodyOnPool(pool, args)
+
     return self._handler.Handle(args).GenerateContent()
 
+  def _PrefetchTimeline(
+      self,
+      args: timeline_pb2.ApiGetCollectedTimelineArgs,
+  ) -> tempfile.SpooledTemporaryFile:
+    """Generates the timeline into a buffer that spills to disk if needed."""
+    buf = tempfile.SpooledTemporaryFile(max_size=_PREFETCH_MEMORY_SIZE)
+    try:
+      for chunk in self._GenerateTimeline(args):
+        buf.write(chunk)
+    except BaseException:
+      buf.close()
+      raise
+
+    buf.seek(0)
+    return buf
+
+  def _WritePrefetchedTimeline(
+      self,
+      zipgen: utils.StreamingZipGenerator,
+      filename: str,
+      future: futures.Future[tempfile.SpooledTemporaryFile],
+  ) -> Iterator[bytes]:
+    with future.result() as buf:
+      yield zipgen.WriteFileHeader(filename)
+      while chunk := buf.read(_PREFETCH_READ_CHUNK_SIZE):
+        yield zipgen.WriteFileChunk(chunk)
+      yield zipgen.WriteFileFooter()
+
+
+def _ClosePrefetchedTimeline(
+    future: futures.Future[tempfile.SpooledTemporaryFile],
+) -> None:
+  if not future.cancelled() and future.exception() is None:
+    future.result().close()
+
+
+_BODY_FORMATTING_POOL: Optional[futures.Executor] = None
+_BODY_FORMATTING_POOL_LOCK = threading.Lock()
+
+
+def _GetBodyFormattingPool() -> Optional[futures.Executor]:
+  """Returns the body formatting process pool, if it is enabled."""
+  global _BODY_FORMATTING_POOL
+
+  num_processes = config.CONFIG["AdminUI.hunt_timeline_export_processes"]
+  if num_processes <= 0:
+    return None
+
+  with _BODY_FORMATTING_POOL_LOCK:
+    if _BODY_FORMATTING_POOL is None:
+      _BODY_FORMATTING_POOL = futures.ProcessPoolExecutor(
+          max_workers=num_processes,
+          # Forking a process that runs server threads is not safe.
+          mp_context=multiprocessing.get_context("spawn"),
+      )
+      # Worker processes have to be stopped before the interpreter exits.
+      atexit.register(_ShutdownBodyFormattingPool)
+
+    return _BODY_FORMATTING_POOL
+
+
+def _ShutdownBodyFormattingPool() -> None:
+  """Shuts the body formatting process pool down, if it was started."""
+  global _BODY_FORMATTING_POOL
+
+  with _BODY_FORMATTING_POOL_LOCK:
+    if _BODY_FORMATTING_POOL is not None:
+      _BODY_FORMATTING_POOL.shutdown(wait=True, cancel_futures=True)
+      _BODY_FORMATTING_POOL = None
+
+
+def _FormatBodyOnPool(
+    pool: futures.Executor,
+    args: timeline_pb2.ApiGetCollectedTimelineArgs,
+) -> Iterator[bytes]:
+  """Formats a timeline in the body format, a blob per pool task."""
+  flow_obj = data_store.REL_DB.ReadFlowObject(args.client_id, args.flow_id)
+  if flow_obj.flow_class_name != timeline.TimelineFlow.__name__:
+    message = "Flow '{}' is not a timeline flow".format(args.flow_id)
+    raise ValueError(message)
+
+  opts = _BodyOpts(args)
+  entry_filter = _EntryFilter(args)
+  if entry_filter is None:
+    blobs = timeline.Blobs(client_id=args.client_id, flow_id=args.flow_id)
+  else:
+    blobs = timeline.FilteredBlobs(
+        client_id=args.client_id,
+        flow_id=args.flow_id,
+        entry_filter=entry_filter,
+    )
+
+  # Keep every worker busy while the formatted blobs are consumed, but do not
+  # read the whole timeline ahead.
+  max_pending = 2 * config.CONFIG["AdminUI.hunt_timeline_export_processes"]
+
+  pending: collections.deque[futures.Future[bytes]] = collections.deque()
+  try:
+    for blob in blobs:
+      pending.append(pool.submit(_FormatBody, blob, opts, entry_filter))
+      if len(pending) > max_pending:
+        yield pending.popleft().result()
+
+    while pending:
+      yield pending.popleft().result()
+  finally:
+    for future in pending:
+      future.cancel()
+
+
+def _FormatBody(
+    blob: bytes,
+    opts: body.Opts,
+    entry_filter: Optional[timeline.EntryFilter],
+) -> bytes:
+  """Formats entries of a single timeline blob in the body format."""
+  entries = util_timeline.DeserializeTimelineEntryProtoStream(iter([blob]))
+  if entry_filter is not None:
+    entries = filter(entry_filter.Matches, entries)
+
+  return b"".join(body.Stream(entries, opts=opts))
+
+
+def _BodyOpts(args: timeline_pb2.ApiGetCollectedTimelineArgs) -> body.Opts:
+  """Creates options of the body format for the given export arguments."""
+  opts = body.Opts()
+  opts.timestamp_subsecond_precision = (
+      args.body_opts.timestamp_subsecond_precision
+  )
+  opts.backslash_escape = args.body_opts.backslash_escape
+  opts.carriage_return_escape = args.body_opts.carriage_return_escape
+  opts.non_printable_escape = args.body_opts.non_printable_escape
+
+  if args.body_opts.HasField("inode_ntfs_file_reference_format"):
+    # If the field is set explicitly, we respect the choice no matter what
+    # filesystem we detected.
+    if args.body_opts.inode_ntfs_file_reference_format:
+      opts.inode_format = body.Opts.InodeFormat.NTFS_FILE_REFERENCE
+  else:
+    fstype = timeline.FilesystemType(
+        client_id=args.client_id, flow_id=args.flow_id
+    )
+    if fstype is not None and fstype.lower() == "ntfs":
+      opts.inode_format = body.Opts.InodeFormat.NTFS_FILE_REFERENCE
+
+  return opts
+
+
+def _EntryFilter(
+    args: timeline_pb2.ApiGetCollectedTimelineArgs,
+) -> Optional[timeline.EntryFilter]:
+  """Creates a timeline entry filter for the given export arguments."""
+  if not args.HasField("filter"):
+    return None
+
+  return timeline.EntryFilter(
+      path_prefix=args.filter.path_prefix,
+      min_time_ns=(
+          args.filter.start_time * 1000
+          if args.filter.HasField("start_time")
+          else None
+      ),
+      max_time_ns=(
+          # The end time is inclusive, so all nanoseconds of its last
+          # microsecond are included too.
+          args.filter.end_time * 1000 + 999
+          if args.filter.HasField("end_time")
+          else None
+      ),
+  )
+
+
+def _ProtoEntries(
+    args: timeline_pb2.ApiGetCollectedTimelineArgs,
+) -> Iterator[flows_timeline_pb2.TimelineEntry]:
+  """Retrieves timeline entries to export, applying the filter if specified."""
+  entry_filter = _EntryFilter(args)
+  if entry_filter is None:
+    return timeline.ProtoEntries(client_id=args.client_id, flow_id=args.flow_id)
+
+  return timeline.FilteredProtoEntries(
+      client_id=args.client_id,
+      flow_id=args.flow_id,
+      entry_filter=entry_filter,
+  )
+
 
 def _GetHuntTimelineFilename(
     snapshot: objects_pb2.ClientSnapshot,
@@ -212,3 +458,10 @@ def _GetHuntTimelineFilename(
 
 
 _FLOW_BATCH_SIZE = 32_768  # A number of flows to fetch in a database call.
+
+# Number of bytes of a prefetched timeline kept in memory before it is spilled
+# to disk.
+_PREFETCH_MEMORY_SIZE = 16 * 1024 * 1024
+
+# Size of chunks prefetched timelines are written to the archive in.
+_PREFETCH_READ_CHUNK_SIZE = 1024 * 1024
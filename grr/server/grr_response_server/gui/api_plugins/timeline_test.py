@@ -1,8 +1,11 @@
 #!/usr/bin/env python
+import atexit
+from concurrent import futures
 import csv
 import io
 import random
 import stat
+from unittest import mock
 import zipfile
 
 from absl.testing import absltest
@@ -19,6 +22,7 @@ from grr_response_server.databases import db_test_utils
 from grr_response_server.flows.general import timeline
 from grr_response_server.gui import api_test_lib
 from grr_response_server.gui.api_plugins import timeline as api_timeline
+from grr.test_lib import test_lib
 from grr.test_lib import testing_startup
 from grr.test_lib import timeline_test_lib
 
@@ -371,6 +375,99 @@ class ApiGetCollectedTimelineHandlerTest(api_test_lib.ApiCallHandlerTest):
 
     self.assertEqual(entries, deserialized)
 
+  def testBodyFilter(self):
+    entry_1 = timeline_pb2.TimelineEntry()
+    entry_1.path = "/foo/bar".encode("utf-8")
+    entry_1.mtime_ns = 1_000 * 10**9
+
+    entry_2 = timeline_pb2.TimelineEntry()
+    entry_2.path = "/foo/baz".encode("utf-8")
+    entry_2.mtime_ns = 2_000 * 10**9
+
+    entry_3 = timeline_pb2.TimelineEntry()
+    entry_3.path = "/quux/thud".encode("utf-8")
+    entry_3.mtime_ns = 2_000 * 10**9
+
+    client_id = db_test_utils.InitializeClient(data_store.REL_DB)
+    flow_id = timeline_test_lib.WriteTimeline(
+        client_id, [entry_1, entry_2, entry_3]
+    )
+
+    args = api_timeline_pb2.ApiGetCollectedTimelineArgs()
+    args.client_id = client_id
+    args.flow_id = flow_id
+    args.format = api_timeline_pb2.ApiGetCollectedTimelineArgs.Format.BODY
+    args.filter.path_prefix = "/foo/".encode("utf-8")
+    args.filter.start_time = 1_500 * 10**6
+
+    result = self.handler.Handle(args)
+    content = b"".join(result.GenerateContent()).decode("utf-8")
+
+    rows = list(csv.reader(io.StringIO(content), delimiter="|"))
+    self.assertLen(rows, 1)
+    self.assertEqual(rows[0][1], "/foo/baz")
+
+  def testFilterEndTimeIncludesItsLastMicrosecond(self):
+    entries = []
+    mtimes_ns = [1_999_999, 2_000_000, 2_000_999, 2_001_000]
+    for idx, mtime_ns in enumerate(mtimes_ns):
+      entry = timeline_pb2.TimelineEntry()
+      entry.path = "/foo/bar{}".format(idx).encode("utf-8")
+      entry.mtime_ns = mtime_ns
+      entries.append(entry)
+
+    client_id = db_test_utils.InitializeClient(data_store.REL_DB)
+    flow_id = timeline_test_lib.WriteTimeline(client_id, entries)
+
+    args = api_timeline_pb2.ApiGetCollectedTimelineArgs()
+    args.client_id = client_id
+    args.flow_id = flow_id
+    args.format = (
+        api_timeline_pb2.ApiGetCollectedTimelineArgs.Format.RAW_GZCHUNKED
+    )
+    args.filter.end_time = 2_000
+
+    content = b"".join(self.handler.Handle(args).GenerateContent())
+
+    buf = io.BytesIO(content)
+    chunks = chunked.ReadAll(buf)
+    deserialized = list(
+        rdf_timeline.DeserializeTimelineEntryStream(iter(chunks))
+    )
+
+    self.assertEqual(entries[:3], deserialized)
+
+  def testRawGzchunkedFilter(self):
+    entries = []
+
+    for idx in range(1024):
+      entry = timeline_pb2.TimelineEntry()
+      entry.path = "/foo/bar{}".format(idx).encode("utf-8")
+      entry.mtime_ns = idx * 10**9
+      entries.append(entry)
+
+    client_id = db_test_utils.InitializeClient(data_store.REL_DB)
+    flow_id = timeline_test_lib.WriteTimeline(client_id, entries)
+
+    args = api_timeline_pb2.ApiGetCollectedTimelineArgs()
+    args.client_id = client_id
+    args.flow_id = flow_id
+    args.format = (
+        api_timeline_pb2.ApiGetCollectedTimelineArgs.Format.RAW_GZCHUNKED
+    )
+    args.filter.start_time = 100 * 10**6
+    args.filter.end_time = 199 * 10**6
+
+    content = b"".join(self.handler.Handle(args).GenerateContent())
+
+    buf = io.BytesIO(content)
+    chunks = chunked.ReadAll(buf)
+    deserialized = list(
+        rdf_timeline.DeserializeTimelineEntryStream(iter(chunks))
+    )
+
+    self.assertEqual(entries[100:200], deserialized)
+
 
 class ApiGetCollectedHuntTimelinesHandlerTest(api_test_lib.ApiCallHandlerTest):
 
@@ -607,6 +704,129 @@ class ApiGetCollectedHuntTimelinesHandlerTest(api_test_lib.ApiCallHandlerTest):
     self.assertEqual(rows[0][1], "/foo/bar/baz")
     self.assertEqual(rows[0][10], "1337.42")
 
+  def _WriteHuntTimelines(self, client_count: int) -> str:
+    hunt_id = "".join(random.choice("ABCDEF") for _ in range(8))
+
+    hunt_obj = hunts_pb2.Hunt()
+    hunt_obj.hunt_id = hunt_id
+    hunt_obj.args.standard.flow_name = timeline.TimelineFlow.__name__
+    hunt_obj.hunt_state = hunts_pb2.Hunt.HuntState.PAUSED
+    data_store.REL_DB.WriteHuntObject(hunt_obj)
+
+    for client_idx in range(client_count):
+      client_id = db_test_utils.InitializeClient(data_store.REL_DB)
+
+      snapshot = objects_pb2.ClientSnapshot()
+      snapshot.client_id = client_id
+      snapshot.knowledge_base.fqdn = f"foo{client_idx}.example.com"
+      data_store.REL_DB.WriteClientSnapshot(snapshot)
+
+      entries = []
+      for entry_idx in range(random.randint(1, 256)):
+        entry = timeline_pb2.TimelineEntry()
+        entry.path = f"/foo/{client_idx}/bar{entry_idx}".encode("utf-8")
+        entry.size = random.randint(0, 1024)
+        entry.mtime_ns = random.randint(0, 1024) * 10**9
+        entries.append(entry)
+
+      timeline_test_lib.WriteTimeline(client_id, entries, hunt_id=hunt_id)
+
+    return hunt_id
+
+  def _ReadArchive(
+      self,
+      args: api_timeline_pb2.ApiGetCollectedHuntTimelinesArgs,
+  ) -> list[tuple[str, bytes]]:
+    content = b"".join(self.handler.Handle(args).GenerateContent())
+
+    with zipfile.ZipFile(io.BytesIO(content), mode="r") as archive:
+      return [(name, archive.read(name)) for name in archive.namelist()]
+
+  def testBodyPrefetch(self):
+    hunt_id = self._WriteHuntTimelines(8)
+
+    args = api_timeline_pb2.ApiGetCollectedHuntTimelinesArgs()
+    args.hunt_id = hunt_id
+    args.format = api_timeline_pb2.ApiGetCollectedTimelineArgs.Format.BODY
+
+    files = self._ReadArchive(args)
+    self.assertLen(files, 8)
+
+    with test_lib.ConfigOverrider({"AdminUI.hunt_timeline_export_prefetch": 3}):
+      prefetched_files = self._ReadArchive(args)
+
+    self.assertEqual(prefetched_files, files)
+
+  def testRawGzchunkedPrefetch(self):
+    hunt_id = self._WriteHuntTimelines(8)
+
+    args = api_timeline_pb2.ApiGetCollectedHuntTimelinesArgs()
+    args.hunt_id = hunt_id
+    args.format = (
+        api_timeline_pb2.ApiGetCollectedTimelineArgs.Format.RAW_GZCHUNKED
+    )
+
+    files = self._ReadArchive(args)
+    self.assertLen(files, 8)
+
+    with test_lib.ConfigOverrider({"AdminUI.hunt_timeline_export_prefetch": 1}):
+      prefetched_files = self._ReadArchive(args)
+
+    self.assertEqual(prefetched_files, files)
+
+  def testBodyFormattingPool(self):
+    hunt_id = self._WriteHuntTimelines(4)
+
+    args = api_timeline_pb2.ApiGetCollectedHuntTimelinesArgs()
+    args.hunt_id = hunt_id
+    args.format = api_timeline_pb2.ApiGetCollectedTimelineArgs.Format.BODY
+    args.filter.path_prefix = "/foo/1/".encode("utf-8")
+
+    files = self._ReadArchive(args)
+    self.assertLen(files, 4)
+
+    # Worker processes would not see the test database, so threads are used.
+    with futures.ThreadPoolExecutor(max_workers=2) as pool:
+      with mock.patch.object(api_timeline, "_BODY_FORMATTING_POOL", pool):
+        with test_lib.ConfigOverrider({
+            "AdminUI.hunt_timeline_export_prefetch": 2,
+            "AdminUI.hunt_timeline_export_processes": 2,
+        }):
+          pool_files = self._ReadArchive(args)
+
+    self.assertEqual(pool_files, files)
+
+  def testBodyFormattingPoolShutdownIsRegistered(self):
+    self.addCleanup(api_timeline._ShutdownBodyFormattingPool)
+
+    with test_lib.ConfigOverrider(
+        {"AdminUI.hunt_timeline_export_processes": 1}
+    ):
+      with mock.patch.object(atexit, "register") as register_mock:
+        pool = api_timeline._GetBodyFormattingPool()
+        self.assertIs(api_timeline._GetBodyFormattingPool(), pool)
+
+    self.assertIsNotNone(pool)
+    register_mock.assert_called_once_with(
+        api_timeline._ShutdownBodyFormattingPool
+    )
+
+    api_timeline._ShutdownBodyFormattingPool()
+    self.assertIsNone(api_timeline._BODY_FORMATTING_POOL)
+
+  def testPrefetchInterrupted(self):
+    hunt_id = self._WriteHuntTimelines(4)
+
+    args = api_timeline_pb2.ApiGetCollectedHuntTimelinesArgs()
+    args.hunt_id = hunt_id
+    args.format = api_timeline_pb2.ApiGetCollectedTimelineArgs.Format.BODY
+
+    with test_lib.ConfigOverrider({"AdminUI.hunt_timeline_export_prefetch": 2}):
+      content = self.handler.Handle(args).GenerateContent()
+      next(content)
+      next(content)
+      content.close()
+
 
 if __name__ == "__main__":
   absltest.main()
@@ -47,6 +47,8 @@ class CollectionArchiveGenerator:
   ).encode("utf-8")
 
   BATCH_SIZE = 1000
+  # Number of blob batches read ahead while the archive is being compressed.
+  PREFETCH_BATCHES = 2
 
   def __init__(
       self,
@@ -187,7 +189,9 @@ class CollectionArchiveGenerator:
         client_ids.add(client_path.client_id)
         client_paths.add(client_path)
 
-      for chunk in file_store.StreamFilesChunks(client_paths):
+      for chunk in file_store.StreamFilesChunks(
+          client_paths, prefetch_batches=self.PREFETCH_BATCHES
+      ):
         self.processed_files.add(chunk.client_path)
         for output in self._WriteFileChunk(chunk=chunk):
           yield output
@@ -238,6 +242,8 @@ class FlowArchiveGenerator:
   """Archive generator for new-style flows that provide custom file mappings."""
 
   BATCH_SIZE = 1000
+  # Number of blob batches read ahead while the archive is being compressed.
+  PREFETCH_BATCHES = 2
 
   def __init__(
       self,
@@ -341,7 +347,8 @@ class FlowArchiveGenerator:
 
       processed_in_batch = set()
       for chunk in file_store.StreamFilesChunks(
-          [m.client_path for m in mappings_batch]
+          [m.client_path for m in mappings_batch],
+          prefetch_batches=self.PREFETCH_BATCHES,
       ):
         processed_in_batch.add(chunk.client_path.path_id)
         processed_files[chunk.client_path.vfs_path] = archive_paths_by_id[
@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 """REL_DB implementation of models_hunts."""
 
+from collections.abc import Iterable, Sequence
+import logging
 from typing import Optional
 
 from grr_response_core.lib import rdfvalue
@@ -34,6 +36,21 @@ CANCELLED_BY_USER = "Cancelled by user"
 # fmt: on
 
 
+# Number of foreman rule changes made by this process. The foreman caches
+# foreman rules and reads them again when this number changes.
+_foreman_rules_version = 0
+
+
+def ForemanRulesVersion() -> int:
+  """Returns a number that changes when this process changes foreman rules."""
+  return _foreman_rules_version
+
+
+def _ForemanRulesChanged() -> None:
+  global _foreman_rules_version
+  _foreman_rules_version += 1
+
+
 class Error(Exception):
   pass
 
@@ -353,6 +370,7 @@ def _ScheduleGenericHunt(hunt_obj: rdf_hunt_objects.Hunt):
       foreman_condition
   )
   data_store.REL_DB.WriteForemanRule(proto_foreman_condition)
+  _ForemanRulesChanged()
 
 
 def StartHunt(hunt_id) -> rdf_hunt_objects.Hunt:
@@ -403,6 +421,7 @@ def PauseHunt(
       hunt_state_comment=reason,
   )
   data_store.REL_DB.RemoveForemanRule(hunt_id=hunt_obj.hunt_id)
+  _ForemanRulesChanged()
 
   hunt_obj = data_store.REL_DB.ReadHuntObject(hunt_id)
   hunt_obj = mig_hunt_objects.ToRDFHunt(hunt_obj)
@@ -433,6 +452,7 @@ def StopHunt(
       hunt_state_comment=reason_comment,
   )
   data_store.REL_DB.RemoveForemanRule(hunt_id=hunt_obj.hunt_id)
+  _ForemanRulesChanged()
 
   # TODO: Stop matching on string (comment).
   if (
@@ -546,16 +566,137 @@ def StartHuntFlowOnClient(client_id, hunt_id):
 
     if hunt_obj.client_limit:
       if _GetNumClients(hunt_obj.hunt_id) >= hunt_obj.client_limit:
-        try:
-          PauseHunt(
-              hunt_id,
-              hunt_state_reason=rdf_hunt_objects.Hunt.HuntStateReason.TOTAL_CLIENTS_EXCEEDED,
-          )
-        except OnlyStartedHuntCanBePausedError:
-          pass
+        _PauseHuntOnClientLimit(hunt_id)
 
   else:
     raise UnknownHuntTypeError(
         f"Can't determine hunt type when starting hunt {client_id} on client"
         f" {hunt_id}."
     )
+
+
+def _PauseHuntOnClientLimit(hunt_id: str) -> None:
+  try:
+    PauseHunt(
+        hunt_id,
+        hunt_state_reason=rdf_hunt_objects.Hunt.HuntStateReason.TOTAL_CLIENTS_EXCEEDED,
+    )
+  except OnlyStartedHuntCanBePausedError:
+    pass
+
+
+def _StartHuntFlowsOnClients(
+    hunt_id: str,
+    client_ids: Sequence[str],
+) -> list[str]:
+  """Starts flows of a given hunt on given clients, returns started clients."""
+  hunt_obj = data_store.REL_DB.ReadHuntObject(hunt_id)
+
+  # See `StartHuntFlowOnClient` for why paused hunts are accepted.
+  if not models_hunts.IsHuntSuitableForFlowProcessing(hunt_obj.hunt_state):
+    return []
+
+  hunt_obj = mig_hunt_objects.ToRDFHunt(hunt_obj)
+  if hunt_obj.args.hunt_type != hunt_obj.args.HuntType.STANDARD:
+    raise UnknownHuntTypeError(
+        f"Can't determine hunt type when starting hunt {hunt_id} on clients"
+        f" {client_ids}."
+    )
+
+  hunt_args = hunt_obj.args.standard
+
+  # Clients that already have the hunt flow are skipped before the client
+  # limit and the client rate are applied, so that they don't take the place
+  # (or the start time) of clients the flow can still be started on. Hunt
+  # flows re-use the id of their hunt.
+  existing_flow_keys = data_store.REL_DB.ReadFlowObjects(
+      [(client_id, hunt_id) for client_id in client_ids]
+  )
+  client_ids = [
+      client_id
+      for client_id in dict.fromkeys(client_ids)
+      if (client_id, hunt_id) not in existing_flow_keys
+  ]
+
+  if hunt_obj.client_limit:
+    # Starting flows one by one pauses the hunt as soon as the limit is
+    # reached, so the batch must not go over the limit either.
+    num_clients = data_store.REL_DB.CountHuntFlows(hunt_id)
+    client_ids = client_ids[: max(0, hunt_obj.client_limit - num_clients)]
+
+  client_ids_and_start_times = []
+  if hunt_obj.client_rate > 0:
+    num_clients_diff = max(
+        0,
+        _GetNumClients(hunt_obj.hunt_id) - hunt_obj.num_clients_at_start_time,
+    )
+    # Every client of the batch is due after the previous one, as if they were
+    # started one by one.
+    for i, client_id in enumerate(client_ids):
+      next_client_due_msecs = int(
+          (num_clients_diff + i) / hunt_obj.client_rate * 60e6
+      )
+      start_at = rdfvalue.RDFDatetime.FromMicrosecondsSinceEpoch(
+          hunt_obj.last_start_time.AsMicrosecondsSinceEpoch()
+          + next_client_due_msecs
+      )
+      client_ids_and_start_times.append((client_id, start_at))
+  else:
+    client_ids_and_start_times = [(client_id, None) for client_id in client_ids]
+
+  flow_cls = registry.FlowRegistry.FlowClassByName(hunt_args.flow_name)
+  if hunt_args.HasField("flow_args"):
+    flow_args = hunt_args.flow_args.Unpack(flow_cls.args_type)
+  else:
+    flow_args = None
+
+  started_client_ids = flow.StartFlowsOnClients(
+      client_ids_and_start_times,
+      flow_cls=flow_cls,
+      parent=flow.FlowParent.FromHuntID(hunt_id),
+      flow_args=flow_args,
+      creator=hunt_obj.creator,
+      cpu_limit=hunt_obj.per_client_cpu_limit,
+      network_bytes_limit=hunt_obj.per_client_network_bytes_limit,
+      output_plugins=hunt_obj.output_plugins,
+  )
+
+  if hunt_obj.client_limit:
+    if num_clients + len(started_client_ids) >= hunt_obj.client_limit:
+      _PauseHuntOnClientLimit(hunt_id)
+
+  return started_client_ids
+
+
+def StartHuntFlowsOnClients(
+    client_hunt_ids: Iterable[tuple[str, str]],
+) -> list[tuple[str, str]]:
+  """Starts flows corresponding to given hunts on given clients in bulk.
+
+  This is a bulk version of `StartHuntFlowOnClient`: every hunt is read once
+  and flows of all its clients are written with a few batched database calls.
+  A failure to start a hunt is logged and doesn't affect the other hunts.
+
+  Args:
+    client_hunt_ids: Pairs of client and hunt ids to start hunt flows for.
+
+  Returns:
+    Pairs of client and hunt ids the hunt flows were started for.
+  """
+  client_ids_by_hunt_id = {}
+  for client_id, hunt_id in client_hunt_ids:
+    client_ids_by_hunt_id.setdefault(hunt_id, []).append(client_id)
+
+  started = []
+  for hunt_id, client_ids in client_ids_by_hunt_id.items():
+    try:
+      started_client_ids = _StartHuntFlowsOnClients(hunt_id, client_ids)
+    except Exception:  # pylint: disable=broad-except
+      logging.exception(
+          "Failure starting hunt %s on clients %s.", hunt_id, client_ids
+      )
+      continue
+
+    started.extend((client_id, hunt_id) for client_id in started_client_ids)
+
+  return started
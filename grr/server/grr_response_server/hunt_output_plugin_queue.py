@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+"""Processing of queued hunt results with the hunt output plugins."""
+
+import collections
+import logging
+import threading
+from typing import Optional, Sequence
+
+from grr_response_core.lib import rdfvalue
+from grr_response_core.lib.rdfvalues import mig_protodict
+from grr_response_core.lib.util import random
+from grr_response_core.stats import metrics
+from grr_response_proto import flows_pb2
+from grr_response_proto import jobs_pb2
+from grr_response_server import data_store
+from grr_response_server import flow_base
+from grr_response_server.databases import db
+from grr_response_server.rdfvalues import mig_flow_objects
+from grr_response_server.rdfvalues import mig_flow_runner
+
+# Time (in seconds) between queueing hunt results and processing them.
+HUNT_OUTPUT_PLUGIN_QUEUE_LAG = metrics.Event(
+    "hunt_output_plugin_queue_lag",
+    bins=[0, 1, 5, 10, 30, 60, 120, 300, 600, 1800, 3600, 7200],
+)
+HUNT_OUTPUT_PLUGIN_BATCH_SIZE = metrics.Event(
+    "hunt_output_plugin_batch_size",
+    bins=[0, 1, 10, 100, 1000, 10000, 100000],
+)
+HUNT_OUTPUT_PLUGIN_DROPPED_REQUESTS = metrics.Counter(
+    "hunt_output_plugin_dropped_requests"
+)
+
+# Number of times output plugins get to process queued results before the
+# results are dropped.
+MAX_ATTEMPTS = 5
+# Delay before the first retry of failed results, doubled on every retry.
+RETRY_DELAY = rdfvalue.Duration.From(1, rdfvalue.MINUTES)
+
+
+class HuntOutputPluginQueueProcessor(object):
+  """Processes queued hunt results with the hunt output plugins.
+
+  Hunt flows queue their results when `Worker.async_hunt_output_plugins` is
+  set. Every processing thread leases a batch of queued requests of a single
+  hunt, processes the results with the hunt output plugins and only then
+  deletes the requests. Requests of a batch that fails to be processed are
+  leased again once their lease expires.
+  """
+
+  POLL_INTERVAL = rdfvalue.Duration.From(5, rdfvalue.SECONDS)
+
+  def __init__(
+      self,
+      num_threads: int,
+      batch_size: int,
+      lease_time: rdfvalue.Duration,
+  ):
+    """Initializes the processor.
+
+    Args:
+      num_threads: Number of processing threads.
+      batch_size: Maximum number of requests a thread leases at once.
+      lease_time: How long leased requests are reserved for a thread.
+    """
+    self.num_threads = num_threads
+    self.batch_size = batch_size
+    self.lease_time = lease_time
+
+    self._threads: list[threading.Thread] = []
+    self._stop = threading.Event()
+
+  def Start(self) -> None:
+    """Starts the processing threads."""
+    self._stop.clear()
+    for i in range(self.num_threads):
+      thread = threading.Thread(
+          name=f"hunt_output_plugin_queue_{i}", target=self._RunLoop
+      )
+      thread.daemon = True
+      thread.start()
+      self._threads.append(thread)
+
+  def Stop(self, timeout: Optional[rdfvalue.Duration] = None) -> None:
+    """Stops the processing threads and waits for them to finish."""
+    self._stop.set()
+    for thread in self._threads:
+      thread.join(timeout.ToFractional(rdfvalue.SECONDS) if timeout else None)
+      if thread.is_alive():
+        raise RuntimeError(f"Thread {thread.name} did not join in time.")
+    self._threads = []
+
+  def _RunLoop(self) -> None:
+    while not self._stop.is_set():
+      try:
+        if not self.ProcessOnce():
+          self._stop.wait(self.POLL_INTERVAL.ToFractional(rdfvalue.SECONDS))
+      except Exception as e:  # pylint: disable=broad-except
+        logging.exception("Failed to process hunt output plugin queue: %s", e)
+        # Avoid spinning if the database is not available.
+        self._stop.wait(self.POLL_INTERVAL.ToFractional(rdfvalue.SECONDS))
+
+  def ProcessOnce(self) -> int:
+    """Leases and processes a single batch of queued requests.
+
+    Returns:
+      The number of processed requests.
+    """
+    requests = data_store.REL_DB.LeaseHuntOutputPluginRequests(
+        self.lease_time, self.batch_size
+    )
+    if requests:
+      ProcessRequests(requests)
+    return len(requests)
+
+
+def ProcessRequests(
+    requests: Sequence[flows_pb2.HuntOutputPluginRequest],
+) -> None:
+  """Processes queued requests with the hunt output plugins.
+
+  Requests are deleted only after they have been processed. Results that some
+  of the output plugins failed to process are queued again, to be processed by
+  these output plugins only, with an increasing delay.
+
+  Args:
+    requests: Leased requests to process.
+  """
+  now = rdfvalue.RDFDatetime.Now()
+  for request in requests:
+    if request.timestamp and not request.failed_attempts:
+      timestamp = rdfvalue.RDFDatetime.FromMicrosecondsSinceEpoch(
+          request.timestamp
+      )
+      HUNT_OUTPUT_PLUGIN_QUEUE_LAG.RecordEvent(
+          (now - timestamp).ToFractional(rdfvalue.SECONDS)
+      )
+
+  requests_by_hunt_id = collections.defaultdict(list)
+  for request in requests:
+    requests_by_hunt_id[request.hunt_id].append(request)
+
+  for hunt_id, hunt_requests in requests_by_hunt_id.items():
+    failed_plugin_ids = ProcessHuntResults(hunt_id, hunt_requests)
+
+    retry_requests = []
+    for request in hunt_requests:
+      plugin_ids = failed_plugin_ids.get(request.request_id)
+      if plugin_ids:
+        retry_request = _RetryRequest(request, plugin_ids, now)
+        if retry_request is not None:
+          retry_requests.append(retry_request)
+
+    if retry_requests:
+      data_store.REL_DB.WriteHuntOutputPluginRequests(retry_requests)
+    data_store.REL_DB.DeleteHuntOutputPluginRequests(hunt_requests)
+
+
+def _RetryRequest(
+    request: flows_pb2.HuntOutputPluginRequest,
+    plugin_ids: Sequence[str],
+    now: rdfvalue.RDFDatetime,
+) -> Optional[flows_pb2.HuntOutputPluginRequest]:
+  """Creates a request retrying failed output plugins, if attempts are left."""
+  failed_attempts = request.failed_attempts + 1
+  if failed_attempts >= MAX_ATTEMPTS:
+    logging.error(
+        "Dropping %d results of flow %s of hunt %s: output plugins %s failed "
+        "to process them %d times.",
+        len(request.results),
+        request.flow_id,
+        request.hunt_id,
+        ",".join(plugin_ids),
+        failed_attempts,
+    )
+    HUNT_OUTPUT_PLUGIN_DROPPED_REQUESTS.Increment()
+    return None
+
+  delay = RETRY_DELAY * 2 ** (failed_attempts - 1)
+  return flows_pb2.HuntOutputPluginRequest(
+      request_id=random.UInt64(),
+      hunt_id=request.hunt_id,
+      client_id=request.client_id,
+      flow_id=request.flow_id,
+      long_flow_id=request.long_flow_id,
+      results=request.results,
+      output_plugin_ids=plugin_ids,
+      failed_attempts=failed_attempts,
+      delivery_time=(now + delay).AsMicrosecondsSinceEpoch(),
+  )
+
+
+def ProcessHuntResults(
+    hunt_id: str,
+    requests: Sequence[flows_pb2.HuntOutputPluginRequest],
+) -> dict[int, list[str]]:
+  """Processes a batch of queued hunt results with the hunt output plugins.
+
+  Every output plugin processes the results of every flow of the batch and its
+  state is updated once per batch. As with results processed inline, results
+  of each flow are processed by a plugin instance with the flow as the source.
+
+  Args:
+    hunt_id: Id of the hunt the requests belong to.
+    requests: Requests with results of (possibly many) flows of the hunt.
+
+  Returns:
+    A dict mapping ids of requests some output plugins failed to process to
+    the ids of these output plugins.
+  """
+  try:
+    data_store.REL_DB.ReadHuntObject(hunt_id)
+  except db.UnknownHuntError:
+    logging.warning(
+        "Dropping %d queued requests of unknown hunt %s.",
+        len(requests),
+        hunt_id,
+    )
+    return {}
+
+  output_plugins_states = data_store.REL_DB.ReadHuntOutputPluginsStates(
+      hunt_id
+  )
+  output_plugins_states = [
+      mig_flow_runner.ToRDFOutputPluginState(s) for s in output_plugins_states
+  ]
+  if not output_plugins_states:
+    return {}
+
+  HUNT_OUTPUT_PLUGIN_BATCH_SIZE.RecordEvent(
+      sum(len(request.results) for request in requests)
+  )
+
+  replies_by_request_id = {
+      request.request_id: [
+          mig_flow_objects.ToRDFFlowResult(r) for r in request.results
+      ]
+      for request in requests
+  }
+
+  failed_plugin_ids = collections.defaultdict(list)
+  log_entries = []
+
+  def _LogEntry(request, plugin_id, log_entry_type, message):
+    return flows_pb2.FlowOutputPluginLogEntry(
+        client_id=request.client_id,
+        flow_id=request.flow_id,
+        hunt_id=hunt_id,
+        output_plugin_id=plugin_id,
+        log_entry_type=log_entry_type,
+        message=message,
+    )
+
+  for index, output_plugin_state in enumerate(output_plugins_states):
+    plugin_descriptor = output_plugin_state.plugin_descriptor
+    plugin_id = output_plugin_state.plugin_id
+    output_plugin_cls = plugin_descriptor.GetPluginClass()
+
+    # Every plugin instance sees the state left by the instances that processed
+    # the preceding results, as if the results were processed inline.
+    initial_plugin_state = output_plugin_state.plugin_state.Copy()
+    output_plugins = []
+    num_processed_replies = 0
+    for request in requests:
+      plugin_ids = request.output_plugin_ids
+      if plugin_ids and plugin_id not in plugin_ids:
+        continue
+
+      replies = replies_by_request_id[request.request_id]
+      output_plugin = output_plugin_cls(
+          source_urn=request.long_flow_id, args=plugin_descriptor.args
+      )
+      state = output_plugin_state.plugin_state
+      try:
+        output_plugin.ProcessResponses(state, replies)
+        output_plugin.Flush(state)
+      except Exception as e:  # pylint: disable=broad-except
+        logging.exception(
+            "Plugin %s failed to process %d replies of flow %s of hunt %s.",
+            plugin_descriptor,
+            len(replies),
+            request.flow_id,
+            hunt_id,
+        )
+        flow_base.HUNT_OUTPUT_PLUGIN_ERRORS.Increment(
+            fields=[plugin_descriptor.plugin_name]
+        )
+        failed_plugin_ids[request.request_id].append(plugin_id)
+        log_entries.append(
+            _LogEntry(
+                request,
+                plugin_id,
+                flows_pb2.FlowOutputPluginLogEntry.LogEntryType.ERROR,
+                "Error while processing %d replies: %s" % (len(replies), e),
+            )
+        )
+        continue
+
+      output_plugin.UpdateState(state)
+      output_plugins.append(output_plugin)
+      num_processed_replies += len(replies)
+      log_entries.append(
+          _LogEntry(
+              request,
+              plugin_id,
+              flows_pb2.FlowOutputPluginLogEntry.LogEntryType.LOG,
+              "Processed %d replies." % len(replies),
+          )
+      )
+
+    if not output_plugins:
+      continue
+
+    # Only do the REL_DB call if the plugin state has actually changed.
+    if output_plugin_state.plugin_state != initial_plugin_state:
+
+      def UpdateFn(
+          plugin_state: jobs_pb2.AttributedDict,
+      ) -> jobs_pb2.AttributedDict:
+        plugin_state_rdf = mig_protodict.ToRDFAttributedDict(plugin_state)
+        for output_plugin in output_plugins:  # pylint: disable=cell-var-from-loop
+          output_plugin.UpdateState(plugin_state_rdf)
+        return mig_protodict.ToProtoAttributedDict(plugin_state_rdf)
+
+      data_store.REL_DB.UpdateHuntOutputPluginState(hunt_id, index, UpdateFn)
+
+    flow_base.HUNT_RESULTS_RAN_THROUGH_PLUGIN.Increment(
+        num_processed_replies, fields=[plugin_descriptor.plugin_name]
+    )
+
+  if log_entries:
+    data_store.REL_DB.WriteMultipleFlowOutputPluginLogEntries(log_entries)
+
+  return dict(failed_plugin_ids)
@@ -0,0 +1,294 @@
+#!/usr/bin/env python
+"""Tests for processing queued hunt results with output plugins."""
+
+import sys
+from unittest import mock
+
+from absl import app
+
+from grr_response_core.lib import rdfvalue
+from grr_response_core.lib.rdfvalues import file_finder as rdf_file_finder
+from grr_response_core.lib.rdfvalues import structs as rdf_structs
+from grr_response_proto import flows_pb2
+from grr_response_server import data_store
+from grr_response_server import flow_base
+from grr_response_server import foreman
+from grr_response_server import foreman_rules
+from grr_response_server import hunt
+from grr_response_server import hunt_output_plugin_queue
+from grr_response_server import output_plugin
+from grr_response_server.flows.general import file_finder
+from grr_response_server.rdfvalues import hunt_objects as rdf_hunt_objects
+from grr_response_server.rdfvalues import mig_flow_runner
+from grr_response_server.rdfvalues import mig_hunt_objects
+from grr_response_server.rdfvalues import output_plugin as rdf_output_plugin
+from grr.test_lib import acl_test_lib
+from grr.test_lib import hunt_test_lib
+from grr.test_lib import stats_test_lib
+from grr.test_lib import test_lib
+
+
+class SourceRecordingHuntOutputPlugin(output_plugin.OutputPlugin):
+  """Output plugin recording the sources of the processed results."""
+
+  source_urns = []
+
+  def ProcessResponses(self, state, responses):
+    SourceRecordingHuntOutputPlugin.source_urns.append(self.source_urn)
+
+
+class HuntOutputPluginQueueTest(
+    stats_test_lib.StatsTestMixin,
+    test_lib.GRRBaseTest,
+):
+  """Tests for processing queued hunt results with output plugins."""
+
+  def setUp(self):
+    super().setUp()
+
+    self.test_username = "hunt_test"
+    acl_test_lib.CreateUser(self.test_username)
+
+    config_overrider = test_lib.ConfigOverrider(
+        {"Worker.async_hunt_output_plugins": True}
+    )
+    config_overrider.Start()
+    self.addCleanup(config_overrider.Stop)
+
+    hunt_test_lib.DummyHuntOutputPlugin.num_calls = 0
+    hunt_test_lib.DummyHuntOutputPlugin.num_responses = 0
+    hunt_test_lib.StatefulDummyHuntOutputPlugin.data = []
+    SourceRecordingHuntOutputPlugin.source_urns = []
+
+  def _CreateAndRunHunt(self, output_plugin_names, num_clients=5):
+    args = rdf_file_finder.FileFinderArgs()
+    args.paths = ["/tmp/evil.txt"]
+    args.action.action_type = rdf_file_finder.FileFinderAction.Action.DOWNLOAD
+
+    hunt_obj = rdf_hunt_objects.Hunt(
+        creator=self.test_username,
+        client_rule_set=foreman_rules.ForemanClientRuleSet(),
+        client_rate=0,
+        args=rdf_hunt_objects.HuntArguments(
+            hunt_type=rdf_hunt_objects.HuntArguments.HuntType.STANDARD,
+            standard=rdf_hunt_objects.HuntArgumentsStandard(
+                flow_name=file_finder.ClientFileFinder.__name__,
+                flow_args=rdf_structs.AnyValue.Pack(args),
+            ),
+        ),
+        output_plugins=[
+            rdf_output_plugin.OutputPluginDescriptor(plugin_name=name)
+            for name in output_plugin_names
+        ],
+    )
+    hunt_obj = mig_hunt_objects.ToProtoHunt(hunt_obj)
+    hunt.CreateHunt(hunt_obj)
+    hunt.StartHunt(hunt_obj.hunt_id)
+
+    client_ids = self.SetupClients(num_clients)
+    foreman_obj = foreman.Foreman()
+    for client_id in client_ids:
+      foreman_obj.AssignTasksToClient(client_id)
+    hunt_test_lib.TestHuntHelper(
+        hunt_test_lib.SampleHuntMock(failrate=-1), client_ids
+    )
+
+    return hunt_obj.hunt_id, client_ids
+
+  def _ReadQueuedRequests(self):
+    return data_store.REL_DB.ReadHuntOutputPluginRequests()
+
+  def _ReadLogEntries(self, hunt_id, log_entry_type):
+    return data_store.REL_DB.ReadHuntOutputPluginLogEntries(
+        hunt_id,
+        output_plugin_id="0",
+        offset=0,
+        count=sys.maxsize,
+        with_type=log_entry_type,
+    )
+
+  def testResultsAreQueuedInsteadOfProcessed(self):
+    hunt_id, client_ids = self._CreateAndRunHunt(["DummyHuntOutputPlugin"])
+
+    self.assertEqual(hunt_test_lib.DummyHuntOutputPlugin.num_calls, 0)
+
+    requests = self._ReadQueuedRequests()
+    self.assertCountEqual([r.client_id for r in requests], client_ids)
+    for r in requests:
+      self.assertEqual(r.hunt_id, hunt_id)
+      self.assertEqual(r.flow_id, hunt_id)
+      self.assertEqual(r.long_flow_id, f"{r.client_id}/flows/{hunt_id}")
+      self.assertLen(r.results, 1)
+
+  def testResultsAreNotQueuedAsMessageHandlerRequests(self):
+    self._CreateAndRunHunt(["DummyHuntOutputPlugin"])
+
+    self.assertEmpty(data_store.REL_DB.ReadMessageHandlerRequests())
+
+  def testNothingIsQueuedForHuntsWithoutOutputPlugins(self):
+    self._CreateAndRunHunt([])
+
+    self.assertEmpty(self._ReadQueuedRequests())
+
+  def testQueuedResultsOfManyFlowsAreProcessedInOneBatch(self):
+    hunt_id, client_ids = self._CreateAndRunHunt(["DummyHuntOutputPlugin"])
+
+    with self.assertStatsCounterDelta(
+        5,
+        flow_base.HUNT_RESULTS_RAN_THROUGH_PLUGIN,
+        fields=["DummyHuntOutputPlugin"],
+    ):
+      hunt_output_plugin_queue.ProcessRequests(self._ReadQueuedRequests())
+
+    self.assertEqual(hunt_test_lib.DummyHuntOutputPlugin.num_responses, 5)
+    self.assertEmpty(self._ReadQueuedRequests())
+
+    logs = self._ReadLogEntries(
+        hunt_id, flows_pb2.FlowOutputPluginLogEntry.LogEntryType.LOG
+    )
+    self.assertCountEqual([l.client_id for l in logs], client_ids)
+    for l in logs:
+      self.assertEqual(l.hunt_id, hunt_id)
+      self.assertEqual(l.message, "Processed 1 replies.")
+
+  def testFlowIsTheSourceOfProcessedResults(self):
+    hunt_id, client_ids = self._CreateAndRunHunt(
+        ["SourceRecordingHuntOutputPlugin"]
+    )
+
+    hunt_output_plugin_queue.ProcessRequests(self._ReadQueuedRequests())
+
+    self.assertCountEqual(
+        SourceRecordingHuntOutputPlugin.source_urns,
+        [f"{client_id}/flows/{hunt_id}" for client_id in client_ids],
+    )
+
+  def testPluginStateIsCheckpointedOncePerBatch(self):
+    hunt_id, _ = self._CreateAndRunHunt(["StatefulDummyHuntOutputPlugin"])
+
+    requests = self._ReadQueuedRequests()
+    with mock.patch.object(
+        data_store.REL_DB,
+        "UpdateHuntOutputPluginState",
+        wraps=data_store.REL_DB.UpdateHuntOutputPluginState,
+    ) as update_mock:
+      hunt_output_plugin_queue.ProcessRequests(requests[:3])
+      hunt_output_plugin_queue.ProcessRequests(requests[3:])
+
+    self.assertEqual(update_mock.call_count, 2)
+    # Results are processed as if they were processed one flow at a time.
+    self.assertListEqual(
+        hunt_test_lib.StatefulDummyHuntOutputPlugin.data, [0, 1, 2, 3, 4]
+    )
+    (state,) = data_store.REL_DB.ReadHuntOutputPluginsStates(hunt_id)
+    state = mig_flow_runner.ToRDFOutputPluginState(state)
+    self.assertEqual(state.plugin_state["index"], 5)
+
+  def testPluginErrorsAreLoggedForEveryFlow(self):
+    hunt_id, client_ids = self._CreateAndRunHunt(
+        ["FailingDummyHuntOutputPlugin"]
+    )
+
+    with self.assertStatsCounterDelta(
+        5,
+        flow_base.HUNT_OUTPUT_PLUGIN_ERRORS,
+        fields=["FailingDummyHuntOutputPlugin"],
+    ):
+      hunt_output_plugin_queue.ProcessRequests(self._ReadQueuedRequests())
+
+    errors = self._ReadLogEntries(
+        hunt_id, flows_pb2.FlowOutputPluginLogEntry.LogEntryType.ERROR
+    )
+    self.assertCountEqual([e.client_id for e in errors], client_ids)
+    for e in errors:
+      self.assertEqual(e.message, "Error while processing 1 replies: Oh no!")
+
+  def testFailedResultsAreRetriedByFailedPluginsOnly(self):
+    self._CreateAndRunHunt(
+        ["DummyHuntOutputPlugin", "FailingDummyHuntOutputPlugin"]
+    )
+    requests = self._ReadQueuedRequests()
+
+    now = rdfvalue.RDFDatetime.Now()
+    retry_time = now + hunt_output_plugin_queue.RETRY_DELAY
+    with test_lib.FakeTime(now):
+      hunt_output_plugin_queue.ProcessRequests(requests)
+    self.assertEqual(hunt_test_lib.DummyHuntOutputPlugin.num_responses, 5)
+
+    retries = self._ReadQueuedRequests()
+    self.assertCountEqual(
+        [r.client_id for r in retries], [r.client_id for r in requests]
+    )
+    for r in retries:
+      self.assertNotIn(r.request_id, [r.request_id for r in requests])
+      self.assertEqual(r.output_plugin_ids, ["1"])
+      self.assertEqual(r.failed_attempts, 1)
+      self.assertEqual(r.delivery_time, retry_time.AsMicrosecondsSinceEpoch())
+
+    hunt_output_plugin_queue.ProcessRequests(retries)
+    # The plugin that succeeded doesn't process the results again.
+    self.assertEqual(hunt_test_lib.DummyHuntOutputPlugin.num_responses, 5)
+    self.assertLen(self._ReadQueuedRequests(), 5)
+
+  def testFailedResultsAreDroppedAfterMaxAttempts(self):
+    self._CreateAndRunHunt(["FailingDummyHuntOutputPlugin"], num_clients=1)
+
+    for _ in range(hunt_output_plugin_queue.MAX_ATTEMPTS - 1):
+      hunt_output_plugin_queue.ProcessRequests(self._ReadQueuedRequests())
+      self.assertLen(self._ReadQueuedRequests(), 1)
+
+    with self.assertStatsCounterDelta(
+        1, hunt_output_plugin_queue.HUNT_OUTPUT_PLUGIN_DROPPED_REQUESTS
+    ):
+      hunt_output_plugin_queue.ProcessRequests(self._ReadQueuedRequests())
+    self.assertEmpty(self._ReadQueuedRequests())
+
+  def testRequestsAreKeptIfProcessingFails(self):
+    self._CreateAndRunHunt(["StatefulDummyHuntOutputPlugin"])
+    requests = self._ReadQueuedRequests()
+
+    with mock.patch.object(
+        data_store.REL_DB,
+        "UpdateHuntOutputPluginState",
+        side_effect=RuntimeError("Database is down."),
+    ):
+      with self.assertRaises(RuntimeError):
+        hunt_output_plugin_queue.ProcessRequests(requests)
+
+    self.assertCountEqual(
+        [r.request_id for r in self._ReadQueuedRequests()],
+        [r.request_id for r in requests],
+    )
+
+  def testRequestsOfDeletedHuntsAreDropped(self):
+    hunt_id, _ = self._CreateAndRunHunt(["DummyHuntOutputPlugin"])
+    requests = self._ReadQueuedRequests()
+
+    data_store.REL_DB.DeleteHuntObject(hunt_id)
+    hunt_output_plugin_queue.ProcessRequests(requests)
+
+    self.assertEqual(hunt_test_lib.DummyHuntOutputPlugin.num_calls, 0)
+    self.assertEmpty(self._ReadQueuedRequests())
+
+  def testProcessorLeasesAndProcessesQueuedResults(self):
+    self._CreateAndRunHunt(["DummyHuntOutputPlugin"])
+
+    processor = hunt_output_plugin_queue.HuntOutputPluginQueueProcessor(
+        num_threads=1,
+        batch_size=3,
+        lease_time=rdfvalue.Duration.From(10, rdfvalue.MINUTES),
+    )
+    self.assertEqual(processor.ProcessOnce(), 3)
+    self.assertEqual(processor.ProcessOnce(), 2)
+    self.assertEqual(processor.ProcessOnce(), 0)
+
+    self.assertEqual(hunt_test_lib.DummyHuntOutputPlugin.num_responses, 5)
+    self.assertEmpty(self._ReadQueuedRequests())
+
+
+def main(argv):
+  test_lib.main(argv)
+
+
+if __name__ == "__main__":
+  app.run(main)
@@ -411,6 +411,113 @@ class HuntTest(
       )
       self.assertLess(time_diff, rdfvalue.Duration.From(5, rdfvalue.SECONDS))
 
+  def testStartHuntFlowsOnClientsStartsFlowsInBulk(self):
+    client_ids = self.SetupClients(5)
+    hunt_id = self._CreateHunt(
+        client_rule_set=foreman_rules.ForemanClientRuleSet(),
+        client_rate=0,
+        args=self.ClientFileFinderHuntArgs(),
+    )
+    other_hunt_id = self._CreateHunt(
+        client_rule_set=foreman_rules.ForemanClientRuleSet(),
+        client_rate=0,
+        args=self.ClientFileFinderHuntArgs(),
+    )
+    hunt.StartHuntFlowOnClient(client_ids[0], hunt_id)
+
+    with mock.patch.object(
+        data_store.REL_DB,
+        "WriteFlowObject",
+        wraps=data_store.REL_DB.WriteFlowObject,
+    ) as write_flow_object:
+      started = hunt.StartHuntFlowsOnClients(
+          [(client_id, hunt_id) for client_id in client_ids]
+          + [(client_ids[0], other_hunt_id)]
+      )
+
+    write_flow_object.assert_not_called()
+    self.assertCountEqual(
+        started,
+        [(client_id, hunt_id) for client_id in client_ids[1:]]
+        + [(client_ids[0], other_hunt_id)],
+    )
+    for client_id in client_ids:
+      flows = data_store.REL_DB.ReadAllFlowObjects(client_id=client_id)
+      self.assertCountEqual(
+          [f.parent_hunt_id for f in flows],
+          [hunt_id, other_hunt_id] if client_id == client_ids[0] else [hunt_id],
+      )
+    self.assertEqual(data_store.REL_DB.CountHuntFlows(hunt_id), 5)
+
+  def testStartHuntFlowsOnClientsRespectsClientLimit(self):
+    client_ids = self.SetupClients(10)
+    hunt_id = self._CreateHunt(
+        client_rule_set=foreman_rules.ForemanClientRuleSet(),
+        client_rate=0,
+        client_limit=5,
+        args=self.ClientFileFinderHuntArgs(),
+    )
+
+    started = hunt.StartHuntFlowsOnClients(
+        [(client_id, hunt_id) for client_id in client_ids]
+    )
+
+    self.assertLen(started, 5)
+    self.assertEqual(data_store.REL_DB.CountHuntFlows(hunt_id), 5)
+    hunt_obj = data_store.REL_DB.ReadHuntObject(hunt_id)
+    self.assertEqual(hunt_obj.hunt_state, hunts_pb2.Hunt.HuntState.PAUSED)
+    self.assertEqual(
+        hunt_obj.hunt_state_reason,
+        hunts_pb2.Hunt.HuntStateReason.TOTAL_CLIENTS_EXCEEDED,
+    )
+
+  def testStartHuntFlowsOnClientsSkipsStartedClientsBeforeClientLimit(self):
+    client_ids = self.SetupClients(10)
+    hunt_id = self._CreateHunt(
+        client_rule_set=foreman_rules.ForemanClientRuleSet(),
+        client_rate=0,
+        client_limit=5,
+        args=self.ClientFileFinderHuntArgs(),
+    )
+    hunt.StartHuntFlowsOnClients(
+        [(client_id, hunt_id) for client_id in client_ids[:2]]
+    )
+
+    started = hunt.StartHuntFlowsOnClients(
+        [(client_id, hunt_id) for client_id in client_ids]
+    )
+
+    self.assertEqual(
+        started, [(client_id, hunt_id) for client_id in client_ids[2:5]]
+    )
+    self.assertEqual(data_store.REL_DB.CountHuntFlows(hunt_id), 5)
+
+  def testStartHuntFlowsOnClientsAppliesClientRate(self):
+    now = rdfvalue.RDFDatetime.Now()
+    client_ids = self.SetupClients(3)
+    hunt_id = self._CreateHunt(
+        client_rule_set=foreman_rules.ForemanClientRuleSet(),
+        client_rate=1,
+        args=self.ClientFileFinderHuntArgs(),
+    )
+
+    hunt.StartHuntFlowsOnClients(
+        [(client_id, hunt_id) for client_id in client_ids]
+    )
+
+    requests = data_store.REL_DB.ReadFlowProcessingRequests()
+    requests.sort(key=lambda r: r.delivery_time)
+    self.assertLen(requests, 3)
+    for i, (r, client_id) in enumerate(zip(requests, client_ids)):
+      self.assertEqual(r.client_id, client_id)
+      delivery_time = rdfvalue.RDFDatetime.FromMicrosecondsSinceEpoch(
+          r.delivery_time
+      )
+      time_diff = delivery_time - (
+          now + rdfvalue.Duration.From(1, rdfvalue.MINUTES) * i
+      )
+      self.assertLess(time_diff, rdfvalue.Duration.From(5, rdfvalue.SECONDS))
+
   def testResultsAreCorrectlyCounted(self):
     path = os.path.join(self.base_path, "*hello*")
     num_files = len(glob.glob(path))
@@ -2,13 +2,16 @@
 """Instant output plugins used by the API for on-the-fly conversion."""
 
 import abc
+import collections
 import functools
 import logging
 import re
+import tempfile
 from typing import Callable, Iterable, Iterator, Optional, Sequence
 
 from google.protobuf import message
 from grr_response_core.lib import rdfvalue
+from grr_response_core.lib.util import chunked
 from grr_response_proto import export_pb2
 from grr_response_proto import flows_pb2
 from grr_response_server import export
@@ -98,6 +101,10 @@ class InstantOutputPluginWithExportConversionProto(InstantOutputPluginProto):
 
   BATCH_SIZE = 5000
 
+  # Maximum number of bytes of exported values of a single type kept in memory
+  # before they are spilled to disk.
+  SPILL_BUFFER_MEMORY_SIZE = 16 * 1024 * 1024
+
   def __init__(self, *args, **kwargs):
     super().__init__(*args, **kwargs)
     self._cached_metadata = {}
@@ -135,6 +142,19 @@ class InstantOutputPluginWithExportConversionProto(InstantOutputPluginProto):
           [], Iterable[flows_pb2.FlowResult]
       ],
   ) -> Iterator[bytes]:
+    """Converts values of a given type and processes the exported values.
+
+    Values are read and converted only once. Exported values of the first
+    exported type are processed as they are converted, values of all the other
+    exported types are spilled into temporary buffers and processed afterwards.
+
+    Args:
+      type_url: Type URL identifying the type of the values to be processed.
+      type_url_results_generator_fn: Function returning an iterable with values.
+
+    Yields:
+      Chunks of bytes.
+    """
     converter_classes = export_converters_registry.GetConvertersByTypeUrl(
         type_url
     )
@@ -143,78 +163,96 @@ class InstantOutputPluginWithExportConversionProto(InstantOutputPluginProto):
       return
 
     original_rdf_type_name = db_utils.TypeURLToRDFTypeName(type_url)
-    next_types = set()
-    processed_types = set()
-    while True:
-      converted_responses = export.FetchMetadataAndConvertFlowResults(
-          source_urn=self.source_urn,
-          options=export_pb2.ExportOptions(),
-          flow_results=type_url_results_generator_fn(),
-          cached_metadata=self._cached_metadata,
-      )
+    converted_responses = export.FetchMetadataAndConvertFlowResults(
+        source_urn=self.source_urn,
+        options=export_pb2.ExportOptions(),
+        flow_results=type_url_results_generator_fn(),
+        cached_metadata=self._cached_metadata,
+        pool=export.GetConversionPool(),
+    )
 
-      generator = self._GenerateSingleExportedTypeIteration(
-          next_types, processed_types, converted_responses
+    spill_buffers: dict[type[message.Message], _SpillBuffer] = {}
+    try:
+      generator = self._GenerateFirstExportedType(
+          converted_responses, spill_buffers
       )
-
       for chunk in self.ProcessUniqueOriginalExportedTypePair(
           original_rdf_type_name, generator
       ):
         yield chunk
-
-      if not next_types:
-        break
-
-  def _GenerateSingleExportedTypeIteration(
+      # Values of other types may still be left if the plugin didn't consume
+      # all values of the first type.
+      collections.deque(generator, maxlen=0)
+
+      for spill_buffer in spill_buffers.values():
+        for chunk in self.ProcessUniqueOriginalExportedTypePair(
+            original_rdf_type_name, spill_buffer.Read()
+        ):
+          yield chunk
+    finally:
+      for spill_buffer in spill_buffers.values():
+        spill_buffer.Close()
+
+  def _GenerateFirstExportedType(
       self,
-      next_types: set[type[message.Message]],
-      processed_types: set[type[message.Message]],
       converted_responses: Iterable[message.Message],
-  ):
-    """Yields responses of a given type only.
-
-    _GenerateSingleExportedTypeIteration iterates through converted_responses
-    and only yields responses of the same type. The type is either popped from
-    next_types or inferred from the first item of converted_responses.
-    The type is added to a set of processed_types.
+      spill_buffers: dict[type[message.Message], "_SpillBuffer"],
+  ) -> Iterator[message.Message]:
+    """Yields responses of the first type, spilling all the other ones.
 
-    Along the way _GenerateSingleExportedTypeIteration updates next_types set.
-    All newly encountered and not previously processed types are added to
-    next_types set.
-
-    Calling _GenerateSingleExportedTypeIteration multiple times allows doing
-    multiple passes on converted responses and emitting converted responses
-    of the same type continuously (so that they can be written into
-    the same file by the plugin).
+    The type is inferred from the first item of converted_responses. Responses
+    of any other type are appended to spill_buffers (which are ordered by the
+    first occurrence of their type).
 
     Args:
-      next_types: List of value type classes that will be used in further
-        iterations.
-      processed_types: List of value type classes that have been used already.
       converted_responses: Iterable with values to iterate over.
+      spill_buffers: A dict of buffers to spill values of other types into.
 
     Yields:
-      Values from converted_response with the same type. Type is either
-      popped from the next_types set or inferred from the first
-      converted_responses value.
+      Values from converted_responses with the same type as the first one.
     """
-    if not next_types:
-      current_type = None
-    else:
-      current_type = next_types.pop()
-      processed_types.add(current_type)
-
+    first_type = None
     for converted_response in converted_responses:
-      if not current_type:
-        current_type = converted_response.__class__
-        processed_types.add(current_type)
+      if first_type is None:
+        first_type = converted_response.__class__
 
-      if converted_response.__class__ != current_type:
-        if converted_response.__class__ not in processed_types:
-          next_types.add(converted_response.__class__)
+      if converted_response.__class__ == first_type:
+        yield converted_response
         continue
 
-      yield converted_response
+      try:
+        spill_buffer = spill_buffers[converted_response.__class__]
+      except KeyError:
+        spill_buffer = _SpillBuffer(
+            converted_response.__class__, self.SPILL_BUFFER_MEMORY_SIZE
+        )
+        spill_buffers[converted_response.__class__] = spill_buffer
+
+      spill_buffer.Append(converted_response)
+
+
+class _SpillBuffer:
+  """A buffer of exported values of a single type.
+
+  Values are kept in memory until they reach the given size, after that they
+  are written to a temporary file.
+  """
+
+  def __init__(self, cls: type[message.Message], max_memory_size: int):
+    self._cls = cls
+    self._file = tempfile.SpooledTemporaryFile(max_size=max_memory_size)
+
+  def Append(self, value: message.Message) -> None:
+    chunked.Write(self._file, value.SerializeToString())
+
+  def Read(self) -> Iterator[message.Message]:
+    """Yields all the values appended to the buffer so far."""
+    self._file.seek(0)
+    for chunk in chunked.ReadAll(self._file):
+      yield self._cls.FromString(chunk)
+
+  def Close(self) -> None:
+    self._file.close()
 
 
 def GetExportedFlowResults(
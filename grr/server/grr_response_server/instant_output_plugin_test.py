@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 import io
 from typing import Iterable, Iterator
+from unittest import mock
 
 from absl import app
 
@@ -170,6 +171,46 @@ class InstantOutputPluginWithExportConversionProtoTest(
         ],
     )
 
+  @export_test_lib.WithAllExportConverters
+  @export_test_lib.WithExportConverterProto(TestConverterProto1)
+  @export_test_lib.WithExportConverterProto(TestConverterProto2)
+  def testReadsAndConvertsValuesOnce(self):
+    values = [tests_pb2.DummySrcValueProto2(value=f"foo{i}") for i in range(3)]
+    flow_results = []
+    for value in values:
+      packed_value = any_pb2.Any()
+      packed_value.Pack(value)
+      flow_results.append(
+          flows_pb2.FlowResult(client_id=self.client_id, payload=packed_value)
+      )
+
+    generator_fn = mock.Mock(return_value=flow_results)
+    plugin = self.plugin_cls(source_urn=self.results_urn)
+    # Make sure that values are spilled to disk.
+    plugin.SPILL_BUFFER_MEMORY_SIZE = 1
+
+    with mock.patch.object(
+        TestConverterProto2, "Convert", wraps=TestConverterProto2().Convert
+    ) as convert_mock:
+      type_url = flow_results[0].payload.type_url
+      chunks = list(plugin.ProcessValuesOfType(type_url, generator_fn))
+
+    generator_fn.assert_called_once()
+    self.assertEqual(convert_mock.call_count, 3)
+    self.assertListEqual(
+        b"".join(chunks).decode("utf-8").splitlines(),
+        [
+            "Original: DummySrcValueProto2",
+            "Exported value: exp1-foo0",
+            "Exported value: exp1-foo1",
+            "Exported value: exp1-foo2",
+            "Original: DummySrcValueProto2",
+            "Exported value: exp2-foo0",
+            "Exported value: exp2-foo1",
+            "Exported value: exp2-foo2",
+        ],
+    )
+
 
 class GetExportedFlowResultsTest(test_lib.GRRBaseTest):
 
@@ -0,0 +1,148 @@
+#!/usr/bin/env python
+"""Flow related helpers."""
+
+import re
+from typing import Optional, Union
+
+from google.protobuf import any_pb2
+from grr_response_core.lib import rdfvalue
+from grr_response_core.lib.rdfvalues import structs as rdf_structs
+from grr_response_proto import flows_pb2
+from grr_response_proto import jobs_pb2
+
+_CLIENT_ID_RE = re.compile(r"C\.[0-9a-f]{16}")
+
+_FLOW_STATUS_BY_GRR_STATUS = {
+    jobs_pb2.GrrStatus.OK: flows_pb2.FlowStatus.OK,
+    jobs_pb2.GrrStatus.IOERROR: flows_pb2.FlowStatus.IOERROR,
+    jobs_pb2.GrrStatus.CLIENT_KILLED: flows_pb2.FlowStatus.CLIENT_KILLED,
+    jobs_pb2.GrrStatus.NETWORK_LIMIT_EXCEEDED: (
+        flows_pb2.FlowStatus.NETWORK_LIMIT_EXCEEDED
+    ),
+    jobs_pb2.GrrStatus.RUNTIME_LIMIT_EXCEEDED: (
+        flows_pb2.FlowStatus.RUNTIME_LIMIT_EXCEEDED
+    ),
+    jobs_pb2.GrrStatus.CPU_LIMIT_EXCEEDED: (
+        flows_pb2.FlowStatus.CPU_LIMIT_EXCEEDED
+    ),
+    jobs_pb2.GrrStatus.GENERIC_ERROR: flows_pb2.FlowStatus.ERROR,
+}
+
+FlowResponse = Union[
+    flows_pb2.FlowResponse,
+    flows_pb2.FlowStatus,
+    flows_pb2.FlowIterator,
+]
+
+
+def _ClientAndFlowIDFromSessionID(session_id: str) -> Optional[tuple[str, str]]:
+  """Extracts client and flow ids from a session id of a well-formed URN."""
+  path = session_id.removeprefix("aff4:")
+  components = path.split("/")
+  if path.startswith("/"):
+    components = components[1:]
+
+  # Anything unusual (e.g. empty or relative components) is left to the RDF
+  # URN normalization.
+  if len(components) < 2 or not all(
+      c and c not in (".", "..") for c in components
+  ):
+    return None
+
+  if not _CLIENT_ID_RE.fullmatch(components[0]):
+    return None
+
+  return components[0], components[-1]
+
+
+def FlowResponseForLegacyResponse(
+    legacy_msg: jobs_pb2.GrrMessage,
+) -> Optional[FlowResponse]:
+  """Converts a legacy client reply to a flow response without RDF values.
+
+  This is an equivalent of `rdf_flow_objects.FlowResponseForLegacyResponse`
+  that works on protos directly. Only replies that can be converted without
+  decoding the payload are supported.
+
+  Args:
+    legacy_msg: A reply to convert.
+
+  Returns:
+    A flow response, status or iterator or None if the reply can only be
+    converted through RDF values.
+  """
+  ids = _ClientAndFlowIDFromSessionID(legacy_msg.session_id)
+  if ids is None:
+    return None
+  client_id, flow_id = ids
+
+  if legacy_msg.type == jobs_pb2.GrrMessage.MESSAGE:
+    payload_cls = rdfvalue.RDFValue.classes.get(legacy_msg.args_rdf_name)
+    if (
+        payload_cls is None
+        or not issubclass(payload_cls, rdf_structs.RDFProtoStruct)
+        or payload_cls.protobuf is None
+    ):
+      # Primitive (and unknown) payloads need type-specific wrapping.
+      return None
+
+    response = flows_pb2.FlowResponse(
+        client_id=client_id,
+        flow_id=flow_id,
+        request_id=legacy_msg.request_id,
+        response_id=legacy_msg.response_id,
+    )
+    response.payload.type_url = (
+        f"type.googleapis.com/grr.{payload_cls.protobuf.__name__}"
+    )
+    response.payload.value = legacy_msg.args
+    if payload_cls is rdf_structs.AnyValue:
+      # Avoid double-packing.
+      any_payload = any_pb2.Any()
+      any_payload.ParseFromString(legacy_msg.args)
+      response.any_payload.CopyFrom(any_payload)
+    else:
+      response.any_payload.type_url = rdf_structs.TypeURL(payload_cls)
+      response.any_payload.value = legacy_msg.args
+    return response
+
+  if legacy_msg.type == jobs_pb2.GrrMessage.STATUS:
+    if legacy_msg.args_rdf_name != "GrrStatus":
+      return None
+
+    legacy_status = jobs_pb2.GrrStatus()
+    legacy_status.ParseFromString(legacy_msg.args)
+    try:
+      status = _FLOW_STATUS_BY_GRR_STATUS[legacy_status.status]
+    except KeyError:
+      raise ValueError(
+          "Unable to convert returned status: %s" % legacy_status.status
+      ) from None
+
+    response = flows_pb2.FlowStatus(
+        client_id=client_id,
+        flow_id=flow_id,
+        request_id=legacy_msg.request_id,
+        response_id=legacy_msg.response_id,
+        status=status,
+        error_message=legacy_status.error_message,
+        backtrace=legacy_status.backtrace,
+        network_bytes_sent=legacy_status.network_bytes_sent,
+        runtime_us=legacy_status.runtime_us,
+    )
+    if legacy_status.HasField("cpu_time_used"):
+      response.cpu_time_used.CopyFrom(legacy_status.cpu_time_used)
+    else:
+      response.cpu_time_used.user_cpu_time = 0
+      response.cpu_time_used.system_cpu_time = 0
+    return response
+
+  if legacy_msg.type == jobs_pb2.GrrMessage.ITERATOR:
+    return flows_pb2.FlowIterator(
+        client_id=client_id,
+        flow_id=flow_id,
+        request_id=legacy_msg.request_id,
+        response_id=legacy_msg.response_id,
+    )
+
+  raise ValueError("Unknown message type: %d" % legacy_msg.type)
@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+from absl.testing import absltest
+
+from google.protobuf import any_pb2
+from grr_response_core.lib import rdfvalue
+from grr_response_core.lib.rdfvalues import mig_flows
+from grr_response_core.lib.rdfvalues import paths as rdf_paths
+from grr_response_proto import flows_pb2
+from grr_response_proto import jobs_pb2
+from grr_response_server.models import flows as models_flows
+from grr_response_server.rdfvalues import flow_objects as rdf_flow_objects
+from grr_response_server.rdfvalues import mig_flow_objects
+
+
+def _FlowResponseForLegacyResponseRDF(legacy_msg: jobs_pb2.GrrMessage):
+  response = rdf_flow_objects.FlowResponseForLegacyResponse(
+      mig_flows.ToRDFGrrMessage(legacy_msg)
+  )
+  if isinstance(response, rdf_flow_objects.FlowStatus):
+    return mig_flow_objects.ToProtoFlowStatus(response)
+  if isinstance(response, rdf_flow_objects.FlowIterator):
+    return mig_flow_objects.ToProtoFlowIterator(response)
+  return mig_flow_objects.ToProtoFlowResponse(response)
+
+
+class FlowResponseForLegacyResponseTest(absltest.TestCase):
+
+  def testMessage(self):
+    pathspec = jobs_pb2.PathSpec(
+        path="/foo/bar",
+        pathtype=jobs_pb2.PathSpec.OS,
+    )
+
+    legacy_msg = jobs_pb2.GrrMessage(
+        session_id="aff4:/C.0123456789abcdef/flows/ABCDEF12",
+        request_id=1,
+        response_id=2,
+        type=jobs_pb2.GrrMessage.MESSAGE,
+        args_rdf_name=rdf_paths.PathSpec.__name__,
+        args=pathspec.SerializeToString(),
+    )
+
+    response = models_flows.FlowResponseForLegacyResponse(legacy_msg)
+
+    self.assertIsInstance(response, flows_pb2.FlowResponse)
+    self.assertEqual(response.client_id, "C.0123456789abcdef")
+    self.assertEqual(response.flow_id, "ABCDEF12")
+    self.assertEqual(response.request_id, 1)
+    self.assertEqual(response.response_id, 2)
+
+    unpacked = jobs_pb2.PathSpec()
+    self.assertTrue(response.any_payload.Unpack(unpacked))
+    self.assertEqual(unpacked, pathspec)
+
+    self.assertEqual(response, _FlowResponseForLegacyResponseRDF(legacy_msg))
+
+  def testMessageAnyValue(self):
+    pathspec = jobs_pb2.PathSpec(path="/foo/bar")
+    payload = any_pb2.Any()
+    payload.Pack(pathspec)
+
+    legacy_msg = jobs_pb2.GrrMessage(
+        session_id="C.0123456789abcdef/ABCDEF12",
+        request_id=1,
+        response_id=2,
+        type=jobs_pb2.GrrMessage.MESSAGE,
+        args_rdf_name="AnyValue",
+        args=payload.SerializeToString(),
+    )
+
+    response = models_flows.FlowResponseForLegacyResponse(legacy_msg)
+
+    self.assertEqual(response.any_payload, payload)
+    self.assertEqual(response, _FlowResponseForLegacyResponseRDF(legacy_msg))
+
+  def testMessagePrimitivePayload(self):
+    legacy_msg = jobs_pb2.GrrMessage(
+        session_id="C.0123456789abcdef/ABCDEF12",
+        request_id=1,
+        response_id=2,
+        type=jobs_pb2.GrrMessage.MESSAGE,
+        args_rdf_name=rdfvalue.RDFString.__name__,
+        args=rdfvalue.RDFString("foo").SerializeToBytes(),
+    )
+
+    self.assertIsNone(models_flows.FlowResponseForLegacyResponse(legacy_msg))
+
+  def testMessageNonClientSessionID(self):
+    legacy_msg = jobs_pb2.GrrMessage(
+        session_id="aff4:/flows/W:ABCDEF12",
+        type=jobs_pb2.GrrMessage.MESSAGE,
+        args_rdf_name=rdf_paths.PathSpec.__name__,
+    )
+
+    self.assertIsNone(models_flows.FlowResponseForLegacyResponse(legacy_msg))
+
+  def testMessageMalformedClientID(self):
+    legacy_msg = jobs_pb2.GrrMessage(
+        session_id="aff4:/C.1234567890abcdef0/flows/ABCDEF12",
+        type=jobs_pb2.GrrMessage.MESSAGE,
+        args_rdf_name=rdf_paths.PathSpec.__name__,
+    )
+
+    self.assertIsNone(models_flows.FlowResponseForLegacyResponse(legacy_msg))
+
+  def testStatus(self):
+    status = jobs_pb2.GrrStatus(
+        status=jobs_pb2.GrrStatus.IOERROR,
+        error_message="foo",
+        backtrace="bar",
+        network_bytes_sent=42,
+        runtime_us=1337,
+    )
+    status.cpu_time_used.user_cpu_time = 1.5
+    status.cpu_time_used.system_cpu_time = 2.5
+
+    legacy_msg = jobs_pb2.GrrMessage(
+        session_id="C.0123456789abcdef/ABCDEF12",
+        request_id=1,
+        response_id=3,
+        type=jobs_pb2.GrrMessage.STATUS,
+        args_rdf_name="GrrStatus",
+        args=status.SerializeToString(),
+    )
+
+    response = models_flows.FlowResponseForLegacyResponse(legacy_msg)
+
+    self.assertIsInstance(response, flows_pb2.FlowStatus)
+    self.assertEqual(response.status, flows_pb2.FlowStatus.IOERROR)
+    self.assertEqual(response.error_message, "foo")
+    self.assertEqual(response.backtrace, "bar")
+    self.assertEqual(response.network_bytes_sent, 42)
+    self.assertEqual(response.runtime_us, 1337)
+    self.assertEqual(response.cpu_time_used.user_cpu_time, 1.5)
+    self.assertEqual(response.cpu_time_used.system_cpu_time, 2.5)
+
+    self.assertEqual(response, _FlowResponseForLegacyResponseRDF(legacy_msg))
+
+  def testStatusUnknown(self):
+    status = jobs_pb2.GrrStatus(status=jobs_pb2.GrrStatus.WORKER_STUCK)
+
+    legacy_msg = jobs_pb2.GrrMessage(
+        session_id="C.0123456789abcdef/ABCDEF12",
+        type=jobs_pb2.GrrMessage.STATUS,
+        args_rdf_name="GrrStatus",
+        args=status.SerializeToString(),
+    )
+
+    with self.assertRaises(ValueError):
+      models_flows.FlowResponseForLegacyResponse(legacy_msg)
+
+  def testIterator(self):
+    legacy_msg = jobs_pb2.GrrMessage(
+        session_id="C.0123456789abcdef/ABCDEF12",
+        request_id=1,
+        response_id=4,
+        type=jobs_pb2.GrrMessage.ITERATOR,
+    )
+
+    response = models_flows.FlowResponseForLegacyResponse(legacy_msg)
+
+    self.assertIsInstance(response, flows_pb2.FlowIterator)
+    self.assertEqual(response.client_id, "C.0123456789abcdef")
+    self.assertEqual(response.flow_id, "ABCDEF12")
+    self.assertEqual(response, _FlowResponseForLegacyResponseRDF(legacy_msg))
+
+
+if __name__ == "__main__":
+  absltest.main()
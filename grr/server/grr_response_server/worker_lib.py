@@ -3,8 +3,9 @@
 
 import logging
 import time
-from typing import Sequence
+from typing import Any, Optional, Sequence
 
+from grr_response_core import config
 from grr_response_core.lib import rdfvalue
 from grr_response_core.lib import registry
 from grr_response_core.lib.util import collection
@@ -14,11 +15,11 @@ from grr_response_proto import objects_pb2
 from grr_response_server import data_store
 from grr_response_server import flow_base
 from grr_response_server import handler_registry
+from grr_response_server import hunt_output_plugin_queue
 # pylint: disable=unused-import
 from grr_response_server import server_stubs
 # pylint: enable=unused-import
 from grr_response_server.databases import db
-from grr_response_server.rdfvalues import flow_objects as rdf_flow_objects
 from grr_response_server.rdfvalues import mig_flow_objects
 from grr_response_server.rdfvalues import mig_objects
 
@@ -80,14 +81,21 @@ class GRRWorker(object):
   """A GRR worker."""
 
   message_handler_lease_time = rdfvalue.Duration.From(600, rdfvalue.SECONDS)
+  flow_processing_time = rdfvalue.Duration.From(6, rdfvalue.HOURS)
 
   def __init__(self):
     """Constructor."""
     logging.info("Started GRR worker.")
+    self._hunt_output_plugin_queue_processor: Optional[
+        hunt_output_plugin_queue.HuntOutputPluginQueueProcessor
+    ] = None
 
   def Shutdown(self) -> None:
     data_store.REL_DB.UnregisterMessageHandler()
     data_store.REL_DB.UnregisterFlowProcessingHandler()
+    if self._hunt_output_plugin_queue_processor is not None:
+      self._hunt_output_plugin_queue_processor.Stop()
+      self._hunt_output_plugin_queue_processor = None
 
   def Run(self) -> None:
     """Event loop."""
@@ -96,7 +104,23 @@ class GRRWorker(object):
         self.message_handler_lease_time,
         limit=100,
     )
-    data_store.REL_DB.RegisterFlowProcessingHandler(self.ProcessFlow)
+    batch_size = config.CONFIG["Worker.flow_processing_batch_size"]
+    if batch_size > 1:
+      data_store.REL_DB.RegisterFlowProcessingBatchHandler(
+          self.ProcessFlows, batch_size
+      )
+    else:
+      data_store.REL_DB.RegisterFlowProcessingHandler(self.ProcessFlow)
+
+    if config.CONFIG["Worker.async_hunt_output_plugins"]:
+      self._hunt_output_plugin_queue_processor = (
+          hunt_output_plugin_queue.HuntOutputPluginQueueProcessor(
+              num_threads=config.CONFIG["Worker.hunt_output_plugin_threads"],
+              batch_size=config.CONFIG["Worker.hunt_output_plugin_batch_size"],
+              lease_time=config.CONFIG["Worker.hunt_output_plugin_lease_time"],
+          )
+      )
+      self._hunt_output_plugin_queue_processor.Start()
 
     try:
       # The main thread just keeps sleeping and listens to keyboard interrupt
@@ -107,8 +131,8 @@ class GRRWorker(object):
       logging.info("Caught interrupt, exiting.")
       self.Shutdown()
 
-  def _ReleaseProcessedFlow(self, flow_obj: rdf_flow_objects.Flow) -> bool:
-    """Release a processed flow if the processing deadline is not exceeded."""
+  def _CheckProcessingDeadline(self, flow_obj: flow_base.FlowBase) -> None:
+    """Raises if the processing deadline of the flow is exceeded."""
     rdf_flow = flow_obj.rdf_flow
     if rdf_flow.processing_deadline < rdfvalue.RDFDatetime.Now():
       raise flow_base.FlowError(
@@ -119,31 +143,39 @@ class GRRWorker(object):
               rdf_flow.processing_deadline,
           ),
       )
+
+  def _ReleaseProcessedFlow(self, flow_obj: flow_base.FlowBase) -> bool:
+    """Release a processed flow if the processing deadline is not exceeded."""
+    self._CheckProcessingDeadline(flow_obj)
     flow_obj.FlushQueuedMessages()
 
-    proto_flow = mig_flow_objects.ToProtoFlow(rdf_flow)
+    proto_flow = mig_flow_objects.ToProtoFlow(flow_obj.rdf_flow)
     return data_store.REL_DB.ReleaseProcessedFlow(proto_flow)
 
-  def ProcessFlow(
-      self, flow_processing_request: flows_pb2.FlowProcessingRequest
-  ) -> None:
-    """The callback for the flow processing queue."""
-    client_id = flow_processing_request.client_id
-    flow_id = flow_processing_request.flow_id
-
-    data_store.REL_DB.AckFlowProcessingRequests([flow_processing_request])
-
-    try:
-      flow = data_store.REL_DB.LeaseFlowForProcessing(
-          client_id,
-          flow_id,
-          processing_time=rdfvalue.Duration.From(6, rdfvalue.HOURS),
-      )
-    except db.ParentHuntIsNotRunningError:
-      flow_base.TerminateFlow(client_id, flow_id, "Parent hunt stopped.")
-      return
-
+  def _ProcessLeasedFlow(
+      self,
+      flow: flows_pb2.Flow,
+      request_dict: Optional[
+          dict[int, tuple[flows_pb2.FlowRequest, Sequence[Any]]]
+      ] = None,
+  ) -> Optional[tuple[flow_base.FlowBase, int]]:
+    """Processes all ready requests of a leased flow.
+
+    Args:
+      flow: A leased flow to process.
+      request_dict: Requests of the flow as returned by `ReadFlowRequests`. If
+        not provided, requests are read from the database.
+
+    Returns:
+      A tuple of the processed flow object and the id of the first request
+      that was processed or None if the flow is not running.
+
+    Raises:
+      FlowHasNothingToProcessError: If there was nothing to process.
+    """
     rdf_flow = mig_flow_objects.ToRDFFlow(flow)
+    client_id = rdf_flow.client_id
+    flow_id = rdf_flow.flow_id
 
     first_request_to_process = rdf_flow.next_request_to_process
     logging.info(
@@ -164,29 +196,44 @@ class GRRWorker(object):
           flow_id,
           client_id,
       )
-      return
+      return None
 
-    processed, incrementally_processed = flow_obj.ProcessAllReadyRequests()
+    processed, incrementally_processed = flow_obj.ProcessAllReadyRequests(
+        request_dict
+    )
     if processed == 0 and incrementally_processed == 0:
       raise FlowHasNothingToProcessError(
           "Unable to process any requests for flow %s on client %s."
           % (flow_id, client_id)
       )
 
-    while not self._ReleaseProcessedFlow(flow_obj):
-      processed, incrementally_processed = flow_obj.ProcessAllReadyRequests()
-      if processed == 0 and incrementally_processed == 0:
-        raise FlowHasNothingToProcessError(
-            "%s/%s: ReleaseProcessedFlow returned false but no "
-            "request could be processed (next req: %d)."
-            % (client_id, flow_id, flow_obj.rdf_flow.next_request_to_process)
-        )
+    return flow_obj, first_request_to_process
+
+  def _ProcessRequestsBlockingRelease(
+      self, flow_obj: flow_base.FlowBase
+  ) -> None:
+    """Processes requests that became ready while the flow was processed."""
+    processed, incrementally_processed = flow_obj.ProcessAllReadyRequests()
+    if processed == 0 and incrementally_processed == 0:
+      raise FlowHasNothingToProcessError(
+          "%s/%s: ReleaseProcessedFlow returned false but no "
+          "request could be processed (next req: %d)."
+          % (
+              flow_obj.rdf_flow.client_id,
+              flow_obj.rdf_flow.flow_id,
+              flow_obj.rdf_flow.next_request_to_process,
+          )
+      )
 
+  def _LogProcessedFlow(
+      self, flow_obj: flow_base.FlowBase, first_request_to_process: int
+  ) -> None:
+    rdf_flow = flow_obj.rdf_flow
     if flow_obj.IsRunning():
       logging.info(
           "Processing Flow %s/%s/%d (%s) done, next request to process: %d.",
-          client_id,
-          flow_id,
+          rdf_flow.client_id,
+          rdf_flow.flow_id,
           first_request_to_process,
           rdf_flow.flow_class_name,
           rdf_flow.next_request_to_process,
@@ -194,8 +241,172 @@ class GRRWorker(object):
     else:
       logging.info(
           "Processing Flow %s/%s/%d (%s) done, flow is done.",
-          client_id,
-          flow_id,
+          rdf_flow.client_id,
+          rdf_flow.flow_id,
           first_request_to_process,
           rdf_flow.flow_class_name,
       )
+
+  def _LeaseAndProcessFlow(self, client_id: str, flow_id: str) -> None:
+    """Leases, processes and releases a single flow."""
+    try:
+      flow = data_store.REL_DB.LeaseFlowForProcessing(
+          client_id,
+          flow_id,
+          processing_time=self.flow_processing_time,
+      )
+    except db.ParentHuntIsNotRunningError:
+      flow_base.TerminateFlow(client_id, flow_id, "Parent hunt stopped.")
+      return
+
+    processed_flow = self._ProcessLeasedFlow(flow)
+    if processed_flow is None:
+      return
+
+    flow_obj, first_request_to_process = processed_flow
+    while not self._ReleaseProcessedFlow(flow_obj):
+      self._ProcessRequestsBlockingRelease(flow_obj)
+
+    self._LogProcessedFlow(flow_obj, first_request_to_process)
+
+  def ProcessFlow(
+      self, flow_processing_request: flows_pb2.FlowProcessingRequest
+  ) -> None:
+    """The callback for the flow processing queue."""
+    data_store.REL_DB.AckFlowProcessingRequests([flow_processing_request])
+
+    self._LeaseAndProcessFlow(
+        flow_processing_request.client_id, flow_processing_request.flow_id
+    )
+
+  def _ReturnLeasedFlow(self, leased_flow: flows_pb2.Flow) -> None:
+    """Gives up the lease of a flow that failed to be processed.
+
+    The flow itself is left as it was when it got leased, so its requests are
+    processed again the next time the flow is processed. Leases that already
+    expired are left alone, as the flow might be leased by someone else now.
+
+    Args:
+      leased_flow: The flow as it was leased.
+    """
+    deadline = rdfvalue.RDFDatetime.FromMicrosecondsSinceEpoch(
+        leased_flow.processing_deadline
+    )
+    if deadline < rdfvalue.RDFDatetime.Now():
+      return
+
+    try:
+      data_store.REL_DB.UpdateFlow(
+          leased_flow.client_id,
+          leased_flow.flow_id,
+          processing_on=None,
+          processing_since=None,
+          processing_deadline=None,
+      )
+    except Exception as e:  # pylint: disable=broad-except
+      logging.exception(
+          "Error returning flow %s/%s: %s",
+          leased_flow.client_id,
+          leased_flow.flow_id,
+          e,
+      )
+
+  def ProcessFlows(
+      self, flow_processing_requests: Sequence[flows_pb2.FlowProcessingRequest]
+  ) -> None:
+    """The callback for batches of the flow processing queue.
+
+    All flows of the batch are leased, have their requests read, their results
+    written and are released with a single database call each. Flows that
+    can't be leased or released in bulk fall back to being processed one by
+    one, and so do all flows of the batch if flushing them in bulk fails.
+    Errors are logged and don't affect other flows of the batch: the lease of
+    a flow that fails is given up, so that it can be processed again.
+
+    Args:
+      flow_processing_requests: Flow processing requests to handle.
+    """
+    data_store.REL_DB.AckFlowProcessingRequests(flow_processing_requests)
+
+    # A flow might have multiple processing requests in a single batch.
+    flow_keys = list(
+        dict.fromkeys(
+            (r.client_id, r.flow_id) for r in flow_processing_requests
+        )
+    )
+    flows = data_store.REL_DB.LeaseFlowsForProcessing(
+        flow_keys, processing_time=self.flow_processing_time
+    )
+
+    for client_id, flow_id in flow_keys:
+      if (client_id, flow_id) in flows:
+        continue
+      # Leasing the flow on its own tells why it can't be processed (e.g. its
+      # parent hunt is stopped) and handles it accordingly.
+      try:
+        self._LeaseAndProcessFlow(client_id, flow_id)
+      except Exception as e:  # pylint: disable=broad-except
+        logging.exception(
+            "Error processing flow %s/%s: %s", client_id, flow_id, e
+        )
+
+    if not flows:
+      return
+
+    request_dicts = data_store.REL_DB.ReadFlowsRequests(list(flows))
+
+    processed_flows = []
+    for (client_id, flow_id), flow in flows.items():
+      try:
+        processed_flow = self._ProcessLeasedFlow(
+            flow, request_dicts.get((client_id, flow_id), {})
+        )
+        if processed_flow is not None:
+          flow_obj, _ = processed_flow
+          self._CheckProcessingDeadline(flow_obj)
+          processed_flows.append(processed_flow)
+      except Exception as e:  # pylint: disable=broad-except
+        logging.exception(
+            "Error processing flow %s/%s: %s", client_id, flow_id, e
+        )
+        self._ReturnLeasedFlow(flow)
+
+    if not processed_flows:
+      return
+
+    flow_objs = [flow_obj for flow_obj, _ in processed_flows]
+    try:
+      flow_base.FlowBase.FlushQueuedMessagesOfFlows(flow_objs)
+      released = data_store.REL_DB.ReleaseProcessedFlows(
+          [mig_flow_objects.ToProtoFlow(f.rdf_flow) for f in flow_objs]
+      )
+    except Exception as e:  # pylint: disable=broad-except
+      logging.exception(
+          "Error flushing %d flows in bulk, flushing them one by one: %s",
+          len(flow_objs),
+          e,
+      )
+      # Whatever wasn't flushed is still queued in the flow objects.
+      released = None
+
+    for flow_obj, first_request_to_process in processed_flows:
+      rdf_flow = flow_obj.rdf_flow
+      key = (rdf_flow.client_id, rdf_flow.flow_id)
+      try:
+        if released is None:
+          while not self._ReleaseProcessedFlow(flow_obj):
+            self._ProcessRequestsBlockingRelease(flow_obj)
+        elif not released.get(key):
+          self._ProcessRequestsBlockingRelease(flow_obj)
+          while not self._ReleaseProcessedFlow(flow_obj):
+            self._ProcessRequestsBlockingRelease(flow_obj)
+
+        self._LogProcessedFlow(flow_obj, first_request_to_process)
+      except Exception as e:  # pylint: disable=broad-except
+        logging.exception(
+            "Error processing flow %s/%s: %s",
+            rdf_flow.client_id,
+            rdf_flow.flow_id,
+            e,
+        )
+        self._ReturnLeasedFlow(flows[key])